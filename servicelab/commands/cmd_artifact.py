@@ -1,18 +1,19 @@
 """
 Stack artifact commands to
-1.  Download an artifact.
+1.  Download artifacts.
 2.  Display artifact statistics.
-3.  Upload an artifact.
+3.  Upload artifacts.
 """
-import os
+import sys
 import json
-import subprocess
 
 import click
-import requests
 
 from requests.auth import HTTPBasicAuth
 from servicelab.stack import pass_context
+from servicelab.utils import download_utils
+from servicelab.utils import http_utils
+from servicelab.utils import upload_utils
 from servicelab.utils import logger_utils
 from servicelab import settings
 
@@ -59,13 +60,14 @@ def display_artifact_status(ctx,
                           "Please, set the correct value for both and retry." %
                           (username, password))
         sys.exit(1)
-    requests.packages.urllib3.disable_warnings()
-    res = requests.get(url, auth=HTTPBasicAuth(username, password))
+    client = http_utils.client_for(ctx, 'artifactory', HTTPBasicAuth(username, password),
+                                   http_utils.origin(url))
+    res = client.get(url)
     slab_logger.log(25, res.content)
 
 
-@cli.command('download', short_help='Download an artifact from Artifactory.')
-@click.argument('url', required=True)
+@cli.command('download', short_help='Download artifacts from Artifactory.')
+@click.argument('urls', nargs=-1, required=True)
 @click.option('-u',
               '--username',
               help='Provide artifactory username')
@@ -76,6 +78,11 @@ def display_artifact_status(ctx,
               '--destination',
               help='Provide destination folder',
               default=".")
+@click.option('-j',
+              '--jobs',
+              help='Number of artifacts downloaded at the same time',
+              type=int,
+              default=4)
 @click.option('-i',
               '--interactive',
               flag_value=True,
@@ -83,39 +90,44 @@ def display_artifact_status(ctx,
 @pass_context
 def download_artifact(ctx,
                       destination,
-                      url,
+                      urls,
                       username,
                       password,
+                      jobs,
                       interactive):
     """
-    Download the artifact.
+    Download the artifacts, given by their Artifactory storage api urls.  An
+    interrupted download is resumed by running the command again.
     """
     if not username:
         username = ctx.get_username()
     if not password:
         password = ctx.get_password(interactive)
-    requests.packages.urllib3.disable_warnings()
-    res = requests.get(url, auth=HTTPBasicAuth(username, password))
-    download_uri = json.loads(res.content)["downloadUri"]
+    auth = HTTPBasicAuth(username, password)
+    downloads = []
+    for url in urls:
+        client = http_utils.client_for(ctx, 'artifactory', auth, http_utils.origin(url))
+        res = client.get(url)
+        try:
+            info = json.loads(res.content)
+            downloads.append(download_utils.artifactory_download(info, destination,
+                                                                 auth))
+        except (ValueError, KeyError):
+            slab_logger.error("Unable to find the artifact %s" % url)
+            sys.exit(1)
 
-    file_name = download_uri.split('/')[-1]
     slab_logger.info("Starting download of {0} to {1}. It might "
-                     "take a few minutes.".format(download_uri, destination))
-    with open(os.path.join(destination, file_name), 'wb') as handle:
-        response = requests.get(download_uri,
-                                stream=True,
-                                auth=HTTPBasicAuth(username, password))
-
-        if not response.ok:
-            slab_logger.error("Error occured during downloading")
-            return
-
-        handle.write(response.content)
+                     "take a few minutes.".format(', '.join(download.url for download
+                                                            in downloads), destination))
+    returncode, _ = download_utils.download_files(downloads, jobs)
+    if not returncode == 0:
+        slab_logger.error("Error occured during downloading")
+        sys.exit(1)
 
     slab_logger.info("Download Complete")
 
 
-@cli.command('upload', short_help='Upload an artifact to Artifactory.')
+@cli.command('upload', short_help='Upload artifacts to Artifactory.')
 @click.argument('url', required=True)
 @click.option('-u',
               '--username',
@@ -125,8 +137,14 @@ def download_artifact(ctx,
               help='Provide artifactory password')
 @click.option('-f',
               '--filepath',
-              help='Provide file path',
+              help='Provide file path, repeat for several files',
+              multiple=True,
               required=True)
+@click.option('-j',
+              '--jobs',
+              help='Number of files uploaded at the same time',
+              type=int,
+              default=4)
 @click.option('-i',
               '--interactive',
               flag_value=True,
@@ -137,9 +155,12 @@ def upload_artifact(ctx,
                     url,
                     username,
                     password,
+                    jobs,
                     interactive):
     """
-    Upload the artifact.
+    Upload the artifacts.  With several files, or a url ending in /, the url is
+    the folder they are uploaded to.  Artifacts Artifactory already has are not
+    sent again.
     """
     if not username:
         username = ctx.get_username()
@@ -149,13 +170,10 @@ def upload_artifact(ctx,
         slab_logger.error("Username is %s and password is %s. "
                           "Please, set the correct value for both and retry." %
                           (username, password))
-    slab_logger.info("Starting upload of {0} to {1}".format(filepath, url))
-    subprocess.call(['curl',
-                     '-X',
-                     'PUT',
-                     '--upload-file',
-                     filepath,
-                     url,
-                     '-u',
-                     "{0}:{1}".format(username, password)])
+        sys.exit(1)
+    slab_logger.info("Starting upload of {0} to {1}".format(', '.join(filepath), url))
+    returncode, _ = upload_utils.artifactory_upload_files(
+        list(filepath), url, HTTPBasicAuth(username, password), workers=jobs)
+    if not returncode == 0:
+        sys.exit(1)
     slab_logger.info('Completed upload')
@@ -4,6 +4,8 @@ Build command submodule displays
     2. Build log of a Jenkins Job.
 
 """
+import sys
+
 import click
 
 from servicelab.stack import pass_context
@@ -58,10 +60,14 @@ def display_build_status(ctx,
         username = ctx.get_username()
     if not password:
         password = ctx.get_password(interactive)
-    status = jenkins_utils.get_build_status(job_name,
-                                            username,
-                                            password,
-                                            ip_address)
+    returncode, status = jenkins_utils.get_build_status(job_name,
+                                                        username,
+                                                        password,
+                                                        ip_address,
+                                                        ctx.path)
+    if not returncode == 0:
+        slab_logger.error(status)
+        sys.exit(1)
     slab_logger.log(25, status)
 
 
@@ -82,8 +88,18 @@ def display_build_status(ctx,
               '--interactive',
               flag_value=True,
               help="interactive editor")
+@click.option('-f',
+              '--follow',
+              is_flag=True,
+              help="Keep printing the log until the build finishes")
+@click.option('-t',
+              '--tail',
+              type=int,
+              default=None,
+              help="Only print the last N lines of the log")
 @pass_context
-def display_build_log(ctx, job_name, username, password, ip_address, interactive):
+def display_build_log(ctx, job_name, username, password, ip_address, interactive,
+                      follow, tail):
     """
     Displays a build log.
     """
@@ -92,8 +108,10 @@ def display_build_log(ctx, job_name, username, password, ip_address, interactive
         username = ctx.get_username()
     if not password:
         password = ctx.get_password(interactive)
-    log = jenkins_utils.get_build_log(job_name, username, password, ip_address)
-    slab_logger.log(25, log)
+    returncode = jenkins_utils.get_build_log(job_name, username, password, ip_address,
+                                             ctx.path, follow=follow, tail=tail)
+    if not returncode == 0:
+        sys.exit(1)
 
 
 @cli.command('run', short_help='Trigger a build in Jenkins.')
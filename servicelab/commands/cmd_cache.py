@@ -0,0 +1,104 @@
+"""
+The module contains the cache subcommand implemenation.
+"""
+import sys
+import time
+import click
+
+from servicelab.stack import pass_context
+from servicelab.utils import cache_utils
+from servicelab.utils import mirror_utils
+from servicelab.utils import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.cache')
+
+
+@click.group('cache', short_help='Manage the local caches in .stack/cache.',
+             add_help_option=True)
+def cli():
+    """
+    Manage the persistent ccs-data index and the git mirrors kept in .stack/cache.
+    """
+    pass
+
+
+@cli.command('rebuild', short_help='Rebuild the ccs-data index from scratch.')
+@pass_context
+def cache_rebuild(ctx):
+    """
+    Throws away the ccs-data index and re-reads every host yaml in ccs-data.
+    """
+    slab_logger.info('Rebuilding the ccs-data index')
+    index = cache_utils.get_ccsdata_index(ctx.path)
+    host_count = index.rebuild()
+    slab_logger.log(25, 'Indexed %i host files' % host_count)
+
+
+@cli.command('stats', short_help='Show the size and hit rate of the ccs-data index.')
+@pass_context
+def cache_stats(ctx):
+    """
+    Shows the number of indexed entries and the hit rate of the ccs-data index.
+    """
+    slab_logger.info('Displaying ccs-data index statistics')
+    summary = cache_utils.get_ccsdata_index(ctx.path).summary()
+    slab_logger.log(25, 'Index file  : %s' % summary['index_file'])
+    slab_logger.log(25, 'Index size  : %i bytes' % summary['size'])
+    slab_logger.log(25, 'Directories : %i' % summary['dirs'])
+    slab_logger.log(25, 'Host files  : %i' % summary['files'])
+    slab_logger.log(25, 'Hits        : %i' % summary['hits'])
+    slab_logger.log(25, 'Misses      : %i' % summary['misses'])
+    slab_logger.log(25, 'Hit rate    : %.1f%%' % summary['hit_rate'])
+
+
+@cli.command('clear', short_help='Remove the ccs-data index.')
+@pass_context
+def cache_clear(ctx):
+    """
+    Removes the ccs-data index.  It is rebuilt on the next command that needs it.
+    """
+    slab_logger.info('Clearing the ccs-data index')
+    cache_utils.get_ccsdata_index(ctx.path).clear()
+    slab_logger.log(25, 'ccs-data index cleared')
+
+
+@cli.command('mirrors', short_help='List the git mirrors services are cloned from.')
+@pass_context
+def cache_mirrors(ctx):
+    """
+    Lists the git mirrors in .stack/cache/git-mirrors with their size and when
+    they were last used.
+    """
+    slab_logger.info('Displaying the git mirrors')
+    mirrors = mirror_utils.list_mirrors(ctx.path)
+    if not mirrors:
+        slab_logger.log(25, 'No git mirrors')
+        return
+    for mirror in mirrors:
+        slab_logger.log(25, '%-40s %8.1f MB  last used %s%s'
+                        % (mirror['name'], mirror['size'] / 1048576.0,
+                           time.strftime('%Y-%m-%d %H:%M',
+                                         time.localtime(mirror['last_used'])),
+                           '  (in use)' if mirror['in_use'] else ''))
+
+
+@cli.command('gc', short_help='Remove unused git mirrors.')
+@click.option('--max-age', type=int, default=mirror_utils.MAX_AGE_DAYS,
+              help='Remove mirrors unused for this many days.')
+@click.option('--max-size', type=int, default=mirror_utils.MAX_SIZE_MB,
+              help='Remove the least recently used mirrors while all of them take '
+                   'more than this many MB.')
+@pass_context
+def cache_gc(ctx, max_age, max_size):
+    """
+    Removes git mirrors no service clone uses that are too old or do not fit in
+    the size limit.
+    """
+    slab_logger.info('Collecting unused git mirrors')
+    if max_age < 0 or max_size < 0:
+        slab_logger.error('--max-age and --max-size can not be negative')
+        sys.exit(1)
+    removed = mirror_utils.gc(ctx.path, max_age, max_size)
+    slab_logger.log(25, 'Removed %i git mirrors%s'
+                    % (len(removed), (': ' + ', '.join(removed)) if removed else ''))
@@ -64,10 +64,8 @@ def destroy_vm(ctx, force, vm_name, all_vms):
         if vm_name:
             slab_logger.error("VM Name cannot be specified with --all-vms option.")
         else:
-            vm_connection = vagrant_utils.Connect_to_vagrant(vm_name="infra-001",
-                                                             path=ctx.path)
             try:
-                statuses = vm_connection.v.status()
+                statuses = vagrant_utils.vm_statuses(ctx.path)
                 for status in statuses:
                     if "infra-001" not in status[0]:
                         vm_utils.destroy_vm_by_name(ctx, force, status[0])
@@ -14,9 +14,9 @@ import json
 import click
 import requests
 from requests.auth import HTTPBasicAuth
-from bs4 import BeautifulSoup
 
 from servicelab.stack import pass_context
+from servicelab.utils import http_utils
 from servicelab.utils import jenkins_utils
 from servicelab.utils import pulp_utils
 from servicelab.utils import gerrit_functions
@@ -47,11 +47,13 @@ def find_repo(ctx, search_term):
     slab_logger.info('Searching Gerrit for repos matching %s' % search_term)
     username = ctx.get_username()
     gfn = gerrit_functions.GerritFns(username, "", ctx)
-    repo_list = gfn.repo_list()
+    try:
+        repo_list = gfn.find_repos(search_term)
+    except re.error as ex:
+        slab_logger.error("Invalid search term %s: %s" % (search_term, ex))
+        sys.exit(1)
     for elem in repo_list:
-        match_obj = re.search(search_term, elem, re.I)
-        if match_obj:
-            slab_logger.log(25, elem)
+        slab_logger.log(25, elem)
 
 
 def validate_artifact_ip_cb(ctx, param, value):
@@ -98,11 +100,12 @@ def find_artifact(ctx, search_term, ip_address,
                           (username, password))
         sys.exit(1)
     if ip_address is None:
-        ip_address = ctx.get_artifactory_info()
+        ip_address = ctx.get_artifactory_info()['url']
     slab_logger.info('Searching for %s artifact in Artifactory' % search_term)
     find_url = ip_address + "/api/search/artifact?name=" + search_term
-    requests.packages.urllib3.disable_warnings()
-    res = requests.get(find_url, auth=HTTPBasicAuth(username, password))
+    client = http_utils.client_for(ctx, 'artifactory', HTTPBasicAuth(username, password),
+                                   http_utils.origin(find_url))
+    res = client.get(find_url)
     if json.loads(res.content).get('results'):
         for val in json.loads(res.content)["results"]:
             slab_logger.log(25, val["uri"])
@@ -155,9 +158,13 @@ def find_pipe(ctx, search_term, localrepo, username,
         internal function returns a list of the pipeline
         strings from the go server
         """
+        from bs4 import BeautifulSoup
+
         slab_logger.info('Finding pipelines from the go server')
         server_url = "http://{0}/go/api/pipelines.xml".format(ip_address)
-        res = requests.get(server_url, auth=HTTPBasicAuth(username, password))
+        client = http_utils.client_for(ctx, 'gocd', HTTPBasicAuth(username, password),
+                                       'http://%s' % ip_address)
+        res = client.get(server_url)
         soup = BeautifulSoup(res.content, "html.parser")
         pipelines = soup.findAll('pipeline')
         return pipelines
@@ -257,11 +264,13 @@ def find_build(ctx, search_term, username, password, ip_address, interactive):
                           (username, password))
         sys.exit(1)
 
-    returncode, server = jenkins_utils.get_server_instance(ip_address, username, password)
-    if not returncode == 0:
-        slab_logger.error('Unable to connect to Jenkins server')
+    client = jenkins_utils.JenkinsClient(ip_address, username, password, ctx.path)
+    try:
+        job_names = client.job_names()
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        slab_logger.error('Unable to connect to Jenkins server : %s' % ex)
         sys.exit(1)
-    for key in server.keys():
+    for key in job_names:
         match_obj = re.search(search_term, key, re.M | re.I)
         if match_obj:
             slab_logger.log(25, key)
@@ -12,15 +12,14 @@ import os
 import re
 import sys
 import json
-import yaml
 
 import click
-from bs4 import BeautifulSoup
-from requests.auth import HTTPBasicAuth
 import requests
+from requests.auth import HTTPBasicAuth
 
 from servicelab.stack import pass_context
 from servicelab.utils import ccsdata_utils
+from servicelab.utils import http_utils
 from servicelab.utils import jenkins_utils
 from servicelab.utils import artifact_utils
 from servicelab.utils import gocd_utils
@@ -182,13 +181,13 @@ def list_build(ctx, ip_address, username, password, interactive):
     if not password:
         password = ctx.get_password(interactive)
     slab_logger.info('Listing builds in Jenkins.')
-    returncode, server = jenkins_utils.get_server_instance(ip_address,
-                                                           username,
-                                                           password)
-    if not returncode == 0:
-        slab_logger.error('Unable to connect to Jenkins server')
+    client = jenkins_utils.JenkinsClient(ip_address, username, password, ctx.path)
+    try:
+        job_names = client.job_names()
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        slab_logger.error('Unable to connect to Jenkins server : %s' % ex)
         sys.exit(1)
-    for key in server.keys():
+    for key in job_names:
         slab_logger.log(25, key)
 
 
@@ -223,8 +222,9 @@ def list_artifact(ctx, ip_address, username, password, interactive):
         password = ctx.get_password(interactive)
     slab_logger.info('Listing artifacts in Artifactory.')
     list_url = ip_address + "/api/search/creation?from=968987355"
-    requests.packages.urllib3.disable_warnings()
-    res = requests.get(list_url, auth=HTTPBasicAuth(username, password))
+    client = http_utils.client_for(ctx, 'artifactory', HTTPBasicAuth(username, password),
+                                   http_utils.origin(list_url))
+    res = client.get(list_url)
     for val in json.loads(res.content)["results"]:
         logger.log(25, val["uri"])
 
@@ -257,6 +257,8 @@ def list_pipe(ctx, localrepo, username, password, ip_address, interactive):
     """
     Lists piplines using GO's API.
     """
+    from bs4 import BeautifulSoup
+
     slab_logger.info('Listing go pipelines')
     if not username:
         username = ctx.get_username()
@@ -274,7 +276,9 @@ def list_pipe(ctx, localrepo, username, password, ip_address, interactive):
         servicesdirs = os.listdir(os.path.join(ctx.path, "services"))
 
     # Find latest run info
-    res = requests.get(server_url, auth=HTTPBasicAuth(username, password))
+    client = http_utils.client_for(ctx, 'gocd', HTTPBasicAuth(username, password),
+                                   'http://%s' % ip_address)
+    res = client.get(server_url)
     soup = BeautifulSoup(res.content, "html.parser")
     pipelines = soup.findAll('pipeline')
     display_pipelines(pipelines, localrepo, servicesdirs)
@@ -339,17 +343,14 @@ def flavors_list(ctx, site):
         flavor_list = ccsdata_utils.get_flavors_from_site(site_env_path)
     else:
         slab_logger.info('Listing flavors for all sites')
-        try:
-            source_file = os.path.join(ctx.path, 'cache', 'all_sites_flavors.yaml')
-            with open(source_file, 'r') as stream:
-                source_data = yaml.load(stream)
-        except IOError:
-            slab_logger.error('Unable to open %s.  Run the "make_flavors_yaml.py" to ' +
-                              'create this file' % source_file)
+        ret_code, sites = ccsdata_utils.list_envs_or_sites(ctx.path)
+        if ret_code > 0:
             return 1
         flavor_list = []
-        for site in source_data:
-            for flavor in source_data[site]:
+        for site in sites:
+            site_env_path = os.path.join(ctx.path, 'services', 'ccs-data', 'sites', site,
+                                         'environments')
+            for flavor in ccsdata_utils.get_flavors_from_site(site_env_path):
                 if flavor not in flavor_list:
                     flavor_list.append(flavor)
         flavor_list.sort()
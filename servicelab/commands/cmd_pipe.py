@@ -8,13 +8,13 @@ import sys
 import json
 import copy
 import click
-import requests
 import xml.etree.ElementTree as ET
 
-from bs4 import BeautifulSoup
 from requests.auth import HTTPBasicAuth
 
 from servicelab.utils import gocd_utils
+from servicelab.utils import http_utils
+from servicelab.utils import pipewatch_utils
 from servicelab.stack import pass_context
 from servicelab.utils import logger_utils
 from servicelab import settings
@@ -22,6 +22,14 @@ from servicelab import settings
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.pipe')
 
 
+def _client(ctx, ip_address, username, password):
+    """
+    Returns the pooled client of the go server at ip_address.
+    """
+    return http_utils.client_for(ctx, 'gocd', HTTPBasicAuth(username, password),
+                                 'http://%s' % ip_address)
+
+
 @click.group(
     'pipe',
     short_help='Command subset to help you work with Go pipelines.',
@@ -63,6 +71,8 @@ def display_pipeline_log(ctx,
     """
     Displays a pipeline log.
     """
+    from bs4 import BeautifulSoup
+
     slab_logger.info('Displaying %s log' % pipeline_name)
     if not username:
         username = ctx.get_username()
@@ -74,9 +84,9 @@ def display_pipeline_log(ctx,
                           (username, password))
         sys.exit(1)
     stages_url = "http://{0}/go/api/pipelines/{1}/stages.xml"
+    client = _client(ctx, ip_address, username, password)
     # Find latest run info
-    res = requests.get(stages_url.format(ip_address, pipeline_name),
-                       auth=HTTPBasicAuth(username, password))
+    res = client.get(stages_url.format(ip_address, pipeline_name))
     soup = BeautifulSoup(res.content, "html.parser")
     try:
         latest_job_info_url = soup.findAll(
@@ -89,8 +99,7 @@ def display_pipeline_log(ctx,
     # Find all the job info for that run
     latest_job_info_url = latest_job_info_url.replace("gocd_java_server",
                                                       ip_address)
-    job_info_res = requests.get(latest_job_info_url,
-                                auth=HTTPBasicAuth(username, password))
+    job_info_res = client.get(latest_job_info_url)
     soup = BeautifulSoup(job_info_res.content, "html.parser")
     job_urls = soup.findAll('job')
 
@@ -98,13 +107,11 @@ def display_pipeline_log(ctx,
     for job_url in job_urls:
         job_url['href'] = job_url['href'].replace("gocd_java_server",
                                                   ip_address)
-        job_url_res = requests.get(job_url['href'],
-                                   auth=HTTPBasicAuth(username, password))
+        job_url_res = client.get(job_url['href'])
         soup = BeautifulSoup(job_url_res.content, "html.parser")
         log_url = soup.find('artifacts')['baseuri']
         log_url = log_url.replace("gocd_java_server", ip_address)
-        log_url_res = requests.get(log_url + "/cruise-output/console.log",
-                                   auth=HTTPBasicAuth(username, password))
+        log_url_res = client.get(log_url + "/cruise-output/console.log")
         soup = BeautifulSoup(log_url_res.content, "html.parser")
         print "\n\n-------------------Printing job log for pipeline : ", \
               log_url, "-------------------------"
@@ -141,6 +148,8 @@ def display_pipeline_status(ctx,
     """
     Displays a pipeline status.
     """
+    from bs4 import BeautifulSoup
+
     slab_logger.info('Displaying status of %s' % pipeline_name)
     if not username:
         username = ctx.get_username()
@@ -152,8 +161,8 @@ def display_pipeline_status(ctx,
                           (username, password))
         sys.exit(1)
     server_url = "http://{0}/go/api/pipelines/{1}/status"
-    res = requests.get(server_url.format(ip_address, pipeline_name),
-                       auth=HTTPBasicAuth(username, password))
+    res = _client(ctx, ip_address, username, password).get(
+        server_url.format(ip_address, pipeline_name))
     soup = BeautifulSoup(res.content, "html.parser")
     print str(soup)
 
@@ -198,6 +207,8 @@ def trigger_pipeline(ctx,
     """
     Runs a pipeline.
     """
+    from bs4 import BeautifulSoup
+
     slab_logger.info('Running pipeline %s' % pipeline_name)
     if not username:
         username = ctx.get_username()
@@ -227,8 +238,8 @@ def trigger_pipeline(ctx,
     slab_logger.log(25, "Current pipeline_counter : %s"
                     % (current_pipeline_counter + 1))
     slab_logger.log(25, "Scheduling pipeline.")
-    res = requests.post(server_url.format(ip_address, pipeline_name),
-                        auth=HTTPBasicAuth(username, password), data=env_data)
+    res = _client(ctx, ip_address, username, password).post(
+        server_url.format(ip_address, pipeline_name), data=env_data)
     soup = BeautifulSoup(res.content, "html.parser")
     slab_logger.log(25, soup)
     if all_stages:
@@ -241,6 +252,67 @@ def trigger_pipeline(ctx,
                 password))
 
 
+@cli.command('watch', short_help='Watch Go pipelines until their stages finish.')
+@click.argument('pipeline_names', nargs=-1, required=True)
+@click.option('-u',
+              '--username',
+              help='Provide go server username')
+@click.option('-p',
+              '--password',
+              help='Provide go server password')
+@click.option('-ip',
+              '--ip_address',
+              default=None,
+              callback=gocd_utils.validate_pipe_ip_cb,
+              help='Provide the go server ip address and port <ip:port>.',
+              required=False)
+@click.option('-c',
+              '--counter',
+              type=int,
+              default=None,
+              help='Watch this run of the pipelines instead of the latest one.')
+@click.option('--max-interval',
+              type=float,
+              default=pipewatch_utils.MAX_INTERVAL,
+              help='Longest wait in seconds between polls of a pipeline.')
+@click.option('-i',
+              '--interactive',
+              flag_value=True,
+              help="interactive editor")
+@pass_context
+def watch_pipelines(ctx,
+                    pipeline_names,
+                    username,
+                    password,
+                    ip_address,
+                    counter,
+                    max_interval,
+                    interactive):
+    """
+    Watches pipelines, printing every stage transition, until none of their
+    stages is running.  Exits with 1 if a stage failed.
+    """
+    slab_logger.info('Watching %s' % ', '.join(pipeline_names))
+    if not username:
+        username = ctx.get_username()
+    if not password:
+        password = ctx.get_password(interactive)
+    if not password or not username:
+        slab_logger.error("Username is %s and password is %s. "
+                          "Please, set the correct value for both and retry." %
+                          (username, password))
+        sys.exit(1)
+    watcher = pipewatch_utils.PipelineWatcher(_client(ctx, ip_address, username, password),
+                                              max_interval=max_interval)
+    for event in watcher.watch(pipeline_names, counter):
+        slab_logger.log(25, pipewatch_utils.format_event(event))
+    failed = sorted(name for name, instance in watcher.instances.items()
+                    if not pipewatch_utils.instance_passed(instance))
+    if failed or watcher.errors:
+        slab_logger.error('Failed: %s' % ', '.join(failed + sorted(watcher.errors)))
+        sys.exit(1)
+
+
 @cli.command('clone', short_help='Clone a Go pipeline - Go admins only.')
 @click.argument('pipeline_name', required=True)
 @click.argument('new_pipeline_name', required=True)
@@ -285,8 +357,7 @@ def clone_pipeline(ctx,
         ip_address)
     post_config_xmlurl = "http://{0}/go/api/admin/config.xml".format(
         ip_address)
-    requests.post(config_xmlurl,
-                  auth=HTTPBasicAuth(username, password))
+    _client(ctx, ip_address, username, password).post(config_xmlurl)
 
     # Retrieve xml config from server
     (md5, root) = gocd_utils.get_config(config_xmlurl, (username, password))
@@ -273,17 +273,17 @@ def review_abandon(ctx, gerrit_change_id, project, username, message, interactiv
 
 
 @cli.command('show', short_help='Display a specific review by Gerrit change ID')
-@click.argument('gerrit_change_id')
+@click.argument('gerrit_change_ids', nargs=-1, required=True)
 @click.option('-p', '--project', help='Enter the project. '
                                       'Default is current selected using stack workon.')
 @click.option('-u', '--username', help='Enter the desired username')
 @click.option('-i', '--interactive', help='interactive editor')
 @pass_context
-def review_show(ctx, gerrit_change_id, project, username, interactive):
+def review_show(ctx, gerrit_change_ids, project, username, interactive):
     """
-    Display the review
+    Display the reviews, queried at once over one connection
     """
-    slab_logger.info('Displaying review for %s' % gerrit_change_id)
+    slab_logger.info('Displaying review for %s' % ', '.join(gerrit_change_ids))
     try:
         if not username:
             username = ctx.get_username()
@@ -297,7 +297,7 @@ def review_show(ctx, gerrit_change_id, project, username, interactive):
                 slab_logger.log(25, "current project is " + project)
 
         gfn = gerrit_functions.GerritFns(username, project, ctx)
-        gfn.print_gerrit("detail", gerrit_change_id)
+        gfn.print_gerrit("detail", list(gerrit_change_ids))
     except Exception as ex:
         slab_logger.error(str(ex))
 
@@ -6,13 +6,13 @@ Stack rpm commands to
 """
 import sys
 import json
-import time
 
 import click
-import requests
 
 from servicelab.stack import pass_context
 from servicelab.utils import pulp_utils
+from servicelab.utils import download_utils
+from servicelab.utils import upload_utils
 from servicelab.utils import logger_utils
 from servicelab import settings
 
@@ -84,8 +84,8 @@ def display_rpm_status(ctx,
     slab_logger.log(25, json.dumps(json.loads(val), indent=4, sort_keys=True))
 
 
-@cli.command('download', short_help='Download the rpm from pulp repository')
-@click.argument('rpm', required='True')
+@cli.command('download', short_help='Download rpms from pulp repository')
+@click.argument('rpms', nargs=-1, required=True)
 @click.option('-u',
               '--username',
               help='Provide pulp username')
@@ -105,6 +105,11 @@ def display_rpm_status(ctx,
     help='Provide the pulp repo id ',
     required=True,
     default=None)
+@click.option('-j',
+              '--jobs',
+              help='Number of rpms downloaded at the same time',
+              type=int,
+              default=4)
 @click.option('-i',
               '--interactive',
               flag_value=True,
@@ -114,10 +119,12 @@ def download_rpm(ctx, username,
                  password,
                  ip_address,
                  pulp_repo,
-                 rpm,
+                 rpms,
+                 jobs,
                  interactive):
     """
-    Download the artifact.
+    Download the rpms.  An interrupted download is resumed by running the
+    command again.
     """
     slab_logger.info('Downloading rpm from pulp repo')
     if not username:
@@ -135,41 +142,42 @@ def download_rpm(ctx, username,
     res_json = json.loads(val)
     repo_json = filter(lambda x: x['repo_id'] == pulp_repo, res_json)
 
-    if len(repo_json) > 0:
-        url = "/pulp/api/v2/repositories/%s/search/units/" % (pulp_repo)
+    if not len(repo_json) > 0:
+        slab_logger.error(
+            "Repo with id %s does not exist. Unable to download the rpm." %
+            (pulp_repo))
+        return
+    downloads = []
+    url = "/pulp/api/v2/repositories/%s/search/units/" % (pulp_repo)
+    for rpm in rpms:
         payload = '{ "criteria": { "filters" : { "unit" : { "name" : "%s"}},'\
-                  ' "fields": { "unit": [ "name", "filename" ] },'\
+                  ' "fields": { "unit": [ "name", "filename", "checksum",'\
+                  ' "checksumtype", "size" ] },'\
                   ' "type_ids": [ "rpm" ] } }' % (rpm)
         val = pulp_utils.post(url, ip_address, ctx, username,
                               password, payload)
         rpm_json = json.loads(val)
-        if len(rpm_json) > 0:
-            download_url = '%s/pulp/repos/%s/%s' % (ip_address,
-                                                    repo_json[0]
-                                                    ['config']
-                                                    ['relative_url'],
-                                                    rpm_json[0]['metadata']
-                                                    ['filename'])
-            slab_logger.log(25, "Starting download from {0}".format(download_url))
-            req = requests.get(download_url, verify=False)
-            with open(rpm_json[0]['metadata']['filename'], 'wb') as rpm_file:
-                for chunk in req.iter_content(chunk_size=1024):
-                    if chunk:
-                        rpm_file.write(chunk)
-                        slab_logger.log(25, ".", nl=False)
-            slab_logger.log(25, "\nDownload complete.")
-            return
-        else:
+        if not len(rpm_json) > 0:
             slab_logger.error(
                 "Rpm %s could not be download since it was"
                 " not found in repo : %s" % (rpm, pulp_repo))
-    else:
-        slab_logger.error(
-            "Repo with id %s does not exist. Unable to download the rpm." %
-            (pulp_repo))
+            return
+        download_url = '%s/pulp/repos/%s/%s' % (ip_address,
+                                                repo_json[0]
+                                                ['config']
+                                                ['relative_url'],
+                                                rpm_json[0]['metadata']
+                                                ['filename'])
+        slab_logger.log(25, "Starting download from {0}".format(download_url))
+        downloads.append(download_utils.pulp_download(download_url,
+                                                      rpm_json[0]['metadata'], '.'))
+    returncode, _ = download_utils.download_files(downloads, jobs)
+    if not returncode == 0:
+        sys.exit(1)
+    slab_logger.log(25, "Download complete.")
 
 
-@cli.command('upload', short_help='Upload the rpm to pulp repository')
+@cli.command('upload', short_help='Upload rpms to pulp repository')
 @click.option('-u',
               '--username',
               help='Provide pulp username')
@@ -191,8 +199,14 @@ def download_rpm(ctx, username,
     default=None)
 @click.option('-f',
               '--filepath',
-              help='Provide file path to rpm',
+              help='Provide file path to rpm, repeat for several rpms',
+              multiple=True,
               required=True)
+@click.option('-j',
+              '--jobs',
+              help='Number of segments uploaded at the same time',
+              type=int,
+              default=4)
 @click.option('-i',
               '--interactive',
               flag_value=True,
@@ -203,9 +217,10 @@ def upload_rpm(ctx, ip_address,
                filepath,
                username,
                password,
+               jobs,
                interactive):
     """
-    Upload the rpm.
+    Upload the rpms.
     """
     slab_logger.info('Uploading rpm to pulp repo')
     if not username:
@@ -217,41 +232,13 @@ def upload_rpm(ctx, ip_address,
                           "Please, set the correct value for both and retry." %
                           (username, password))
         sys.exit(1)
-    slab_logger.log(25, "Starting upload of {0}".format(filepath))
-    url = "/pulp/api/v2/content/uploads/"
-    val = pulp_utils.post(url, ip_address, ctx, username, password, "")
-    res_json = json.loads(val)
-    slab_logger.log(25, "Got upload id : %s " % (res_json['upload_id']))
-    rpm_file = open(filepath, 'rb')
-    offset = 0
-    while True:
-        chunk = rpm_file.read(100000)
-        if chunk:
-            put_url = "%s%s/%s/" % (url, res_json['upload_id'], offset)
-            offset = offset + 100000
-            slab_logger.log(25, ".", nl=False)
-            val = pulp_utils.put(put_url, ip_address,
-                                 ctx, username, password, chunk)
-            slab_logger.log(25, ".", nl=False)
-        else:
-            break
-    rpm_file.close()
-    payload = '{"override_config": {}, "unit_type_id": "rpm", "upload_id": '\
-              '"%s", "unit_key": {}, "unit_metadata": '\
-              '{"checksum_type": null}}' % (res_json['upload_id'])
-    post_url = '/pulp/api/v2/repositories/%s/actions'\
-               '/import_upload/' % (pulp_repo)
-    slab_logger.log(25, "\nImporting rpm to server for upload id: %s "
-                    % (res_json['upload_id']))
-    time.sleep(2)
-    val = pulp_utils.post(post_url, ip_address, ctx, username,
-                          password, payload)
-    payload = '{"override_config": {},  "id" : "yum_distributor"}'
-    post_url = "/pulp/api/v2/repositories/%s/actions/publish/" % (pulp_repo)
-    slab_logger.log(25, "Publishing rpm to server for upload id: %s "
-                    % (res_json['upload_id']))
-    val = pulp_utils.post(post_url, ip_address, ctx, username,
-                          password, payload)
-    slab_logger.log(25, "Upload process completed for rpm {0}."
-                    "\nGot response from server : ".format(filepath))
-    slab_logger.log(25, val)
+    slab_logger.log(25, "Starting upload of {0}".format(', '.join(filepath)))
+    uploader = upload_utils.PulpUploader(ip_address, (username, password), workers=jobs)
+    try:
+        returncode, _ = uploader.upload(pulp_repo, list(filepath))
+    finally:
+        uploader.close()
+    if not returncode == 0:
+        sys.exit(1)
+    slab_logger.log(25, "Upload process completed for rpm {0}.".format(
+        ', '.join(filepath)))
@@ -6,6 +6,8 @@ Stack command to show details of
     4. artifact
     5. Pipe
 """
+import sys
+
 import click
 
 from servicelab.stack import pass_context
@@ -67,10 +69,17 @@ def show_build(ctx, build_number):
     username = ctx.get_username()
     servername = context_utils.get_jenkins_url()
     password = click.prompt("password", hide_input=True, type=str)
-    slab_logger.log(25, jenkins_utils.get_build_status(build_number, username,
-                                                       password, servername))
-    slab_logger.log(25, jenkins_utils.get_build_log(build_number, username,
-                                                    password, servername))
+    returncode, status = jenkins_utils.get_build_status(build_number, username,
+                                                        password, servername,
+                                                        ctx.path)
+    if not returncode == 0:
+        slab_logger.error(status)
+        sys.exit(1)
+    slab_logger.log(25, status)
+    returncode = jenkins_utils.get_build_log(build_number, username, password,
+                                             servername, ctx.path)
+    if not returncode == 0:
+        sys.exit(1)
 
 
 @cli.command('artifact', short_help='Show the details of an artifact'
@@ -13,6 +13,8 @@ from servicelab.utils import vagrant_utils as v_utils
 from servicelab.utils import helper_utils
 from servicelab.stack import pass_context
 from servicelab.utils import yaml_utils
+from servicelab.utils import inventory_utils
+from servicelab.utils import boot_utils
 from servicelab.utils import vagrantfile_utils as Vf_utils
 from servicelab.utils import ccsdata_utils
 from servicelab.utils import logger_utils
@@ -94,13 +96,23 @@ slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.up')
                    "administation privileges unless /etc/sudoers file has been "
                    "setup on the host system. Please check Vagrant documentation "
                    "on this.")
+@click.option('--parallel',
+              type=int,
+              default=1,
+              help="Number of vms booted at the same time by --full and --mini. Vms "
+                   "only boot together with others of their tier: the proxies, the db "
+                   "cluster, the ctl services, then the compute vms.")
+@click.option('--fail-fast/--keep-going',
+              default=True,
+              help="Stop booting --full and --mini vms after the first failure, or "
+                   "boot every vm and report the failures at the end.")
 @click.group('up',
              invoke_without_command=True,
              short_help="Boot VM(s).")
 @pass_context
 def cli(ctx, full, mini, rhel7, target, service, remote, ha, redhouse_branch, data_branch,
         service_branch, username, interactive, existing_vm, env, flavor, image,
-        nfs):
+        nfs, parallel, fail_fast):
     flavor = str(flavor)
     image = str(image)
     service_groups = []
@@ -230,19 +242,20 @@ def cli(ctx, full, mini, rhel7, target, service, remote, ha, redhouse_branch, da
 
         # Setup Vagrantfile w/ vm
         my_sec_grps = ""
+        inventory = inventory_utils.get_inventory(ctx.path)
         if remote:
             returncode, float_net, mynets, my_sec_grps = os_utils.os_ensure_network(ctx.path)
             if returncode > 0:
                 slab_logger.error("No OS_ environment variables found")
                 sys.exit(1)
             myvfile.set_env_vars(float_net, mynets, my_sec_grps)
-            returncode, host_dict = yaml_utils.gethost_byname(hostname, ctx.path)
+            returncode, host_dict = inventory.get(hostname)
             if returncode > 0:
                 slab_logger.error('Failed to get the requested host from your Vagrant.yaml')
                 sys.exit(1)
             myvfile.add_openstack_vm(host_dict)
         else:
-            returncode, host_dict = yaml_utils.gethost_byname(hostname, ctx.path)
+            returncode, host_dict = inventory.get(hostname)
             if returncode > 0:
                 slab_logger.error('Failed to get the requested host from your Vagrant.yaml')
                 sys.exit(1)
@@ -413,24 +426,29 @@ def cli(ctx, full, mini, rhel7, target, service, remote, ha, redhouse_branch, da
                                username,
                                "service-redhouse-tenant")
 
+    provision = inventory_utils.get_inventory(os.path.join(ctx.path, 'provision'))
+    if provision.load() > 0:
+        slab_logger.error("Couldn't get the vms from the vagrant.yaml.")
+        sys.exit(1)
     if mini:
         slab_logger.info('Booting vms for mini OSP deployment')
-        returncode, allmy_vms = yaml_utils.getmin_OS_vms(ctx.path)
+        allmy_vms = provision.mini_hosts()
     elif full:
         slab_logger.info('Booting vms for full OSP deployment')
-        returncode, allmy_vms = yaml_utils.getfull_OS_vms(os.path.join(ctx.path,
-                                                                       'provision'),
-                                                          '001')
+        allmy_vms = provision.hosts_matching('001')
     else:
         return 0
-    if returncode > 0:
+    if not allmy_vms:
         slab_logger.error("Couldn't get the vms from the vagrant.yaml.")
         sys.exit(1)
 
-    returncode, order = yaml_utils.get_host_order(os.path.join(ctx.path, 'provision'))
+    returncode, order = provision.host_order()
     if returncode > 0:
         slab_logger.error("Couldn't get order of vms from order.yaml")
         sys.exit(1)
+    # Note: hosts are added to .stack/vagrant.yaml in memory while booting and
+    #       written out once, even if a boot fails part way through.
+    inventory = inventory_utils.get_inventory(ctx.path)
     try:
         # Note: not sure if this will work w/ vm_name set to infra-001 arbitrarily
         # Note: move path to ctx.path if able to boot OSP pieces via infra/heighliner
@@ -487,58 +505,67 @@ def cli(ctx, full, mini, rhel7, target, service, remote, ha, redhouse_branch, da
                        os.path.join(redhouse_ten_path,
                                     "dev",
                                     "ccs-data"))
-        for i in order:
-            # Need to build nodes in specific order
-            # so filter out everything but
-            # if result is empty, then don't built this node and skip
-            # variables aren't referenced outside of a lambda, so had
-            # to pass in current node (i) as variable o
-            vhosts = filter(lambda x, o=i: o in x, allmy_vms)
-            if len(vhosts) == 0:
-                continue
-            if ha:
-                ha_vm = vhosts.replace("001", "002")
-                returncode, ha_vm_dicts = yaml_utils.gethost_byname(ha_vm,
-                                                                    os.path.join(ctx.path,
-                                                                                 'provision')
-                                                                    )
+        vm_dicts = dict((host.keys()[0], host) for host in allmy_vms)
+        if ha:
+            for hostname in vm_dicts.keys():
+                ha_vm = hostname.replace("001", "002")
+                returncode, ha_vm_dict = provision.get(ha_vm)
                 if returncode > 0:
                     slab_logger.error("Couldn't get the vm {0} for HA".format(ha_vm))
                     sys.exit(1)
-                else:
-                    allmy_vms.append(ha_vm_dicts)
-            for hosts in vhosts:
-                for host in hosts:
-                    newmem = (hosts[host]['memory']/512)
-                    retcode = yaml_utils.host_add_vagrantyaml(path=ctx.path,
-                                                              file_name="vagrant.yaml",
-                                                              hostname=host,
-                                                              site='ccs-dev-1',
-                                                              memory=newmem,
-                                                              box=hosts[host]['box'],
-                                                              role=hosts[host]['role'],
-                                                              profile=hosts[host]['profile'],
-                                                              domain=hosts[host]['domain'],
-                                                              mac_nocolon=hosts[host]['mac'],
-                                                              ip=hosts[host]['ip'],
-                                                              )
-                if retcode > 0:
-                    slab_logger.error("Failed to add host" + host)
-                    slab_logger.error("Continuing despite failure...")
-            curhost = vhosts[0].keys()[0]
+                vm_dicts[ha_vm] = ha_vm_dict
+
+        # Note: every vm goes into the Vagrantfile at once, written a single time
+        #       before anything boots, instead of a rewrite per vm while others
+        #       are already booting from it.
+        if myvfile.add_vms([vm_dicts[name] for name in sorted(vm_dicts)],
+                           ctx.path, nfs) > 0:
+            slab_logger.error('Failed to add the vms to the Vagrantfile')
+            sys.exit(1)
+
+        def prepare(vm_name):
+            """
+            Adds a vm to the inventory right before it boots.
+            """
+            hosts = vm_dicts[vm_name]
+            host = hosts[vm_name]
+            newmem = (host['memory']/512) * 512
+            retcode = inventory.add_host(vm_name,
+                                         inventory_utils.make_host(host['ip'],
+                                                                   host['mac'],
+                                                                   role=host['role'],
+                                                                   profile=host['profile'],
+                                                                   domain=host['domain'],
+                                                                   memory=newmem,
+                                                                   box=host['box']))
+            if retcode > 0:
+                slab_logger.error("Failed to add host" + vm_name)
+                slab_logger.error("Continuing despite failure...")
             if remote:
                 settingsyaml = {'openstack_provider': True}
                 returncode = yaml_utils.wr_settingsyaml(ctx.path,
                                                         settingsyaml,
-                                                        hostname=curhost)
+                                                        hostname=vm_name)
                 if returncode > 0:
-                    slab_logger.error('writing to settings yaml failed on: ' + curhost)
-                myvfile.add_openstack_vm(vhosts[0])
-                a.v.up(vm_name=curhost, provider='openstack')
-            else:
-                myvfile.add_virtualbox_vm(vhosts[0], ctx.path, nfs)
-                a.v.up(vm_name=curhost)
+                    slab_logger.error('writing to settings yaml failed on: ' + vm_name)
+            return 0
+
+        # Note: vms of a tier boot concurrently.  settings.yaml is rewritten for
+        #       every openstack vm, so those wait until vagrant has read it.
+        scheduler = boot_utils.BootScheduler(redhouse_ten_path,
+                                             os.path.join(ctx.path, 'logs', 'up'),
+                                             parallel=parallel,
+                                             fail_fast=fail_fast,
+                                             provider='openstack' if remote else None,
+                                             prepare=prepare,
+                                             hold_until_started=remote)
+        returncode, results = scheduler.boot(boot_utils.boot_tiers(order, vm_dicts.keys()))
+        if returncode > 0:
+            sys.exit(1)
 
     except IOError as e:
         slab_logger.error("{0} for vagrant.yaml in {1}".format(e, ctx.path))
         sys.exit(1)
+    finally:
+        if inventory.save() > 0:
+            slab_logger.error("Failed to write vagrant.yaml in {0}".format(ctx.path))
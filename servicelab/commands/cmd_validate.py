@@ -1,6 +1,8 @@
 """
 Stack functions to validate the YAML File syntax.
 """
+import sys
+
 import click
 
 from servicelab.stack import pass_context
@@ -22,12 +24,29 @@ def cli(_):
     pass
 
 
-@cli.command('yaml', short_help='Verify the yaml syntax for the file is good.')
-@click.argument('file_name')
+@cli.command('yaml', short_help='Verify the yaml syntax of files or directories.')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('-j', '--jobs', type=int, default=None,
+              help='Number of files validated in parallel, defaults to the number of cpus.')
 @pass_context
-def validate_yaml(_, file_name):
+def validate_yaml(_, paths, jobs):
     """
-    This cmd function takes the yaml file and validates its syntax.
+    This cmd function takes yaml files, or directories searched for yaml files,
+    and validates their syntax.
     """
-    slab_logger.info('Validating syntax of %s' % file_name)
-    yaml_utils.validate_syntax(file_name)
+    file_names = yaml_utils.find_yaml_files(paths)
+    slab_logger.info('Validating syntax of %i yaml files' % len(file_names))
+    failed = 0
+    for file_name, (returncode, problems) in yaml_utils.check_syntax_files(file_names,
+                                                                           jobs):
+        for problem in problems:
+            if problem[2] == 'error':
+                slab_logger.error(yaml_utils.format_problem(file_name, problem))
+            else:
+                slab_logger.warning(yaml_utils.format_problem(file_name, problem))
+        if returncode > 0:
+            failed += 1
+    if failed:
+        slab_logger.error('%i of %i yaml files are invalid' % (failed, len(file_names)))
+        sys.exit(1)
+    slab_logger.log(25, '%i yaml files are valid' % len(file_names))
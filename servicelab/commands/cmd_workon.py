@@ -8,6 +8,7 @@ import click
 
 from servicelab.stack import pass_context
 from servicelab.utils import service_utils
+from servicelab.utils import mirror_utils
 from servicelab.utils import logger_utils
 from servicelab import settings
 
@@ -59,10 +60,20 @@ def cli(ctx, branch, data_branch, username, service_name):
             # Note: notice we're passing the variable current not service_name.
             repo_name = current
 
-    returncode = service_utils.sync_service(ctx.path, branch, username, repo_name)
-    if not returncode:
-        slab_logger.error('Unable to sync %s repo' % service_name)
+    # Note: The service and ccs-data are cloned or fetched at the same time.
+    services = [(repo_name, branch)]
+    if not service_name == 'ccs-data' and not repo_name == 'ccs-data':
+        services.append(('ccs-data', data_branch))
+    results = service_utils.sync_services(ctx.path, username, services)
+    for name, synced, _ in results:
+        if not synced:
+            slab_logger.error('Unable to sync %s repo'
+                              % (service_name if name == repo_name else name))
+    if not all(synced for _, synced, _ in results):
         sys.exit(1)
+    removed = mirror_utils.gc(ctx.path)
+    if removed:
+        slab_logger.log(15, 'Removed unused git mirrors: %s' % ', '.join(removed))
 
     returncode = service_utils.link(ctx.path, service_name, branch, username)
     if not returncode == 0:
@@ -73,9 +84,3 @@ def cli(ctx, branch, data_branch, username, service_name):
     if not returncode == 0:
         slab_logger.error('Failed to generate ssh keys:\n%s' % output)
         sys.exit(1)
-
-    if not service_name == 'ccs-data':
-        returncode = service_utils.sync_service(ctx.path, data_branch, username, 'ccs-data')
-        if not returncode:
-            slab_logger.error('Unable to sync ccs-data repo')
-            sys.exit(1)
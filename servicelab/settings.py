@@ -1,3 +1,9 @@
 # Global variables file
 
-verbosity = 25
\ No newline at end of file
+# Note: Default screen verbosity, stack -v changes it in memory for the run only,
+#       see logger_utils.set_verbosity.
+verbosity = 25
+
+# Note: Read the state of a local VirtualBox VM through the virtualbox bindings
+#       instead of running vagrant status, see vagrant_utils.StatusEngine.
+vbox_fast_path = True
@@ -1,7 +1,8 @@
 """
 stack
 
-Do not import util modules as doing so will break logging
+Do not import util modules other than logger_utils. Their loggers are set up on
+import, the commands import them after the verbosity option is parsed.
 """
 import os
 import re
@@ -11,11 +12,38 @@ import logging
 
 import click
 
+from servicelab import settings
+from servicelab.utils import logger_utils
+
 # Global Variables
 # auto envvar prefix will take in any env vars that are prefixed with STK
 # short for stack.
 CONTEXT_SETTINGS = dict(auto_envvar_prefix='STK')
 
+# Note: Short help of every command, so stack --help lists them without importing
+#       the command modules and the libraries they pull in. Keep in sync with the
+#       short_help of the cli in each servicelab/commands/cmd_*.py.
+COMMANDS = {
+    'artifact': 'Work with artifacts from artifactory with this command subset.',
+    'build': 'Work with builds in Jenkins with this command subset.',
+    'cache': 'Manage the local caches in .stack/cache.',
+    'create': 'Creates pipeline resources to work with.',
+    'destroy': 'Remove local and remote pipeline resources.',
+    'enc': 'Encrypt a string for you to put into ccs-data.',
+    'explain': 'Provide high level explanations of servicelab.',
+    'find': 'Helps you search pipeline resources.',
+    'list': 'You can list objects in pipeline resources.',
+    'pipe': 'Command subset to help you work with Go pipelines.',
+    'redeploy': 'Redeploy your service to your VMs.',
+    'review': 'Helps you work with reviews in Gerrit.',
+    'rpm': 'RPM to work with.',
+    'show': 'Helps you show the details of a pipeline resource.',
+    'status': 'Shows the status of your servicelab environment.',
+    'up': 'Boot VM(s).',
+    'validate': 'Help validate resources being used in the pipeline.',
+    'workon': 'Clone a service locally that you would like to work on.',
+}
+
 
 class Context(object):
     """
@@ -31,6 +59,9 @@ class Context(object):
 
         branch (str)
 
+        verbosity (int)    - screen verbosity of the run, see
+                             logger_utils.setup_logger
+
         __gerrit_test_info - Gerrit staging server
         __gerrit_info      - Gerrit server
 
@@ -38,6 +69,7 @@ class Context(object):
     """
     def __init__(self):
         self.branch = "master"
+        self.verbosity = settings.verbosity
         self.path = os.path.join(os.path.dirname(__file__), '.stack')
         self.config = os.path.join(os.path.dirname(__file__),
                                    '.stack/stack.conf')
@@ -205,17 +237,22 @@ class ComplexCLI(click.MultiCommand):
             return
         return mod.cli
 
-
-def write_settings_file(verbosity):
-    """
-    Update the servicelab/settings.py file to reflect the selected verbosity level
-    """
-    settings_file = os.path.join(os.path.dirname(__file__), 'settings.py')
-    myfile = open(settings_file, 'w')
-    file_data = ('# Global variables file\n\nverbosity = %i'
-                 % (verbosity))
-    myfile.write(file_data)
-    myfile.close()
+    def format_commands(self, ctx, formatter):
+        """
+        format_commands lists the commands with their short help from COMMANDS,
+        only importing the modules of commands missing from it.
+        """
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in COMMANDS:
+                rows.append((name, COMMANDS[name]))
+                continue
+            cmd = self.get_command(ctx, name)
+            if cmd is not None:
+                rows.append((name, cmd.short_help or ''))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
 
 
 def verbosity_option(f):
@@ -223,7 +260,9 @@ def verbosity_option(f):
     This function is needed to set the verbosity level before the stack subcommand is called
 
     The orginal code is from https://github.com/mitsuhiko/click/issues/108 and modified to
-    handle our custom levels of verbosity
+    handle our custom levels of verbosity.  The level is kept in memory, on the
+    Context and through logger_utils.set_verbosity, servicelab/settings.py only holds
+    the default.
     """
     def callback(ctx, param, value):
         verbosity = 25
@@ -238,7 +277,8 @@ def verbosity_option(f):
                 verbosity = 10
                 message = 'debug (DEBUG)'
             click.echo('Verbosity set to %s\n' % message)
-        write_settings_file(verbosity)
+        logger_utils.set_verbosity(verbosity)
+        ctx.ensure_object(Context).verbosity = verbosity
         return value
     return click.option('-v', '--verbose', count=True,
                         expose_value=False,
@@ -3,6 +3,7 @@ Set of utility functions for Jenkins server
 """
 import requests
 
+import http_utils
 import logger_utils
 
 from requests.auth import HTTPBasicAuth
@@ -16,9 +17,9 @@ def get_artifact_info(url, user, password):
     Get artifact info string
     """
     slab_logger.debug('Extracting artifact information')
-    requests.packages.urllib3.disable_warnings()
     try:
-        res = requests.get(url, auth=HTTPBasicAuth(user, password))
+        res = http_utils.get_client('artifactory', http_utils.origin(url),
+                                    HTTPBasicAuth(user, password)).get(url)
     except requests.ConnectionError as ex:
         slab_logger.error(ex)
         raise Exception("Cannot connect to artifactory : %s " % ex)
@@ -0,0 +1,309 @@
+"""
+Parallel vagrant boots for stack up --full / --mini.
+
+order.yaml lists the OSP vms in the order they have to come up.  boot_tiers
+turns that list into tiers of vms of the same role class, e.g. all proxies or all
+ctl services, that may boot together, and BootScheduler
+runs the vagrant up calls of a tier concurrently, one tier after the other,
+writing the output of every vm to its own log file.
+"""
+import os
+import re
+import time
+import threading
+import subprocess32 as subprocess
+
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.boot')
+
+# Note: Lines of a failed vm's log shown on the console.
+LOG_TAIL_LINES = 10
+
+# Note: Role classes of the OSP vms, matched against the host family.  Vms of a
+#       class only depend on the classes booted before them, e.g. every ctl
+#       service needs the db cluster but not the other ctl services.  A family
+#       matching none of them is a class of its own.
+ROLE_CLASSES = (('proxy', r'^proxy'),
+                ('db', r'^db$'),
+                ('ctl', r'(ctl|api)$|^horizon$'),
+                ('compute', r'^(net|nova)$'))
+
+
+def host_family(hostname):
+    """Return the name of a host without its instance number.
+
+    Args:
+        hostname (str): The name of the host, e.g. ceph-mon-002
+
+    Returns:
+        The family of the host (str), e.g. ceph-mon
+
+    Example Usage:
+        >>> print host_family('proxyinternal-002')
+        proxyinternal
+    """
+    return re.sub(r'-\d+$', '', hostname)
+
+
+def role_class(hostname):
+    """Return the role class of a host, see ROLE_CLASSES.
+
+    Args:
+        hostname (str): The name of the host, e.g. glancectl-001
+
+    Returns:
+        The role class (str), the family of the host if no class matches
+
+    Example Usage:
+        >>> print role_class('neutronapi-002')
+        ctl
+    """
+    family = host_family(hostname)
+    for name, pattern in ROLE_CLASSES:
+        if re.search(pattern, family):
+            return name
+    return family
+
+
+def boot_tiers(order, hostnames=None):
+    """Turn the order from order.yaml into tiers of vms that can boot together.
+
+    An entry of the order is either a hostname or a list of hostnames.  A list
+    is a tier of its own.  Consecutive hostnames of the same role class, e.g.
+    keystonectl-001, glancectl-001 and novactl-001, form one tier.  Tiers boot
+    in order, so every vm only depends on the tiers before its own.
+
+    Args:
+        order (list): The order from order.yaml
+        hostnames (list): Only keep these hosts, e.g. the mini vms.  All hosts
+                          are kept if None.
+
+    Returns:
+        tiers (list): Lists of hostnames, without empty tiers
+
+    Example Usage:
+        >>> print boot_tiers(['db-001', 'db-002', 'keystonectl-001', 'novactl-001',
+        ...                   ['a-001', 'b-001']])
+        [['db-001', 'db-002'], ['keystonectl-001', 'novactl-001'], ['a-001', 'b-001']]
+    """
+    if hostnames is not None:
+        hostnames = set(hostnames)
+    tiers = []
+    last_class = None
+    for entry in order:
+        if isinstance(entry, list):
+            tiers.append(list(entry))
+            last_class = None
+            continue
+        entry_class = role_class(entry)
+        if entry_class != last_class:
+            tiers.append([])
+            last_class = entry_class
+        tiers[-1].append(entry)
+    seen = set()
+    result = []
+    for tier in tiers:
+        tier = [host for host in tier if (hostnames is None or host in hostnames) and
+                host not in seen]
+        seen.update(tier)
+        if tier:
+            result.append(tier)
+    return result
+
+
+class BootResult(object):
+    """
+    The outcome of booting one vm.
+
+    Attributes:
+        vm_name (str): Name of the vm
+        returncode (int): Exit code of vagrant up, None if the vm was skipped
+        elapsed (float): Seconds the boot took
+        log_file (str): File holding the output of vagrant up
+    """
+
+    def __init__(self, vm_name, returncode=None, elapsed=0.0, log_file=None):
+        self.vm_name = vm_name
+        self.returncode = returncode
+        self.elapsed = elapsed
+        self.log_file = log_file
+
+    @property
+    def skipped(self):
+        return self.returncode is None
+
+    @property
+    def failed(self):
+        return self.returncode is not None and self.returncode != 0
+
+
+class BootScheduler(object):
+    """
+    Boots tiers of vms with vagrant up, up to parallel vms at a time.
+
+    Attributes:
+        path (str): Directory vagrant runs in, the one holding the Vagrantfile
+        log_dir (str): Directory for the <vm>.log files
+        parallel (int): Maximum number of vagrant up calls running at once
+        fail_fast (bool): Stop starting vms after the first failure.  Otherwise
+                          every vm is tried and the failures reported at the end.
+        provider (str): Passed to vagrant up --provider, if set
+        vagrant (str): The vagrant executable
+        prepare (function): Called with the vm name before its vagrant up, e.g.
+                            to add it to the Vagrantfile.  Calls never overlap.
+                            Returns 0 on success.
+        hold_until_started (bool): Keep other vms from being prepared until
+                                   vagrant has started on this one, i.e. has
+                                   read the Vagrantfile and the files it loads.
+                                   Needed when prepare rewrites a file they share.
+
+    Example Usage:
+        >>> scheduler = BootScheduler(path, os.path.join(ctx.path, 'logs', 'up'),
+        ...                           parallel=4)
+        >>> returncode, results = scheduler.boot([['db-001', 'db-002'], ['infra-001']])
+    """
+
+    def __init__(self, path, log_dir, parallel=1, fail_fast=True, provider=None,
+                 vagrant='vagrant', prepare=None, hold_until_started=False):
+        self.path = path
+        self.log_dir = log_dir
+        self.parallel = max(1, parallel)
+        self.fail_fast = fail_fast
+        self.provider = provider
+        self.vagrant = vagrant
+        self.prepare = prepare
+        self.hold_until_started = hold_until_started
+        self._prepare_lock = threading.Lock()
+        self._failed = threading.Event()
+
+    def boot(self, tiers):
+        """Boot the tiers one after the other, the vms of a tier concurrently.
+
+        Args:
+            tiers (list): Lists of vm names, see boot_tiers
+
+        Returns:
+            Returncode (int):
+                0 -- Success, every vm came up
+                1 -- Failure, at least one vm failed or was skipped
+            Results (list): BootResult of every vm, in tier order
+        """
+        if not os.path.isdir(self.log_dir):
+            os.makedirs(self.log_dir)
+        self._failed.clear()
+        results = []
+        for num, tier in enumerate(tiers):
+            slab_logger.info('Booting tier %i of %i: %s'
+                             % (num + 1, len(tiers), ', '.join(tier)))
+            results.extend(self._boot_tier(tier))
+        failed = [result for result in results if result.failed]
+        skipped = [result for result in results if result.skipped]
+        if skipped:
+            slab_logger.error('Skipped after an earlier failure: %s'
+                              % ', '.join(result.vm_name for result in skipped))
+        if failed or skipped:
+            slab_logger.error('Failed to boot: %s'
+                              % ', '.join(result.vm_name for result in failed))
+            return 1, results
+        return 0, results
+
+    def _boot_tier(self, tier):
+        pending = list(tier)
+        results = {}
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    vm_name = pending.pop(0)
+                if self.fail_fast and self._failed.is_set():
+                    result = BootResult(vm_name)
+                else:
+                    try:
+                        result = self._boot_vm(vm_name)
+                    except (IOError, OSError) as error:
+                        slab_logger.error('Failed to boot %s: %s' % (vm_name, error))
+                        self._failed.set()
+                        result = BootResult(vm_name, 1)
+                with lock:
+                    results[vm_name] = result
+
+        workers = [threading.Thread(target=worker, name='boot-%i' % num)
+                   for num in range(min(self.parallel, len(tier)))]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            # Note: join with a timeout so ctrl-c still reaches the main thread.
+            while thread.is_alive():
+                thread.join(1)
+        return [results[vm_name] for vm_name in tier]
+
+    def _command(self, vm_name):
+        cmd = [self.vagrant, 'up', vm_name]
+        if self.provider:
+            cmd.extend(['--provider', self.provider])
+        return cmd
+
+    def _boot_vm(self, vm_name):
+        log_file = os.path.join(self.log_dir, '%s.log' % vm_name)
+        start = time.time()
+        with self._prepare_lock:
+            if self.prepare is not None and self.prepare(vm_name) > 0:
+                slab_logger.error('Could not prepare %s for booting' % vm_name)
+                self._failed.set()
+                return BootResult(vm_name, 1, time.time() - start, log_file)
+            slab_logger.log(25, 'Booting %s, logging to %s' % (vm_name, log_file))
+            log = open(log_file, 'w')
+            try:
+                proc = subprocess.Popen(self._command(vm_name), cwd=self.path,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, close_fds=True)
+            except OSError as error:
+                log.write('Could not run %s: %s\n' % (self.vagrant, error))
+                log.close()
+                slab_logger.error('Could not run %s: %s' % (self.vagrant, error))
+                self._failed.set()
+                return BootResult(vm_name, 1, time.time() - start, log_file)
+            first_line = ''
+            if self.hold_until_started:
+                first_line = proc.stdout.readline()
+        try:
+            log.write(first_line)
+            for line in iter(proc.stdout.readline, ''):
+                log.write(line)
+                log.flush()
+            returncode = proc.wait()
+        finally:
+            log.close()
+        result = BootResult(vm_name, returncode, time.time() - start, log_file)
+        if result.failed:
+            self._failed.set()
+            slab_logger.error('%s failed to boot after %.0fs, see %s'
+                              % (vm_name, result.elapsed, log_file))
+            for line in tail(log_file, LOG_TAIL_LINES):
+                slab_logger.error('  %s: %s' % (vm_name, line))
+        else:
+            slab_logger.log(25, '%s is up after %.0fs' % (vm_name, result.elapsed))
+        return result
+
+
+def tail(fname, lines):
+    """Return the last lines of a file.
+
+    Args:
+        fname (str): Path of the file
+        lines (int): Number of lines
+
+    Returns:
+        The lines (list), without line endings
+    """
+    try:
+        with open(fname, 'r') as stream:
+            return [line.rstrip('\n') for line in stream.readlines()[-lines:]]
+    except IOError:
+        return []
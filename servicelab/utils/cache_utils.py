@@ -0,0 +1,397 @@
+"""
+Persistent caches kept under servicelab/.stack/cache
+"""
+import os
+import json
+import time
+import tempfile
+import cPickle as pickle
+
+import yaml_io
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.cache')
+
+# Note: Bump this whenever the layout of the index file changes so that stale
+#       indexes are thrown away instead of misread.
+INDEX_VERSION = 2
+INDEX_FILE = 'ccsdata_index.pickle'
+STATS_FILE = 'ccsdata_index_stats.json'
+
+# Note: Entries whose mtime is this close to the time they were cached are not
+#       trusted, since a second write within the same timestamp tick would go
+#       unnoticed (the "racy clean" problem git deals with the same way).
+RACY_WINDOW = 1.0
+
+
+def get_cache_dir(path):
+    """Returns the cache directory, creating it if needed.
+
+    Args:
+        path (str): The path to your working .stack directory. Typically,
+                    this looks like ./servicelab/servicelab/.stack where "."
+                    is the path to the root of the servicelab repository.
+
+    Returns:
+        cache_dir (str): Full path to the .stack/cache directory
+
+    Example Usage:
+        >>> print get_cache_dir("/Users/aaltman/Git/servicelab/servicelab/.stack")
+        /Users/aaltman/Git/servicelab/servicelab/.stack/cache
+    """
+    cache_dir = os.path.join(path, 'cache')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+
+def write_atomic(fname, data):
+    """Write data to fname through a temporary file and a rename so readers never
+       see a partially written file.  The permissions of an existing fname are
+       kept, a new file gets the usual umask based ones.
+
+    Args:
+        fname (str): Full path of the file to write
+        data (str): Contents of the file
+
+    Returns:
+        Nothing
+    """
+    try:
+        mode = os.stat(fname).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fdesc, tmp_name = tempfile.mkstemp(dir=os.path.dirname(fname),
+                                       prefix='.' + os.path.basename(fname))
+    try:
+        with os.fdopen(fdesc, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.chmod(tmp_name, mode)
+        os.rename(tmp_name, fname)
+    except (IOError, OSError):
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def read_stamped(fname):
+    """Read a json file written by write_stamped.
+
+    Args:
+        fname (str): Full path of the file
+
+    Returns:
+        stamp (float): When the data was written, 0 if fname could not be read
+        data: The data, None if fname could not be read
+    """
+    try:
+        with open(fname, 'r') as stream:
+            doc = json.load(stream)
+        return doc['stamp'], doc['data']
+    except (IOError, ValueError, KeyError, TypeError):
+        return 0, None
+
+
+def write_stamped(fname, data, stamp=None):
+    """Atomically write data as json along with the time it was fetched, for
+       caches that expire after a time to live.
+
+    Args:
+        fname (str): Full path of the file
+        data: Anything json can dump
+        stamp (float): When data was fetched, now if None
+
+    Returns:
+        Nothing
+
+    Example Usage:
+        >>> write_stamped(os.path.join(get_cache_dir(ctx.path), 'jobs.json'), jobs)
+        >>> stamp, jobs = read_stamped(os.path.join(get_cache_dir(ctx.path), 'jobs.json'))
+        >>> fresh = time.time() - stamp < 300
+    """
+    if stamp is None:
+        stamp = time.time()
+    write_atomic(fname, json.dumps({'stamp': stamp, 'data': data}))
+
+
+class CcsdataIndex(object):
+    """
+    Persistent index of the ccs-data directory layout and host yaml contents.
+
+    Directory listings are keyed by the directory path and its mtime, parsed
+    host yamls by the file path, mtime and size.  Only entries that changed
+    since the last run are re-read, everything else is served from the index
+    file in .stack/cache.  The index is pickled, so cached host yamls keep the
+    types the yaml loader gave them, e.g. integer keys and dates.
+
+    Args:
+        path {str}: Path to the working .stack directory (ctx.path)
+        cache_dir {str}: Optional directory to keep the index file in.  Defaults
+                         to .stack/cache
+
+    Example Usage:
+        index = cache_utils.CcsdataIndex(ctx.path)
+        site_data = index.host_data(site_env_path)
+        index.save()
+    """
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.ccsdata_path = os.path.join(path, 'services', 'ccs-data')
+        if not cache_dir:
+            cache_dir = get_cache_dir(path)
+        self.index_file = os.path.join(cache_dir, INDEX_FILE)
+        self.stats_file = os.path.join(cache_dir, STATS_FILE)
+        self.dirs = {}
+        self.files = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        self.run_stats = {'hits': 0, 'misses': 0}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Read the index file.  A missing, unreadable or outdated index starts empty.
+        """
+        try:
+            with open(self.stats_file, 'r') as stats_stream:
+                self.stats.update(json.load(stats_stream))
+        except (IOError, ValueError):
+            pass
+        try:
+            with open(self.index_file, 'rb') as index_stream:
+                doc = pickle.load(index_stream)
+        except IOError:
+            return
+        # Note: A truncated or damaged pickle raises just about anything.
+        except Exception as error:
+            slab_logger.debug('Discarding unreadable ccs-data index: %s' % error)
+            return
+        if not isinstance(doc, dict) or doc.get('version') != INDEX_VERSION:
+            slab_logger.debug('Discarding ccs-data index with old layout')
+            return
+        self.dirs = doc.get('dirs', {})
+        self.files = doc.get('files', {})
+
+    def save(self):
+        """
+        Write the index back to disk if anything changed during this run.  The hit
+        counters live in a separate small file so a fully warm run does not rewrite
+        the index itself.
+        """
+        try:
+            if self.dirty:
+                doc = {'version': INDEX_VERSION,
+                       'dirs': self.dirs,
+                       'files': self.files}
+                write_atomic(self.index_file, pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+                self.dirty = False
+            if any(self.run_stats.values()):
+                for key in self.run_stats:
+                    self.stats[key] += self.run_stats[key]
+                    self.run_stats[key] = 0
+                write_atomic(self.stats_file, json.dumps(self.stats))
+        except (IOError, OSError) as error:
+            slab_logger.debug('Unable to write the ccs-data index: %s' % error)
+
+    def clear(self):
+        """
+        Drop every entry and remove the index file.
+        """
+        self.dirs = {}
+        self.files = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        self.run_stats = {'hits': 0, 'misses': 0}
+        self.dirty = False
+        for fname in (self.index_file, self.stats_file):
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    @staticmethod
+    def _is_fresh(entry, stat):
+        """
+        Check a cached entry against the current os.stat of its path.
+        """
+        if entry.get('mtime') != stat.st_mtime:
+            return False
+        if 'size' in entry and entry['size'] != stat.st_size:
+            return False
+        return entry['mtime'] < entry.get('stamp', 0) - RACY_WINDOW
+
+    def _count(self, hit):
+        self.run_stats['hits' if hit else 'misses'] += 1
+
+    def walk_dir(self, dirpath):
+        """Cached equivalent of os.walk(dirpath).next()
+
+        Args:
+            dirpath (str): Directory to list
+
+        Returns:
+            dirnames (list): Names of the subdirectories
+            filenames (list): Names of the files
+
+            Both lists are empty if dirpath is not a directory.
+        """
+        try:
+            stat = os.stat(dirpath)
+        except OSError:
+            if self.dirs.pop(dirpath, None) is not None:
+                self.dirty = True
+            return [], []
+        entry = self.dirs.get(dirpath)
+        if entry and self._is_fresh(entry, stat):
+            self._count(True)
+            return entry['dirnames'], entry['filenames']
+
+        self._count(False)
+        dirnames = []
+        filenames = []
+        for name in os.listdir(dirpath):
+            if os.path.isdir(os.path.join(dirpath, name)):
+                dirnames.append(name)
+            else:
+                filenames.append(name)
+        self.dirs[dirpath] = {'mtime': stat.st_mtime,
+                              'stamp': time.time(),
+                              'dirnames': dirnames,
+                              'filenames': filenames}
+        self.dirty = True
+        return dirnames, filenames
+
+    def load_yaml(self, fname):
+        """Cached yaml_io.load of a file
+
+        Args:
+            fname (str): Full path of the yaml file
+
+        Returns:
+            data: Parsed contents of the file, or None if it could not be read
+        """
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            if self.files.pop(fname, None) is not None:
+                self.dirty = True
+            return None
+        entry = self.files.get(fname)
+        if entry and self._is_fresh(entry, stat):
+            self._count(True)
+            return entry['data']
+
+        self._count(False)
+        with open(fname, 'r') as stream:
+            data = yaml_io.load(stream)
+        self.files[fname] = {'mtime': stat.st_mtime,
+                             'size': stat.st_size,
+                             'stamp': time.time(),
+                             'data': data}
+        self.dirty = True
+        return data
+
+    def prune(self, root):
+        """Forget entries under root that no longer exist on disk.
+
+        Args:
+            root (str): Directory whose entries should be checked
+        """
+        root = os.path.join(root, '')
+        for table in (self.dirs, self.files):
+            for key in list(table):
+                if key.startswith(root) and not os.path.exists(key):
+                    del table[key]
+                    self.dirty = True
+
+    def sites(self):
+        """Lists all sites, environments and host files in ccs-data
+
+        Returns:
+            Returns a dictionary of dictionaries (site -> env -> host files), the
+            same structure ccsdata_utils.list_envs_or_sites returns.
+        """
+        our_sites = {}
+        sites_path = os.path.join(self.ccsdata_path, 'sites')
+        site_names, _ = self.walk_dir(sites_path)
+        for site in site_names:
+            env_path = os.path.join(sites_path, site, 'environments')
+            env_names, _ = self.walk_dir(env_path)
+            our_sites[site] = {}
+            for env in env_names:
+                _, host_files = self.walk_dir(os.path.join(env_path, env, 'hosts.d'))
+                our_sites[site][env] = list(host_files) or None
+        return our_sites
+
+    def host_data(self, site_env_path):
+        """Extract all host.yaml data from all environments within the supplied site
+
+        Args:
+            site_env_path {str}: Path to the ccs-data site environment
+                services/ccs-data/sites/service/environments
+
+        Returns:
+            site_data {dict of dicts}: env -> host file name -> host yaml data
+        """
+        site_data = {}
+        env_names, env_files = self.walk_dir(site_env_path)
+        for env in env_names + env_files:
+            site_data[env] = {}
+            hosts_path = os.path.join(site_env_path, env, 'hosts.d')
+            _, host_files = self.walk_dir(hosts_path)
+            for host in host_files:
+                site_data[env][host] = self.load_yaml(os.path.join(hosts_path, host))
+        return site_data
+
+    def rebuild(self):
+        """
+        Throw the index away and re-read every host yaml in ccs-data.
+
+        Returns:
+            host_count (int): Number of host files indexed
+        """
+        self.clear()
+        host_count = 0
+        sites_path = os.path.join(self.ccsdata_path, 'sites')
+        for site in self.sites():
+            site_data = self.host_data(os.path.join(sites_path, site, 'environments'))
+            for env in site_data:
+                host_count += len(site_data[env])
+        self.save()
+        return host_count
+
+    def summary(self):
+        """
+        Returns a dictionary describing the size and hit rate of the index.
+        """
+        hits = self.stats['hits'] + self.run_stats['hits']
+        misses = self.stats['misses'] + self.run_stats['misses']
+        lookups = hits + misses
+        size = 0
+        if os.path.exists(self.index_file):
+            size = os.path.getsize(self.index_file)
+        return {'index_file': self.index_file,
+                'size': size,
+                'dirs': len(self.dirs),
+                'files': len(self.files),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': (100.0 * hits / lookups) if lookups else 0.0}
+
+
+_indexes = {}
+
+
+def get_ccsdata_index(path):
+    """Returns the CcsdataIndex for path, shared by everything in this process.
+
+    Args:
+        path (str): The path to your working .stack directory
+
+    Returns:
+        CcsdataIndex object
+    """
+    if path not in _indexes:
+        _indexes[path] = CcsdataIndex(path)
+    return _indexes[path]
@@ -0,0 +1,314 @@
+"""
+Catalog of the gerrit projects, kept in .stack/cache/projects
+
+The catalog is the output of gerrit ls-projects, one project per line, and is
+refreshed when it is older than CATALOG_TTL.  A stale catalog keeps answering
+while a detached ssh refreshes it in the background, so only the very first
+lookup waits for gerrit.  Exact names are looked up in a set.  Regex searches
+only test the projects holding every trigram of the literal parts of the
+pattern.
+"""
+import os
+import re
+import time
+import pipes
+import sre_parse
+import sre_constants
+import subprocess32 as subprocess
+
+import cache_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.catalog')
+
+CATALOG_FILE = 'projects'
+GERRIT_HOST = 'ccs-gerrit.cisco.com'
+GERRIT_PORT = 29418
+
+# Note: Seconds after which the catalog is refreshed in the background.
+CATALOG_TTL = 3600
+
+# Note: A name missing from a catalog older than this many seconds makes the
+#       lookup refresh the catalog first, the project may just have been created.
+MISS_REFRESH = 60
+
+# Note: Seconds a background refresh may take before another one is started.
+REFRESH_TIMEOUT = 300
+
+
+def ls_projects_command(hostname=GERRIT_HOST, port=GERRIT_PORT, user=None, key=None):
+    """Returns the command listing the projects of a gerrit server.
+
+    Args:
+        hostname (str): The gerrit server
+        port (int): Its ssh port
+        user (str): Gerrit username, the ssh default if None
+        key (str): ssh private key, the ssh default if None
+
+    Returns:
+        The command (list)
+
+    Example Usage:
+        >>> print ls_projects_command(user='aaltman')
+        ['ssh', '-p', '29418', 'aaltman@ccs-gerrit.cisco.com', 'gerrit', 'ls-projects']
+    """
+    command = ['ssh', '-p', str(port)]
+    if key:
+        command += ['-i', key]
+    command.append('%s@%s' % (user, hostname) if user else hostname)
+    return command + ['gerrit', 'ls-projects']
+
+
+def trigrams(text):
+    """
+    Returns the set of three character substrings of text, lower cased.
+    """
+    text = text.lower()
+    return set(text[pos:pos + 3] for pos in range(len(text) - 2))
+
+
+def required_literals(pattern, flags=0):
+    """Returns strings every match of a regex contains, e.g. service-lab and ccs
+       for ^service-lab.*ccs.  Only the top level sequence of the pattern is
+       looked at.
+
+    Args:
+        pattern (str): The regex
+        flags (int): Its re flags
+
+    Returns:
+        literals (list): Lower cased ascii literals, empty if none is known
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (sre_constants.error, OverflowError):
+        return []
+    literals = []
+    current = []
+    for opcode, argument in parsed:
+        if opcode == sre_constants.BRANCH:
+            return []
+        if opcode == sre_constants.LITERAL and argument < 128:
+            current.append(chr(argument))
+            continue
+        literals.append(''.join(current))
+        current = []
+    literals.append(''.join(current))
+    return [literal.lower() for literal in literals if literal]
+
+
+class ProjectCatalog(object):
+    """
+    The gerrit projects, cached on disk with a time to live.
+
+    Attributes:
+        fname (str): The catalog file, .stack/cache/projects
+        command (list): Prints the projects one per line, see ls_projects_command
+        ttl (float): Seconds after which the catalog is refreshed
+        fetch (function): Returns the returncode and output of gerrit ls-projects,
+                          used instead of running command in the foreground,
+                          e.g. ssh_utils.GerritConnection.ls_projects
+        refreshes (int): Refreshes run in the foreground
+        background (int): Refreshes started in the background
+
+    Example Usage:
+        >>> catalog = get_catalog(ctx.path)
+        >>> catalog.exists('service-horizon')
+        True
+        >>> catalog.search('^service-h')
+        ['service-heat', 'service-horizon']
+    """
+
+    def __init__(self, path, command=None, ttl=CATALOG_TTL, fetch=None):
+        self.fname = os.path.join(cache_utils.get_cache_dir(path), CATALOG_FILE)
+        self.command = command or ls_projects_command()
+        self.ttl = ttl
+        self.fetch = fetch
+        self.refreshes = 0
+        self.background = 0
+        self._names = None
+        self._mtime = None
+        self._exact = None
+        self._trigrams = None
+
+    def _load(self):
+        """
+        Read the catalog file if it changed since it was last read.
+        """
+        try:
+            mtime = os.stat(self.fname).st_mtime
+        except OSError:
+            self._names = None
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.fname, 'r') as stream:
+            names = [line.strip() for line in stream]
+        self._names = [name for name in names if name]
+        self._mtime = mtime
+        self._exact = set(self._names)
+        self._trigrams = None
+
+    def age(self):
+        """
+        Returns the seconds since the catalog was fetched, None if it never was.
+        """
+        self._load()
+        if self._names is None:
+            return None
+        return max(0, time.time() - self._mtime)
+
+    def refresh(self):
+        """Fetch the catalog from gerrit and wait for it.
+
+        Returns:
+            returncode (int):
+                0 -- Success
+                1 -- Failure, the catalog is left as it was
+        """
+        self.refreshes += 1
+        slab_logger.debug('Pulling all projects from gerrit')
+        if self.fetch:
+            returncode, output = self.fetch()
+            if returncode != 0:
+                slab_logger.error("Unable to fetch project list from gerrit: %s" % output)
+                return 1
+            cache_utils.write_atomic(self.fname, output)
+            self._load()
+            return 0
+        try:
+            proc = subprocess.Popen(self.command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, close_fds=True)
+            output, error = proc.communicate()
+        except OSError as error:
+            slab_logger.error("Unable to fetch project list from gerrit: %s" % error)
+            return 1
+        if proc.returncode != 0:
+            slab_logger.error("Unable to fetch project list from gerrit")
+            slab_logger.error("error {}".format(error))
+            return 1
+        cache_utils.write_atomic(self.fname, output)
+        self._load()
+        return 0
+
+    def refresh_in_background(self):
+        """Start a detached refresh of the catalog, unless one is running.  The
+           catalog file is replaced once the whole list arrived.
+
+        Returns:
+            True if a refresh was started (bool)
+        """
+        lock = self.fname + '.refresh'
+        try:
+            if time.time() - os.stat(lock).st_mtime < REFRESH_TIMEOUT:
+                return False
+            os.remove(lock)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except OSError:
+            return False
+        tmp = '%s.%i' % (self.fname, os.getpid())
+        script = '%s > %s && mv -f %s %s; rm -f %s %s' % (
+            ' '.join(pipes.quote(arg) for arg in self.command), pipes.quote(tmp),
+            pipes.quote(tmp), pipes.quote(self.fname), pipes.quote(tmp), pipes.quote(lock))
+        slab_logger.debug('Refreshing the gerrit project catalog in the background')
+        with open(os.devnull, 'r+') as devnull:
+            subprocess.Popen(['sh', '-c', script], stdin=devnull, stdout=devnull,
+                             stderr=devnull, close_fds=True, start_new_session=True)
+        self.background += 1
+        return True
+
+    def names(self):
+        """Returns every project, fetching the catalog if there is none yet and
+           starting a background refresh if it is stale.
+
+        Returns:
+            names (list): The projects, None if there is no catalog
+        """
+        age = self.age()
+        if age is None:
+            self.refresh()
+        elif age > self.ttl:
+            self.refresh_in_background()
+        return self._names
+
+    def exists(self, name):
+        """Returns True if name is exactly the name of a project.
+
+        A name not in a catalog older than MISS_REFRESH refreshes it first.
+        """
+        names = self.names()
+        if names is None:
+            return False
+        if name in self._exact:
+            return True
+        if self.age() > MISS_REFRESH and self.refresh() == 0:
+            return name in self._exact
+        return False
+
+    def _trigram_index(self):
+        if self._trigrams is None:
+            self._trigrams = {}
+            for num, name in enumerate(self._names):
+                for trigram in trigrams(name):
+                    self._trigrams.setdefault(trigram, set()).add(num)
+        return self._trigrams
+
+    def candidates(self, pattern, flags=0):
+        """
+        Returns the indexes of the projects that may match pattern, in order.
+        """
+        wanted = set()
+        for literal in required_literals(pattern, flags):
+            wanted |= trigrams(literal)
+        if not wanted:
+            return range(len(self._names))
+        index = self._trigram_index()
+        postings = sorted((index.get(trigram, set()) for trigram in wanted), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            found &= posting
+        return sorted(found)
+
+    def search(self, pattern, flags=re.I):
+        """Returns the projects matching a regex, in catalog order.
+
+        Args:
+            pattern (str): The regex, searched for anywhere in the names
+            flags (int): re flags, case insensitive by default
+
+        Returns:
+            names (list)
+
+        Raises:
+            re.error if pattern is not a valid regex
+        """
+        regex = re.compile(pattern, flags)
+        if self.names() is None:
+            return []
+        return [self._names[num] for num in self.candidates(pattern, flags)
+                if regex.search(self._names[num])]
+
+
+_catalogs = {}
+
+
+def get_catalog(path, command=None, fetch=None):
+    """Returns the catalog of path, shared by everything in this process.
+
+    Args:
+        path (str): The path to your working .stack directory
+        command (list): Prints the projects, see ls_projects_command
+        fetch (function): Fetches the projects in the foreground, see
+                          ProjectCatalog
+
+    Returns:
+        ProjectCatalog object
+    """
+    key = (path, tuple(command or ()))
+    if key not in _catalogs:
+        _catalogs[key] = ProjectCatalog(path, command, fetch=fetch)
+    return _catalogs[key]
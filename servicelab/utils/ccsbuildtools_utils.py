@@ -1,10 +1,8 @@
 import logging
 import os
-import yaml
-
-from prettytable import PrettyTable
 
 import yaml_utils
+import yaml_io
 import ccsdata_utils
 import logger_utils
 from servicelab import settings
@@ -70,7 +68,7 @@ def gather_site_info(path, cont):
     path_to_temp_file = os.path.join(path_to_cache, "temp_site_data.yaml")
     if os.path.isfile(path_to_temp_file) and cont:
         with open(path_to_temp_file) as f:
-            site_dictionary = yaml.load(f)
+            site_dictionary = yaml_io.load(f)
     else:
         site_dictionary = get_input_requirements_for_ccsbuildtools()
     # These if clauses are skipped if they've already been completed by user
@@ -197,7 +195,7 @@ def gather_env_info(path):
                            site_name, "data.d", "answer-%s.yaml" % (site_name)
                            )
               ) as f:
-        site_dictionary = yaml.load(f)
+        site_dictionary = yaml_io.load(f)
     print "---Gathering user input for new tenant cloud for %s---" % (site_name)
     tenant_cloud_name = _input_cloud_info(tenant_cloud, False)
     site_dictionary['tenant_cloud'] = tenant_cloud
@@ -211,6 +209,8 @@ def gather_env_info(path):
 def table_selection(options, topic_name):
     """Table selection, return option that was selected
     """
+    from prettytable import PrettyTable
+
     table = PrettyTable(['#', topic_name])
     table.align['#'] = 'r'
     table.align[topic_name] = 'l'
@@ -298,7 +298,7 @@ def exit_input(site_dictionary, path_to_dump, exit):
               " your data will get deleted."
     with open(path_to_dump, 'w') as f:
         f.write("---\n")
-        yaml.dump(site_dictionary, f, default_flow_style=False)
+        yaml_io.dump(site_dictionary, f)
     return
 
 
@@ -355,6 +355,8 @@ def _edit_ip_ranges(ip_ranges):
     Args:
         ip_ranges: dictionary mapping vlan numbers to ip ranges
     """
+    from prettytable import PrettyTable
+
     slab_logger.debug('Prompting for user input of vlan data')
     while True:
         print "Here are your ip ranges. Type c to confirm and use these values, " \
@@ -1,5 +1,4 @@
 import re
-import yaml
 import click
 
 import ccsdata_utils
@@ -7,7 +6,6 @@ import yaml_utils
 import logger_utils
 
 from random import randint
-from fabric.api import run
 from servicelab import settings
 
 lab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.ccsdata_haproxy')
@@ -85,7 +83,7 @@ def save_ccsdata(path, site, env, data):
         The data dictionary saved as yaml file.
     """
     yaml_file = ccsdata_utils.get_environment_yaml_file(path, site, env)
-    ccsdata_utils.ordered_yaml.dump(data, yaml_file, Dumper=yaml.SafeDumper)
+    ccsdata_utils.ordered_yaml.dump(data, yaml_file)
 
 
 def console_print(data):
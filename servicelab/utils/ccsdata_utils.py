@@ -2,9 +2,9 @@ import os
 import sys
 import yaml
 
+import cache_utils
 import ordered_yaml
 import logger_utils
-import tc_vm_yaml_create
 
 from servicelab import settings
 from servicelab.stack import Context
@@ -107,49 +107,18 @@ def list_envs_or_sites(path):
         >>> print list_envs_or_sites("/Users/aaltman/Git/servicelab/servicelab/.stack")
     """
     slab_logger.log(15, 'Gathering site names from ccs-data')
-    # TODO: JIC we want to list services in the future.
-    services = []
     our_sites = {}
-    os.listdir(path)
-    # TODO: Add error handling and possibly return code
     slab_logger.debug('Checking for ccs-data repo')
     ccsdata_reporoot = os.path.join(path, "services", "ccs-data")
     if not os.path.isdir(ccsdata_reporoot):
         slab_logger.error('The ccs-data repo could not be found.  '
                           'Please try "stack workon ccs-data"')
         return(1, our_sites)
-    ccsdata_sitedir = os.path.join(ccsdata_reporoot, "sites")
-    our_sites = {x: None for x in os.listdir(ccsdata_sitedir)}
-    slab_logger.debug('Ensuring found sites are valid sites and not environments')
-    for key in our_sites:
-        # Note: os.walk provides dirpath, dirnames, and files,
-        #       but next()[1] provides us just dirnames for an
-        #       absolute path.
-        # Note: Expected to print dirs of environments/ directiory
-        # Note: Assumption - every site will have dir "environments"
-        # Note: Couldn't figure out how else to get the dirs correctly
-        #       associated so I do the dict comprehension before the
-        #       for loop.
-        our_sites[key] = {dirnames: None for dirnames in os.walk(os.path.join(
-                          ccsdata_sitedir, key,
-                          "environments")).next()[1]}
-        for dirs in os.walk(os.path.join(ccsdata_sitedir, key,
-                                         "environments")).next()[1]:
-
-            # Note: Get the hosts for each env in each site and add it to data structure
-            #       under the right grouping.
-            for _, _, files in os.walk(os.path.join(ccsdata_sitedir,
-                                                    key,
-                                                    "environments",
-                                                    dirs,
-                                                    "hosts.d")):
-                our_sites[key][dirs] = files
-
-            # TODO: get this working - list operator already used
-            for _, _, files in os.walk(os.path.join(ccsdata_sitedir, key, "environment",
-                                                    dirs, "data.d")):
-                pass
-
+    # Note: The index only re-lists the directories whose mtime changed since
+    #       the last run, see cache_utils.CcsdataIndex
+    index = cache_utils.get_ccsdata_index(path)
+    our_sites = index.sites()
+    index.save()
     return(0, our_sites)
 
 
@@ -245,13 +214,8 @@ def get_host_data_from_site(site_env_path):
                                   'type': 'virtual'},
     """
     slab_logger.debug('Extracting all host yaml file data from %s' % site_env_path)
-    site_data = {}
-    for env in os.listdir(site_env_path):
-        site_data[env] = {}
-        hosts_path = os.path.join(site_env_path, env, 'hosts.d')
-        if os.path.exists(hosts_path):
-            hosts = os.listdir(hosts_path)
-            for host in hosts:
-                host_file = os.path.join(hosts_path, host)
-                site_data[env][host] = tc_vm_yaml_create.open_yaml(host_file)
+    # Note: Host yamls are only re-parsed when their mtime or size changed
+    index = cache_utils.get_ccsdata_index(ctx.path)
+    site_data = index.host_data(site_env_path)
+    index.save()
     return(site_data)
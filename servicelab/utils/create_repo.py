@@ -14,10 +14,11 @@ For
 
 """
 import os
-import yaml
 import click
 import shutil
 
+import yaml_io
+import ssh_utils
 import logger_utils
 import service_utils
 
@@ -109,15 +110,13 @@ class Repo(object):
         )
         """
         slab_logger.log(15, 'Creating project %s on gerrit' % self.get_reponame())
-        hostname = self.gsrvr['hostname']
-        port = self.gsrvr['port']
-        cmd = "ssh -p {} {}@{} gerrit create-project {}".format(port,
-                                                                self.username,
-                                                                hostname,
-                                                                self.get_reponame())
-
-        ret_code, ret_str = service_utils.run_this(cmd)
-        return (ret_code, ret_str)
+        conn = ssh_utils.get_connection(self.gsrvr['hostname'], self.gsrvr['port'],
+                                        self.username)
+        try:
+            ret_str = conn.gerrit('create-project', self.get_reponame())
+        except ssh_utils.GerritSSHError as ex:
+            return (1, str(ex))
+        return (0, ret_str)
 
     def cleanup_properties(self, name):
         """
@@ -127,7 +126,7 @@ class Repo(object):
         pdict = {}
         fpath = os.path.join(self.get_reponame(), "serverspec", "properties.yml")
         with open(self.get_reponame() + "/serverspec/properties.yml") as ydata:
-            pdict = yaml.load(ydata)
+            pdict = yaml_io.load(ydata)
             pdict[str(self.name)] = pdict[name]
             del pdict[name]
         os.remove(fpath)
@@ -240,7 +239,7 @@ class Ansible(Repo):
 
         nimbus_name = os.path.join(".", self.get_reponame(), ".nimbus.yml")
         with open(nimbus_name, "w") as nimbus:
-            nimbus.write(yaml.dump(nimbusdict, default_flow_style=False))
+            nimbus.write(yaml_io.dump(nimbusdict))
 
     def create_ansible(self):
         """
@@ -277,7 +276,7 @@ class Ansible(Repo):
             playfile = "./{}/ansible/{}".format(self.get_reponame(),
                                                 self.name + ".yml")
             with open(playfile, "w") as playbook:
-                playbook.write(yaml.dump(playdict, default_flow_style=False))
+                playbook.write(yaml_io.dump(playdict))
 
         # make the necessary directory
         ansibledir = "./{}/ansible".format(self.get_reponame())
@@ -441,7 +440,7 @@ class Puppet(Repo):
 
         nimbus_name = os.path.join(".", self.get_reponame(), ".nimbus.yml")
         with open(nimbus_name, "w") as nimbus:
-            nimbus.write(yaml.dump(nimbusdict, default_flow_style=False))
+            nimbus.write(yaml_io.dump(nimbusdict))
 
     def download_template(self):
         """
@@ -489,7 +488,7 @@ class Puppet(Repo):
             note = "This was populated from service.yml"
             sdict["{}::banner".format(self.name)] = banner
             sdict["{}::service-note".format(self.name)] = note
-            servf.write(yaml.dump(yaml.dump(sdict, default_flow_style=False)))
+            servf.write(yaml_io.dump(yaml_io.dump(sdict)))
 
         with open(os.path.join(self.get_reponame(), "puppet",
                                "manifests", "site.pp"), "w") as sitef:
@@ -628,7 +627,7 @@ class Project(Repo):
 
         nimbus_name = os.path.join(".", self.get_reponame(), ".nimbus.yml")
         with open(nimbus_name, "w") as nimbus:
-            nimbus.write(yaml.dump(nimbusdict, default_flow_style=False))
+            nimbus.write(yaml_io.dump(nimbusdict))
 
     def construct(self):
         """
@@ -0,0 +1,294 @@
+"""
+Streamed, resumable and checksum verified downloads of artifacts and rpms
+
+Every download is streamed in large chunks into <destination>.part, hashing it
+on the way, so memory use does not grow with the size of the file.  An
+interrupted download leaves the .part file behind and the next attempt asks the
+server for the rest of it only.  The file gets its final name once the checksum
+from the Artifactory or Pulp metadata matches.
+"""
+import os
+import sys
+import time
+import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+import http_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.download')
+
+CHUNK_SIZE = 1024 * 1024
+
+# Note: Seconds between two updates of the progress line.
+PROGRESS_INTERVAL = 0.5
+
+# Note: In order of preference when the metadata lists several checksums.
+CHECKSUM_TYPES = ('sha256', 'sha1', 'md5')
+
+
+class Download(object):
+    """
+    A file to download.
+
+    Attributes:
+        url (str): Where to download it from
+        destination (str): Full path of the downloaded file
+        checksum (str): Expected hex digest, not verified if None
+        checksum_type (str): hashlib name of the checksum, e.g. sha256
+        size (int): Expected size in bytes, if known
+        auth (tuple or object): Passed as auth to requests
+        verify (bool): Verify the server's certificate
+
+    Example Usage:
+        >>> download = Download('https://host/artifactory/repo/foo.tgz', './foo.tgz',
+        ...                     checksum='2fd4e1c6...', checksum_type='sha1')
+    """
+
+    def __init__(self, url, destination, checksum=None, checksum_type=None, size=None,
+                 auth=None, verify=True):
+        self.url = url
+        self.destination = destination
+        self.checksum = checksum.lower() if checksum else None
+        self.checksum_type = checksum_type
+        self.size = size
+        self.auth = auth
+        self.verify = verify
+
+    @property
+    def part_file(self):
+        return self.destination + '.part'
+
+    @property
+    def name(self):
+        return os.path.basename(self.destination)
+
+
+def artifactory_download(info, destination, auth=None, verify=True):
+    """Build a Download from the Artifactory storage api info of an artifact.
+
+    Args:
+        info (dict): The parsed json of /artifactory/api/storage/<repo>/<path>
+        destination (str): Directory to download into
+        auth (tuple or object): Passed as auth to requests
+        verify (bool): Verify the server's certificate
+
+    Returns:
+        Download object
+    """
+    checksums = info.get('checksums', {})
+    checksum_type = next((name for name in CHECKSUM_TYPES if checksums.get(name)), None)
+    size = info.get('size')
+    return Download(info['downloadUri'],
+                    os.path.join(destination, info['downloadUri'].split('/')[-1]),
+                    checksums.get(checksum_type), checksum_type,
+                    int(size) if size else None, auth, verify)
+
+
+def pulp_download(url, metadata, destination, auth=None, verify=False):
+    """Build a Download from the metadata of a Pulp rpm unit.
+
+    Args:
+        url (str): Where the rpm is published
+        metadata (dict): The unit metadata, with filename and optionally checksum,
+                         checksumtype and size
+        destination (str): Directory to download into
+        auth (tuple or object): Passed as auth to requests
+        verify (bool): Verify the server's certificate
+
+    Returns:
+        Download object
+    """
+    checksum_type = metadata.get('checksumtype')
+    if checksum_type == 'sha':
+        checksum_type = 'sha1'
+    return Download(url, os.path.join(destination, metadata['filename']),
+                    metadata.get('checksum') if checksum_type else None, checksum_type,
+                    metadata.get('size'), auth, verify)
+
+
+class Progress(object):
+    """
+    One progress line for any number of concurrent downloads, redrawn at most
+    every PROGRESS_INTERVAL seconds.
+
+    Args:
+        total (int): Number of downloads
+        stream (file): Where the line is written, nothing is written if None
+    """
+
+    def __init__(self, total, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.received = 0
+        self.expected = 0
+        self.start = time.time()
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def expect(self, size):
+        with self._lock:
+            self.expected += size or 0
+
+    def update(self, size):
+        with self._lock:
+            self.received += size
+            now = time.time()
+            if now - self._last < PROGRESS_INTERVAL:
+                return
+            self._last = now
+            self._draw(now)
+
+    def finish_one(self):
+        with self._lock:
+            self.done += 1
+            self._draw(time.time())
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.write('\n')
+            self.stream.flush()
+
+    def _draw(self, now):
+        if self.stream is None:
+            return
+        rate = self.received / max(now - self.start, 0.001)
+        expected = ''
+        if self.expected:
+            expected = ' of %.1f' % (self.expected / 1048576.0)
+        self.stream.write('\r%i/%i files  %.1f%s MB  %.1f MB/s '
+                          % (self.done, self.total, self.received / 1048576.0,
+                             expected, rate / 1048576.0))
+        self.stream.flush()
+
+
+def _hash_file(fname, hasher):
+    with open(fname, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+            hasher.update(chunk)
+
+
+def download_file(download, session=None, progress=None, resume=True):
+    """Stream a download to disk, resuming a partial one, and verify it.
+
+    Args:
+        download (Download): What to download
+        session (requests.Session): Session to use, a new one if None
+        progress (Progress): Told about every chunk received
+        resume (bool): Continue an existing .part file
+
+    Returns:
+        returncode (int):
+            0 -- Success, download.destination holds the verified file
+            1 -- Failure
+        message (str): What went wrong, or the destination on success
+
+    Example Usage:
+        >>> print download_file(Download('http://host/foo.rpm', '/tmp/foo.rpm'))
+        (0, '/tmp/foo.rpm')
+    """
+    hasher = None
+    if download.checksum:
+        try:
+            hasher = hashlib.new(download.checksum_type)
+        except (TypeError, ValueError):
+            return 1, ('Unknown checksum type %s for %s'
+                       % (download.checksum_type, download.name))
+    session = session or http_utils.make_session(1)
+    offset = 0
+    if resume and os.path.isfile(download.part_file):
+        offset = os.path.getsize(download.part_file)
+    headers = {}
+    if offset:
+        headers['Range'] = 'bytes=%i-' % offset
+    try:
+        response = session.get(download.url, stream=True, auth=download.auth,
+                               verify=download.verify, headers=headers)
+        if response.status_code == 416 and offset:
+            # Note: The .part file is not a prefix of what the server has now.
+            response.close()
+            return download_file(download, session, progress, resume=False)
+        if not response.ok:
+            response.close()
+            return 1, 'Error %i downloading %s' % (response.status_code, download.url)
+        if offset and response.status_code == 206 and \
+                response.headers.get('Content-Range', '').startswith('bytes %i-' % offset):
+            slab_logger.log(15, 'Resuming %s at %i bytes' % (download.name, offset))
+            mode = 'ab'
+            if hasher:
+                _hash_file(download.part_file, hasher)
+            if progress:
+                progress.update(offset)
+        else:
+            mode = 'wb'
+            offset = 0
+        with open(download.part_file, mode) as part:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                part.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                if progress:
+                    progress.update(len(chunk))
+    except (requests.exceptions.RequestException, IOError) as error:
+        return 1, 'Unable to download %s: %s' % (download.url, error)
+    if hasher and hasher.hexdigest() != download.checksum:
+        os.remove(download.part_file)
+        if offset:
+            # Note: The file changed on the server since the .part file was written.
+            return download_file(download, session, progress, resume=False)
+        return 1, ('%s checksum of %s is %s, expected %s'
+                   % (download.checksum_type, download.name, hasher.hexdigest(),
+                      download.checksum))
+    os.rename(download.part_file, download.destination)
+    return 0, download.destination
+
+
+def download_files(downloads, workers=4, stream=sys.stderr):
+    """Download several files concurrently with one progress line.
+
+    Args:
+        downloads (list): Download objects
+        workers (int): Maximum number of downloads running at once
+        stream (file): Where the progress line goes, none is shown if None
+
+    Returns:
+        returncode (int):
+            0 -- Success, every file was downloaded and verified
+            1 -- Failure, at least one download failed
+        results (list): (Download, returncode, message) in the order of downloads
+
+    Example Usage:
+        >>> returncode, results = download_files([download_a, download_b], workers=2)
+    """
+    if not downloads:
+        return 0, []
+    workers = max(1, min(workers, len(downloads)))
+    session = http_utils.make_session(workers)
+    progress = Progress(len(downloads), stream)
+    for download in downloads:
+        progress.expect(download.size)
+
+    def worker(download):
+        returncode, message = download_file(download, session, progress)
+        progress.finish_one()
+        return download, returncode, message
+
+    pool = ThreadPool(workers)
+    try:
+        results = pool.map(worker, downloads)
+    finally:
+        pool.close()
+        pool.join()
+        progress.close()
+        session.close()
+    for download, returncode, message in results:
+        if returncode == 0:
+            slab_logger.log(25, 'Downloaded %s' % message)
+        else:
+            slab_logger.error(message)
+    return (1 if any(result[1] for result in results) else 0), results
@@ -4,14 +4,12 @@ Stack explain command
 import os
 import re
 
-import yaml
-import requests
 import operator
 from string import maketrans
-from prettytable import PrettyTable
-from bs4 import BeautifulSoup
 
 import service_utils
+import http_utils
+import yaml_io
 import ccsbuildtools_utils
 import logger_utils
 from servicelab import settings
@@ -42,7 +40,8 @@ def compile_man_page(path, user, password):
         url = 'https://confluence.sco.cisco.com/display/' + item
         site_title = item.translate(None, '+')
         file_title = item.translate(maketrans("+", "-")).lower()[4:]
-        content = requests.get(url, auth=(user, password))
+        content = http_utils.get_client('confluence', http_utils.origin(url),
+                                        (user, password)).get(url)
         if content.status_code != 200:
             slab_logger.error("Unable to login to %s as user %s with supplied password."
                               % (url, user))
@@ -88,6 +87,8 @@ def query(path, query_str):
     for sections the user should visit based on the query, but ultimately lets the user
     pick which section to visit.
     """
+    from prettytable import PrettyTable
+
     slab_logger.log(15, 'Displaying sections of man page based on query matches\n')
     man_yaml = _load_slabmanyaml(path)
     topic_titles = {}
@@ -223,7 +224,7 @@ def _load_slabmanyaml(path):
     path_to_yaml = os.path.split(path)[0]
     path_to_yaml = os.path.join(path_to_yaml, "utils", "slab_man_data.yaml")
     with open(path_to_yaml, 'r') as yaml_file:
-        return yaml.load(yaml_file)
+        return yaml_io.load(yaml_file)
 
 
 # This needs improvement. Formatting is an issue for some html websites. There are too many
@@ -236,6 +237,8 @@ def _parse_confluence_website(html_text, site_title):
     Removes all html tag s and grabs relevant data from a confluence html page -
     converts the content into human-readable format.
     """
+    from bs4 import BeautifulSoup
+
     slab_logger.log('Extracting data from confluence')
     soup = BeautifulSoup(html_text, 'html.parser')
     title = soup.title.text.split('-')[0]
@@ -5,12 +5,11 @@ import os
 import click
 import datetime
 
+import ssh_utils
 import logger_utils
+import catalog_utils
 import service_utils
 
-from gerrit import filters
-from gerrit import reviews
-
 from servicelab import settings
 
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.gerrit')
@@ -127,6 +126,7 @@ class GerritFns(object):
         self.prjname = project
         self.hostname = ctx.get_gerrit_server()['hostname']
         self.port = ctx.get_gerrit_server()['port']
+        self.path = ctx.path
 
     def getkey(self):
         """ get the ssh key-credential of the user."""
@@ -139,6 +139,26 @@ class GerritFns(object):
                                     "user {} ssh key".format(self.user))
         return key
 
+    def connection(self):
+        """ The ssh connection to the gerrit server shared by every query and review
+            of this run."""
+        return ssh_utils.get_connection(self.hostname, self.port, self.user,
+                                        self.getkey())
+
+    def query(self, *terms):
+        """ Query the gerrit server for changes.
+
+            Args:
+                terms           -- search operators, e.g. change:1234
+
+            Raises:
+               GerritFnException        -- If the query failed.
+        """
+        try:
+            return self.connection().query(*terms)
+        except ssh_utils.GerritSSHError as ex:
+            raise GerritFnException(str(ex))
+
     def change_review(self, number, rev_number, verify_number, msg=""):
         """ Change the review and verify numbers for a gerrit review number
 
@@ -153,28 +173,20 @@ class GerritFns(object):
             Raises:
                GerritFnException        -- If Unable to find the gerrit review number.
          """
-        slab_logger.debug('Changing review for gerrit review %i' % number)
-        project = filters.OrFilter()
-        project.add_items('project', [self.prjname])
-        other = filters.Items()
-        other.add_items('change', number)
-        key = self.getkey()
-        query = reviews.Query(self.hostname, self.port, self.user, key)
-
-        for review in query.filter(project, other):
+        slab_logger.debug('Changing review for gerrit review %s' % number)
+        for review in self.query('project:%s' % self.prjname, 'change:%s' % number):
             revision = review["currentPatchSet"]["revision"]
-            rev = reviews.Review(revision, self.hostname, self.port, self.user, key)
-            rev.review(rev_number)
-            rev.verify(verify_number)
             if not msg:
                 msg = click.prompt(Format.message(0, 0, Format.bld,
                                                   "Commit Message for Review? "),
                                    default="")
-            ret = rev.commit(msg)
-            if not ret:
+            try:
+                self.connection().review(revision, code_review=rev_number,
+                                         verified=verify_number, message=msg)
+            except ssh_utils.GerritSSHError as ex:
                 raise GerritFnException("Unable to change the review and "
                                         "verification number on " +
-                                        number)
+                                        str(number) + ": " + str(ex))
             return
         raise GerritFnException("Unable to find the review " + number)
 
@@ -190,26 +202,20 @@ class GerritFns(object):
             Raises:
                GerritFnException        -- If Unable to find the gerrit review number.
          """
-        slab_logger.debug('Changing the state of gerrit review to %i' % number)
-        project = filters.OrFilter()
-        project.add_items('project', [self.prjname])
-        other = filters.Items()
-        other.add_items('change', number)
-        key = self.getkey()
-        query = reviews.Query(self.hostname, self.port, self.user, key)
+        slab_logger.debug('Changing the state of gerrit review %s to %s' % (number, state))
         if state not in ['abandon', 'restore', 'delete']:
-            raise GerritFnException("unknown state for change " + number)
+            raise GerritFnException("unknown state for change " + str(number))
 
-        for review in query.filter(project, other):
+        for review in self.query('project:%s' % self.prjname, 'change:%s' % number):
             revision = review["currentPatchSet"]["revision"]
-            rev = reviews.Review(revision, self.hostname, self.port, self.user, key)
-            rev.status(state)
             if not msg:
                 msg = click.prompt(Format.message(0, 0, Format.bld, "Message? "),
                                    default="")
-            ret = rev.commit(msg)
-            if not ret:
-                raise GerritFnException("Unable to abondon changes on " + number)
+            try:
+                self.connection().review(revision, state=state, message=msg)
+            except ssh_utils.GerritSSHError as ex:
+                raise GerritFnException("Unable to %s changes on %s: %s" % (state, number,
+                                                                            ex))
             return
         raise GerritFnException("Unable to find the review " + number)
 
@@ -222,15 +228,9 @@ class GerritFns(object):
             Raises:
                GerritFnException        -- If Unable to find the gerrit review number.
         """
-        slab_logger.debug('Pulling gerrit review %i for code review' % number)
-        project = filters.OrFilter()
-        project.add_items('project', [self.prjname])
-        other = filters.Items()
-        other.add_items('change', number)
+        slab_logger.debug('Pulling gerrit review %s for code review' % number)
         key = self.getkey()
-        query = reviews.Query(self.hostname, self.port, self.user, key)
-
-        for review in query.filter(project, other):
+        for review in self.query('project:%s' % self.prjname, 'change:%s' % number):
             if 'type' in review.keys() and review['type'] == 'error':
                 raise GerritFnException(review['message'])
 
@@ -261,20 +261,32 @@ class GerritFns(object):
             else:
                 raise GerritFnException(ret_str)
 
+    def catalog(self):
+        """ The cached catalog of the repos on gerrit server, fetched with the
+            user's ssh key."""
+        command = catalog_utils.ls_projects_command(self.hostname, self.port,
+                                                    self.user, self.getkey())
+        return catalog_utils.get_catalog(self.path, command,
+                                         self.connection().ls_projects)
+
     def repo_list(self):
         """ Generate list of all repos on gerrit server."""
         slab_logger.debug('Generating list of all repos on gerrit')
-        key = self.getkey()
-        cmd = "ssh -i {} -p {} {}@{} gerrit ls-projects".format(key,
-                                                                self.port,
-                                                                self.user,
-                                                                self.hostname)
+        names = self.catalog().names()
+        if names is None:
+            raise GerritFnException("unable to fetch the project list from gerrit")
+        return names
 
-        # now run the command and get output
-        ret_code, ret_str = service_utils.run_this(cmd)
-        if ret_code:
-            raise GerritFnException(ret_str)
-        return ret_str.split()
+    def find_repos(self, search_term):
+        """ Repos on gerrit server matching the search_term regex, ignoring case.
+
+            Args:
+                search_term     -- the regex
+        """
+        slab_logger.debug('Searching repos on gerrit for %s' % search_term)
+        if self.catalog().names() is None:
+            raise GerritFnException("unable to fetch the project list from gerrit")
+        return self.catalog().search(search_term)
 
     def print_list(self):
         """ Prints the generated  list of all repos on gerrit server."""
@@ -289,31 +301,37 @@ class GerritFns(object):
                                          is detail.
                 number                -- Review number. If no review are supplied then
                                          all the reviews of a particualr owner, reviwer
-                                         or status are printed.
+                                         or status are printed. A list of numbers is
+                                         queried on parallel channels.
                 owner                 -- The review owner
                 reviewer              -- The reviewer.
                 status                -- Any valid gerrit status.
         """
         slab_logger.debug('Extracting details of gerrit review(s)')
-        other = filters.Items()
-        if number:
-            other.add_items('change', number)
+        terms = []
         if owner:
-            other.add_items('owner', owner)
+            terms.append('owner:%s' % owner)
         if reviewer:
-            other.add_items('reviewer', reviewer)
+            terms.append('reviewer:%s' % reviewer)
         if self.prjname:
-            other.add_items('project', self.prjname)
+            terms.append('project:%s' % self.prjname)
 
         if status:
             if status in GerritFns.status:
-                other.add_items("status", status)
+                terms.append('status:%s' % status)
             else:
                 raise ValueError("Invalid Status supplied")
 
-        key = self.getkey()
-        query = reviews.Query(self.hostname, self.port, self.user, key)
-        for review in query.filter(other):
+        if isinstance(number, (list, tuple)):
+            try:
+                results = self.connection().query_many([['change:%s' % num] + terms
+                                                        for num in number])
+            except ssh_utils.GerritSSHError as ex:
+                raise GerritFnException(str(ex))
+            found = [review for result in results for review in result]
+        else:
+            found = self.query(*((['change:%s' % number] if number else []) + terms))
+        for review in found:
             if GerritFns.instrument_code:
                 # if instrumenting code we only need to check the first review
                 return review
@@ -4,8 +4,9 @@ Git check utilities
 import os
 import re
 import shlex
-import subprocess
-from subprocess import PIPE
+import subprocess32 as subprocess
+from subprocess32 import PIPE
+from multiprocessing.pool import ThreadPool
 
 import logger_utils
 from servicelab import settings
@@ -39,6 +40,7 @@ class Gitcheckutils(object):
         for directory, dirnames, dummy_filenames in os.walk(curdir):
             if '.git' in dirnames:
                 repo.append(directory)
+                dirnames.remove('.git')
 
         repo.sort()
         return repo
@@ -144,51 +146,135 @@ class Gitcheckutils(object):
         """
         Checks repository
         """
-        slab_logger.log(15, 'Checking repo')
-        branch = Gitcheckutils.get_default_branch(rep)
-        if re.match(self.ignoreBranch, branch):
+        state = Gitcheckutils.get_repository_state(rep, self.ignoreBranch)
+        if state is None:
             return False
+        Gitcheckutils.display_repository_state(state)
+        return
 
-        changes = Gitcheckutils.get_local_files_change(rep)
-        ischange = len(changes) > 0
-
-        branch = Gitcheckutils.get_default_branch(rep)
-        if branch != "":
-            remotes = Gitcheckutils.get_remote_repositories(rep)
-            topush = Gitcheckutils.get_to_push(ischange, remotes, rep, branch)
-            topull = Gitcheckutils.get_to_pull(ischange, remotes, rep, branch)
+    @staticmethod
+    def get_repository_state(rep, ignore_branch=r'^$'):
+        """
+        Collects the state of a repository with as few git commands as possible:
+        one status for the branch and changed files, one listing of the remotes
+        and their branches, one rev-list count per remote branch, and a log only
+        for the directions that have commits.
+
+        Returns None if the branch matches ignore_branch, otherwise a dict with
+        the repository, branch, changes (status -s style [XY, path] pairs) and
+        remotes ([remote, commits to push, commits to pull] lists).
+        """
+        slab_logger.log(15, 'Checking repo %s' % rep)
+        branch, changes = Gitcheckutils.get_status(rep)
+        if re.match(ignore_branch, branch):
+            return None
+
+        remotes = []
+        remote_refs = Gitcheckutils.get_remote_refs(rep)
+        for remote in Gitcheckutils.get_remote_repositories(rep):
+            ref = '%s/%s' % (remote, branch)
+            topush = []
+            topull = []
+            if ref in remote_refs:
+                behind, ahead = Gitcheckutils.git_exec(
+                    rep, "rev-list --left-right --count %(ref)s...HEAD" % locals()).split()
+                if int(ahead):
+                    topush = Gitcheckutils.get_local_to_push(rep, remote, branch, True)
+                if int(behind):
+                    topull = Gitcheckutils.get_remote_to_pull(rep, remote, branch, True)
+            remotes.append([remote, topush, topull])
+
+        return {'rep': rep, 'branch': branch, 'changes': changes, 'remotes': remotes}
 
-        repname = Gitcheckutils.get_rep_name(rep)
+    @staticmethod
+    def display_repository_state(state):
+        """
+        Displays the state collected by get_repository_state
+        """
+        repname = Gitcheckutils.get_rep_name(state['rep'])
+        changes = state['changes']
+        topush = "".join(" %s[To Review:%s files]" % (remote, len(commits))
+                         for remote, commits, _ in state['remotes'] if commits)
+        topull = "".join(" %s[To Pull:%s files]" % (remote, len(commits))
+                         for remote, _, commits in state['remotes'] if commits)
 
         if len(changes) > 0:
-            strlocal = "Local["
-            len_files_chnaged = len(Gitcheckutils.get_local_files_change(rep))
-            strlocal = strlocal + "To Commit:%s files" % (
-                len_files_chnaged
-            )
-            strlocal += "]"
+            strlocal = "Local[To Commit:%s files]" % len(changes)
         else:
             strlocal = ""
 
         slab_logger.log(25, "%s/%s %s%s%s"
-                        % (repname, branch, strlocal, topush, topull))
-
-        if ischange > 0:
-            filename = "  |--Local"
-            for change in changes:
-                filename = "     |--%s %s" % (
-                    change[0],
-                    change[1])
-                slab_logger.log(25, filename)
-        if branch != "":
-            remotes = Gitcheckutils.get_remote_repositories(rep)
-            Gitcheckutils.display_reviews(remotes, rep, branch)
-
-        if branch != "":
-            remotes = Gitcheckutils.get_remote_repositories(rep)
-            Gitcheckutils.display_pulls(remotes, rep, branch)
+                        % (repname, state['branch'], strlocal, topush, topull))
 
-        return
+        for change in changes:
+            filename = "     |--%s %s" % (
+                change[0],
+                change[1])
+            slab_logger.log(25, filename)
+
+        for remote, commits, _ in state['remotes']:
+            if commits:
+                slab_logger.log(25, "  |--%s" % remote)
+                for commit in commits:
+                    slab_logger.log(25, "     |--[To Review] %s" % commit)
+
+        for remote, _, commits in state['remotes']:
+            if commits:
+                slab_logger.log(25, "  |--%s" % remote)
+                for commit in commits:
+                    slab_logger.log(25, "     |--[To Pull] %s" % commit)
+
+    @staticmethod
+    def get_status(rep):
+        """
+        Gets the current branch and the changed files from one git status.
+
+        The branch is named as git branch names it, and "" for a repository
+        without commits.  The changes are [XY, path] pairs as in git status -s.
+        """
+        slab_logger.log(15, 'Determining branch and changed files')
+        result = Gitcheckutils.git_exec(rep, "status --porcelain=v2 --branch")
+        branch = ""
+        initial = False
+        changes = []
+
+        def quote(path):
+            # Note: git status -s also quotes paths that only contain spaces
+            if ' ' in path and not path.startswith('"'):
+                return '"%s"' % path
+            return path
+
+        for line in result.split('\n'):
+            if line.startswith('# branch.oid '):
+                initial = line[len('# branch.oid '):] == '(initial)'
+            elif line.startswith('# branch.head '):
+                branch = line[len('# branch.head '):]
+            elif line.startswith('1 ') or line.startswith('u '):
+                fields = line.split(' ', 10 if line[0] == 'u' else 8)
+                changes.append([fields[1].replace('.', ' '), quote(fields[-1])])
+            elif line.startswith('2 '):
+                fields = line.split(' ', 9)
+                path, orig_path = fields[-1].split('\t', 1)
+                changes.append([fields[1].replace('.', ' '),
+                                "%s -> %s" % (quote(orig_path), quote(path))])
+            elif line.startswith('? '):
+                changes.append(['??', quote(line[2:])])
+        if initial:
+            branch = ""
+        elif branch == '(detached)':
+            # Note: git branch names a detached HEAD by what it was detached at
+            branch = Gitcheckutils.get_default_branch(rep)
+        return branch, changes
+
+    @staticmethod
+    def get_remote_refs(rep):
+        """
+        Gets the remote tracking branches, as remote/branch names
+        """
+        slab_logger.log(15, 'Determining remote branches')
+        result = Gitcheckutils.git_exec(rep, "for-each-ref --format=%(refname) "
+                                             "refs/remotes")
+        return set(x[len('refs/remotes/'):] for x in result.split('\n') if x)
 
     @staticmethod
     def get_local_files_change(rep):
@@ -218,12 +304,12 @@ class Gitcheckutils(object):
         return '%s/%s' % (remote, branch) in result
 
     @staticmethod
-    def get_local_to_push(rep, remote, branch):
+    def get_local_to_push(rep, remote, branch, checked=False):
         """
         checks if local exists for push
         """
         slab_logger.log(15, 'Checking for branch on local repo')
-        if not Gitcheckutils.has_remote_branch(rep, remote, branch):
+        if not checked and not Gitcheckutils.has_remote_branch(rep, remote, branch):
             return []
         result = Gitcheckutils.git_exec(rep, "log %(remote)s/%(branch)s..HEAD \
                           --oneline" % locals())
@@ -231,12 +317,12 @@ class Gitcheckutils(object):
         return [x for x in result.split('\n') if x]
 
     @staticmethod
-    def get_remote_to_pull(rep, remote, branch):
+    def get_remote_to_pull(rep, remote, branch, checked=False):
         """
         checks if remote exists for pull
         """
         slab_logger.log(15, 'Checking for branch on remote repo')
-        if not Gitcheckutils.has_remote_branch(rep, remote, branch):
+        if not checked and not Gitcheckutils.has_remote_branch(rep, remote, branch):
             return []
         result = Gitcheckutils.git_exec(rep, "log HEAD..%(remote)s/%(branch)s \
                           --oneline" % locals())
@@ -286,13 +372,22 @@ class Gitcheckutils(object):
         return output.decode('utf-8')
 
     # Check all git repositories
-    def git_check(self, srch_dir):
+    def git_check(self, srch_dir, workers=8):
         """
-        Does git check
+        Does git check.  The repositories are checked concurrently by a pool of
+        workers and displayed in the order of their paths.
         """
         slab_logger.log(15, 'Checking all git repos')
-        repos = Gitcheckutils.search_repositories(srch_dir)
-
-        for repo in repos:
-            if "ccs-data" not in repo:
-                self.check_repository(repo)
+        repos = [repo for repo in Gitcheckutils.search_repositories(srch_dir)
+                 if "ccs-data" not in repo]
+        if not repos:
+            return
+        pool = ThreadPool(min(workers, len(repos)))
+        try:
+            for state in pool.imap(lambda repo: Gitcheckutils.get_repository_state(
+                    repo, self.ignoreBranch), repos):
+                if state is not None:
+                    Gitcheckutils.display_repository_state(state)
+        finally:
+            pool.close()
+            pool.join()
@@ -8,15 +8,27 @@ import json
 import xml.etree.ElementTree as ET
 import requests
 
+import http_utils
 import logger_utils
+import pipewatch_utils
 
 from requests.auth import HTTPBasicAuth
-from bs4 import BeautifulSoup
 from servicelab import settings
 
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.gocd')
 
 
+def _client(url, auth=None):
+    """
+    Returns the pooled client of the go server at url, an ip address or a url.
+    """
+    if '://' in url:
+        url = http_utils.origin(url)
+    else:
+        url = 'http://%s' % url
+    return http_utils.get_client('gocd', url, auth)
+
+
 def get_config(config_xmlurl, auth=None):
     """
     Retrieves the go config
@@ -26,10 +38,7 @@ def get_config(config_xmlurl, auth=None):
         auth
     """
     slab_logger.log(15, "Retrieving go config")
-    if auth:
-        req = requests.get(config_xmlurl, auth=auth)
-    else:
-        req = requests.get(config_xmlurl)
+    req = _client(config_xmlurl, auth).get(config_xmlurl)
     if req.status_code == 200:
         try:
             root = ET.fromstring(req.text)
@@ -59,11 +68,7 @@ def push_config(config_xmlurl, md5, xmlfile, auth=None):
         'xmlFile': xmlfile
     }
 
-    if auth:
-        req = requests.post(config_xmlurl,
-                            auth=auth, data=payload)
-    else:
-        req = requests.post(config_xmlurl, data=payload)
+    req = _client(config_xmlurl, auth).post(config_xmlurl, data=payload)
     if req.status_code != 200:
         slab_logger.error(req.status_code, req.text)
         sys.exit(1)
@@ -81,10 +86,7 @@ def get_current_pipeline_counter(pipeline_name, ip_address, auth=None):
     url = "http://%s/go/api/pipelines/%s/history/0" % (
         ip_address, pipeline_name)
 
-    if auth:
-        req = requests.get(url, auth=auth)
-    else:
-        req = requests.get(url)
+    req = _client(ip_address, auth).get(url)
     if req.status_code != 200:
         slab_logger.error(req.status_code, req.text)
         return -1, None
@@ -105,51 +107,39 @@ def process_all_stages(pipeline_name, pipeline_counter, ip_address, auth=None):
         pipeline_name
     """
     slab_logger.log(15, 'Processing pipeline stages')
-    wait_for_pipeline(pipeline_name, ip_address, auth)
+    watcher = pipewatch_utils.PipelineWatcher(_client(ip_address, auth))
+    watcher.wait_until_schedulable(pipeline_name)
     return_code, pipeline_instance = get_pipeline_instance(
         pipeline_name, pipeline_counter, ip_address, auth)
     if return_code != 0:
         slab_logger.error("Error occurred. Exiting")
         return
 
-    i = 0
-    if pipeline_instance['stages']:
-        for stage in pipeline_instance['stages']:
-            return_code, current_pipeline_instance = get_pipeline_instance(
-                pipeline_name, pipeline_counter, ip_address, auth)
-            matching_stage = current_pipeline_instance['stages'][i]
-            if return_code != 0:
-                slab_logger.error("Error occurred. Exiting")
-                return
-
-            if 'result' in matching_stage:
-                slab_logger.log(25, "Stage : %s  has %s "
-                                % (matching_stage['name'], matching_stage['result']))
-                if matching_stage['result'] == "Failed":
-                    slab_logger.error("Exiting.")
-                    return
-            else:
+    # Note: The instance is only fetched again by waiting on a stage, which
+    #       returns on the poll that sees the stage finish.
+    for i in range(len(pipeline_instance['stages'])):
+        stage = pipeline_instance['stages'][i]
+        state = pipewatch_utils.stage_state(stage)
+        if state not in pipewatch_utils.FINAL_STATES:
+            if state == pipewatch_utils.NOT_RUN:
                 slab_logger.log(25, "Scheduling Stage : %s " % (stage['name']))
                 url = "http://%s/go/run/%s/%s/%s" % (
                     ip_address, pipeline_name, pipeline_counter, stage['name'])
-                req = requests.post(url, auth=auth, data="")
+                req = watcher.client.post(url, data="")
                 if req.status_code != 200:
                     slab_logger.error(req.status_code, req.text)
                     return -1, None
-                time.sleep(10)
-                wait_for_stage(
-                    pipeline_name,
-                    ip_address,
-                    stage['name'],
-                    pipeline_counter,
-                    auth=auth)
-                return_code, current_pipeline_instance = get_pipeline_instance(
-                    pipeline_name, pipeline_counter, ip_address, auth)
-                matching_stage = current_pipeline_instance['stages'][i]
-                slab_logger.log(25, "Stage : %s  has %s "
-                                % (matching_stage['name'], matching_stage['result']))
-
-            i += 1
+            pipeline_instance = watcher.wait_for_stage(pipeline_name, pipeline_counter,
+                                                       stage['name'])
+            if pipeline_instance is None:
+                slab_logger.error("Error occurred. Exiting")
+                return
+            stage = pipeline_instance['stages'][i]
+            state = pipewatch_utils.stage_state(stage)
+        slab_logger.log(25, "Stage : %s  has %s " % (stage['name'], state))
+        if state == "Failed":
+            slab_logger.error("Exiting.")
+            return
 
 
 def get_pipeline_instance(
@@ -163,10 +153,7 @@ def get_pipeline_instance(
     slab_logger.log(15, 'Determining pipeline instance')
     url = "http://%s/go/api/pipelines/%s/instance/%s" % (
         ip_address, pipeline_name, pipeline_counter)
-    if auth:
-        req = requests.get(url, auth=auth)
-    else:
-        req = requests.get(url)
+    req = _client(ip_address, auth).get(url)
     if req.status_code != 200:
         slab_logger.error(req.status_code, req.text)
         return -1, None
@@ -179,20 +166,8 @@ def wait_for_pipeline(pipeline_name, ip_address, auth=None):
     Wait for pipeline.
     """
     slab_logger.log(15, 'Waiting for pipeline %s' % pipeline_name)
-    server_url = "http://{0}/go/api/pipelines/{1}/status".format(
-        ip_address, pipeline_name)
-    schedulable = False
-
-    while not schedulable:
-        res = requests.get(server_url, auth=auth)
-        status = json.loads(res.content)
-        if status:
-            schedulable = status['schedulable']
-        else:
-            return
-        if not status['schedulable']:
-            slab_logger.warning("Pipeline is running. Waiting for it to finish.")
-            time.sleep(10)
+    watcher = pipewatch_utils.PipelineWatcher(_client(ip_address, auth))
+    watcher.wait_until_schedulable(pipeline_name)
 
 
 def wait_for_stage(
@@ -205,20 +180,8 @@ def wait_for_stage(
     Wait for stage.
     """
     slab_logger.log(15, 'Waiting for stage %s' % stage_name)
-    server_url = "http://{0}/go/api/stages/{1}/{2}/instance/{3}/1".format(
-        ip_address, pipeline_name, stage_name, pipeline_counter)
-    stopped = False
-
-    while not stopped:
-        res = requests.get(server_url, auth=auth)
-        stage = json.loads(res.content)
-        if stage['result'] != "Unknown":
-            stopped = True
-        else:
-            slab_logger.warning(
-                "Stage %s is running. Waiting for it to finish." %
-                (stage['name']))
-            time.sleep(10)
+    watcher = pipewatch_utils.PipelineWatcher(_client(ip_address, auth))
+    watcher.wait_for_stage(pipeline_name, pipeline_counter, stage_name)
 
 
 def create_pipeline(root, name, new_name):
@@ -269,12 +232,13 @@ def get_pipe_info(pipeline_name, username, password, ip_address):
     """
     Get pipe info string
     """
+    from bs4 import BeautifulSoup
+
     slab_logger.log(15, 'Determining pipeline information string')
-    requests.packages.urllib3.disable_warnings()
     try:
         url = "http://{0}/go/api/pipelines/{1}/status".format(ip_address,
                                                               pipeline_name)
-        res = requests.get(url, auth=HTTPBasicAuth(username, password))
+        res = _client(ip_address, HTTPBasicAuth(username, password)).get(url)
         soup = BeautifulSoup(res.content, "html.parser")
     except requests.ConnectionError as ex:
         slab_logger.error(ex)
@@ -0,0 +1,210 @@
+"""
+Pooled keep-alive http clients for the GoCD, Jenkins, Pulp and Artifactory servers
+
+Every backend gets one requests.Session per base url and credentials for the
+whole run, so repeated calls reuse their TCP and TLS connections instead of opening new ones.
+Pool size, keep-alive and timeouts default to the values below and can be set
+per backend in the info dictionaries of the stack Context, e.g.
+ctx.get_gocd_info()['read_timeout'].
+"""
+import threading
+import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.http')
+
+# Note: Most of the servers use self signed certificates.
+requests.packages.urllib3.disable_warnings()
+
+POOL_SIZE = 10
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+
+# Note: Options a Context info dictionary may set for its backend.
+OPTIONS = ('pool_size', 'keep_alive', 'connect_timeout', 'read_timeout', 'verify')
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def make_session(pool_size=POOL_SIZE, keep_alive=True):
+    """Returns a requests.Session keeping up to pool_size connections per host.
+
+    Args:
+        pool_size (int): Connections kept open per host
+        keep_alive (bool): Close every connection after its request if False
+
+    Returns:
+        requests.Session object
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def origin(url):
+    """Returns the scheme and host part of a url.
+
+    Example Usage:
+        >>> print origin('https://ccs-artifactory.cisco.com/artifactory/api/search')
+        https://ccs-artifactory.cisco.com
+    """
+    parts = urlparse.urlsplit(url)
+    return '%s://%s' % (parts.scheme, parts.netloc)
+
+
+class HTTPClient(object):
+    """
+    A pooled session to one server.
+
+    Attributes:
+        backend (str): Name of the backend, e.g. gocd
+        base_url (str): Relative urls are joined to it
+        session (requests.Session): The pooled session, with auth set once
+        verify (bool): Verify the server's certificate
+        timeout (tuple): (connect, read) timeout in seconds used unless a
+                         request passes its own
+
+    Example Usage:
+        >>> client = get_client('pulp', 'https://ccs-mirror.cisco.com', ('user', 'pw'),
+        ...                     verify=False)
+        >>> res = client.get('/pulp/api/v2/repositories/')
+    """
+
+    def __init__(self, backend, base_url, auth=None, verify=True, pool_size=POOL_SIZE,
+                 keep_alive=True, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT):
+        self.backend = backend
+        self.base_url = base_url.rstrip('/')
+        self.session = make_session(pool_size, keep_alive)
+        self.session.auth = auth
+        self.verify = verify
+        self.timeout = (connect_timeout, read_timeout)
+
+    def url(self, path):
+        """
+        Returns path joined to the base url, or path itself if it is a full url.
+        """
+        if '://' in path:
+            return path
+        return self.base_url + '/' + path.lstrip('/')
+
+    def request(self, method, path, **kwargs):
+        """Send a request through the pooled session.
+
+        Args:
+            method (str): The http method
+            path (str): Path relative to the base url, or a full url
+            kwargs: Passed to requests.Session.request
+
+        Returns:
+            requests.Response object
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        # Note: Passed on every request, requests lets REQUESTS_CA_BUNDLE
+        #       override a verify set on the session.
+        kwargs.setdefault('verify', self.verify)
+        slab_logger.debug('%s %s' % (method, self.url(path)))
+        return self.session.request(method, self.url(path), **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _auth_key(auth):
+    """
+    Returns a hashable stand-in for credentials, equal for equal credentials.
+    """
+    if isinstance(auth, HTTPBasicAuth):
+        return (type(auth).__name__, auth.username, auth.password)
+    if isinstance(auth, list):
+        return tuple(auth)
+    return auth
+
+
+def get_client(backend, base_url, auth=None, verify=True, **options):
+    """Returns the shared client of a backend's server, creating it if needed.
+
+    Args:
+        backend (str): Name of the backend, e.g. gocd
+        base_url (str): The server, e.g. http://sdlc-go.cisco.com
+        auth (tuple or object): Credentials for every request.  Other
+                                credentials get a client of their own, the
+                                ones of a shared client never change.
+        verify (bool): Verify the server's certificate
+        options: pool_size, keep_alive, connect_timeout, read_timeout, only
+                 used when the client is created
+
+    Returns:
+        HTTPClient object
+    """
+    key = (backend, base_url.rstrip('/'), _auth_key(auth))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = HTTPClient(backend, base_url, auth, verify, **options)
+            _clients[key] = client
+    return client
+
+
+def backend_url(info, backend):
+    """
+    Returns the base url of a backend from its Context info dictionary.
+    """
+    if backend == 'gocd':
+        return 'http://%s' % info['ip']
+    return origin(info['url'])
+
+
+def client_for(ctx, backend, auth=None, base_url=None):
+    """Returns the shared client of a backend configured in the stack Context.
+
+    Args:
+        ctx (object): The stack Context
+        backend (str): One of gocd, jenkins, pulp or artifactory
+        auth (tuple or object): Credentials for every request
+        base_url (str): Use this server instead of the one from the Context,
+                        e.g. the value of an --ip_address option
+
+    Returns:
+        HTTPClient object
+
+    Example Usage:
+        >>> client = client_for(ctx, 'artifactory', (username, password))
+        >>> res = client.get(ctx.get_artifactory_info()['url'] + '/api/search/creation')
+    """
+    info = getattr(ctx, 'get_%s_info' % backend)()
+    options = dict((name, info[name]) for name in OPTIONS if name in info)
+    return get_client(backend, base_url or backend_url(info, backend), auth, **options)
+
+
+def close_all():
+    """
+    Close the connections of every client.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
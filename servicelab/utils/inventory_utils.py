@@ -0,0 +1,362 @@
+"""
+In memory model of the vagrant.yaml inventory and its order.yaml.
+
+A VagrantInventory parses vagrant.yaml once, keeps lookups by hostname, role and
+the mini flag, and collects changes until save() writes the file back in one
+atomic step.  get_inventory hands out one shared instance per file so that every
+function used during a command works on the same parsed copy.
+"""
+import os
+import copy
+import threading
+
+import yaml_io
+import cache_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.inventory')
+
+
+def make_host(ip, mac, role='none', profile=None, domain=1, cpus=2, memory=1024,
+              box='http://cis-kickstart.cisco.com/ccs-rhel-7.box'):
+    """Build the vagrant.yaml entry of a host.
+
+    Args:
+        ip (str): The ip of the host
+        mac (str): The mac of the host, without colons
+        role (str): The puppet role of the host
+        profile (str): The puppet profile of the host
+        domain (int): The faux domain of the host
+        cpus (int): Number of CPUs
+        memory (int): Memory in MB
+        box (str): The vagrant box to boot
+
+    Returns:
+        values (dict): The host entry, as stored under hosts: in vagrant.yaml
+
+    Example Usage:
+        >>> print make_host('192.168.100.30', '000027000030', role='build')
+        {'role': 'build', 'domain': 1, 'profile': None, 'ip': '192.168.100.30',
+         'mac': '000027000030', 'cpus': 2, 'memory': 1024,
+         'box': 'http://cis-kickstart.cisco.com/ccs-rhel-7.box'}
+    """
+    return {'role': role,
+            'domain': domain,
+            'profile': profile,
+            'ip': ip,
+            'mac': mac,
+            'cpus': cpus,
+            'memory': memory,
+            'box': box,
+            }
+
+
+def _file_stamp(fname):
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+class VagrantInventory(object):
+    """
+    The hosts of a vagrant.yaml file, and the boot order of the order.yaml next
+    to it.
+
+    The file is parsed and validated once.  Lookups go through the in memory
+    copy and indexes, and the file is only parsed again if it was changed on
+    disk by someone else.  Changes made with add_host and del_host stay in
+    memory until save() is called.
+
+    Attributes:
+        path (str): Directory holding the yaml files
+        fname (str): Full path of the inventory file
+        doc (dict): The parsed inventory file
+        hosts (dict): hostname -> host values, the hosts: section of doc
+        roles (dict): role -> sorted list of hostnames
+        mini (list): Sorted hostnames with the min flag set
+        dirty (bool): True if there are changes not saved yet
+        valid (bool): True if the file exists and has valid yaml
+
+    Example Usage:
+        >>> inventory = VagrantInventory(ctx.path)
+        >>> inventory.exists('infra-001')
+        True
+        >>> inventory.add_host('rhel7-001', make_host('192.168.100.2', '000027000002'))
+        0
+        >>> inventory.save()
+        0
+    """
+
+    def __init__(self, path, file_name='vagrant.yaml'):
+        self.path = path
+        self.fname = os.path.join(path, file_name)
+        self.doc = {}
+        self.hosts = {}
+        self.roles = {}
+        self.mini = []
+        self.dirty = False
+        self.valid = False
+        self._stamp = None
+        self._order = None
+        self._order_stamp = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Parse the inventory file, unless the copy in memory is current.
+
+        Unsaved changes are kept even if the file changed on disk; save()
+        overwrites the file with them.
+
+        Returns:
+            0 -- the file exists and has valid yaml
+            1 -- the file is missing, unreadable or invalid
+        """
+        with self._lock:
+            stamp = _file_stamp(self.fname)
+            if self.dirty or (stamp is not None and stamp == self._stamp):
+                return 0 if self.valid else 1
+            self._stamp = stamp
+            self.doc = {}
+            self.valid = False
+            if stamp is None:
+                slab_logger.debug('%s file is missing' % self.fname)
+                self._index()
+                return 1
+            slab_logger.log(15, 'Loading inventory %s' % self.fname)
+            try:
+                with open(self.fname, 'r') as stream:
+                    contents = stream.read()
+            except IOError as error:
+                slab_logger.error('File error: ' + str(error))
+                self._index()
+                return 1
+            problems = [problem for problem in yaml_io.check(contents)
+                        if problem[2] == 'error']
+            if problems:
+                slab_logger.error('Invalid yaml file %s' % self.fname)
+                for line, column, _, message in problems:
+                    slab_logger.error('%s:%i:%i: %s' % (self.fname, line, column, message))
+                self._index()
+                return 1
+            self.doc = yaml_io.load(contents) or {}
+            self.valid = isinstance(self.doc, dict)
+            if not self.valid:
+                self.doc = {}
+            self._index()
+            return 0 if self.valid else 1
+
+    def _index(self):
+        hosts = self.doc.get('hosts')
+        self.hosts = hosts if isinstance(hosts, dict) else {}
+        self.roles = {}
+        mini = []
+        for hostname, values in self.hosts.iteritems():
+            if not isinstance(values, dict):
+                continue
+            self.roles.setdefault(values.get('role'), []).append(hostname)
+            if 'min' in values:
+                mini.append(hostname)
+        for hostnames in self.roles.itervalues():
+            hostnames.sort()
+        self.mini = sorted(mini)
+
+    def exists(self, hostname):
+        """Check if hostname is in the inventory.
+
+        Args:
+            hostname (str): The name of the host
+
+        Returns:
+            True if the host is in the inventory, otherwise False
+        """
+        with self._lock:
+            self.load()
+            return hostname in self.hosts
+
+    def get(self, hostname):
+        """Return the values of a host.
+
+        Args:
+            hostname (str): The name of the host
+
+        Returns:
+            Returncode (int):
+                0 -- Success
+                1 -- Failure, the file is invalid or the host is not in it
+            Host (dict): {hostname: values}, a copy the caller may change
+        """
+        with self._lock:
+            self.load()
+            values = self.hosts.get(hostname)
+            if not values:
+                return 1, {}
+            return 0, {hostname: copy.deepcopy(values)}
+
+    def _host_list(self, hostnames):
+        return [{hostname: copy.deepcopy(self.hosts[hostname])} for hostname in hostnames]
+
+    def by_role(self, role):
+        """Return the hosts with the given role.
+
+        Args:
+            role (str): The puppet role, e.g. tenant_db
+
+        Returns:
+            Hosts (list): {hostname: values} dicts sorted by hostname
+        """
+        with self._lock:
+            self.load()
+            return self._host_list(self.roles.get(role, []))
+
+    def mini_hosts(self):
+        """Return the hosts that have the min flag set.
+
+        Returns:
+            Hosts (list): {hostname: values} dicts sorted by hostname
+        """
+        with self._lock:
+            self.load()
+            return self._host_list(self.mini)
+
+    def hosts_matching(self, name_part):
+        """Return the hosts whose name contains name_part.
+
+        Args:
+            name_part (str or int): Part of the hostname, e.g. 001
+
+        Returns:
+            Hosts (list): {hostname: values} dicts sorted by hostname
+        """
+        name_part = str(name_part)
+        with self._lock:
+            self.load()
+            return self._host_list(sorted(hostname for hostname in self.hosts
+                                          if name_part in hostname))
+
+    def host_order(self):
+        """Return the boot order from the order.yaml next to the inventory file.
+
+        Returns:
+            Returncode (int):
+                0 -- Success
+                1 -- Failure
+            Hosts (list): The hostnames in the order they must be booted
+        """
+        order_file = os.path.join(self.path, 'order.yaml')
+        with self._lock:
+            stamp = _file_stamp(order_file)
+            if stamp is None or stamp != self._order_stamp:
+                self._order_stamp = stamp
+                self._order = None
+                try:
+                    doc = yaml_io.load_file(order_file)
+                except IOError as error:
+                    slab_logger.error('File error: ' + str(error))
+                    return 1, []
+                except yaml_io.YAMLError as error:
+                    slab_logger.error('Invalid yaml file %s: %s' % (order_file, error))
+                    return 1, []
+                if isinstance(doc, dict) and 'order' in doc:
+                    self._order = doc['order']
+            if self._order is None:
+                return 1, []
+            return 0, list(self._order)
+
+    def add_host(self, hostname, values, replace=False):
+        """Add a host to the inventory.  The change is written by save().
+
+        Args:
+            hostname (str): The name of the host
+            values (dict): The host values, see make_host
+            replace (bool): Replace the values of an existing host
+
+        Returns:
+            0 -- Success, the host was added or was already there
+            1 -- Failure, the inventory file exists but is invalid
+        """
+        with self._lock:
+            if self.load() > 0 and self._stamp is not None:
+                slab_logger.error('Not adding %s to invalid %s' % (hostname, self.fname))
+                return 1
+            if hostname in self.hosts and not replace:
+                slab_logger.debug("Host %s already exists in %s" % (hostname, self.fname))
+                return 0
+            slab_logger.debug("Adding %s to vagrant environment now." % hostname)
+            if not self.hosts:
+                self.doc['hosts'] = self.hosts
+            self.hosts[hostname] = values
+            self.dirty = True
+            self._index()
+            return 0
+
+    def del_host(self, hostname):
+        """Remove a host from the inventory.  The change is written by save().
+
+        Args:
+            hostname (str): The name of the host
+
+        Returns:
+            0 -- Success
+            1 -- Failure, the host is not in the inventory
+        """
+        with self._lock:
+            self.load()
+            if hostname not in self.hosts:
+                return 1
+            slab_logger.debug('Deleting host: ' + hostname)
+            del self.hosts[hostname]
+            self.dirty = True
+            self._index()
+            return 0
+
+    def save(self):
+        """Write the pending changes back to the inventory file in one atomic step.
+
+        Returns:
+            0 -- Success, or nothing to write
+            1 -- Failure
+        """
+        with self._lock:
+            if not self.dirty:
+                return 0
+            slab_logger.log(15, 'Writing inventory %s' % self.fname)
+            try:
+                cache_utils.write_atomic(self.fname, yaml_io.dump(self.doc))
+            except (IOError, OSError) as error:
+                slab_logger.error('File error: ' + str(error))
+                return 1
+            self.dirty = False
+            self.valid = True
+            self._stamp = _file_stamp(self.fname)
+            return 0
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(path, file_name='vagrant.yaml'):
+    """Return the shared VagrantInventory of path/file_name.
+
+    Args:
+        path (str): Directory holding the inventory, typically ctx.path or
+                    ctx.path/provision
+        file_name (str): The inventory file, vagrant.yaml by default
+
+    Returns:
+        The VagrantInventory for the file, created on first use
+
+    Example Usage:
+        >>> inventory = get_inventory(ctx.path)
+        >>> print inventory.get('infra-001')
+        (0, {'infra-001': {'role': 'build', ...}})
+    """
+    fname = os.path.abspath(os.path.join(path, file_name))
+    with _inventories_lock:
+        if fname not in _inventories:
+            _inventories[fname] = VagrantInventory(os.path.dirname(fname),
+                                                   os.path.basename(fname))
+        return _inventories[fname]
@@ -0,0 +1,325 @@
+"""
+Allocation of free IPs in a vlan for new hosts.
+
+An IpPool keeps one bit per address of the vlan, set for the addresses taken by
+the ccs-data hosts, so marking and finding a free address never builds a list of
+the whole vlan.  Free candidates are then checked in reverse DNS, a batch at a
+time on a pool of threads with a timeout, and the answers are kept in
+.stack/cache so the next run only asks about addresses it has not seen lately.
+"""
+import os
+import time
+import socket
+import ipaddress
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+import cache_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.ip')
+
+DNS_FILE = 'reverse_dns.json'
+
+# Note: Lookups running at once, and how long a batch of them may take.
+DNS_WORKERS = 16
+DNS_TIMEOUT = 2.0
+
+# Note: A name found in DNS is trusted for a day.  An address without one is only
+#       trusted for a few minutes, someone may be registering it right now.
+DNS_TTL_FOUND = 24 * 3600
+DNS_TTL_MISSING = 600
+
+# Note: The first 4 addresses of a vlan *should* be reserved in AM anyway.
+RESERVED_HOSTS = 4
+
+
+def _address(ip):
+    # Note: ipaddress takes a py2 str for a packed address
+    if isinstance(ip, str):
+        ip = unicode(ip)
+    return ipaddress.IPv4Address(ip)
+
+
+class IpPool(object):
+    """
+    The addresses of a vlan a host may get, with the used ones marked in a bitset.
+
+    Attributes:
+        network (IPv4Network): The vlan
+        first (int): Offset in the vlan of the first address hosts may get
+        last (int): Offset in the vlan of the last address hosts may get
+        used (int): Number of addresses marked in the pool
+
+    Example Usage:
+        >>> pool = IpPool(ipaddress.IPv4Network(u'10.11.12.0/24'))
+        >>> pool.mark(u'10.11.12.5')
+        True
+        >>> [str(ip) for ip in pool.free(2)]
+        ['10.11.12.6', '10.11.12.7']
+    """
+
+    def __init__(self, network, reserved=RESERVED_HOSTS):
+        self.network = network
+        self._base = int(network.network_address)
+        size = network.num_addresses
+        if size > 2:
+            # Note: hosts() skips the network and broadcast addresses
+            self.first, self.last = 1 + reserved, size - 2
+        else:
+            self.first, self.last = reserved, size - 1
+        self._bits = bytearray((size + 7) // 8)
+        self.used = 0
+
+    def _offset(self, ip):
+        offset = int(_address(ip)) - self._base
+        if self.first <= offset <= self.last:
+            return offset
+        return None
+
+    def mark(self, ip):
+        """
+        Marks an address used.
+
+        Args:
+            ip (str or IPv4Address): The address
+
+        Returns:
+            True if the address is one of the pool, False if it is outside of it
+        """
+        offset = self._offset(ip)
+        if offset is None:
+            return False
+        if not self._bits[offset >> 3] & (1 << (offset & 7)):
+            self._bits[offset >> 3] |= 1 << (offset & 7)
+            self.used += 1
+        return True
+
+    def is_free(self, ip):
+        offset = self._offset(ip)
+        return offset is not None and not self._bits[offset >> 3] & (1 << (offset & 7))
+
+    def free(self, count=None, start=None):
+        """
+        Yields the free addresses in order, skipping full bytes of the bitset at once.
+
+        Args:
+            count (int): Stop after that many, all of them if None
+            start (str or IPv4Address): Begin at this address rather than the first
+
+        Returns:
+            Generator of IPv4Address
+        """
+        bits = self._bits
+        offset = self.first
+        if start is not None:
+            offset = max(int(_address(start)) - self._base, self.first)
+        found = 0
+        while offset <= self.last and (count is None or found < count):
+            index = offset >> 3
+            if bits[index] == 0xff:
+                rest = bits[index:]
+                offset = (index + len(rest) - len(rest.lstrip('\xff'))) << 3
+                continue
+            if not bits[index] & (1 << (offset & 7)):
+                found += 1
+                yield ipaddress.IPv4Address(self._base + offset)
+            offset += 1
+
+
+def site_pool(env_path, network, path):
+    """
+    An IpPool of the vlan with the addresses of every host of a ccs-data site
+    marked, read through the ccs-data index.
+
+    Args:
+        env_path (str): path to service cloud env - ccs-data/sites/sc/environments
+        network (IPv4Network): The vlan
+        path (str): The .stack directory holding the cache
+
+    Returns:
+        The IpPool
+    """
+    pool = IpPool(network)
+    index = cache_utils.get_ccsdata_index(path)
+    site_data = index.host_data(env_path)
+    index.save()
+    for env in site_data:
+        for fname, host_data in site_data[env].items():
+            if not host_data or 'interfaces' not in host_data:
+                continue
+            # Not all interface names are created equally
+            for interface, values in host_data['interfaces'].items():
+                try:
+                    # Not all interfaces have an ip_address
+                    if 'ip_address' in values:
+                        pool.mark(unicode(values['ip_address']))
+                except TypeError:
+                    slab_logger.debug('%s did not contain any data for interface %s'
+                                      % (os.path.join(env, 'hosts.d', fname), interface))
+                except ipaddress.AddressValueError:
+                    slab_logger.info('Bad address found in %s'
+                                     % os.path.join(env_path, env, 'hosts.d', fname))
+    slab_logger.log(15, '%i addresses of %s used by ccs-data hosts' % (pool.used, network))
+    return pool
+
+
+def _lookup(resolver, ip):
+    """
+    Returns the DNS name of ip, '' if it has none, None if DNS could not tell.
+    """
+    try:
+        return resolver(ip)[0]
+    # socket.herror means there was no DNS reservation found
+    except socket.herror:
+        return ''
+    except (socket.error, UnicodeError) as error:
+        slab_logger.debug('Reverse lookup of %s failed: %s' % (ip, error))
+        return None
+
+
+class ReverseDns(object):
+    """
+    Reverse DNS lookups run at once, with the answers cached in .stack/cache.
+
+    Attributes:
+        fname (str): The cache file
+        entries (dict): ip -> [name, time of the lookup], '' for no name
+        lookups (int): Lookups sent to DNS
+        resolver (function): socket.gethostbyaddr, or a stand-in
+
+    Example Usage:
+        >>> dns = ReverseDns(ctx.path)
+        >>> dns.names(['10.11.12.5', '10.11.12.6'])
+        {'10.11.12.5': 'build-001.example.com', '10.11.12.6': ''}
+        >>> dns.save()
+    """
+
+    def __init__(self, path, workers=DNS_WORKERS, timeout=DNS_TIMEOUT,
+                 resolver=socket.gethostbyaddr):
+        self.fname = os.path.join(cache_utils.get_cache_dir(path), DNS_FILE)
+        self.workers = workers
+        self.timeout = timeout
+        self.resolver = resolver
+        self.lookups = 0
+        self.dirty = False
+        _, self.entries = cache_utils.read_stamped(self.fname)
+        if not isinstance(self.entries, dict):
+            self.entries = {}
+
+    def cached(self, ip):
+        """
+        Returns the cached name of ip, '' if it has none, None if not cached or expired.
+        """
+        entry = self.entries.get(ip)
+        if not entry:
+            return None
+        name, stamp = entry
+        ttl = DNS_TTL_FOUND if name else DNS_TTL_MISSING
+        if time.time() - stamp > ttl:
+            return None
+        return name
+
+    def names(self, ips):
+        """
+        Looks up the addresses not in the cache, all at once.
+
+        Args:
+            ips (list): Addresses as str
+
+        Returns:
+            dict ip -> name, '' for no name, None if DNS did not answer in time
+        """
+        found = {}
+        missing = []
+        for ip in ips:
+            found[ip] = self.cached(ip)
+            if found[ip] is None:
+                missing.append(ip)
+        if not missing:
+            return found
+        slab_logger.log(15, 'Reverse lookup of %i addresses' % len(missing))
+        pool = ThreadPool(min(self.workers, len(missing)))
+        try:
+            pending = [(ip, pool.apply_async(_lookup, (self.resolver, ip)))
+                       for ip in missing]
+            deadline = time.time() + self.timeout
+            for ip, result in pending:
+                try:
+                    found[ip] = result.get(max(deadline - time.time(), 0))
+                except TimeoutError:
+                    slab_logger.debug('Reverse lookup of %s timed out' % ip)
+                if found[ip] is not None:
+                    self.entries[ip] = [found[ip], time.time()]
+                    self.dirty = True
+        finally:
+            # Note: lookups stuck in the resolver cannot be stopped, the threads are
+            #       daemons and left to finish on their own.
+            pool.close()
+        self.lookups += len(missing)
+        return found
+
+    def save(self):
+        if not self.dirty:
+            return
+        now = time.time()
+        self.entries = dict((ip, entry) for ip, entry in self.entries.items()
+                            if now - entry[1] <= DNS_TTL_FOUND)
+        try:
+            cache_utils.write_stamped(self.fname, self.entries)
+        except (IOError, OSError) as error:
+            slab_logger.debug('Could not write %s: %s' % (self.fname, error))
+        self.dirty = False
+
+
+def allocate(pool, count=1, dns=None):
+    """
+    Reserves the first count free addresses of the pool that have no DNS name.
+    Candidates are checked a batch at a time; addresses with a name are marked
+    used, addresses DNS did not answer for in time are passed over.
+
+    Args:
+        pool (IpPool): The vlan, with the used addresses marked
+        count (int): Number of addresses wanted
+        dns (ReverseDns): The lookups to use, None to skip the DNS check
+
+    Returns:
+        returncode (int): 0 if count addresses were found, 1 if not
+        ips (list): The addresses found, as str, in order.  They are marked used.
+
+    Example Usage:
+        >>> allocate(site_pool(env_path, vlan, ctx.path), 3, ReverseDns(ctx.path))
+        (0, ['10.11.12.25', '10.11.12.26', '10.11.12.28'])
+    """
+    ips = []
+    unanswered = 0
+    batch = DNS_WORKERS if dns is None else max(dns.workers, 1)
+    start = None
+    while len(ips) < count:
+        candidates = [str(ip) for ip in pool.free(max(batch, count - len(ips)), start)]
+        if not candidates:
+            break
+        start = _address(candidates[-1]) + 1
+        names = dns.names(candidates) if dns is not None else {}
+        for ip in candidates:
+            name = names.get(ip, '')
+            if name is None:
+                unanswered += 1
+            elif name:
+                slab_logger.debug('%s is taken by %s' % (ip, name))
+                pool.mark(ip)
+            else:
+                slab_logger.debug('Using IP %s' % ip)
+                pool.mark(ip)
+                ips.append(ip)
+                if len(ips) == count:
+                    break
+    if dns is not None:
+        dns.save()
+    if unanswered:
+        slab_logger.warning('DNS did not answer for %i addresses, they were not used'
+                            % unanswered)
+    if len(ips) < count:
+        return 1, ips
+    return 0, ips
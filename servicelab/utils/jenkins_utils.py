@@ -1,14 +1,25 @@
 """
 Set of utility functions for Jenkins server
+
+Jenkins is queried through its json api with tree projections, so every call
+fetches just the fields it needs in a single request.  The job list, with the
+last build of every job, is cached in .stack/cache for JOBS_TTL seconds and
+serves stack list builds, stack find build and stack build status.  Console
+logs are streamed from their byte offsets through logText/progressiveText and
+never held in memory as a whole.
 """
+import os
+import re
 import sys
 import time
+import urllib
+
 import requests
 
-from bs4 import BeautifulSoup
-from jenkinsapi.jenkins import Jenkins
 from requests.auth import HTTPBasicAuth
 
+import http_utils
+import cache_utils
 import logger_utils
 from servicelab import settings
 
@@ -18,100 +29,351 @@ slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.jenkins
 START_LOG = "-------- Printing job log for build %s--------\n"
 END_LOG = "-------- End of job log for build --------"
 
+# Note: Seconds the cached job list is used for listing and finding jobs, and
+#       for the status of a build.  A build status older than STATUS_TTL is
+#       fetched again.
+JOBS_TTL = 300
+STATUS_TTL = 15
 
-def get_server_instance(jenkins_server, jenkinsuser, jenkinspass):
-    """
-    For the given Jenkins servre, User Name and Password get the
-    Jenkins instance.
-    """
-    requests.packages.urllib3.disable_warnings()
-    server = ''
-    try:
-        server = Jenkins(jenkins_server, username=jenkinsuser,
-                         password=jenkinspass)
-    except Exception as ex:
-        slab_logger.log(25, "Unable to connect to Jenkins server : %s " %
-                        str(ex))
-        return(1, server)
+# Note: Pieces a console log is read and written in, and the first window read
+#       back from its end to find the last lines.
+LOG_CHUNK = 64 * 1024
 
-    return(0,  server)
+# Note: Seconds between requests for more of the log of a running build.
+FOLLOW_INTERVAL = 2.0
 
+BUILD_TREE = 'number,result,building,fullDisplayName'
+JOBS_TREE = 'jobs[name,color,lastBuild[%s]]' % BUILD_TREE
 
-def get_build_status(job_name, user, password, ip_address):
-    """
-    get the build status
+
+def build_status(build):
+    """Returns the status of a build the way stack build status prints it.
+
+    Example Usage:
+        >>> print build_status({'fullDisplayName': 'check-servicelab #12',
+        ...                     'result': 'SUCCESS'})
+        check-servicelab #12,SUCCESS
     """
-    returncode, server = get_server_instance(ip_address, user, password)
-    if not returncode == 0:
-        # this should be an exception
-        print "unable to get server instance"
-        return(returncode, server)
+    status = build['fullDisplayName']
+    if build.get('result'):
+        status = status + "," + build['result']
+    return status
+
 
-    status = server[job_name].get_last_build().name
-    if server[job_name].get_last_build().get_status():
-        status = status + "," + server[job_name].get_last_build().get_status()
-    return(returncode, status)
+class JenkinsClient(object):
+    """
+    A thin client of the Jenkins json api.
 
+    Attributes:
+        base_url (str): The jenkins server, e.g. https://ccs-jenkins.cisco.com
+        client (http_utils.HTTPClient): The pooled client of the server
+        ttl (float): Seconds the job list is cached for
+        cache_file (str): Where the job list is cached, None to only keep it
+                          in memory
+        requests (int): Requests sent
 
-def get_build_log(job_name, user, password, ip_address):
+    Example Usage:
+        >>> client = JenkinsClient(ip_address, username, password, ctx.path)
+        >>> print [job['name'] for job in client.jobs()]
+        [u'check-servicelab', u'gate-servicelab']
+        >>> print build_status(client.last_build('check-servicelab'))
+        check-servicelab #12,SUCCESS
     """
-    Creates a build log string
+
+    def __init__(self, base_url, user=None, password=None, path=None, ttl=JOBS_TTL):
+        self.base_url = base_url.rstrip('/')
+        auth = HTTPBasicAuth(user, password) if user else None
+        self.client = http_utils.get_client('jenkins', http_utils.origin(base_url), auth)
+        self.ttl = ttl
+        self.cache_file = None
+        if path:
+            name = re.sub(r'[^\w.-]+', '_', self.base_url.split('://')[-1])
+            self.cache_file = os.path.join(cache_utils.get_cache_dir(path),
+                                           'jenkins_jobs_%s.json' % name)
+        self.requests = 0
+        self._jobs = None
+
+    def job_path(self, job_name):
+        return '/job/%s' % urllib.quote(job_name, safe='')
+
+    def request(self, method, path, **kwargs):
+        """Send a request to a path of the jenkins server.
+
+        Returns:
+            requests.Response object, after raising HTTPError for an error status
+        """
+        self.requests += 1
+        res = self.client.request(method, self.base_url + path, **kwargs)
+        res.raise_for_status()
+        return res
+
+    def api(self, path, tree):
+        """Returns the fields in tree of the json api of path.
+
+        Args:
+            path (str): e.g. /job/check-servicelab, empty for the server itself
+            tree (str): The fields, e.g. jobs[name,color]
+        """
+        return self.request('GET', path + '/api/json', params={'tree': tree}).json()
+
+    def jobs(self, max_age=None):
+        """Returns the jobs with their last build, from the cache if it is younger
+           than max_age.
+
+        Args:
+            max_age (float): Oldest cached job list to accept, ttl if None
+
+        Returns:
+            jobs (list): dicts of name, color and lastBuild, None if the job has
+                         not been built
+        """
+        jobs = self.cached_jobs(self.ttl if max_age is None else max_age)
+        if jobs is not None:
+            return jobs
+        jobs = self.api('', JOBS_TREE).get('jobs', [])
+        self._jobs = (time.time(), jobs)
+        if self.cache_file:
+            try:
+                cache_utils.write_stamped(self.cache_file, jobs, self._jobs[0])
+            except (IOError, OSError) as error:
+                slab_logger.debug('Unable to cache the jenkins jobs: %s' % error)
+        return jobs
+
+    def cached_jobs(self, max_age):
+        """
+        Returns the cached job list if it is younger than max_age, else None.
+        """
+        if self._jobs is None and self.cache_file:
+            self._jobs = cache_utils.read_stamped(self.cache_file)
+        if self._jobs and 0 <= time.time() - self._jobs[0] < max_age:
+            return self._jobs[1]
+        return None
+
+    def job_names(self):
+        return [job['name'] for job in self.jobs()]
+
+    def invalidate(self):
+        """
+        Forget the cached job list, e.g. after starting a build.
+        """
+        self._jobs = None
+        if self.cache_file and os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+
+    def last_build(self, job_name, max_age=STATUS_TTL):
+        """Returns the last build of a job, from the cached job list if it is
+           younger than max_age.
+
+        Args:
+            job_name (str): Name of the job
+            max_age (float): Oldest cached job list to accept
+
+        Returns:
+            build (dict): number, result, building and fullDisplayName, None if
+                          the job has not been built or does not exist
+        """
+        for job in self.cached_jobs(max_age) or []:
+            if job['name'] == job_name:
+                return job.get('lastBuild')
+        try:
+            return self.api(self.job_path(job_name) + '/lastBuild', BUILD_TREE)
+        except requests.exceptions.HTTPError as error:
+            if error.response is not None and error.response.status_code == 404:
+                return None
+            raise
+
+    def is_running(self, job_name):
+        """
+        Returns True if a build of the job is queued or running.
+        """
+        job = self.api(self.job_path(job_name), 'inQueue,lastBuild[building]')
+        return bool(job.get('inQueue') or (job.get('lastBuild') or {}).get('building'))
+
+    def progressive_text(self, job_name, number, start=0, method='GET'):
+        """Returns the console log of a build from byte start, streamed.
+
+        Args:
+            job_name (str): Name of the job
+            number (int): The build
+            start (int): Offset in bytes to start from
+            method (str): HEAD to only get the headers
+
+        Returns:
+            requests.Response object, read with iter_content.  Its X-Text-Size
+            header is the offset to continue from, and X-More-Data is true while
+            the build is running.
+        """
+        path = '%s/%s/logText/progressiveText' % (self.job_path(job_name), number)
+        return self.request(method, path, params={'start': start}, stream=True)
+
+    def log_size(self, job_name, number):
+        """
+        Returns the size in bytes of the console log of a build.
+        """
+        res = self.progressive_text(job_name, number, 0, 'HEAD')
+        res.close()
+        return int(res.headers.get('X-Text-Size', 0))
+
+    def tail_offset(self, job_name, number, lines):
+        """Finds where the last lines of a console log start, reading windows
+           back from its end instead of the whole log.
+
+        Args:
+            job_name (str): Name of the job
+            number (int): The build
+            lines (int): Number of lines
+
+        Returns:
+            offset (int): The offset in bytes of the first of the last lines
+        """
+        size = self.log_size(job_name, number)
+        window = LOG_CHUNK
+        while True:
+            offset = max(0, size - window)
+            res = self.progressive_text(job_name, number, offset)
+            data = ''.join(res.iter_content(LOG_CHUNK))[:size - offset]
+            pos = len(data) - 1 if data.endswith('\n') else len(data)
+            for _ in range(lines):
+                pos = data.rfind('\n', 0, pos)
+                if pos < 0:
+                    break
+            if pos >= 0:
+                return offset + pos + 1
+            if offset == 0:
+                return 0
+            window *= 2
+
+    def stream_log(self, job_name, number, out, start=0, follow=False,
+                   interval=FOLLOW_INTERVAL):
+        """Write the console log of a build to out as it arrives.
+
+        Args:
+            job_name (str): Name of the job
+            number (int): The build
+            out (file): Where to write the log
+            start (int): Offset in bytes to start from
+            follow (bool): Keep writing what the build logs until it finishes
+            interval (float): Seconds between requests while following
+
+        Returns:
+            offset (int): The offset in bytes the log was written up to
+        """
+        while True:
+            res = self.progressive_text(job_name, number, start)
+            for chunk in res.iter_content(LOG_CHUNK):
+                out.write(chunk)
+            out.flush()
+            start = int(res.headers.get('X-Text-Size', start))
+            if not follow or res.headers.get('X-More-Data') != 'true':
+                return start
+            time.sleep(interval)
+
+
+def get_build_status(job_name, user, password, ip_address, path=None):
+    """Get the status of the last build of a job.
+
+    Args:
+        job_name (str): Name of the job
+        user (str): Jenkins username
+        password (str): Jenkins password
+        ip_address (str): The jenkins server url
+        path (str): The .stack directory to cache the job list in, ctx.path
+
+    Returns:
+        returncode (int):
+            0 -- Success
+            1 -- Failure
+        status (str): e.g. check-servicelab #12,SUCCESS, or why it failed
+
+    Example Usage:
+        >>> print get_build_status('check-servicelab', username, password,
+        ...                        'https://ccs-jenkins.cisco.com', ctx.path)
+        (0, 'check-servicelab #12,SUCCESS')
     """
-    server = get_server_instance(ip_address, user, password)
-    if not server:
-        # this should be an exception
-        print "unable to get server instance"
-        return False
+    client = JenkinsClient(ip_address, user, password, path)
+    try:
+        build = client.last_build(job_name)
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        slab_logger.error("Unable to connect to Jenkins server : %s " % str(ex))
+        return(1, str(ex))
+    if not build:
+        return(1, "%s has no builds" % job_name)
+    return(0, build_status(build))
+
 
-    log = server[job_name].get_last_build().name
-    if server[job_name].get_last_build().get_status():
-        log = log + "," + server[job_name].get_last_build().get_status()
+def get_build_log(job_name, user, password, ip_address, path=None, out=None,
+                  follow=False, tail=None):
+    """Write the log of the last build of a job to out as it is downloaded.
 
-    job_number = server[job_name].get_last_build().get_number()
-    log_url = "{0}/job/{1}/{2}/consoleText".format(ip_address, job_name,
-                                                   job_number)
+    Args:
+        job_name (str): Name of the job
+        user (str): Jenkins username
+        password (str): Jenkins password
+        ip_address (str): The jenkins server url
+        path (str): The .stack directory the job list is cached in, ctx.path
+        out (file): Where to write the log, sys.stdout if None
+        follow (bool): Keep writing what the build logs until it finishes
+        tail (int): Only write the last tail lines, without downloading the rest
 
-    # Find latest run info
-    res = requests.post(log_url, auth=HTTPBasicAuth(user, password))
-    soup = BeautifulSoup(res.content, "html.parser")
-    log = log + START_LOG.format(log_url)
-    log = log + str(soup) + "\n"
-    log = log + END_LOG + "\n"
+    Returns:
+        returncode (int):
+            0 -- Success
+            1 -- Failure
 
-    return log
+    Example Usage:
+        >>> get_build_log('check-servicelab', username, password,
+        ...               'https://ccs-jenkins.cisco.com', ctx.path, tail=20)
+        0
+    """
+    out = out or sys.stdout
+    client = JenkinsClient(ip_address, user, password, path)
+    try:
+        build = client.last_build(job_name, max_age=0 if follow else STATUS_TTL)
+        if not build:
+            slab_logger.error("%s has no builds" % job_name)
+            return 1
+        log_url = "{0}/job/{1}/{2}/consoleText".format(ip_address, job_name,
+                                                       build['number'])
+        out.write(build_status(build) + "\n")
+        out.write(START_LOG % log_url)
+        start = 0
+        if tail is not None:
+            start = client.tail_offset(job_name, build['number'], tail)
+        client.stream_log(job_name, build['number'], out, start, follow)
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        slab_logger.error("Unable to connect to Jenkins server : %s " % str(ex))
+        return 1
+    out.write("\n" + END_LOG + "\n")
+    return 0
 
 
 def run_build(job_name, user, password, ip_address, ctx):
     """
     run a build
     """
-    server = get_server_instance(ip_address, user, password)
-    if not server:
-        # this should be an exception
-        slab_logger.log(25, "unable to get server instance")
+    client = JenkinsClient(ip_address, user, password, ctx.path)
+    try:
+        build = client.last_build(job_name, max_age=0)
+        if build:
+            slab_logger.log(25, "Retriggering last build # : %s " % (build['number']))
+            res = client.client.post("%s%s/%s/gerrit-trigger-retrigger-this/"
+                                     % (client.base_url, client.job_path(job_name),
+                                        build['number']))
+            if process_response(res, ctx) is False:
+                return False
+        else:
+            slab_logger.log(25, "Starting Build : %s " % (job_name))
+            client.request('POST', client.job_path(job_name) + '/build')
+        client.invalidate()
+        time.sleep(2)
+        running = client.is_running(job_name)
+        slab_logger.log(25, '%s run status is : %s' % (job_name, running))
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        slab_logger.error("Could not connect to jenkins server. Please,"
+                          " check url {0}".format(ip_address))
+        slab_logger.error(str(ex))
         return False
-
-    if server[job_name].get_last_build():
-        build_number = server[job_name].get_last_build().get_number()
-        url = "%s/job/%s/%s/gerrit-trigger-retrigger-this/" % (ip_address,
-                                                               job_name,
-                                                               build_number)
-        try:
-            slab_logger.log(25, "Retriggering last build # : %s " % (build_number))
-            res = requests.post(url, auth=HTTPBasicAuth(user, password))
-            process_response(res, ctx)
-        except requests.exceptions.RequestException as ex:
-            slab_logger.error("Could not connect to jenkins server. Please,"
-                              " check url {0}".format(ip_address))
-            slab_logger.error(str(ex))
-            return False
-    else:
-        slab_logger.log(25, "Starting Build : %s " % (job_name))
-        server.build_job(job_name)
-
-    job_instance = server.get_job(job_name)
-    time.sleep(2)
-    slab_logger.log(25, '%s run status is : %s' % (job_name, job_instance.is_running()))
+    return True
 
 
 def validate_build_ip_cb(ctx, param, value):
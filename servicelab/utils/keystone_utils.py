@@ -0,0 +1,173 @@
+"""
+Keystone tokens scoped to a tenant, cached in .stack/cache/keystone_tokens.json
+
+One login gets a token scoped to the tenant, by id or by name, instead of an
+unscoped login to look the tenant up followed by a scoped one.  The token, its
+expiry and the neutron endpoint from the service catalog are cached and reused
+by every run until shortly before the token expires, so a warm stack up --remote
+does not talk to keystone at all.
+"""
+import os
+import time
+import calendar
+
+import cache_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.keystone')
+
+TOKEN_FILE = 'keystone_tokens.json'
+
+# Note: A token expiring within this many seconds is not reused, the run needs
+#       it for a while.
+EXPIRY_MARGIN = 300
+
+
+def get_auth_url(base_url, url_domain=".cisco.com"):
+    """Returns the keystone url, OS_AUTH_URL if it is set.
+
+    Example Usage:
+        >>> print get_auth_url('us-rdu-3')
+        https://us-rdu-3.cisco.com:5000/v2.0
+    """
+    auth_url = os.environ.get('OS_AUTH_URL')
+    if auth_url:
+        return auth_url.rstrip('/')
+    return 'https://' + base_url + url_domain + ':5000/v2.0'
+
+
+def authenticate(auth_url, username, password, tenant_id=None, tenant_name=None):
+    """Log in to keystone once, scoped to a tenant.
+
+    Args:
+        auth_url (str): The keystone v2.0 url
+        username (str): The Openstack user
+        password (str): Its password
+        tenant_id (str): The tenant, or
+        tenant_name (str): the name of the tenant if its id is not known
+
+    Returns:
+        token (dict): token, expires (epoch seconds), tenant_id, tenant_name,
+                      network_url (the neutron endpoint, None if the catalog
+                      has none), auth_url and username
+
+    Raises:
+        keystoneclient.exceptions.Unauthorized or AuthorizationFailure
+    """
+    from keystoneclient.exceptions import EndpointNotFound
+    from keystoneclient.v2_0 import client
+
+    slab_logger.debug('Logging in to keystone at %s' % auth_url)
+    keystone = client.Client(username=username, password=password, auth_url=auth_url,
+                             tenant_id=tenant_id or None,
+                             tenant_name=None if tenant_id else tenant_name)
+    ref = keystone.auth_ref
+    try:
+        network_url = ref.service_catalog.url_for(service_type='network',
+                                                  endpoint_type='publicURL')
+    except EndpointNotFound:
+        network_url = None
+    return {'token': ref.auth_token, 'expires': calendar.timegm(ref.expires.utctimetuple()),
+            'tenant_id': ref.tenant_id, 'tenant_name': ref.tenant_name,
+            'network_url': network_url, 'auth_url': auth_url, 'username': username}
+
+
+class TokenCache(object):
+    """
+    Scoped tokens of every keystone, user and tenant, in a file only its owner
+    can read.
+
+    Attributes:
+        fname (str): The cache file, .stack/cache/keystone_tokens.json
+        margin (float): Tokens expiring within this many seconds are not returned
+
+    Example Usage:
+        >>> cache = TokenCache(ctx.path)
+        >>> token = cache.get(auth_url, 'aaltman', tenant_name='ServiceLab')
+    """
+
+    def __init__(self, path, margin=EXPIRY_MARGIN):
+        self.fname = os.path.join(cache_utils.get_cache_dir(path), TOKEN_FILE)
+        self.margin = margin
+
+    def _read(self):
+        _, tokens = cache_utils.read_stamped(self.fname)
+        return tokens if isinstance(tokens, list) else []
+
+    def _write(self, tokens):
+        if not os.path.exists(self.fname):
+            os.close(os.open(self.fname, os.O_CREAT | os.O_WRONLY, 0o600))
+        cache_utils.write_stamped(self.fname, tokens)
+
+    def get(self, auth_url, username, tenant_id=None, tenant_name=None):
+        """
+        Returns a cached token of the user for the tenant that is not about to
+        expire, None if there is none.
+        """
+        limit = time.time() + self.margin
+        for token in self._read():
+            if token['auth_url'] != auth_url or token['username'] != username:
+                continue
+            if tenant_id and token['tenant_id'] != tenant_id:
+                continue
+            if not tenant_id and token['tenant_name'] != tenant_name:
+                continue
+            if token['expires'] > limit:
+                return token
+        return None
+
+    def put(self, token):
+        """
+        Cache a token from authenticate, dropping the expired ones and the one
+        it replaces.
+        """
+        now = time.time()
+        ident = (token['auth_url'], token['username'], token['tenant_id'])
+        tokens = [cached for cached in self._read() if cached['expires'] > now and
+                  (cached['auth_url'], cached['username'], cached['tenant_id']) != ident]
+        self._write(tokens + [token])
+
+    def invalidate(self, token_id):
+        """
+        Forget a token keystone or neutron refused.
+        """
+        tokens = self._read()
+        kept = [cached for cached in tokens if cached['token'] != token_id]
+        if len(kept) != len(tokens):
+            self._write(kept)
+
+
+def get_token(path, auth_url, username, password, tenant_id=None, tenant_name=None):
+    """Returns a token scoped to a tenant, from the cache if a valid one is there
+       and from a single keystone login otherwise.
+
+    Args:
+        path (str): The path to your working .stack directory
+        auth_url (str): The keystone v2.0 url, see get_auth_url
+        username (str): The Openstack user
+        password (str): Its password
+        tenant_id (str): The tenant, or
+        tenant_name (str): the name of the tenant if its id is not known
+
+    Returns:
+        token (dict): See authenticate
+
+    Raises:
+        keystoneclient.exceptions.Unauthorized or AuthorizationFailure
+
+    Example Usage:
+        >>> token = get_token(ctx.path, get_auth_url('us-rdu-3'), 'aaltman', password,
+        ...                   tenant_name='ServiceLab')
+        >>> print token['tenant_id'], token['token']
+        2e3e3bb7ce9f4ab6912da0e500a822ac 4946e8af849f46879ea08796274d1d46
+    """
+    cache = TokenCache(path)
+    token = cache.get(auth_url, username, tenant_id, tenant_name)
+    if token:
+        slab_logger.debug('Reusing the keystone token of %s valid until %s'
+                          % (token['tenant_name'], time.ctime(token['expires'])))
+        return token
+    token = authenticate(auth_url, username, password, tenant_id, tenant_name)
+    cache.put(token)
+    return token
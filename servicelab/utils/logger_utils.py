@@ -2,6 +2,12 @@ import os
 import sys
 import logging
 
+from servicelab import settings
+
+# Note: Console handlers of every logger set up so far, set_verbosity changes the
+#       level of loggers created before the verbosity option was parsed.
+_console_handlers = []
+
 
 class SLAB_Formatter(logging.Formatter):
     """
@@ -65,5 +71,25 @@ def setup_logger(verbosity, name='stack'):
         console_handler.setFormatter(SLAB_Formatter())
         console_handler.setLevel(verbosity)
         logger.addHandler(console_handler)
+        _console_handlers.append(console_handler)
 
     return logger
+
+
+def set_verbosity(verbosity):
+    """
+    Set the screen verbosity for the rest of the run.
+
+    Loggers already set up have their console level changed, loggers set up later
+    read it from settings.verbosity.  Nothing is written to disk, so concurrent
+    stack runs can use different verbosity levels.
+
+    Args:
+        verbosity (int): Level of screen verbosity, see setup_logger
+
+    Example Usage:
+        logger_utils.set_verbosity(15)
+    """
+    settings.verbosity = verbosity
+    for handler in _console_handlers:
+        handler.setLevel(verbosity)
@@ -5,8 +5,8 @@ Build a yaml file in servicelab/services/.stack/cache to improve the speed of th
 'stack list flavors' command
 """
 import os
-import yaml
 
+import yaml_io
 import ccsdata_utils
 from servicelab.stack import Context
 
@@ -21,4 +21,4 @@ for site in os.listdir(sites_path):
 
 my_file = os.path.join(ctx.path, 'cache', 'all_sites_flavors.yaml')
 with open(my_file, 'w') as output_file:
-    output_file.write(yaml.dump(yaml_data, default_flow_style=False))
+    output_file.write(yaml_io.dump(yaml_data))
@@ -0,0 +1,260 @@
+"""
+Shared bare git mirrors of the service repos, kept in .stack/cache/git-mirrors
+
+A service is cloned from its local mirror with git clone --shared, so the
+clone borrows every object from the mirror through .git/objects/info/alternates
+and only origin points back to gerrit.  Switching back to a service that was
+worked on before then costs one fetch of the mirror instead of a full clone.
+gc bounds the disk the mirrors take, never removing one a clone still borrows
+objects from.
+"""
+import os
+import time
+import shutil
+import threading
+import subprocess32 as subprocess
+
+import cache_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.mirror')
+
+MIRROR_DIR = 'git-mirrors'
+
+# Note: Touched every time a mirror is used, gc removes the least recently
+#       used mirrors first.
+STAMP_FILE = 'slab-last-used'
+
+# Note: Mirrors unused for this many days are removed by gc, and the least
+#       recently used ones are removed while all of them take more than
+#       MAX_SIZE_MB.
+MAX_AGE_DAYS = 30
+MAX_SIZE_MB = 4096
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock(mirror):
+    with _locks_lock:
+        return _locks.setdefault(mirror, threading.Lock())
+
+
+def _git(args, cwd=None):
+    """
+    Run git with args, returning its return code and combined output.
+    """
+    slab_logger.debug('Running git %s' % ' '.join(args))
+    try:
+        proc = subprocess.Popen(['git'] + args, cwd=cwd, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                close_fds=True)
+    except OSError as error:
+        return 1, str(error)
+    output = proc.communicate()[0]
+    return proc.returncode, output
+
+
+def mirrors_dir(path):
+    """Returns the directory holding the mirrors, creating it if needed.
+
+    Args:
+        path (str): The path to your working .stack directory.
+
+    Returns:
+        The full path of .stack/cache/git-mirrors (str)
+    """
+    mirror_root = os.path.join(cache_utils.get_cache_dir(path), MIRROR_DIR)
+    if not os.path.isdir(mirror_root):
+        os.makedirs(mirror_root)
+    return mirror_root
+
+
+def mirror_path(path, service_name):
+    """Returns where the mirror of service_name lives, whether it exists or not.
+
+    Args:
+        path (str): The path to your working .stack directory.
+        service_name (str): name of service
+
+    Returns:
+        The full path of the bare mirror (str)
+
+    Example Usage:
+        >>> print mirror_path("/Users/aaltman/Git/servicelab/servicelab/.stack",
+        ...                   "ccs-data")
+        /Users/aaltman/Git/servicelab/servicelab/.stack/cache/git-mirrors/ccs-data.git
+    """
+    return os.path.join(mirrors_dir(path), '%s.git' % service_name)
+
+
+def _touch(mirror):
+    with open(os.path.join(mirror, STAMP_FILE), 'w'):
+        pass
+
+
+def last_used(mirror):
+    """
+    Returns the time a mirror was last used, 0 if unknown.
+    """
+    for fname in (os.path.join(mirror, STAMP_FILE), mirror):
+        try:
+            return os.path.getmtime(fname)
+        except OSError:
+            continue
+    return 0
+
+
+def update_mirror(path, url, service_name):
+    """Create the mirror of a service or bring it up to date with one fetch.
+
+    Args:
+        path (str): The path to your working .stack directory.
+        url (str): Where the service is cloned from, e.g. its gerrit url
+        service_name (str): name of service
+
+    Returns:
+        returncode (int) -- 0 if successful, failure otherwise
+        mirror (str)     -- Path of the mirror, or the git output on failure
+
+    Example Usage:
+        >>> print update_mirror(ctx.path, "ssh://aaltman@cis-gerrit.cisco.com:29418/"
+        ...                     "ccs-data", "ccs-data")
+        (0, '/Users/aaltman/Git/servicelab/servicelab/.stack/cache/git-mirrors/ccs-data.git')
+    """
+    mirror = mirror_path(path, service_name)
+    with _lock(mirror):
+        if os.path.isdir(mirror):
+            slab_logger.log(15, 'Refreshing the %s mirror' % service_name)
+            returncode, output = _git(['fetch', '--prune', '--quiet', url,
+                                       '+refs/heads/*:refs/heads/*',
+                                       '+refs/tags/*:refs/tags/*'], cwd=mirror)
+        else:
+            slab_logger.log(15, 'Creating the %s mirror' % service_name)
+            tmp_mirror = mirror + '.tmp'
+            if os.path.isdir(tmp_mirror):
+                shutil.rmtree(tmp_mirror)
+            # Note: Cloned into a temporary name so an interrupted clone is never
+            #       mistaken for a mirror.  The mirror is a full clone on purpose,
+            #       a partial one would leave every new clone fetching the blobs
+            #       of its checkout from gerrit again.
+            returncode, output = _git(['clone', '--bare', '--quiet', url, tmp_mirror])
+            if returncode == 0:
+                # Note: Clones borrow objects that a forced update may leave
+                #       unreachable here, so they must never be pruned.
+                returncode, output = _git(['config', 'gc.pruneExpire', 'never'],
+                                          cwd=tmp_mirror)
+            if returncode == 0:
+                os.rename(tmp_mirror, mirror)
+            elif os.path.isdir(tmp_mirror):
+                shutil.rmtree(tmp_mirror)
+        if not returncode == 0:
+            return returncode, output
+        _touch(mirror)
+    return 0, mirror
+
+
+def clone_from_mirror(mirror, url, branch, dest):
+    """Clone branch from a mirror, borrowing its objects, with origin set to url.
+
+    Args:
+        mirror (str): Path of the mirror, see update_mirror
+        url (str): Where later fetches go, e.g. the gerrit url of the service
+        branch (str): The branch to check out
+        dest (str): Directory to clone into
+
+    Returns:
+        returncode (int) -- 0 if successful, failure otherwise
+        output (str)     -- git output
+    """
+    returncode, output = _git(['clone', '--shared', '--quiet', '-b', branch, mirror,
+                               dest])
+    if not returncode == 0:
+        return returncode, output
+    return _git(['remote', 'set-url', 'origin', url], cwd=dest)
+
+
+def _dir_size(dirpath):
+    size = 0
+    for root, _, filenames in os.walk(dirpath):
+        for fname in filenames:
+            try:
+                size += os.lstat(os.path.join(root, fname)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def list_mirrors(path):
+    """Describe the mirrors of a .stack directory.
+
+    Args:
+        path (str): The path to your working .stack directory.
+
+    Returns:
+        mirrors (list): A dict with the name, path, size in bytes, last_used
+                        time and in_use flag of every mirror, by name.  in_use
+                        is set if a clone in .stack/services borrows its objects.
+    """
+    mirror_root = mirrors_dir(path)
+    borrowed = set()
+    services_dir = os.path.join(path, 'services')
+    if os.path.isdir(services_dir):
+        for service in os.listdir(services_dir):
+            alternates = os.path.join(services_dir, service, '.git', 'objects', 'info',
+                                      'alternates')
+            if os.path.isfile(alternates):
+                with open(alternates) as stream:
+                    borrowed.update(os.path.realpath(os.path.dirname(line.strip()))
+                                    for line in stream if line.strip())
+    mirrors = []
+    for name in sorted(os.listdir(mirror_root)):
+        mirror = os.path.join(mirror_root, name)
+        if not name.endswith('.git') or not os.path.isdir(mirror):
+            continue
+        mirrors.append({'name': name[:-len('.git')],
+                        'path': mirror,
+                        'size': _dir_size(mirror),
+                        'last_used': last_used(mirror),
+                        'in_use': os.path.realpath(mirror) in borrowed})
+    return mirrors
+
+
+def gc(path, max_age_days=MAX_AGE_DAYS, max_size_mb=MAX_SIZE_MB):
+    """Bound the disk used by the mirrors.
+
+    Mirrors unused for max_age_days are removed, then the least recently used
+    ones until the rest fits in max_size_mb.  Mirrors a clone in .stack/services
+    borrows objects from are always kept.  The kept mirrors get a git gc --auto.
+
+    Args:
+        path (str): The path to your working .stack directory.
+        max_age_days (int): Remove mirrors unused for longer than this
+        max_size_mb (int): Size all mirrors together should stay under
+
+    Returns:
+        removed (list): Names of the removed mirrors
+
+    Example Usage:
+        >>> print gc(ctx.path, max_age_days=7)
+        ['service-old']
+    """
+    slab_logger.log(15, 'Collecting unused git mirrors')
+    mirrors = sorted(list_mirrors(path), key=lambda mirror: mirror['last_used'])
+    total = sum(mirror['size'] for mirror in mirrors)
+    oldest = time.time() - max_age_days * 86400
+    removed = []
+    for mirror in mirrors:
+        if mirror['in_use']:
+            continue
+        if mirror['last_used'] < oldest or total > max_size_mb * 1024 * 1024:
+            with _lock(mirror['path']):
+                shutil.rmtree(mirror['path'], ignore_errors=True)
+            total -= mirror['size']
+            removed.append(mirror['name'])
+            slab_logger.debug('Removed the %s mirror' % mirror['name'])
+    for mirror in mirrors:
+        if mirror['name'] not in removed:
+            _git(['gc', '--auto', '--quiet'], cwd=mirror['path'])
+    return removed
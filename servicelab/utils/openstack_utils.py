@@ -1,21 +1,286 @@
 import os
-import yaml
 import time
 import requests
+import collections
 
+import cache_utils
 import logger_utils
 import helper_utils
 import vagrant_utils
+import keystone_utils
+import teardown_utils
+import pipewatch_utils
 
 from subprocess import CalledProcessError
-from keystoneclient.exceptions import AuthorizationFailure, Unauthorized
-from neutronclient.neutron import client as neutron_client
-from keystoneclient.v2_0 import client
-from neutronclient.common.exceptions import NotFound
 from servicelab import settings
 
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.openstack')
 
+# Note: Seconds to wait for neutron to attach a new subnet to its network, the
+#       shortest and longest interval between two looks and the growth of the
+#       interval.  A look is a single show_network, so the interval stays short.
+READY_TIMEOUT = 60
+READY_MIN_INTERVAL = 0.25
+READY_MAX_INTERVAL = 1.0
+READY_BACKOFF = 1.5
+
+# Note: Words of a SLAB resource name that tell resources apart, see find.
+NAME_PARTS = ['SLAB', 'mgmt', 'network', 'subnet', 'router', 'security_group']
+
+RESOURCE_FILE = 'openstack_ids.json'
+
+# Note: The show_* call and the key of its answer for every cached resource type.
+SHOW = {'networks': 'network', 'external_networks': 'network', 'subnets': 'subnet',
+        'routers': 'router', 'ports': 'port', 'security_groups': 'security_group',
+        'floatingips': 'floatingip'}
+
+
+class ResourceCache(object):
+    """
+    The neutron resources SLab_OS found or created, by tenant, type and the name
+    they were looked up by, kept across runs.
+
+    Every change is written to the file at once, through a temporary file and a
+    rename.  What the cache holds may be gone from neutron by the time it is read,
+    NeutronSnapshot.cached checks every resource with a show_* call before using it.
+
+    Attributes:
+        fname (str): The cache file, .stack/cache/openstack_ids.json
+
+    Example Usage:
+        >>> cache = ResourceCache(ctx.path)
+        >>> cache.put(a.tenant_id, 'networks', 'SLAB_aaltman_network', network)
+        >>> cache.get(a.tenant_id, 'networks', 'SLAB_aaltman_network')['id']
+        u'c42bf975-8ef3-43d3-94a4-fde3251b7cf3'
+    """
+
+    def __init__(self, path):
+        self.fname = os.path.join(cache_utils.get_cache_dir(path), RESOURCE_FILE)
+
+    def _read(self):
+        _, tenants = cache_utils.read_stamped(self.fname)
+        return tenants if isinstance(tenants, dict) else {}
+
+    def _write(self, tenants):
+        try:
+            cache_utils.write_stamped(self.fname, tenants)
+        except (IOError, OSError) as error:
+            slab_logger.debug('Unable to write the Openstack resource cache: %s' % error)
+            return 1
+        return 0
+
+    def get(self, tenant_id, resource, name):
+        """
+        Returns the resource cached by name, None if there is none.
+        """
+        return self._read().get(tenant_id, {}).get(resource, {}).get(name)
+
+    def put(self, tenant_id, resource, name, item):
+        """
+        Cache a resource by name, returns 1 if the cache could not be written.
+        """
+        tenants = self._read()
+        cached = tenants.setdefault(tenant_id, {}).setdefault(resource, {})
+        if cached.get(name, {}).get('id') == item['id']:
+            return 0
+        cached[name] = dict(item)
+        return self._write(tenants)
+
+    def discard(self, tenant_id, resource, item_id):
+        """
+        Forget a resource by id, under whatever names it was cached.
+        """
+        tenants = self._read()
+        cached = tenants.get(tenant_id, {}).get(resource, {})
+        names = [name for name, item in cached.items() if item['id'] == item_id]
+        if not names:
+            return 0
+        for name in names:
+            del cached[name]
+        return self._write(tenants)
+
+
+class NeutronSnapshot(object):
+    """
+    The neutron resources of a tenant, listed once per run.
+
+    Every resource type is listed on first use, filtered to the tenant by
+    neutron, and kept in memory.  Resources SLab_OS creates or deletes are put
+    into or removed from the snapshot, and the types a change has side effects
+    on are invalidated, so only they are listed again on their next use.
+
+    With a ResourceCache, a resource looked up by name before a type is listed is
+    taken from the cache and checked with a single show_* call, so a run that
+    finds everything in place lists nothing.
+
+    Attributes:
+        neutron (neutronclient.v2_0.client.Client): The connected client
+        tenant_id (str): The tenant
+        cache (ResourceCache): The resources of earlier runs, None to list always
+        listings (int): List requests sent
+        shows (int): Show requests sent
+
+    Example Usage:
+        >>> snapshot = NeutronSnapshot(a.neutron, a.tenant_id)
+        >>> snapshot.find('networks', 'SLAB_aaltman_network')
+        {u'status': u'ACTIVE', u'name': u'SLAB_aaltman_network', ...}
+    """
+    RESOURCES = ('networks', 'subnets', 'routers', 'ports', 'security_groups')
+
+    def __init__(self, neutron, tenant_id, cache=None):
+        self.neutron = neutron
+        self.tenant_id = tenant_id
+        self.cache = cache
+        self.listings = 0
+        self.shows = 0
+        self._items = {}
+        self._shown = {}
+        self._external = None
+
+    def _list(self, resource, **filters):
+        self.listings += 1
+        return getattr(self.neutron, 'list_' + resource)(**filters)[resource]
+
+    def items(self, resource):
+        """
+        Returns the resources of a type in the tenant, listing them if needed.
+        """
+        if resource not in self._items:
+            slab_logger.debug('Listing neutron %s of the tenant' % resource)
+            items = self._list(resource, tenant_id=self.tenant_id)
+            self._items[resource] = collections.OrderedDict((item['id'], item)
+                                                            for item in items)
+        return self._items[resource].values()
+
+    def get(self, resource, item_id):
+        """
+        Returns a resource by id, None if the tenant has none.
+        """
+        if resource not in self._items and self._shown.get(resource, {}).get(item_id):
+            return self._shown[resource][item_id]
+        self.items(resource)
+        return self._items[resource].get(item_id)
+
+    def cached(self, resource, name, valid):
+        """Returns the resource cached by name if neutron still has it and it is
+           still valid, None otherwise.
+
+        Every resource is shown once per snapshot.  One that is gone or no longer
+        valid is dropped from the cache.
+
+        Args:
+            resource (str): The type, a key of SHOW
+            name (str): The name it was cached by
+            valid (function): Tells if the resource neutron shows is still the one
+                              looked for
+
+        Returns:
+            The resource (dict), None if there is none
+        """
+        from neutronclient.common.exceptions import NotFound
+
+        entry = self.cache and self.cache.get(self.tenant_id, resource, name)
+        if not entry:
+            return None
+        shown = self._shown.setdefault(resource, {})
+        if entry['id'] not in shown:
+            self.shows += 1
+            try:
+                shown[entry['id']] = getattr(self.neutron, 'show_' + SHOW[resource])(
+                    entry['id'])[SHOW[resource]]
+            except NotFound:
+                shown[entry['id']] = None
+        item = shown[entry['id']]
+        if item is None or not valid(item):
+            slab_logger.debug('Cached %s %s is gone' % (resource, name))
+            shown.pop(entry['id'], None)
+            self.cache.discard(self.tenant_id, resource, entry['id'])
+            return None
+        return item
+
+    def _matches(self, item, name):
+        parts = [part for part in name.split('_') if part in NAME_PARTS]
+        if item['tenant_id'] != self.tenant_id:
+            return False
+        if not all(part in item['name'] for part in parts):
+            return False
+        return 'mgmt' in parts or 'mgmt' not in item['name']
+
+    def find(self, resource, name):
+        """Returns the first resource matching a SLAB name, e.g. the network named
+           SLAB_aaltman_mgmt_ServiceLab_network matches SLAB_aaltman_mgmt_network.
+
+        Only the words of NAME_PARTS are compared, and a name without mgmt does
+        not match a mgmt resource.  Until the type is listed, the resource cached
+        by name is tried first.
+
+        Returns:
+            The resource (dict), None if there is none
+        """
+        if resource not in self._items:
+            item = self.cached(resource, name, lambda item: self._matches(item, name))
+            if item:
+                return item
+        for item in self.items(resource):
+            if self._matches(item, name):
+                if self.cache:
+                    self.cache.put(self.tenant_id, resource, name, item)
+                return item
+        return None
+
+    def external_networks(self):
+        """
+        Returns the external networks, which belong to other tenants, listed once.
+        """
+        if self._external is None:
+            self._external = self._list('networks', **{'router:external': True})
+        return self._external
+
+    def find_external(self, name):
+        """
+        Returns the first external network whose name contains name, None if there
+        is none.  Until they are listed, the one cached by name is tried first.
+        """
+        def valid(item):
+            return item.get('router:external') and name in item['name']
+        if self._external is None:
+            item = self.cached('external_networks', name, valid)
+            if item:
+                return item
+        for item in self.external_networks():
+            if valid(item):
+                if self.cache:
+                    self.cache.put(self.tenant_id, 'external_networks', name, item)
+                return item
+        return None
+
+    def put(self, resource, item):
+        """
+        Add a resource just created or replace one that changed.
+        """
+        if resource in self._items:
+            self._items[resource][item['id']] = item
+        self._shown.setdefault(resource, {})[item['id']] = item
+
+    def remove(self, resource, item_id):
+        """
+        Drop a resource just deleted.
+        """
+        if resource in self._items:
+            self._items[resource].pop(item_id, None)
+        self._shown.get(resource, {}).pop(item_id, None)
+        if self.cache:
+            self.cache.discard(self.tenant_id, resource, item_id)
+
+    def invalidate(self, *resources):
+        """
+        Forget resource types a change had side effects on, they are listed again
+        on their next use.
+        """
+        for resource in resources:
+            self._items.pop(resource, None)
+            self._shown.pop(resource, None)
+
 
 class SLab_OS(object):
 
@@ -64,16 +329,16 @@ class SLab_OS(object):
         self.auth_url = ""
         self.tenant_id = ""
         self.token = ""
+        self.network_url = None
 
     def login_or_gettoken(self, tenant_id=''):
         """Login to an Openstack endpoint (probably a tenant cloud) or get a keystone token.
 
-        The reason for the dual logic here is because if you login to keystone without
-        providing a tenant id you will get a token, but it's a limited token in that it
-        doesn't belong to any tenant. If you use that token to attempt something you will
-        get a lack of privledges error; however, if you login twice once without a
-        tenant_id and the second time with a tenant_id b/c you're limited login allows you
-        to geta tenant id you will avoid the error and can begin modifying your environment.
+        A token without a tenant lacks the privileges to modify anything, so the token
+        is always scoped to the tenant: to tenant_id if it is known and to the tenant
+        named os_tenant_name otherwise, in a single login.  Tokens are cached in
+        .stack/cache until shortly before they expire, see keystone_utils, and a
+        cached one is used without logging in.
 
         Args:
             self.tenant_id (str): An openstack unique identifier for a project/tenant. It
@@ -106,51 +371,47 @@ class SLab_OS(object):
             >>> print a.login_or_gettoken(tenant_id="2e3e3bb7ce9f4ab6912da0e500a822ac")
            0, 2e3e3bb7ce9f4ab6912da0e500a822ac, 3e03f91d8ee549e6bf9337169141103e
 
-        Example OS return of a list of tenant objects:
-            [<Tenant {u'enabled': True, u'description': u'', u'name': u'ServiceLab',
-                      u'id': u'2e3e3bb7ce9f4ab6912da0e500a822ac'}>]
         """
+        from keystoneclient.exceptions import AuthorizationFailure, Unauthorized
+
         slab_logger.log(15, 'Extracting keystone token from Openstack endpoint')
-        self.auth_url = 'https://' + self.base_url + self.url_domain + ':5000/v2.0'
+        self.auth_url = keystone_utils.get_auth_url(self.base_url, self.url_domain)
+        tenant_id = tenant_id or self.tenant_id
+        if not tenant_id and not self.os_tenant_name:
+            slab_logger.error("Unable to determine tenant_id, neither OS_TENANT_ID nor "
+                              "OS_TENANT_NAME is set")
+            return 1, self.tenant_id, self.token
 
         try:
-            if not tenant_id:
-                keystone = client.Client(username=self.username, password=self.password,
-                                         auth_url=self.auth_url)
-                self.token = keystone.auth_token
-                all_tenants = keystone.tenants.list()
-                # TODO: Look for one in cache rather than just failing.
-
-                for tenant in all_tenants:
-                    if self.os_tenant_name == tenant.name:
-                        self.tenant_id = tenant.id
-                        break
-
-                if not self.tenant_id:
-                    slab_logger.error("Unable to determine tenant_id"
-                                      "for {}".format(self.os_tenant_name))
-                    return 1, self.tenant_id, self.token
-                return 0, self.tenant_id, self.token
-            else:
-                keystone = client.Client(username=self.username, password=self.password,
-                                         auth_url=self.auth_url, tenant_id=self.tenant_id)
-                self.token = keystone.auth_token
-                return 0, self.tenant_id, self.token
-
+            token = keystone_utils.get_token(self.path, self.auth_url, self.username,
+                                             self.password, tenant_id, self.os_tenant_name)
         except AuthorizationFailure as auth_failure:
             slab_logger.error(auth_failure.message)
             return 1, self.tenant_id, self.token
         except Unauthorized as unauthorized:
-            slab_logger.error(unauthorized.message)
+            slab_logger.error("Unable to login to {} as {}: {}".format(
+                tenant_id or self.os_tenant_name, self.username, unauthorized.message))
             return 1, self.tenant_id, self.token
 
+        self.tenant_id = token['tenant_id']
+        self.token = token['token']
+        self.network_url = token['network_url']
+        return 0, self.tenant_id, self.token
+
+    def forget_token(self):
+        """
+        Drop the token from the cache after Openstack refused it, e.g. because it
+        was revoked, so the next login_or_gettoken logs in again.
+        """
+        keystone_utils.TokenCache(self.path).invalidate(self.token)
+        self.token = ""
+
     def connect_to_neutron(self):
-        """Connect to neutron post the dual keystone login.
+        """Connect to neutron post the keystone login.
 
         Now that you're connected authenticated to keystone you have to sync up to the
-        neutron endpoint. It uses port 9696. It actually imports keystone again. They're
-        looking to resolve this duplication so we may not have to do this in the future.
-        We would still have to make a connection to port 9696 though for these REST calls.
+        neutron endpoint, the one of keystone's service catalog or port 9696 of the
+        base url.
 
         Args:
             None - the instance's variables should already be set for us to use this
@@ -166,11 +427,16 @@ class SLab_OS(object):
             >>> print a.connect_to_neutron()
             0
         """
+        from neutronclient.neutron import client as neutron_client
+
         slab_logger.log(15, 'Connecting to neutron endpoint')
-        self.endpoint_url = "https://" + self.base_url + self.url_domain + ":9696"
+        self.endpoint_url = (self.network_url or
+                             "https://" + self.base_url + self.url_domain + ":9696")
         self.neutron = neutron_client.Client('2.0', endpoint_url=self.endpoint_url,
                                              token=self.token)
         self.neutron.format = 'json'
+        self.cache = ResourceCache(self.path)
+        self.snapshot = NeutronSnapshot(self.neutron, self.tenant_id, self.cache)
         return 0
 
     def create_name_for(self, neutron_type, append=""):
@@ -253,21 +519,10 @@ class SLab_OS(object):
               u'tenant_id': u'2e3e3bb7ce9f4ab6912da0e500a822ac'}]}
         """
         slab_logger.log(15, 'Checking neutron for %s' % name)
-        networks = self.neutron.list_networks()
-        network = ""
-        parts = name.split('_')
-        # ['SLAB', 'Servicelab2', 'aaltman', 'mgmt', 'network']
-        parts = [i for i in parts if i in ['SLAB', 'mgmt', 'network', 'subnet', 'router']]
-        # ['SLAB', 'mgmt', 'network']
-        for network in networks['networks']:
-            if network['tenant_id'] != self.tenant_id:
-                continue
-            if all(i in network['name'] for i in parts):
-                if 'mgmt' not in parts and 'mgmt' in network['name']:
-                    continue
-                else:
-                    return 0, network
-        return 1, network
+        network = self.snapshot.find('networks', name)
+        if network is None:
+            return 1, ""
+        return 0, network
 
     def check_for_subnet(self, name):
         """Check to see if the named subnet exists.
@@ -309,21 +564,10 @@ class SLab_OS(object):
             name "SLAB_aaltman_network".
         """
         slab_logger.log(15, 'Checking neutron for %s' % name)
-        subnets = self.neutron.list_subnets()
-        subnet = ""
-        parts = name.split('_')
-        # ['SLAB', 'Servicelab2', 'aaltman', 'mgmt', 'subnet']
-        parts = [i for i in parts if i in ['SLAB', 'mgmt', 'network', 'subnet', 'router']]
-        # ['SLAB', 'mgmt', 'subnet']
-        for subnet in subnets['subnets']:
-            if subnet['tenant_id'] != self.tenant_id:
-                continue
-            if all(i in subnet['name'] for i in parts):
-                if 'mgmt' not in parts and 'mgmt' in subnet['name']:
-                    continue
-                else:
-                    return 0, subnet
-        return 1, subnet
+        subnet = self.snapshot.find('subnets', name)
+        if subnet is None:
+            return 1, ""
+        return 0, subnet
 
     def check_for_router(self, name):
         """Check to see if the named router exists.
@@ -354,21 +598,10 @@ class SLab_OS(object):
                 }
         """
         slab_logger.log(15, 'Checking neutron for %s' % name)
-        routers = self.neutron.list_routers()
-        router = ""
-        parts = name.split('_')
-        # ['SLAB', 'Servicelab2', 'aaltman', 'mgmt', 'router']
-        parts = [i for i in parts if i in ['SLAB', 'mgmt', 'network', 'subnet', 'router']]
-        # ['SLAB', 'mgmt', 'router']
-        for router in routers['routers']:
-            if router['tenant_id'] != self.tenant_id:
-                continue
-            if all(i in router['name'] for i in parts):
-                if 'mgmt' not in parts and 'mgmt' in router['name']:
-                    continue
-                else:
-                    return 0, router
-        return 1, router
+        router = self.snapshot.find('routers', name)
+        if router is None:
+            return 1, ""
+        return 0, router
 
     def check_for_ports(self, mgmt=False):
         """Check to see if ports exist on router from SLAB's networks' subnets.
@@ -424,17 +657,25 @@ class SLab_OS(object):
            u'tenant_id': u'4ab4b8260df84a869782e2a3a5bf6101'},]}
         """
         slab_logger.log(15, 'Checking neutron for router ports')
-        ports = self.neutron.list_ports()
-        for i in ports['ports']:
+        key = self.create_name_for('router_interface', append='mgmt' if mgmt else '')
+        port = self.snapshot.cached('ports', key, lambda port: port.get(
+            'device_owner') == 'network:router_interface' and port['fixed_ips'])
+        if port:
+            return 0
+        for i in self.snapshot.items('ports'):
             if i.get('device_owner') == 'network:router_interface':
-                mysub = i.get('fixed_ips')
-                mysub = self.neutron.show_subnet(mysub[0]['subnet_id'])
+                mysub = self.snapshot.get('subnets', i['fixed_ips'][0]['subnet_id'])
+                if mysub is None:
+                    # Note: Subnets of other tenants are not in the snapshot.
+                    continue
                 if mgmt:
-                    if all(i in mysub['subnet']['name'] for i in ['SLAB', 'mgmt']):
+                    if all(part in mysub['name'] for part in ['SLAB', 'mgmt']):
+                        self.write_to_cache('ports', key, i)
                         return 0
                 else:
-                    if 'SLAB' in mysub['subnet']['name']:
-                        if 'mgmt' not in mysub['subnet']['name']:
+                    if 'SLAB' in mysub['name']:
+                        if 'mgmt' not in mysub['name']:
+                            self.write_to_cache('ports', key, i)
                             return 0
         return 1
 
@@ -472,14 +713,10 @@ class SLab_OS(object):
         returncode, network = self.check_for_network(name)
         if returncode == 1:
             network = {'name': name, 'admin_state_up': True, 'tenant_id': self.tenant_id}
-            self.neutron.create_network({'network': network})
-            returncode2, network = self.check_for_network(name)
-            if returncode2 == 0:
-                self.write_to_cache(network)
-                return 0, network
-            else:
-                slab_logger.error("Tried to make the network, but failed.")
-                return 1, network
+            network = self.neutron.create_network({'network': network})['network']
+            self.snapshot.put('networks', network)
+            self.write_to_cache('networks', name, network)
+            return 0, network
         else:
             return 0, network
 
@@ -524,14 +761,12 @@ class SLab_OS(object):
                     router = {'name': name, 'admin_state_up': True, 'external_gateway_info':
                               {'network_id': external_net_id, 'external_snat': True}
                               }
-                    self.neutron.create_router({'router': router})
-                    returncode3, router = self.check_for_router(name)
-                    if returncode3 == 0:
-                        self.write_to_cache(router)
-                        return 0, router
-                    else:
-                        slab_logger.error("Tried to make the router, but failed.")
-                        return 1, router
+                    router = self.neutron.create_router({'router': router})['router']
+                    self.snapshot.put('routers', router)
+                    # Note: The gateway of the router is a port.
+                    self.snapshot.invalidate('ports')
+                    self.write_to_cache('routers', name, router)
+                    return 0, router
         else:
             return 0, router
 
@@ -558,24 +793,10 @@ class SLab_OS(object):
             created.
         """
         slab_logger.log(15, 'Checking for security group %s' % name)
-        security_groups = self.neutron.list_security_groups()
-        security_group = ""
-        parts = name.split('_')
-        # ['SLAB', 'Servicelab2', 'aaltman', 'mgmt', 'subnet']
-        parts = [i for i in parts if i in ['SLAB', 'mgmt', 'network',
-                                           'subnet', 'router',
-                                           'security_group']
-                 ]
-        # ['SLAB', 'mgmt', 'subnet']
-        for security_group in security_groups['security_groups']:
-            if security_group['tenant_id'] != self.tenant_id:
-                continue
-            if all(i in security_group['name'] for i in parts):
-                if 'mgmt' not in parts and 'mgmt' in security_group['name']:
-                    continue
-                else:
-                    return 0, security_group
-        return 1, security_group
+        security_group = self.snapshot.find('security_groups', name)
+        if security_group is None:
+            return 1, ""
+        return 0, security_group
 
     def create_security_group(self, name=""):
         """Create a security group in your OS tenant/project.
@@ -604,9 +825,8 @@ class SLab_OS(object):
             security_group = {'name': name,
                               'description': 'SLAB default security group'
                               }
-            self.neutron.create_security_group(
-                {'security_group': security_group})
-            returncode3, security_group = self.check_for_security_group(name)
+            security_group = self.neutron.create_security_group(
+                {'security_group': security_group})['security_group']
             self.neutron.create_security_group_rule({
                 'security_group_rule': {
                     'direction': 'ingress',
@@ -631,6 +851,8 @@ class SLab_OS(object):
                     'tenant_id': security_group['tenant_id'],
                     'security_group_id': security_group['id']
                 }})
+            # Note: The group's rules changed, it is listed again when needed.
+            self.snapshot.invalidate('security_groups')
             returncode3, security_group = self.check_for_security_group(name)
 
             if returncode3 == 0:
@@ -707,17 +929,54 @@ class SLab_OS(object):
             subnet = {'name': name, 'network_id': net_id, 'ip_version': 4,
                       'cidr': cidr, 'tenant_id': self.tenant_id, 'gateway_ip':
                       gateway_ip}
-            self.neutron.create_subnet({'subnet': subnet})
-            returncode3, subnet = self.check_for_subnet(name)
-            if returncode3 == 0:
-                self.write_to_cache(subnet)
-                return 0, subnet
-            else:
-                slab_logger.error("Failed to create the subnet.")
-                return 1, subnet
+            subnet = self.neutron.create_subnet({'subnet': subnet})['subnet']
+            self.snapshot.put('subnets', subnet)
+            # Note: The network lists its subnets and dhcp gets a port.
+            self.snapshot.invalidate('networks', 'ports')
+            self.write_to_cache('subnets', name, subnet)
+            return 0, subnet
         else:
             return 0, subnet
 
+    def wait_for_subnet(self, subnet, timeout=READY_TIMEOUT):
+        """Wait for neutron to attach a new subnet to its network and the network to
+           be ACTIVE, so routers can get an interface on it.
+
+        Neutron is looked at again after intervals growing from READY_MIN_INTERVAL
+        to READY_MAX_INTERVAL, until timeout.
+
+        Args:
+            subnet (dict): The subnet, as create_subnet returns it
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            Returncode (int):
+                0 - Success
+                1 - Failure, the subnet was not ready in time
+
+        Example Usage:
+            >>> returncode, subnet = a.create_subnet()
+            >>> print a.wait_for_subnet(subnet)
+            0
+        """
+        slab_logger.log(15, 'Waiting for subnet %s to be ready' % subnet['name'])
+        backoff = pipewatch_utils.Backoff(READY_MIN_INTERVAL, READY_MAX_INTERVAL,
+                                          READY_BACKOFF)
+        deadline = time.time() + timeout
+        network = self.snapshot.get('networks', subnet['network_id'])
+        while True:
+            if network and network.get('status') == 'ACTIVE' and \
+                    subnet['id'] in network['subnets']:
+                return 0
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                slab_logger.error("Subnet %s was not ready after %gs."
+                                  % (subnet['name'], timeout))
+                return 1
+            time.sleep(min(remaining, backoff.update(False)))
+            network = self.neutron.show_network(subnet['network_id'])['network']
+            self.snapshot.put('networks', network)
+
     def create_floatingip(self):
         """Create floating ip in your OS project/tenant.
 
@@ -739,9 +998,9 @@ class SLab_OS(object):
                                           b/c can't find public floating network.")
             return 1
         floatingip = {'floating_network_id': external_net_id, 'tenant_id': self.tenant.id}
-        floatingip = self.neutron.create_floatingip({'floatingip': floatingip})
+        floatingip = self.neutron.create_floatingip({'floatingip': floatingip})['floatingip']
         # TODO: check if success b4 returning 0
-        self.write_to_cache(floatingip)
+        self.write_to_cache('floatingips', floatingip['floating_ip_address'], floatingip)
         return 0
 
     def find_floatnet_id(self, return_name=""):
@@ -774,15 +1033,11 @@ class SLab_OS(object):
             0, 364c4cc8-dbc0-406b-b996-b20f1e164b74
         """
         _id = ""
-        float_name = ""
-        networks = self.neutron.list_networks()
-        for i in networks['networks']:
-            if "public-floating" in i['name']:
-                _id = i['id']
-                float_name = i['name']
-                if return_name:
-                    return 0, float_name
-                return 0, _id
+        network = self.snapshot.find_external("public-floating")
+        if network:
+            if return_name:
+                return 0, network['name']
+            return 0, network['id']
         slab_logger.error('Failed to find public-floating-\* in networks names')
         return 1, _id
 
@@ -813,6 +1068,9 @@ class SLab_OS(object):
             >>> print a.del_in_project(subnet, "bd738973-2d66-4e19-b67c-1ee261244a91")
             0
         """
+        if neutron_type in ("network", "router", "subnet"):
+            self.snapshot.remove(neutron_type + "s", id)
+            self.snapshot.invalidate("ports")
         if neutron_type == "network":
             self.neutron.delete_network(id)
             returncode = self.check_for_network(id)
@@ -873,18 +1131,23 @@ class SLab_OS(object):
             port = self.neutron.add_interface_router(router_id,
                                                      {'subnet_id': subnet_id}
                                                      )
-        # TODO: write to cache if port has id returned aka is a success else fail.
-            self.write_to_cache(port)
+            self.snapshot.invalidate('ports')
+            key = self.create_name_for('router_interface', append='mgmt' if mgmt else '')
+            self.write_to_cache('ports', key, {'id': port['port_id'], 'device_id': router_id,
+                                               'subnet_id': port['subnet_id']})
             return 0
         else:
             return 0
 
-    def write_to_cache(self, writeit):
-        """Write a dictionary item to cache.
+    def write_to_cache(self, neutron_type, name, writeit):
+        """Write a neutron item to the resource cache, see ResourceCache.
 
         Args:
-            writeit (dict): This should be a dictionary so that we can post
-                    the data as yaml. We can append it
+            neutron_type (str): The type of neutron object, including networks,
+                                subnets, routers, ports or floatingips.
+            name (str): The name the item is looked up by, typically from
+                        create_name_for()
+            writeit (dict): The item, as neutron answered with it. It needs an id.
 
         Returns:
             Returncode (int):
@@ -892,55 +1155,35 @@ class SLab_OS(object):
                 1 - Failure
 
         Example Usage:
-            >>> print a.write_to_cache({"this": "is", "a": "dictionary"})
+            >>> print a.write_to_cache("networks", "SLAB_aaltman_network", network)
             0
-
-        TODO: catch exceptions so I can return 1 on failure. Or check to see if
-              if an item is already in dict.
         """
-        # Note: write should be a dictionary so we can write as yaml
-        self.OS_ids_cachefile = os.path.join(self.path, "cache", "OS_ids.yaml")
-        if os.path.exists(self.OS_ids_cachefile):
-            with open(self.OS_ids_cachefile, 'a') as f:
-                f.write(yaml.dump(writeit, default_flow_style=False))
-                return 0
-        else:
-            with open(self.OS_ids_cachefile, 'w') as f:
-                f.write(yaml.dump(writeit, default_flow_style=False))
-                return 0
+        return self.cache.put(self.tenant_id, neutron_type, name, writeit)
 
-    def get_from_cache(self, neutron_type, get_this):
-        """Get a dictionary item from yaml file serving as cache.
+    def get_from_cache(self, neutron_type, name):
+        """Get a neutron item from the resource cache, as it was when cached.
 
         Args:
             neutron_type (str): The type of neutron object you're trying to
-                                work with, including subnet, router, network,
-                                or floatingip.
-            Get_this (str - dict key): This should be a relevant dictionary key
-                                       for the neutron_type you're fetching.
+                                work with, including networks, subnets, routers,
+                                ports or floatingips.
+            name (str): The name the item was cached by.
 
         Returns:
-            d (dict value): This could be a section of a dictionary or a single
-                            value depending on what your input was. It will only
-                            be related to what neutron_type was used in the call.
             Returncode (int):
                 0 - Success
-                1 - Failure
+                1 - Failure, nothing is cached by that name
+            item (dict): The item, "" if nothing is cached by that name. Neutron
+                         may have deleted it since, NeutronSnapshot.cached checks.
 
         Example Usage:
-            >>> print a.get_from_cache("subnet", TODO: put maybe interpolated "id" here.)
-            0, TODO: show example item
+            >>> print a.get_from_cache("subnets", "SLAB_aaltman_subnet")
+            0, {u'name': u'SLAB_aaltman_subnet', u'id': u'bd738973-2d66-...', ...}
         """
-
-        # Note: get_this should be some sort of key in one of the neutron
-        #      types. Pls see the create function for more details.
-        self.OS_ids_cachefile = os.path.join(self.path, cache, "OS_ids.yaml")
-        if os.path.exists(self.OS_ids_cachefile):
-            with open(OS_ids_cachefile, 'r') as f:
-                d = yaml.load(f)
-                return 0, d[get_this]
-        else:
-            return 1, d[get_this]
+        item = self.cache.get(self.tenant_id, neutron_type, name)
+        if item is None:
+            return 1, ""
+        return 0, item
 
 
 def os_ensure_network(path):
@@ -981,22 +1224,40 @@ def os_ensure_network(path):
         slab_logger.error('Exiting now.')
         return 1, float_net, mynewnets, security_groups
 
+    from neutronclient.common.exceptions import Unauthorized
+
     a = SLab_OS(path=path, password=password, username=username,
                 base_url=base_url)
     a.tenant_id = os.environ.get('OS_TENANT_ID')
     a.os_tenant_name = os.environ.get('OS_TENANT_NAME')
-    if not a.tenant_id:
-        returncode, a.tenant_id, temp_token = a.login_or_gettoken()
-        if returncode > 0:
-            slab_logger.error("Could not login to Openstack.")
-            return 1, float_net, mynewnets, security_groups
-    # Note: _ is same as above --> a.tenant_id
-    returncode, _, token = a.login_or_gettoken(tenant_id=a.tenant_id)
+    returncode, a.tenant_id, token = a.login_or_gettoken(tenant_id=a.tenant_id)
     if returncode > 0:
         slab_logger.error("Could not get token to project.")
         return 1, float_net, mynewnets, security_groups
 
     a.connect_to_neutron()
+    try:
+        return _ensure_network(a)
+    except Unauthorized:
+        # Note: The cached token was revoked, log in again and start over.  Every
+        #       step checks for what exists already.
+        slab_logger.debug('Openstack refused the cached token, logging in again.')
+        a.forget_token()
+        returncode, a.tenant_id, token = a.login_or_gettoken(tenant_id=a.tenant_id)
+        if returncode > 0:
+            slab_logger.error("Could not get token to project.")
+            return 1, float_net, mynewnets, security_groups
+        a.connect_to_neutron()
+        return _ensure_network(a)
+
+
+def _ensure_network(a):
+    """
+    Creates what os_ensure_network needs in the project a is connected to.
+    """
+    float_net = ''
+    mynewnets = []
+    security_groups = []
 
     returncode, security_group = a.create_security_group()
     if returncode > 0:
@@ -1019,8 +1280,8 @@ def os_ensure_network(path):
     if returncode > 0:
         slab_logger.error("Could not create subnet in project.")
         return 1, float_net, mynewnets, security_groups
-    slab_logger.debug('Sleeping 5s b/c of slow neutron create times.')
-    time.sleep(5)
+    if a.wait_for_subnet(subnet) > 0:
+        return 1, float_net, mynewnets, security_groups
     a.add_int_to_router(router_id, subnet['id'])
 
     mgmtname = a.create_name_for("network", append="mgmt")
@@ -1034,22 +1295,12 @@ def os_ensure_network(path):
     if returncode > 0:
         slab_logger.error("Could not create subnet in project.")
         return 1, float_net, mynewnets, security_groups
-    slab_logger.debug('Sleeping 5s b/c of slow neutron create times.')
-    time.sleep(5)
+    if a.wait_for_subnet(mgmt_subnet) > 0:
+        return 1, float_net, mynewnets, security_groups
     a.add_int_to_router(router_id, mgmt_subnet['id'], mgmt=True)
-    mynets = a.neutron.list_networks()
-    my_security_groups = a.neutron.list_security_groups()
-
-    mynewnets = []
-    for i in mynets['networks']:
-        if i.get('name') == network['name']:
-            mynewnets.append(i)
-        elif i.get('name') == mgmt_network['name']:
-            mynewnets.append(i)
-
-    for i in my_security_groups['security_groups']:
-        if i.get('name') == security_group['name']:
-            security_groups.append(i)
+    mynewnets = [a.snapshot.get('networks', network['id']),
+                 a.snapshot.get('networks', mgmt_network['id'])]
+    security_groups = [security_group]
 
     return 0, float_net, mynewnets, security_groups
 
@@ -1064,11 +1315,9 @@ def os_check_vms(path):
     Example Usage:
 
     """
-    vm_connection = vagrant_utils.Connect_to_vagrant(vm_name="infra-001",
-                                                     path=path)
     running_vm = False
     try:
-        statuses = vm_connection.v.status()
+        statuses = vagrant_utils.vm_statuses(path)
         for status in statuses:
                 if status[1] == 'running' or status[1] == 'active':
                     running_vm = True
@@ -1081,46 +1330,60 @@ def os_check_vms(path):
 
 
 def os_delete_vms(path, force):
-    """
+    """Destroy the VMs, all at once once the prompts are answered.
+
     Args:
         path (str): Your working .stack directory, typically ctx.path
         force : Force delete or prompt before deletion
     Returns:
+        Returncode (int):
+            0 - Success
+            1 - Failure
 
     Example Usage:
-
+        >>> os_delete_vms(ctx.path, True)
+        0
     """
     vm_connection = vagrant_utils.Connect_to_vagrant(vm_name="infra-001",
                                                      path=path)
     if force:
         slab_logger.log(25, "Deleting all VMs.")
     try:
-        statuses = vm_connection.v.status()
-        for status in statuses:
-            if force:
-                vm_connection.v.destroy(status[0])
-                slab_logger.log(25, "Deleted VM : %s " % (status[0]))
-            else:
-                if yes_or_no("Do you want to destroy VM : %s ? "
-                             % (status[0])):
-                    vm_connection.v.destroy(status[0])
-                    slab_logger.log(25, "Deleted VM : %s " % (status[0]))
-                else:
-                    slab_logger.log(25, "Skipping deletion of VM : %s " % (status[0]))
+        statuses = vagrant_utils.vm_statuses(path)
     except CalledProcessError:
         # RFI: is there a better way to return here? raise exception?
         slab_logger.log(25, "Error occurred connecting to Vagrant.")
+        return 1
+    names = []
+    for status in statuses:
+        if force or yes_or_no("Do you want to destroy VM : %s ? " % (status[0])):
+            names.append(status[0])
+        else:
+            slab_logger.log(25, "Skipping deletion of VM : %s " % (status[0]))
+    plan = teardown_utils.vm_plan(vm_connection.v, names)
+    returncode = plan.run()
+    plan.report()
+    return returncode
 
 
 def os_delete_networks(path, force):
-    """Delete a network in OS tenant/project.
+    """Delete the SLAB networks of the OS tenant/project, with their ports and
+    subnets, and the routers of the tenant.
+
+    The tenant is listed once and the deletions run concurrently, in the order
+    teardown_utils.network_plan gives them.
+
     Args:
-        name (str):
+        path (str): Your working .stack directory, typically ctx.path
+        force : Force delete or prompt before deletion
     Returns:
-        Returncode
+        Returncode (int):
+            0 - Success
+            1 - Failure
 
     Example Usage:
-
+        >>> os_delete_networks(ctx.path, True)
+        0
     """
     requests.packages.urllib3.disable_warnings()
 
@@ -1132,60 +1395,55 @@ def os_delete_networks(path, force):
         slab_logger.error('Can delete network b/c password or base_url is\
         not set')
         slab_logger.error('Exiting now.')
-        return
+        return 1
 
     slab = SLab_OS(path=path, password=password, username=username,
                    base_url=base_url)
     slab.tenant_id = os.environ.get('OS_TENANT_ID')
     slab.os_tenant_name = os.environ.get('OS_TENANT_NAME')
-    if not slab.tenant_id:
-        returncode, slab.tenant_id, _ = slab.login_or_gettoken()
-        if returncode > 0:
-            slab_logger.error("Could not login to Openstack.")
-            return
-    # Note: _ is same as above --> a.tenant_id
-    returncode, _, _ = slab.login_or_gettoken(tenant_id=slab.tenant_id)
+    returncode, slab.tenant_id, _ = slab.login_or_gettoken(tenant_id=slab.tenant_id)
     if returncode > 0:
         slab_logger.error("Could not get token to project.")
-        return
+        return 1
 
     slab.connect_to_neutron()
-    netw = slab.neutron.list_networks()
     if force:
         slab_logger.log(25, "Deleting all SLAB networks.")
-    try:
-        networks = netw['networks']
-        for network in networks:
-            if network['tenant_id'] != slab.tenant_id:
-                continue
-            if 'SLAB' in network['name']:
-                if force:
-                    os_delete_networking_components(slab.neutron, network)
-                else:
-                    if yes_or_no("Do you want to delete network : %s ? "
-                                 % (network['name'])):
-                        os_delete_networking_components(slab.neutron, network)
-                    else:
-                        slab_logger.log(25, "Skipping deletion of network : %s "
-                                        % (network['name']))
-        os_delete_routers(slab.neutron, force)
-    except CalledProcessError:
-        slab_logger.log(25, "Error occurred deleting network.")
+    networks = []
+    for network in slab.snapshot.items('networks'):
+        if 'SLAB' not in network['name']:
+            continue
+        if force or yes_or_no("Do you want to delete network : %s ? "
+                              % (network['name'])):
+            networks.append(network)
+        else:
+            slab_logger.log(25, "Skipping deletion of network : %s " % (network['name']))
+    routers = []
+    for router in slab.snapshot.items('routers'):
+        if force or yes_or_no("Do you want to delete router : %s ? " % (router['name'])):
+            routers.append(router)
+        else:
+            slab_logger.log(25, "Skipping deletion of router : %s " % (router['name']))
+    plan = teardown_utils.network_plan(slab.neutron, slab.snapshot, networks, routers)
+    returncode = plan.run()
+    plan.report()
+    return returncode
 
 
 def os_delete_networking_components(neutron, network):
-    """Deletes all networking comppnents.
+    """Deletes a network with its ports, router interfaces and subnets.
     Args:
         neutron : Neutron client
         network : Network to be deleted
-        force  : Force option
     Returns:
         Returncode
     """
-    os_delete_ports(neutron, network)
-    os_delete_subnets(neutron, network)
-    neutron.delete_network(network['id'])
-    slab_logger.log(25, "Deleted network : %s " % (network['name']))
+    snapshot = NeutronSnapshot(neutron, network['tenant_id'])
+    plan = teardown_utils.network_plan(neutron, snapshot, [network])
+    returncode = plan.run()
+    if returncode == 0:
+        slab_logger.log(25, "Deleted network : %s " % (network['name']))
+    return returncode
 
 
 def os_delete_subnets(neutron, network):
@@ -1196,6 +1454,8 @@ def os_delete_subnets(neutron, network):
     Returns:
         Returncode
     """
+    from neutronclient.common.exceptions import NotFound
+
     try:
         for subnet in network['subnets']:
             slab_logger.log(25, "Deleting subnet : %s " % (subnet))
@@ -1212,6 +1472,8 @@ def os_delete_routers(neutron, force):
     Returns:
 
     """
+    from neutronclient.common.exceptions import NotFound
+
     routers = neutron.list_routers(retrieve_all=True)
     if routers['routers']:
         for router in routers['routers']:
@@ -1242,6 +1504,8 @@ def os_delete_ports(neutron, network):
     Returns:
 
     """
+    from neutronclient.common.exceptions import NotFound
+
     ports = neutron.list_ports()
     if ports['ports']:
         for port in ports['ports']:
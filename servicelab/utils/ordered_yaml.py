@@ -1,6 +1,7 @@
 import re
 import yaml
 
+import yaml_io
 import logger_utils
 
 from collections import OrderedDict
@@ -13,13 +14,17 @@ based on the stack overflow discussin
 http://stackoverflow.com/questions/5121931/\
 in-python-how-can-you-load-yaml-mappings-as-ordereddicts
 
+The loader and dumper classes live in yaml_io so they are built once and use
+libyaml when it is available.
 """
 
 
-def load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
+def load(stream, Loader=None, object_pairs_hook=OrderedDict):
     slab_logger.log(15, 'Loading yaml file into ordered dictionary')
+    if Loader is None and object_pairs_hook is OrderedDict:
+        return yaml_io.load(stream, ordered=True)
 
-    class OrderedLoader(Loader):
+    class OrderedLoader(Loader or yaml_io.Loader):
         pass
 
     def construct_mapping(loader, node):
@@ -32,21 +37,23 @@ def load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
     return yaml.load(stream, OrderedLoader)
 
 
-def dump(data, fname, Dumper=yaml.Dumper):
+def dump(data, fname, Dumper=yaml_io.Dumper):
     # this dumps the data as it was read in by load
     slab_logger.log(15, 'Writing data as it was read in by load')
-
-    class OrderedDumper(Dumper):
-        pass
-
-    def _dict_representer(dumper, data):
-        return dumper.represent_mapping(
-            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-            data.items())
-
-    with open(fname, "w") as stream:
-        OrderedDumper.add_representer(OrderedDict, _dict_representer)
-        yaml.dump(data, stream, OrderedDumper, default_flow_style=False)
+    if Dumper is yaml_io.Dumper:
+        yaml_io.dump_file(data, fname)
+    else:
+        class OrderedDumper(Dumper):
+            pass
+
+        def _dict_representer(dumper, data):
+            return dumper.represent_mapping(
+                yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+                data.items())
+
+        with open(fname, "w") as stream:
+            OrderedDumper.add_representer(OrderedDict, _dict_representer)
+            yaml.dump(data, stream, OrderedDumper, default_flow_style=False)
 
     # massaging the data with correct anchor names rather than m/c names
     # assumption is the key name is the anchor name
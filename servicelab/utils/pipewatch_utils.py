@@ -0,0 +1,355 @@
+"""
+Watch GoCD pipelines until their stages finish
+
+Every pipeline is polled with an adaptive backoff.  The interval starts short,
+grows while nothing changes and drops back as soon as a stage changes state.
+Requests are conditional on the ETag of the previous answer, so polling an
+unchanged pipeline costs the server a 304.  Stage transitions come out as
+StageEvent tuples, and watching stops on the poll that sees a pipeline finish.
+"""
+import time
+import threading
+import collections
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.pipewatch')
+
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 15.0
+BACKOFF_FACTOR = 2.0
+
+# Note: A pipeline whose polls failed this many times in a row, e.g. because the
+#       server is unreachable, is given up on.  With the backoff that is about
+#       15 seconds of trying plus the connect timeouts.
+MAX_FAILURES = 5
+
+# Note: States of a stage.  GoCD reports result Unknown for a stage that is
+#       scheduled but not finished, and for one that is not scheduled at all.
+NOT_RUN = 'NotRun'
+BUILDING = 'Building'
+FINAL_STATES = ('Passed', 'Failed', 'Cancelled')
+
+StageEvent = collections.namedtuple('StageEvent',
+                                    ['pipeline', 'counter', 'stage', 'previous', 'state'])
+
+
+class Backoff(object):
+    """
+    Interval between polls, doubling while nothing changes.
+
+    Attributes:
+        minimum (float): Interval after a change, and the first one
+        maximum (float): Longest interval
+        factor (float): Growth of the interval on every poll without a change
+        interval (float): The interval after the next poll without a change
+
+    Example Usage:
+        >>> backoff = Backoff(1, 8)
+        >>> [backoff.update(changed) for changed in (False, False, False, False, True)]
+        [1, 2, 4, 8, 1]
+    """
+
+    def __init__(self, minimum=MIN_INTERVAL, maximum=MAX_INTERVAL, factor=BACKOFF_FACTOR):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.factor = factor
+        self.interval = minimum
+
+    def update(self, changed):
+        """
+        Returns the interval to wait after a poll that saw a change or not.
+        """
+        if changed:
+            self.interval = self.minimum
+        interval = self.interval
+        self.interval = min(self.maximum, interval * self.factor)
+        return interval
+
+
+def stage_state(stage):
+    """Returns the state of a stage of a pipeline instance.
+
+    Args:
+        stage (dict): A stage as the GoCD pipeline instance api returns it
+
+    Returns:
+        NotRun, Building, Passed, Failed or Cancelled (str)
+    """
+    result = stage.get('result', 'Unknown')
+    if result in FINAL_STATES:
+        return result
+    scheduled = stage.get('scheduled')
+    if scheduled is None:
+        # Note: Some GoCD versions leave out scheduled, and result too for a
+        #       stage that was never scheduled.
+        scheduled = 'result' in stage
+    if not scheduled:
+        return NOT_RUN
+    return BUILDING
+
+
+def instance_finished(instance):
+    """A pipeline instance is finished when none of its stages is building and
+       GoCD is not about to start the next one by itself.
+
+    Args:
+        instance (dict): A pipeline instance
+
+    Returns:
+        True if the instance is finished (bool)
+    """
+    previous = None
+    for stage in instance.get('stages', []):
+        state = stage_state(stage)
+        if state == BUILDING:
+            return False
+        if state in ('Failed', 'Cancelled'):
+            return True
+        if state == NOT_RUN:
+            # Note: GoCD schedules a stage approved on success of the one before.
+            return not (previous == 'Passed' and stage.get('approval_type') == 'success')
+        previous = state
+    return True
+
+
+def instance_passed(instance):
+    """
+    Returns True if no stage of a pipeline instance failed or was cancelled.
+    """
+    return not [stage for stage in instance.get('stages', [])
+                if stage_state(stage) in ('Failed', 'Cancelled')]
+
+
+def format_event(event):
+    """Returns a one line description of a StageEvent.
+
+    Example Usage:
+        >>> print format_event(StageEvent('deploy', 12, 'test', 'Building', 'Passed'))
+        deploy/12 test: Building -> Passed
+    """
+    if event.previous is None:
+        return '%s/%s %s: %s' % (event.pipeline, event.counter, event.stage, event.state)
+    return '%s/%s %s: %s -> %s' % (event.pipeline, event.counter, event.stage,
+                                   event.previous, event.state)
+
+
+class PipelineWatcher(object):
+    """
+    Polls GoCD pipelines and reports their stage transitions.
+
+    Attributes:
+        client (http_utils.HTTPClient): Client of the go server
+        min_interval (float): Seconds between polls of a pipeline after a change
+        max_interval (float): Longest wait between polls of a pipeline
+        workers (int): Pipelines polled at the same time
+        max_failures (int): Polls of a pipeline failing in a row before giving up
+        instances (dict): Last instance seen of every pipeline watched
+        errors (dict): Why a pipeline could not be watched, by pipeline
+        requests (int): Requests sent
+        not_modified (int): Requests the server answered with 304 Not Modified
+
+    Example Usage:
+        >>> watcher = PipelineWatcher(http_utils.get_client('gocd', 'http://go:8153'))
+        >>> for event in watcher.watch(['deploy-sdu', 'deploy-ccs']):
+        ...     print format_event(event)
+    """
+
+    def __init__(self, client, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 workers=8, max_failures=MAX_FAILURES):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.workers = max(1, workers)
+        self.max_failures = max(1, max_failures)
+        self.instances = {}
+        self.errors = {}
+        self.requests = 0
+        self.not_modified = 0
+        self._etags = {}
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def get_json(self, path):
+        """Get a json document, conditional on the ETag of the last answer.
+
+        Args:
+            path (str): Path on the go server
+
+        Returns:
+            data (object): The document, the previous one if the server answered 304
+            changed (bool): The document is not the one received before
+        """
+        headers = {'Accept': 'application/json'}
+        if path in self._etags:
+            headers['If-None-Match'] = self._etags[path]
+        res = self.client.get(path, headers=headers)
+        with self._lock:
+            self.requests += 1
+            if res.status_code == 304:
+                self.not_modified += 1
+        if res.status_code == 304:
+            return self._bodies[path], False
+        res.raise_for_status()
+        data = res.json()
+        changed = data != self._bodies.get(path)
+        if res.headers.get('ETag'):
+            self._etags[path] = res.headers['ETag']
+        self._bodies[path] = data
+        return data, changed
+
+    def instance(self, pipeline, counter=None):
+        """Returns a pipeline instance.
+
+        Args:
+            pipeline (str): Name of the pipeline
+            counter (int): The run, the latest if None
+
+        Returns:
+            The instance (dict), None if the pipeline never ran
+        """
+        if counter is None:
+            history, _ = self.get_json('/go/api/pipelines/%s/history/0' % pipeline)
+            if not history.get('pipelines'):
+                return None
+            return history['pipelines'][0]
+        return self.get_json('/go/api/pipelines/%s/instance/%s' % (pipeline, counter))[0]
+
+    def _fetch(self, item):
+        pipeline, counter = item
+        try:
+            return pipeline, self.instance(pipeline, counter), None
+        except (requests.exceptions.RequestException, ValueError) as error:
+            return pipeline, None, error
+
+    def watch(self, pipelines, counter=None, until=instance_finished):
+        """Poll pipelines until until is true for all of them.
+
+        Pipelines are polled concurrently, each with its own backoff.  The first
+        poll reports the state of every stage, with previous None.  A pipeline
+        the server answers an http error for, or whose polls fail max_failures
+        times in a row, is dropped and its error kept in errors.
+
+        Args:
+            pipelines (list): Names of the pipelines
+            counter (int): The run to watch, the latest if None
+            until (function): Called with a pipeline instance, returns True once
+                              the pipeline needs no more watching
+
+        Returns:
+            Generator of StageEvents.  instances holds the last instance seen of
+            every pipeline when it is exhausted.
+        """
+        states = {}
+        backoffs = dict((pipeline, Backoff(self.min_interval, self.max_interval))
+                        for pipeline in pipelines)
+        due = dict((pipeline, 0) for pipeline in pipelines)
+        failures = dict((pipeline, 0) for pipeline in pipelines)
+        pending = list(pipelines)
+        pool = ThreadPool(max(1, min(self.workers, len(pending))))
+        try:
+            while pending:
+                now = time.time()
+                ready = [(pipeline, counter) for pipeline in pending if due[pipeline] <= now]
+                for pipeline, instance, error in pool.map(self._fetch, ready):
+                    if isinstance(error, requests.exceptions.HTTPError):
+                        slab_logger.error('Unable to watch %s: %s' % (pipeline, error))
+                        self.errors[pipeline] = error
+                        pending.remove(pipeline)
+                        continue
+                    if error:
+                        failures[pipeline] += 1
+                        if failures[pipeline] >= self.max_failures:
+                            slab_logger.error('Unable to watch %s, %i polls failed: %s'
+                                              % (pipeline, failures[pipeline], error))
+                            self.errors[pipeline] = error
+                            pending.remove(pipeline)
+                            continue
+                        slab_logger.warning('Unable to poll %s: %s' % (pipeline, error))
+                    elif instance is None:
+                        slab_logger.log(25, '%s has not run yet' % pipeline)
+                        pending.remove(pipeline)
+                        continue
+                    events = []
+                    if instance is not None:
+                        failures[pipeline] = 0
+                        self.instances[pipeline] = instance
+                        events = self._transitions(pipeline, instance, states)
+                        for event in events:
+                            yield event
+                        if until(instance):
+                            pending.remove(pipeline)
+                            continue
+                    due[pipeline] = time.time() + backoffs[pipeline].update(bool(events))
+                if pending:
+                    time.sleep(max(0, min(due[pipeline] for pipeline in pending) -
+                                   time.time()))
+        finally:
+            pool.close()
+            pool.join()
+
+    def _transitions(self, pipeline, instance, states):
+        """
+        Returns the StageEvents between the stage states seen last and instance.
+        """
+        counter = instance.get('counter')
+        if pipeline not in states or states[pipeline][0] != counter:
+            states[pipeline] = (counter, {})
+        known = states[pipeline][1]
+        events = []
+        for stage in instance.get('stages', []):
+            state = stage_state(stage)
+            if known.get(stage['name']) != state:
+                events.append(StageEvent(pipeline, counter, stage['name'],
+                                         known.get(stage['name']), state))
+                known[stage['name']] = state
+        return events
+
+    def wait_for_stage(self, pipeline, counter, stage_name):
+        """Wait for a stage of a pipeline run to finish.
+
+        Args:
+            pipeline (str): Name of the pipeline
+            counter (int): The run
+            stage_name (str): The stage
+
+        Returns:
+            The pipeline instance once the stage finished (dict), None if it could
+            not be watched
+        """
+        def stage_finished(instance):
+            for stage in instance.get('stages', []):
+                if stage['name'] == stage_name:
+                    return stage_state(stage) in FINAL_STATES
+            return False
+
+        for event in self.watch([pipeline], counter, stage_finished):
+            if event.stage == stage_name:
+                slab_logger.log(15, format_event(event))
+        if pipeline in self.errors:
+            return None
+        return self.instances.get(pipeline)
+
+    def wait_until_schedulable(self, pipeline):
+        """Wait for a pipeline to be schedulable, i.e. not running.
+
+        Args:
+            pipeline (str): Name of the pipeline
+
+        Returns:
+            The pipeline status (dict), None if the server has none
+        """
+        backoff = Backoff(self.min_interval, self.max_interval)
+        warned = False
+        while True:
+            status, changed = self.get_json('/go/api/pipelines/%s/status' % pipeline)
+            if not status or status.get('schedulable'):
+                return status
+            if not warned:
+                slab_logger.warning("Pipeline is running. Waiting for it to finish.")
+                warned = True
+            time.sleep(backoff.update(changed))
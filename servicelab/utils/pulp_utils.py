@@ -4,8 +4,8 @@ Utility functions for pulp
 import sys
 import logging
 import requests
-from requests.auth import HTTPBasicAuth
 
+import http_utils
 import logger_utils
 from servicelab import settings
 
@@ -34,6 +34,13 @@ def validate_pulp_ip_cb(ctx, param, value):
     return value
 
 
+def _client(ip_address, username, password):
+    """
+    Returns the pooled client of the pulp server at ip_address.
+    """
+    return http_utils.get_client('pulp', ip_address, (username, password), verify=False)
+
+
 def put(url, ip_address, ctx, username, password,
         payload):
     """Makes a put request to supplied to URL.
@@ -56,14 +63,11 @@ def put(url, ip_address, ctx, username, password,
                       "admin", {"criteria":{"filters":{"repo_id":{"$eq": "test_repo"}}}})
     """
     slab_logger.log(15, 'Sending put request to %s' % ip_address)
-    requests.packages.urllib3.disable_warnings()
     headers = {"Accept": "application/json",
                "Content-Type": "multipart/form-data"}
     try:
-        res = requests.put(ip_address + url, verify=False,
-                           auth=HTTPBasicAuth(username, password),
-                           data=payload,
-                           headers=headers)
+        res = _client(ip_address, username, password).put(url, data=payload,
+                                                          headers=headers)
         slab_logger.log(25, ".", nl=False)
         process_response(res, ctx)
     except requests.exceptions.RequestException as ex:
@@ -95,14 +99,11 @@ def post(url, ip_address, ctx, username, password, payload):
                       "admin", {"criteria":{"filters":{"repo_id":{"$eq": "test_repo"}}}})
     """
     slab_logger.log(15, 'Sending post request to %s' % ip_address)
-    requests.packages.urllib3.disable_warnings()
     headers = {"Accept": "application/json"}
     try:
         slab_logger.log(25, ip_address + url)
-        res = requests.post(ip_address + url, verify=False,
-                            auth=HTTPBasicAuth(username, password),
-                            headers=headers,
-                            data=payload)
+        res = _client(ip_address, username, password).post(url, headers=headers,
+                                                           data=payload)
         process_response(res, ctx)
     except requests.exceptions.RequestException as ex:
         slab_logger.error("Could not connect to pulp server. Please,"
@@ -132,12 +133,9 @@ def get(url, ip_address, ctx, username, password):
                       "admin")
     """
     slab_logger.log(15, 'Sending get request to %s' % ip_address)
-    requests.packages.urllib3.disable_warnings()
     headers = {"Accept": "application/json"}
     try:
-        res = requests.get(ip_address + url, verify=False,
-                           auth=HTTPBasicAuth(username, password),
-                           headers=headers)
+        res = _client(ip_address, username, password).get(url, headers=headers)
         process_response(res, ctx)
     except requests.exceptions.RequestException as ex:
         slab_logger.error("Could not connect to pulp server. Please,"
@@ -3,18 +3,33 @@ Stack utility functions
 """
 import os
 import re
+import time
 import shutil
 
 import platform
 import subprocess32 as subprocess
+from multiprocessing.pool import ThreadPool
 from reconfigure.configs import ExportsConfig
 
 import yaml_utils
+import mirror_utils
+import catalog_utils
 import logger_utils
 from servicelab import settings
 
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.service')
 
+# Note: Where service repos are cloned from.  {username} and {service} are filled in.
+GIT_URL = 'ssh://{username}@cis-gerrit.cisco.com:29418/{service}'
+
+# Note: Depths tried, in order, when a shallow clone lacks the history needed to
+#       decide a fast forward, before falling back to fetching all of it.
+DEEPEN_STEPS = (50, 500)
+
+# Note: Clone services from the shared mirrors in .stack/cache/git-mirrors, see
+#       mirror_utils.  Without them every clone is a fresh shallow one.
+USE_MIRRORS = True
+
 
 def sync_service(path, branch, username, service_name):
     """Synchronize a service with service-lab.
@@ -78,6 +93,45 @@ def sync_service(path, branch, username, service_name):
                 return True
 
 
+def sync_services(path, username, services, workers=4):
+    """Synchronize several services concurrently, see sync_service.
+
+    Args:
+        path (str): The path to your working .stack directory.
+        username (str): name of user
+        services (list): (service_name, branch) tuples
+        workers (int): Maximum number of services synchronized at the same time
+
+    Returns:
+        results (list): (service_name, synced (bool), seconds taken) tuples in
+                        the order of services
+
+    Example Usage:
+        >>> print sync_services(ctx.path, "aaltman", [("service-foo", "master"),
+        ...                                           ("ccs-data", "master")])
+        [('service-foo', True, 2.1), ('ccs-data', True, 14.8)]
+    """
+    slab_logger.log(15, 'Synchronizing %s' % ', '.join(name for name, _ in services))
+
+    def timed_sync(service):
+        service_name, branch = service
+        start = time.time()
+        synced = sync_service(path, branch, username, service_name)
+        elapsed = time.time() - start
+        slab_logger.log(25, '%s %s in %.1fs' % ('Synced' if synced else 'Failed to sync',
+                                                service_name, elapsed))
+        return service_name, synced, elapsed
+
+    if not services:
+        return []
+    pool = ThreadPool(min(workers, len(services)))
+    try:
+        return pool.map(timed_sync, services)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def build_data(path):
     """Build ccs-data for site ccs-dev-1 and move built hosts into .stack/
 
@@ -189,13 +243,26 @@ def _git_clone(path, branch, username, service_name):
     """
     slab_logger.log(15, 'Cloning %s into servicelab/.stack/services' % service_name)
     # Note: Branch defaults to master in the click application
-    # DETAIL: "Executing subprocess for git clone"
-    # DEBUG: print 'git clone -b %s ssh://%s@cis-gerrit.cisco.com:29418/%s
-    #        %s/services/%s' % (branch, username, service_name, path,
-    #        service_name)
-    returncode, myinfo = run_this(
-        "git clone --depth=1 -b %s ssh://%s@cis-gerrit.cisco.com:29418/%s %s/services/%s"
-        % (branch, username, service_name, path, service_name))
+    url = GIT_URL.format(username=username, service=service_name)
+    if USE_MIRRORS:
+        returncode, mirror = mirror_utils.update_mirror(path, url, service_name)
+        if returncode == 0:
+            returncode, myinfo = mirror_utils.clone_from_mirror(
+                mirror, url, branch, os.path.join(path, "services", service_name))
+            if returncode == 0:
+                return(0, myinfo)
+            shutil.rmtree(os.path.join(path, "services", service_name),
+                          ignore_errors=True)
+            mirror = myinfo
+        slab_logger.debug("Cloning %s without its mirror: %s" % (service_name, mirror))
+    # Note: The clone is shallow and partial, blobs outside the checked out tree
+    #       are only downloaded if history is deepened later on.
+    clone = "git clone --depth=1 %s-b %s %s %s/services/%s"
+    returncode, myinfo = run_this(clone % ("--filter=blob:none ", branch, url, path,
+                                           service_name))
+    if returncode != 0 and "filter" in myinfo:
+        # Note: git older than 2.19 does not know partial clones
+        returncode, myinfo = run_this(clone % ("", branch, url, path, service_name))
     if not returncode == 0:
         slab_logger.error(myinfo)
         return(1, myinfo)
@@ -240,54 +307,56 @@ def _git_pull_ff(path, branch, service_name):
     slab_logger.log(15, 'Fast forward only pull of %s branch %s' % (service_name, branch))
     # Note: Branch defaults to master in the click application
     service_path = os.path.join(path, "services", service_name)
+    local_ref = 'refs/heads/%s' % branch
+    remote_ref = 'refs/remotes/origin/%s' % branch
 
-    # Before doing git checkout, check if the remote ref exists
-    # if it does not then take some steps to get it and run checks
-    slab_logger.debug("Checking for remote references in %s " % (service_path))
-    returncode, output = run_this('git show-ref %s' % (branch), cwd=service_path)
+    returncode, output = run_this('git for-each-ref --format="%%(refname)" %s %s'
+                                  % (local_ref, remote_ref), cwd=service_path)
     if not returncode == 0:
         return(returncode, output)
-        slab_logger.error('"git show-ref %s" returned an error for %s\ncmd output: %s'
-                          % (branch, service_name, output))
-    if branch not in output:
-        slab_logger.log(25, "Remote git branch not found : %s " % (branch))
-        slab_logger.log(25, "Setting remote origin in .git/config to :"
-                            " +refs/heads/*:refs/remotes/origin/*")
-        command_to_run = 'git config --replace-all  remote.origin.fetch'\
-                         '  "+refs/heads/*:refs/remotes/origin/*"'
-        returncode, output = run_this(command_to_run, cwd=service_path)
-        if not returncode == 0:
-            return(returncode, output)
-        slab_logger.debug("Fetching all remote branches. It might take a few minutes. %s"
-                          % (service_path))
-        returncode, output = run_this('git fetch --unshallow', cwd=service_path)
-        if not returncode == 0:
-            return(returncode, output)
-        slab_logger.debug("Done Fetching all remote branches.  Updating remotes.")
-        returncode, output = run_this('git remote update', cwd=service_path)
+    refs = output.split()
+
+    # Note: A branch that was fetched before only needs the new commits.  A new
+    #       one is fetched shallow, whatever else the clone holds stays as it is.
+    depth = '' if remote_ref in refs else '--depth=1 '
+    returncode, output = run_this('git fetch %sorigin +%s:%s'
+                                  % (depth, local_ref, remote_ref), cwd=service_path)
+    if not returncode == 0:
+        if "couldn't find remote ref" in output:
+            slab_logger.log(25, "Remote git branch not found : %s " % (branch))
+            slab_logger.log(25, "Branch not found. Please, check branch name. Exiting.")
+            return(1, 'Unable to find remote branch')
+        return(returncode, output)
+
+    returncode, output = run_this('git symbolic-ref -q --short HEAD', cwd=service_path)
+    if output.strip() != branch:
+        if local_ref in refs:
+            returncode, output = run_this('git checkout %s' % (branch), cwd=service_path)
+        else:
+            # Note: The clone only fetches the branch it was made from, add this one.
+            returncode, output = run_this('git remote set-branches --add origin %s'
+                                          % (branch), cwd=service_path)
+            if not returncode == 0:
+                return(returncode, output)
+            returncode, output = run_this('git checkout -b %s --track origin/%s'
+                                          % (branch, branch), cwd=service_path)
         if not returncode == 0:
             return(returncode, output)
-        slab_logger.debug("Remote updates completed. ")
-        command_to_run = "git show-ref %s" % (branch)
-        returncode, output = run_this(command_to_run, cwd=service_path)
+
+    returncode, myinfo = run_this('git merge --ff-only origin/%s' % (branch), service_path)
+    # Note: A shallow clone may not hold the common history of the local and the
+    #       remote branch.  Deepen it step by step until the merge can decide.
+    deepen = ['--deepen=%i' % step for step in DEEPEN_STEPS] + ['--unshallow']
+    while returncode != 0 and deepen and \
+            os.path.isfile(os.path.join(service_path, '.git', 'shallow')):
+        slab_logger.debug("Deepening %s with %s" % (service_name, deepen[0]))
+        returncode, output = run_this('git fetch %s origin +%s:%s'
+                                      % (deepen.pop(0), local_ref, remote_ref),
+                                      cwd=service_path)
         if not returncode == 0:
             return(returncode, output)
-        if branch not in output:
-            slab_logger.error("Remote branch %s not found." % (branch))
-            returncode, output = run_this("git show-ref", cwd=service_path)
-            if not returncode == 0:
-                return(returncode, output)
-            ref_info = output.communicate()[0]
-            slab_logger.log(25, "The following branches were found : %s " % ref_info)
-            slab_logger.log(25, "Branch not found. Please, check branch name. Exiting.")
-            return(1, 'Unable to find remote branch')
-    # TODO: Do more error checking here --> after debugging, definitely
-    # TODO: checkout a branch ifexists in origin only--> not replacing git
-    #       or setup a tracking branch if there's nothing local or fail.
-    returncode, output = run_this('git checkout %s' % (branch), cwd=service_path)
-    if not returncode == 0:
-        return(returncode, output)
-    returncode, myinfo = run_this('git pull --ff-only origin %s' % (branch), service_path)
+        returncode, myinfo = run_this('git merge --ff-only origin/%s' % (branch),
+                                      service_path)
     return(returncode, myinfo)
 
 
@@ -473,7 +542,7 @@ def clean(path):
 
 
 def check_service(path, service_name):
-    """Checks gerrit for a repo matching service_name.
+    """Checks gerrit for a repo named service_name, using the project catalog.
 
     Args:
         path (str): The path to your working .stack directory. Typically,
@@ -499,49 +568,12 @@ def check_service(path, service_name):
                               'Please enter a service to work on."')
             return 1
 
-    if os.path.exists(os.path.join(path, "cache")):
-        if os.path.isfile(os.path.join(path, "cache", "projects")):
-            for line in open(os.path.join(path, "cache", "projects"), 'r'):
-                # Note: re.search takes a search term as 1st arg and what to
-                #       search as second arg.
-                if re.search(service_name, line):
-                    return 0
-
-            ret_val, ret_str = run_this('ssh -p 29418 ccs-gerrit.cisco.com '
-                                        '"gerrit ls-projects" > %s'
-                                        % (os.path.join(path, "cache", "projects")))
-            if ret_val != 0:
-                SERVICE_UTILS_LOGGER.error("Unable to fetch project list from gerrit")
-                SERVICE_UTILS_LOGGER.error("error {}".format(ret_str))
-                return 1
-            for line in open(os.path.join(path, "cache", "projects"), 'r'):
-                if re.search(service_name, line):
-                    return 0
-
-            # Note: We didn't succeed in finding a match.
-            slab_logger.error("Could not find repo in ccs-gerrit.")
-            return 1
-    else:
-        os.makedirs(os.path.join(path, "cache"))
-        cachef = open(os.path.join(path, "cache", "projects"), 'w+')
-        # Note: We close right away b/c we're just trying to
-        #       create the file.
-        cachef.close()
-
-        # Note: We didn't succeed in finding a match.
-        slab_logger.error("Could not find repo in ccs-gerrit.")
-    slab_logger.debug('Pulling all projects from gerrit')
-    ret_val, ret_str = run_this(
-        'ssh -p 29418 ccs-gerrit.cisco.com "gerrit ls-projects" > %s'
-        % (os.path.join(path, "cache", "projects")))
-    if ret_val != 0:
-        slab_logger.error("Unable to fetch project list from gerrit")
-        slab_logger.error("error {}".format(ret_str))
-        return 1
-
-    for line in open(os.path.join(path, "cache", "projects"), 'r'):
-        if re.search(service_name, line):
-            return 0
+    # Note: The catalog in .stack/cache/projects is refreshed when it is older
+    #       than catalog_utils.CATALOG_TTL, or misses service_name and is older
+    #       than catalog_utils.MISS_REFRESH.
+    catalog = catalog_utils.get_catalog(path)
+    if catalog.exists(service_name.strip()):
+        return 0
     # Note: We didn't succeed in finding a match.
     slab_logger.error("Could not find repo %s in ccs-gerrit." % service_name)
     return 1
@@ -0,0 +1,233 @@
+"""
+Shared ssh connections to gerrit
+
+Every gerrit server gets one authenticated transport for the whole run, opened
+through engine.SSHClient.  Each gerrit command runs on its own channel of that
+transport, so a batch of queries and reviews pays for a single handshake, and
+several queries can run at once on parallel channels.
+"""
+import json
+import pipes
+import threading
+from multiprocessing.pool import ThreadPool
+
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.ssh')
+
+GERRIT_PORT = 29418
+
+# Note: Queries running at once on one transport.  Gerrit's sshd serves the
+#       channels of a session concurrently.
+QUERY_WORKERS = 4
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+class GerritSSHError(Exception):
+    """ A gerrit command failed."""
+    pass
+
+
+def quote(arg):
+    """
+    Quotes an argument of a gerrit command, gerrit splits command lines like a
+    shell does.
+    """
+    return pipes.quote(str(arg))
+
+
+class GerritConnection(object):
+    """
+    One authenticated ssh transport to a gerrit server, shared by every command.
+
+    Attributes:
+        ssh (engine.SSHClient): Resolves host, port, user and key from the ssh
+                                config and connects
+        commands (int): Commands run on the transport
+
+    Example Usage:
+        >>> conn = get_connection('ccs-gerrit.cisco.com', 29418, 'aaltman')
+        >>> for review in conn.query('project:servicelab', 'status:open'):
+        ...     print review['number']
+    """
+
+    def __init__(self, host, port=GERRIT_PORT, user=None, key=None, config="~/.ssh/config"):
+        import engine
+
+        self.ssh = engine.SSHClient(host, port, user, key, config)
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self):
+        """
+        The transport, connecting and authenticating on first use and again
+        after the server dropped it.
+        """
+        with self._lock:
+            transport = self.ssh.client.get_transport()
+            if transport is None or not transport.is_active():
+                self.close()
+                transport = self.ssh.client.get_transport()
+            return transport
+
+    def run(self, command):
+        """Run a command on a new channel of the transport.
+
+        Args:
+            command (str): The command line
+
+        Returns:
+            returncode (int): Exit status of the command
+            output (str): What it wrote to stdout
+            error (str): What it wrote to stderr
+
+        Raises:
+            GerritSSHError if the server could not be reached
+        """
+        from paramiko import SSHException
+
+        slab_logger.debug('Running gerrit ssh command "%s"' % command)
+        try:
+            channel = self.transport.open_session()
+        except (SSHException, EnvironmentError) as error:
+            raise GerritSSHError('Unable to connect to %s: %s' % (self.ssh.host, error))
+        try:
+            channel.exec_command(command)
+            stdout = channel.makefile('rb')
+            stderr = channel.makefile_stderr('rb')
+            output = stdout.read()
+            error = stderr.read()
+            returncode = channel.recv_exit_status()
+        finally:
+            channel.close()
+        with self._lock:
+            self.commands += 1
+        return returncode, output, error
+
+    def gerrit(self, *args):
+        """Run a gerrit command, e.g. gerrit('ls-projects').
+
+        Returns:
+            output (str): What the command wrote to stdout
+
+        Raises:
+            GerritSSHError if the command failed
+        """
+        returncode, output, error = self.run(' '.join(['gerrit'] + [quote(arg)
+                                                                    for arg in args]))
+        if returncode:
+            raise GerritSSHError(error.strip() or output.strip() or
+                                 'gerrit %s failed' % args[0])
+        return output
+
+    def query(self, *terms):
+        """Query changes, with their current patch set.
+
+        Args:
+            terms: Search operators, e.g. project:servicelab, change:1234
+
+        Returns:
+            reviews (list): The changes as gerrit's json format has them.  An
+                            error row has type error and a message.
+        """
+        output = self.gerrit('query', '--format=JSON', '--current-patch-set', *terms)
+        reviews = []
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            review = json.loads(line)
+            if review.get('type') != 'stats':
+                reviews.append(review)
+        return reviews
+
+    def query_many(self, queries, workers=QUERY_WORKERS):
+        """Run several queries at once, on parallel channels of the transport.
+
+        Args:
+            queries (list): Lists of search operators, one per query
+            workers (int): Queries running at once
+
+        Returns:
+            results (list): The reviews of every query, in the order of queries
+        """
+        if not queries:
+            return []
+        pool = ThreadPool(max(1, min(workers, len(queries))))
+        try:
+            return pool.map(lambda terms: self.query(*terms), queries)
+        finally:
+            pool.close()
+            pool.join()
+
+    def review(self, revision, code_review=None, verified=None, state=None, message=None):
+        """Vote on a patch set or change the state of its change.
+
+        Args:
+            revision (str): The patch set
+            code_review (int): Code-Review vote, -2 to 2
+            verified (int): Verified vote, -1 to 1
+            state (str): abandon, restore or delete
+            message (str): Review message
+
+        Raises:
+            GerritSSHError if gerrit refused the review
+        """
+        args = ['review']
+        if code_review is not None:
+            args += ['--code-review', code_review]
+        if verified is not None:
+            args += ['--verified', verified]
+        if state:
+            args.append('--%s' % state)
+        if message:
+            args += ['--message', message]
+        self.gerrit(*(args + [revision]))
+
+    def ls_projects(self):
+        """
+        Returns the (returncode, output) of gerrit ls-projects, for the project
+        catalog.
+        """
+        try:
+            return 0, self.gerrit('ls-projects')
+        except GerritSSHError as error:
+            return 1, str(error)
+
+    def close(self):
+        client = self.ssh.__dict__.pop('_client', None)
+        if client is not None:
+            client.close()
+
+
+def get_connection(host, port=GERRIT_PORT, user=None, key=None, config="~/.ssh/config"):
+    """Returns the shared connection to a gerrit server, creating it if needed.
+
+    Args:
+        host (str): The gerrit server
+        port (int): Its ssh port
+        user (str): Gerrit username
+        key (str): ssh private key, paramiko looks for one if None
+        config (str): ssh config file
+
+    Returns:
+        GerritConnection object
+    """
+    ident = (host, int(port), user, key)
+    with _connections_lock:
+        if ident not in _connections:
+            _connections[ident] = GerritConnection(host, port, user, key, config)
+        return _connections[ident]
+
+
+def close_all():
+    """
+    Close every connection.
+    """
+    with _connections_lock:
+        for connection in _connections.values():
+            connection.close()
+        _connections.clear()
@@ -36,10 +36,8 @@ def show_vm_status(path):
     """
     slab_logger.log(15, 'Extracting vm statuses')
     slab_logger.log(25, '\nShowing vm status of services :')
-    vm_connection = vagrant_utils.Connect_to_vagrant(vm_name=VM_NAME,
-                                                     path=path)
     try:
-        statuses = vm_connection.v.status()
+        statuses = vagrant_utils.vm_statuses(path)
         for status in statuses:
             slab_logger.log(25, "VM name : {}   VM status : {} ".
                             format(status[0], status[1]))
@@ -2,10 +2,10 @@ import os
 import re
 import sys
 
-import yaml
-import socket
 import ipaddress
 
+import ip_utils
+import yaml_io
 import service_utils
 import logger_utils
 from servicelab import settings
@@ -29,7 +29,7 @@ def open_yaml(filename):
     """
     try:
         with open(filename, 'r') as stream:
-            return yaml.load(stream)
+            return yaml_io.load(stream)
     except IOError:
         slab_logger.error('Unable to open %s' % filename)
         return 1
@@ -60,16 +60,15 @@ def write_file(yaml_data, output_file):
         return 1
     # default_flow_style=False breaks lists into individual lines with leading '-'
     with open(output_file, 'w') as outfile:
-        outfile.write(yaml.dump(yaml_data, default_flow_style=False))
+        outfile.write(yaml_io.dump(yaml_data))
     slab_logger.log(25, output_file)
     slab_logger.log(25, 'File created successfully')
     slab_logger.debug('%s created succesfully' % output_file)
 
 
 def find_vlan(source_data):
-    """Determines which vlan the IP belongs to from the env data.  Generates a list of all
-       IPs for each vlan found within the dictionary provided, then checks if the supplied
-       IP is in the list.
+    """Determines which vlan the IP belongs to from the env data.  Checks if the supplied
+       IP is one of the host IPs of each vlan found within the dictionary provided.
 
     Args:
        source_data {dict}: Keys needed:
@@ -89,8 +88,9 @@ def find_vlan(source_data):
         # Regex search for all keys that are only numbers
         if re.search('^\d+$', key):
             subnet = ipaddress.IPv4Network(unicode(source_data[key]))
-            subnet_ips = list(subnet.hosts())
-            if my_ip in subnet_ips:
+            # Note: the hosts of the subnet, without building the list of them
+            if my_ip in subnet and my_ip not in (subnet.network_address,
+                                                 subnet.broadcast_address):
                 return key
 
     slab_logger.error('Unable to find the vlan for %s within %s'
@@ -150,52 +150,40 @@ def find_ip(env_path, vlan):
     Example Usage:
         find_ip('<environments path>, ipaddress.IPv4Network(unicode(10.11.12.0/24))
     """
-    slab_logger.log(15, 'Finding next available IP in vlan %s' % vlan)
-    # Create list of ipaddress module objects of all valid IPs in the subnet
-    all_ips = list(vlan.hosts())
-    # Remove the first 4 IPs.  They *should* be reserved in AM anyway.
-    del all_ips[0:4]
+    returncode, ips = find_ips(env_path, vlan)
+    if returncode > 0:
+        return(1, '')
+    return(0, ips[0])
 
+
+def find_ips(env_path, vlan, count=1):
+    """Finds the first count unassigned IPs in the selected vlan.  The IPs of all host.yamls
+       in the service cloud environments subdirs are marked used in a bitset of the vlan,
+       then the free ones are looked up in reverse DNS a batch at a time.
+
+    Args:
+       env_path {str}: path to service cloud env - ccs-data/sites/sc/environments
+       vlan {obj}: ipaddress object of vlan subnet data
+       count {int}: Number of IPs to reserve
+
+    Returns:
+       returncode {int}: 0 for success, 1 if fewer than count IPs are free
+       ips {list}: The unused / unassigned IPs from vlan, in order
+
+    Example Usage:
+        find_ips('<environments path>, ipaddress.IPv4Network(unicode(10.11.12.0/22)), 3)
+    """
+    slab_logger.log(15, 'Finding next %i available IPs in vlan %s' % (count, vlan))
     # check if path exists if not exist
     if not os.path.exists(env_path):
         slab_logger.info('The ccs-data repo was not found.  Cloning it now.')
         returncode = service_utils.sync_service(ctx.path, 'master', ctx.username, 'ccs-data')
         if not returncode:
-            return(1, '')
-    # Find all the envs within the site
-    for env in os.listdir(env_path):
-        hosts_path = os.path.join(env_path, env, 'hosts.d')
-        # Find all the hosts within the env
-        files = os.listdir(hosts_path)
-        for f in files:
-            hostfile = os.path.join(hosts_path, f)
-            host_data = open_yaml(hostfile)
-            if 'interfaces' in host_data:
-                # Not all interface names are created equally
-                for interface in host_data['interfaces']:
-                    try:
-                        # Not all interfaces have an ip_address
-                        if 'ip_address' in host_data['interfaces'][interface]:
-                            addy = unicode(
-                                host_data['interfaces'][interface]['ip_address'])
-                            # Turn IP into ipaddress module object for list search
-                            ipaddy = ipaddress.IPv4Address(addy)
-                            if ipaddy in all_ips:
-                                all_ips.remove(ipaddy)
-                    except TypeError:
-                        slab_logger.debug('%s did not contain any data for interface %s'
-                                          % (hostfile, interface))
-                    except ipaddress.AddressValueError:
-                        tcvm_logger.info('Bad address found in %s' % hostfile)
-    for ip in all_ips:
-        try:
-            # Host lookup by ip address
-            socket.gethostbyaddr(str(ip))
-        # socket.herror means there was no DNS reservation found
-        except socket.herror:
-            slab_logger.debug('Using IP %s' % str(ip))
-            return(0, str(ip))
-    return(1, '')
+            return(1, [])
+    # Find all the hosts within all the envs of the site.  The ccs-data index only
+    # re-parses the host yamls that changed since the last run.
+    pool = ip_utils.site_pool(env_path, vlan, ctx.path)
+    return ip_utils.allocate(pool, count, ip_utils.ReverseDns(ctx.path))
 
 
 def create_vm(
@@ -0,0 +1,286 @@
+"""
+Concurrent, dependency ordered teardown of Openstack networking and VMs
+
+A TeardownPlan is a graph of deletions built from one listing of the tenant.
+Router interfaces and ports go before the subnets they use, subnets and ports
+before their network, and interfaces before their router.  Deletions whose
+dependencies are done run at once on a bounded pool of threads.  A deletion
+neutron refuses with 409 Conflict is retried with a growing delay, and one that
+finds its resource gone counts as done.  Every deletion's latency is kept for
+the report.
+"""
+import time
+import Queue
+import collections
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.teardown')
+
+# Note: Deletions running at once.
+TEARDOWN_WORKERS = 8
+
+# Note: A deletion refused with a conflict is tried again this many times, after
+#       CONFLICT_DELAY seconds, doubling every time.
+CONFLICT_RETRIES = 5
+CONFLICT_DELAY = 0.5
+
+DONE = 'done'
+GONE = 'gone'
+CONFLICT = 'conflict'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def status_code(error):
+    """
+    Returns the http status of a neutronclient exception, None for others.
+    """
+    return getattr(error, 'status_code', None)
+
+
+class Step(object):
+    """
+    One deletion of a TeardownPlan.
+
+    Attributes:
+        key (str): Identifies the step, e.g. subnet:<id>
+        description (str): What is deleted, for the log
+        action (function): Deletes it
+        after (list): Keys of the steps that must be done first
+        state (str): None until it ran, then done, gone, conflict, failed or skipped
+        attempts (int): Times action was called
+        elapsed (float): Seconds of the last attempt
+        error (Exception): Why it failed
+    """
+
+    def __init__(self, key, description, action, after=()):
+        self.key = key
+        self.description = description
+        self.action = action
+        self.after = list(after)
+        self.state = None
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.error = None
+        self.due = 0
+
+
+class TeardownPlan(object):
+    """
+    Deletions and the order they must run in.
+
+    Attributes:
+        steps (OrderedDict): The steps by key, in the order they were added
+        elapsed (float): Seconds the last run took
+
+    Example Usage:
+        >>> plan = network_plan(slab.neutron, slab.snapshot, networks, routers)
+        >>> returncode = plan.run()
+        >>> plan.report()
+    """
+
+    def __init__(self):
+        self.steps = collections.OrderedDict()
+        self.elapsed = 0.0
+
+    def add(self, key, description, action, after=()):
+        """Add a deletion.
+
+        Args:
+            key (str): Identifies the step
+            description (str): What is deleted
+            action (function): Called without arguments to delete it
+            after (list): Keys of the steps it waits for, keys not in the plan
+                          when it runs are ignored
+        """
+        self.steps[key] = Step(key, description, action, after)
+
+    def _attempt(self, step):
+        step.attempts += 1
+        start = time.time()
+        try:
+            step.action()
+            step.state = DONE
+        except Exception as error:
+            if status_code(error) == 404:
+                step.state = GONE
+            elif status_code(error) == 409:
+                step.state = CONFLICT
+            else:
+                step.state = FAILED
+            step.error = error
+        step.elapsed = time.time() - start
+        return step
+
+    def run(self, workers=TEARDOWN_WORKERS, retries=CONFLICT_RETRIES, delay=CONFLICT_DELAY):
+        """Run the deletions, each once the steps it waits for are done.
+
+        A step whose dependency failed is skipped.
+
+        Args:
+            workers (int): Deletions running at once
+            retries (int): Times a deletion refused with a conflict is retried
+            delay (float): Seconds before the first retry, doubling after that
+
+        Returns:
+            Returncode (int):
+                0 - Success
+                1 - Failure, some steps failed or were skipped
+        """
+        start = time.time()
+        pending = collections.OrderedDict(self.steps)
+        finished = set()
+        failed = set()
+        results = Queue.Queue()
+        running = 0
+        pool = ThreadPool(max(1, workers))
+        try:
+            while pending or running:
+                now = time.time()
+                for key, step in pending.items():
+                    after = [dep for dep in step.after if dep in self.steps]
+                    if any(dep in failed for dep in after):
+                        step.state = SKIPPED
+                        failed.add(key)
+                        del pending[key]
+                    elif step.due <= now and all(dep in finished for dep in after):
+                        del pending[key]
+                        running += 1
+                        pool.apply_async(self._attempt, (step,), callback=results.put)
+                if not running:
+                    due = [step.due for step in pending.values() if step.due > now]
+                    if due:
+                        time.sleep(min(due) - now)
+                        continue
+                    # Note: Nothing runs and nothing waits for a retry, what is
+                    #       left waits for itself.
+                    for key, step in pending.items():
+                        slab_logger.error('Unable to order the deletion of %s'
+                                          % step.description)
+                        step.state = SKIPPED
+                        failed.add(key)
+                    pending.clear()
+                    continue
+                due = [step.due for step in pending.values() if step.due > now]
+                try:
+                    step = results.get(timeout=max(0, min(due) - now) if due else None)
+                except Queue.Empty:
+                    continue
+                running -= 1
+                if step.state in (DONE, GONE):
+                    slab_logger.log(15, 'Deleted %s in %.2fs'
+                                    % (step.description, step.elapsed))
+                    finished.add(step.key)
+                elif step.state == CONFLICT and step.attempts <= retries:
+                    slab_logger.debug('%s is still in use, retrying' % step.description)
+                    step.due = time.time() + delay * 2 ** (step.attempts - 1)
+                    pending[step.key] = step
+                else:
+                    slab_logger.error('Unable to delete %s: %s' % (step.description,
+                                                                   step.error))
+                    failed.add(step.key)
+        finally:
+            pool.close()
+            pool.join()
+        self.elapsed = time.time() - start
+        return 1 if failed else 0
+
+    def report(self):
+        """Log the latency of every deletion, slowest first, and a summary.
+
+        Returns:
+            lines (list): The report
+        """
+        lines = []
+        steps = sorted(self.steps.values(), key=lambda step: step.elapsed, reverse=True)
+        for step in steps:
+            lines.append('%-8s %6.2fs %i attempt(s)  %s'
+                         % (step.state, step.elapsed, step.attempts, step.description))
+        deleted = len([step for step in steps if step.state in (DONE, GONE)])
+        lines.append('Deleted %i of %i in %.2fs' % (deleted, len(steps), self.elapsed))
+        for line in lines[:-1]:
+            slab_logger.log(15, line)
+        slab_logger.log(25, lines[-1])
+        return lines
+
+
+def network_plan(neutron, snapshot, networks, routers=()):
+    """Plan the deletion of networks with everything on them, and of routers.
+
+    DHCP ports are left to neutron, which deletes them with their subnet.  A
+    router with interfaces on networks that are not deleted is left alone.
+
+    Args:
+        neutron (neutronclient.v2_0.client.Client): The connected client
+        snapshot (openstack_utils.NeutronSnapshot): The tenant's resources
+        networks (list): The networks to delete
+        routers (list): The routers to delete
+
+    Returns:
+        TeardownPlan object
+    """
+    plan = TeardownPlan()
+    net_ids = set(network['id'] for network in networks)
+    ports = [port for port in snapshot.items('ports') if port['network_id'] in net_ids]
+    subnets = [subnet for subnet in snapshot.items('subnets')
+               if subnet['network_id'] in net_ids]
+    names = dict((router['id'], router['name']) for router in snapshot.items('routers'))
+
+    for port in ports:
+        if port.get('device_owner') == 'network:router_interface':
+            plan.add('port:' + port['id'], 'interface of router %s on %s' % (
+                names.get(port['device_id'], port['device_id']),
+                port['fixed_ips'][0]['subnet_id'] if port['fixed_ips'] else port['id']),
+                partial(neutron.remove_interface_router, port['device_id'],
+                        {'port_id': port['id']}))
+        elif port.get('device_owner') != 'network:dhcp':
+            plan.add('port:' + port['id'], 'port %s' % port['id'],
+                     partial(neutron.delete_port, port['id']))
+
+    for subnet in subnets:
+        users = [port for port in ports
+                 if subnet['id'] in [ip['subnet_id'] for ip in port['fixed_ips']]]
+        plan.add('subnet:' + subnet['id'], 'subnet %s' % subnet['name'],
+                 partial(neutron.delete_subnet, subnet['id']),
+                 ['port:' + port['id'] for port in users])
+
+    for network in networks:
+        after = ['subnet:' + subnet['id'] for subnet in subnets
+                 if subnet['network_id'] == network['id']]
+        after += ['port:' + port['id'] for port in ports
+                  if port['network_id'] == network['id']]
+        plan.add('network:' + network['id'], 'network %s' % network['name'],
+                 partial(neutron.delete_network, network['id']), after)
+
+    for router in routers:
+        interfaces = [port for port in snapshot.items('ports')
+                      if port.get('device_owner') == 'network:router_interface' and
+                      port['device_id'] == router['id']]
+        if [port for port in interfaces if port['network_id'] not in net_ids]:
+            slab_logger.log(25, 'Keeping router %s, it has interfaces on networks '
+                            'that are kept' % router['name'])
+            continue
+        plan.add('router:' + router['id'], 'router %s' % router['name'],
+                 partial(neutron.delete_router, router['id']),
+                 ['port:' + port['id'] for port in interfaces])
+    return plan
+
+
+def vm_plan(vagrant, names):
+    """Plan the destruction of VMs, which do not depend on each other.
+
+    Args:
+        vagrant (vagrant.Vagrant): The Vagrant environment of the VMs
+        names (list): The VMs
+
+    Returns:
+        TeardownPlan object
+    """
+    plan = TeardownPlan()
+    for name in names:
+        plan.add('vm:' + name, 'VM %s' % name, partial(vagrant.destroy, name))
+    return plan
@@ -0,0 +1,365 @@
+"""
+Streamed uploads of artifacts to Artifactory and rpms to Pulp
+
+Files are read from disk in chunks and never held in memory as a whole.
+Artifactory uploads first try a checksum deploy, which makes uploading an
+artifact Artifactory already has a single empty request.  Pulp uploads go
+through its upload request api, sending the segments of all files on a shared
+thread pool.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+import http_utils
+import logger_utils
+from servicelab import settings
+
+slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.upload')
+
+CHUNK_SIZE = 1024 * 1024
+
+# Note: Size of the pieces a file is sent to pulp in.  At most one segment per
+#       worker is in memory at a time.
+SEGMENT_SIZE = 4 * 1024 * 1024
+
+PULP_UPLOADS = '/pulp/api/v2/content/uploads/'
+PULP_TASKS = '/pulp/api/v2/tasks/'
+
+# Note: Imports and publishes are pulp tasks running after the request returned.
+#       Their state is polled every TASK_POLL seconds, for at most TASK_TIMEOUT.
+TASK_POLL = 0.5
+TASK_TIMEOUT = 600
+TASK_DONE = ('finished', 'skipped')
+TASK_FINAL = TASK_DONE + ('error', 'canceled')
+
+
+def _map(function, items, workers):
+    """
+    Run function over items on a thread pool, returning the results in order.
+    """
+    if not items:
+        return []
+    pool = ThreadPool(max(1, min(workers, len(items))))
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def file_checksums(filepath):
+    """Compute the checksums Artifactory knows artifacts by, reading the file once.
+
+    Args:
+        filepath (str): File to checksum
+
+    Returns:
+        checksums (dict): Hex digests by name, md5, sha1 and sha256
+    """
+    hashers = dict((name, hashlib.new(name)) for name in ('md5', 'sha1', 'sha256'))
+    with open(filepath, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    return dict((name, hasher.hexdigest()) for name, hasher in hashers.items())
+
+
+def artifactory_target(url, filepath, several=False):
+    """Where a file is deployed to.  url is the full path of the artifact unless
+       it ends with a / or several files are uploaded to it, then it is the folder.
+
+    Args:
+        url (str): The url given on the command line
+        filepath (str): The file to upload
+        several (bool): Several files are uploaded to url
+
+    Returns:
+        The url of the artifact (str)
+    """
+    if several or url.endswith('/'):
+        return url.rstrip('/') + '/' + os.path.basename(filepath)
+    return url
+
+
+def artifactory_upload(filepath, url, auth=None, verify=True, session=None):
+    """Deploy a file to Artifactory.
+
+    A checksum deploy is tried first.  If Artifactory does not know the content
+    yet the file is streamed, with its checksums for Artifactory to verify.
+
+    Args:
+        filepath (str): The file to upload
+        url (str): The url of the artifact
+        auth (tuple or object): Passed as auth to requests
+        verify (bool): Verify the server's certificate
+        session (requests.Session): Session to use, a new one if None
+
+    Returns:
+        returncode (int):
+            0 -- Success
+            1 -- Failure
+        message (str): What happened
+
+    Example Usage:
+        >>> print artifactory_upload('foo.tgz', 'https://host/artifactory/repo/foo.tgz',
+        ...                          ('user', 'password'))
+        (0, 'Deployed foo.tgz by checksum')
+    """
+    session = session or http_utils.make_session(1)
+    name = os.path.basename(filepath)
+    try:
+        checksums = file_checksums(filepath)
+        headers = {'X-Checksum-Sha1': checksums['sha1'],
+                   'X-Checksum-Sha256': checksums['sha256'],
+                   'X-Checksum': checksums['md5']}
+        deploy = dict(headers, **{'X-Checksum-Deploy': 'true'})
+        res = session.put(url, auth=auth, verify=verify, headers=deploy, data='')
+        if res.ok:
+            return 0, 'Deployed %s by checksum' % name
+        if res.status_code != 404:
+            return 1, 'Error %i uploading %s: %s' % (res.status_code, name, res.text)
+        headers['Content-Length'] = str(os.path.getsize(filepath))
+        with open(filepath, 'rb') as stream:
+            res = session.put(url, auth=auth, verify=verify, headers=headers,
+                              data=stream)
+    except (requests.exceptions.RequestException, IOError) as error:
+        return 1, 'Unable to upload %s: %s' % (name, error)
+    if not res.ok:
+        return 1, 'Error %i uploading %s: %s' % (res.status_code, name, res.text)
+    return 0, 'Uploaded %s' % name
+
+
+def artifactory_upload_files(filepaths, url, auth=None, verify=True, workers=4):
+    """Deploy several files to Artifactory concurrently, see artifactory_upload.
+
+    Args:
+        filepaths (list): The files to upload
+        url (str): The url of the artifact, or the folder for several files
+        auth (tuple or object): Passed as auth to requests
+        verify (bool): Verify the server's certificate
+        workers (int): Maximum number of uploads running at once
+
+    Returns:
+        returncode (int):
+            0 -- Success, every file was deployed
+            1 -- Failure, at least one upload failed
+        results (list): (filepath, returncode, message) in the order of filepaths
+    """
+    session = http_utils.make_session(workers)
+    several = len(filepaths) > 1
+
+    def upload(filepath):
+        target = artifactory_target(url, filepath, several)
+        returncode, message = artifactory_upload(filepath, target, auth, verify, session)
+        return filepath, returncode, message
+
+    try:
+        results = _map(upload, filepaths, workers)
+    finally:
+        session.close()
+    for _, returncode, message in results:
+        if returncode == 0:
+            slab_logger.log(25, message)
+        else:
+            slab_logger.error(message)
+    return (1 if any(result[1] for result in results) else 0), results
+
+
+def file_segments(filepath, segment_size=SEGMENT_SIZE):
+    """Returns the (offset, length) of the segments of a file.
+
+    Args:
+        filepath (str): The file
+        segment_size (int): Size of every segment but the last
+
+    Returns:
+        segments (list): (offset, length) tuples, one empty segment for an
+                         empty file
+    """
+    size = os.path.getsize(filepath)
+    return [(offset, min(segment_size, size - offset))
+            for offset in range(0, size, segment_size)] or [(0, 0)]
+
+
+class PulpUploader(object):
+    """
+    Uploads rpms into a pulp repository.
+
+    Every file gets an upload request, the segments of all files are sent on a
+    thread pool, then the files are imported and the repository published once.
+    Imports and the publish are asynchronous in pulp, their tasks are waited for
+    before the next step, and an upload request is only deleted once the import
+    reading it is over.
+
+    Attributes:
+        base_url (str): The pulp server, e.g. https://pulp.example.com
+        auth (tuple or object): Passed as auth to requests
+        verify (bool): Verify the server's certificate
+        workers (int): Maximum number of segments sent at once
+        segment_size (int): Size of the segments
+        poll (float): Seconds between two checks of a pulp task
+        timeout (float): Seconds to wait for a pulp task
+
+    Example Usage:
+        >>> uploader = PulpUploader(ip_address, (username, password))
+        >>> returncode, results = uploader.upload('CentOS-7-x86_64', ['foo.rpm'])
+    """
+
+    def __init__(self, base_url, auth=None, verify=False, workers=4,
+                 segment_size=SEGMENT_SIZE, poll=TASK_POLL, timeout=TASK_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.auth = auth
+        self.verify = verify
+        self.workers = max(1, workers)
+        self.segment_size = segment_size
+        self.poll = poll
+        self.timeout = timeout
+        self.session = http_utils.make_session(self.workers)
+        self._lock = threading.Lock()
+        self._sent = 0
+
+    def _request(self, method, path, **kwargs):
+        res = self.session.request(method, self.base_url + path, auth=self.auth,
+                                   verify=self.verify, **kwargs)
+        if not res.ok:
+            raise requests.exceptions.HTTPError('Error %i from %s: %s'
+                                                % (res.status_code, path, res.text),
+                                                response=res)
+        return res
+
+    def _post(self, path, payload):
+        return self._request('POST', path, data=json.dumps(payload),
+                             headers={'Accept': 'application/json',
+                                      'Content-Type': 'application/json'}).json()
+
+    def _wait_tasks(self, response):
+        """
+        Waits for the tasks a pulp call spawned.
+
+        Returns:
+            over (bool): False if a task was still running at the timeout
+            error (str): None if every task finished, else why not
+        """
+        tasks = [task['task_id'] for task in response.get('spawned_tasks') or []]
+        deadline = time.time() + self.timeout
+        for task_id in tasks:
+            while True:
+                task = self._request('GET', '%s%s/' % (PULP_TASKS, task_id)).json()
+                if task.get('state') in TASK_FINAL:
+                    break
+                if time.time() > deadline:
+                    return False, ('Task %s still %s after %gs'
+                                   % (task_id, task.get('state'), self.timeout))
+                time.sleep(self.poll)
+            if task['state'] not in TASK_DONE:
+                error = task.get('error') or {}
+                return True, 'Task %s %s: %s' % (task_id, task['state'],
+                                                 error.get('description', error))
+        return True, None
+
+    def _send_segment(self, segment):
+        filepath, upload_id, offset, length = segment
+        with open(filepath, 'rb') as stream:
+            stream.seek(offset)
+            data = stream.read(length)
+        try:
+            self._request('PUT', '%s%s/%i/' % (PULP_UPLOADS, upload_id, offset),
+                          data=data, headers={'Content-Type': 'application/octet-stream'})
+        except requests.exceptions.RequestException as error:
+            return filepath, str(error)
+        with self._lock:
+            self._sent += length
+        return filepath, None
+
+    def upload(self, pulp_repo, filepaths, publish=True):
+        """Upload rpms into a repository.
+
+        Args:
+            pulp_repo (str): The pulp repo id
+            filepaths (list): The rpms to upload
+            publish (bool): Publish the repository after importing the rpms
+
+        Returns:
+            returncode (int):
+                0 -- Success, every rpm was imported
+                1 -- Failure
+            results (list): (filepath, error or None) in the order of filepaths
+        """
+        errors = dict((filepath, None) for filepath in filepaths)
+        upload_ids = {}
+        running = set()
+        try:
+            for filepath in filepaths:
+                upload_ids[filepath] = self._post(PULP_UPLOADS, {})['upload_id']
+                slab_logger.log(15, 'Got upload id %s for %s'
+                                % (upload_ids[filepath], filepath))
+            segments = [(filepath, upload_ids[filepath], offset, length)
+                        for filepath in filepaths
+                        for offset, length in file_segments(filepath, self.segment_size)]
+            for filepath, error in _map(self._send_segment, segments, self.workers):
+                if error and not errors[filepath]:
+                    errors[filepath] = error
+            imports = {}
+            for filepath in filepaths:
+                if errors[filepath]:
+                    continue
+                slab_logger.log(25, 'Importing %s' % os.path.basename(filepath))
+                try:
+                    imports[filepath] = self._post(
+                        '/pulp/api/v2/repositories/%s/actions/import_upload/' % pulp_repo,
+                        {'override_config': {}, 'unit_type_id': 'rpm',
+                         'upload_id': upload_ids[filepath], 'unit_key': {},
+                         'unit_metadata': {'checksum_type': None}})
+                    # Note: the import task reads the upload, keep it until it is over
+                    running.add(filepath)
+                except requests.exceptions.RequestException as error:
+                    errors[filepath] = str(error)
+            for filepath in filepaths:
+                if filepath in imports:
+                    over, errors[filepath] = self._wait_tasks(imports[filepath])
+                    if over:
+                        running.discard(filepath)
+            imported = [filepath for filepath in filepaths
+                        if filepath in imports and not errors[filepath]]
+            if publish and imported:
+                slab_logger.log(25, 'Publishing %s' % pulp_repo)
+                _, error = self._wait_tasks(self._post(
+                    '/pulp/api/v2/repositories/%s/actions/publish/' % pulp_repo,
+                    {'override_config': {}, 'id': 'yum_distributor'}))
+                for filepath in imported:
+                    errors[filepath] = error and 'Publish failed: ' + error
+        except (requests.exceptions.RequestException, IOError, OSError,
+                ValueError, KeyError) as error:
+            for filepath in filepaths:
+                errors[filepath] = errors[filepath] or str(error)
+        finally:
+            for filepath, upload_id in upload_ids.items():
+                if filepath in running:
+                    slab_logger.debug('Keeping upload request %s of a running import'
+                                      % upload_id)
+                    continue
+                try:
+                    self._request('DELETE', '%s%s/' % (PULP_UPLOADS, upload_id))
+                except requests.exceptions.RequestException:
+                    slab_logger.debug('Unable to delete upload request %s' % upload_id)
+        results = [(filepath, errors[filepath]) for filepath in filepaths]
+        for filepath, error in results:
+            if error:
+                slab_logger.error('Unable to upload %s: %s' % (filepath, error))
+        return (1 if any(error for _, error in results) else 0), results
+
+    @property
+    def sent(self):
+        """
+        Bytes of segments sent so far.
+        """
+        return self._sent
+
+    def close(self):
+        self.session.close()
@@ -2,14 +2,11 @@
 Utility functions for vagrant related tasks.
 """
 import os
+import collections
 from subprocess import CalledProcessError
 
-import vagrant
-import virtualbox
-from fabric.api import env, task
-from fabric.contrib.files import sed
-
 import yaml_utils
+import cache_utils
 import service_utils
 import vagrantfile_utils
 import logger_utils
@@ -17,6 +14,17 @@ from servicelab import settings
 
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.vagrant')
 
+REQUIRED_PLUGINS = ["vagrant-hostmanager", "vagrant-openstack-provider"]
+PLUGIN_FILE = 'vagrant_plugins.json'
+
+# Note: Commands after which the states vagrant status reported are stale.
+STATE_CHANGES = ('up', 'destroy', 'halt', 'reload', 'provision', 'resume', 'suspend')
+
+# Note: Vagrant's names for the VirtualBox machine states, see VBOX_STATES in
+#       vagrant's plugins/providers/virtualbox/driver.
+VBOX_STATES = {'PoweredOff': 'poweroff', 'Saved': 'saved', 'Aborted': 'aborted',
+               'Running': 'running', 'Paused': 'paused', 'Stuck': 'gurumeditation'}
+
 
 class Connect_to_vagrant(object):
     """Vagrant class for booting, provisioning and managing a virtual machine."""
@@ -52,11 +60,17 @@ class Connect_to_vagrant(object):
         # Note: The quiet is so we know what's happening during
         #       vagrant commands in the term.
         # Note: Setup vagrant client.
+        import vagrant
+
         vagrant_dir = path
         self.v = vagrant.Vagrant(
             root=vagrant_dir,
             quiet_stdout=False,
             quiet_stderr=False)
+        # Note: Commands changing the state of the VMs drop the states read for
+        #       this directory.
+        for command in STATE_CHANGES:
+            setattr(self.v, command, _forgetting(getattr(self.v, command), path))
 
         # check for installed plugins
 
@@ -66,11 +80,227 @@ class Connect_to_vagrant(object):
         # as we may have to exec over the running  process
         # please see stack discussion
         # http://stackoverflow.com/questions/19492738/demand-a-vagrant-plugin-within-the-vagrantfile
-        req_lst = ["vagrant-hostmanager", "vagrant-openstack-provider"]
-        plugin_lst = self.v.plugin_list()
-        for plugin in req_lst:
-            if plugin not in plugin_lst:
-                service_utils.run_this('vagrant plugin install {}'.format(plugin))
+        ensure_plugins(self.v, path)
+
+
+def _forgetting(command, path):
+    def run(*args, **kwargs):
+        try:
+            return command(*args, **kwargs)
+        finally:
+            forget_statuses(path)
+    return run
+
+
+def _stack_dir(path):
+    """
+    Returns the .stack directory path is in, path itself if it is in none.
+    """
+    parent = os.path.abspath(path)
+    while os.path.basename(parent) != '.stack':
+        if os.path.dirname(parent) == parent:
+            return path
+        parent = os.path.dirname(parent)
+    return parent
+
+
+def _vagrant_stamp():
+    """
+    Identifies the installed vagrant and its plugins without running vagrant: the
+    executable with its mtime and the mtime of the plugins.json vagrant keeps.
+    """
+    from vagrant import get_vagrant_executable
+
+    stamp = []
+    vagrant_home = os.environ.get('VAGRANT_HOME', os.path.expanduser('~/.vagrant.d'))
+    for fname in (get_vagrant_executable(), os.path.join(vagrant_home, 'plugins.json')):
+        try:
+            fname = os.path.realpath(fname)
+            stamp.append([fname, os.stat(fname).st_mtime])
+        except (AttributeError, OSError):
+            stamp.append([fname, None])
+    return stamp
+
+
+_plugins_checked = set()
+
+
+def ensure_plugins(v, path):
+    """Install the vagrant plugins Servicelab needs that are missing.
+
+    The plugins vagrant has are cached in .stack/cache along with its version.
+    They are listed again only when vagrant or its plugins.json changed, and at
+    most once per command.
+
+    Args:
+        v (vagrant.Vagrant): The vagrant environment
+        path (str): The working .stack directory or a directory below it
+
+    Returns:
+        plugins (list): Names of the installed plugins
+    """
+    stamp = _vagrant_stamp()
+    fname = os.path.join(cache_utils.get_cache_dir(_stack_dir(path)), PLUGIN_FILE)
+    _, cached = cache_utils.read_stamped(fname)
+    if cached and cached.get('stamp') == stamp and \
+            set(REQUIRED_PLUGINS) <= set(cached['plugins']):
+        return cached['plugins']
+    key = repr(stamp)
+    if key in _plugins_checked:
+        return REQUIRED_PLUGINS
+    _plugins_checked.add(key)
+
+    slab_logger.log(15, 'Checking the installed vagrant plugins')
+    version = v.version()
+    plugins = [plugin.name for plugin in v.plugin_list()]
+    for plugin in REQUIRED_PLUGINS:
+        if plugin not in plugins:
+            if service_utils.run_this('vagrant plugin install {}'.format(plugin))[0] == 0:
+                plugins.append(plugin)
+    if set(REQUIRED_PLUGINS) <= set(plugins):
+        try:
+            cache_utils.write_stamped(fname, {'stamp': _vagrant_stamp(), 'version': version,
+                                              'plugins': plugins})
+        except (IOError, OSError) as error:
+            slab_logger.debug('Unable to cache the vagrant plugins: %s' % error)
+    return plugins
+
+
+class StatusEngine(object):
+    """
+    States of the machines of one vagrant project directory, read once per command.
+
+    All states come from a single vagrant status --machine-readable.  With
+    settings.vbox_fast_path, the state of a single VirtualBox machine vagrant
+    created is read from VirtualBox through the virtualbox bindings instead,
+    without running vagrant at all.
+
+    Attributes:
+        path (str): The directory of the Vagrantfile
+
+    Example Usage:
+        >>> engine = get_status_engine(ctx.path)
+        >>> engine.get('infra-001')
+        Status(name='infra-001', state='running', provider='virtualbox')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._statuses = None
+        self._fast = {}
+
+    def all(self):
+        """Returns the states of all machines in the Vagrantfile.
+
+        Returns:
+            statuses (OrderedDict): vagrant.Status by machine name
+
+        Raises:
+            CalledProcessError: vagrant status failed, e.g. there is no Vagrantfile
+        """
+        if self._statuses is None:
+            slab_logger.log(15, 'Reading the state of the VMs in %s' % self.path)
+            statuses = Connect_to_vagrant(vm_name=None, path=self.path).v.status()
+            self._statuses = collections.OrderedDict((status.name, status)
+                                                     for status in statuses)
+        return self._statuses
+
+    def get(self, name):
+        """Returns the state of a machine, None if the Vagrantfile has none by that name.
+
+        Raises:
+            CalledProcessError: vagrant status failed, e.g. there is no Vagrantfile
+        """
+        if self._statuses is None and settings.vbox_fast_path:
+            if name not in self._fast:
+                self._fast[name] = _vbox_status(self.path, name)
+            if self._fast[name]:
+                return self._fast[name]
+        return self.all().get(name)
+
+    def forget(self):
+        """
+        Drop the states read, they are read again on the next use.
+        """
+        self._statuses = None
+        self._fast = {}
+
+
+_vbox = []
+
+
+def _vbox_status(path, name):
+    """
+    Returns the state of a VirtualBox machine vagrant created as a vagrant.Status,
+    None if it has to be asked from vagrant.
+    """
+    import vagrant
+
+    id_file = os.path.join(path, '.vagrant', 'machines', name, 'virtualbox', 'id')
+    if not os.path.isfile(id_file):
+        return None
+    if not _vbox:
+        try:
+            import virtualbox
+            _vbox.append(virtualbox.VirtualBox())
+        except Exception as error:
+            slab_logger.debug('Unable to reach VirtualBox, asking vagrant: %s' % error)
+            _vbox.append(None)
+    if _vbox[0] is None:
+        return None
+    try:
+        with open(id_file) as id_stream:
+            machine = _vbox[0].find_machine(id_stream.read().strip())
+        state = VBOX_STATES.get(str(machine.state))
+    except Exception as error:
+        slab_logger.debug('VirtualBox has no machine %s, asking vagrant: %s'
+                          % (name, error))
+        return None
+    return state and vagrant.Status(name=name, state=state, provider='virtualbox')
+
+
+_engines = {}
+
+
+def get_status_engine(path):
+    """Returns the StatusEngine for the Vagrantfile in path, shared by everything in
+       this command.
+
+    Args:
+        path (str): The directory of the Vagrantfile, typically ctx.path
+
+    Returns:
+        StatusEngine object
+    """
+    key = os.path.realpath(path)
+    if key not in _engines:
+        _engines[key] = StatusEngine(path)
+    return _engines[key]
+
+
+def vm_statuses(path):
+    """Returns the states of all machines in the Vagrantfile in path.
+
+    Args:
+        path (str): The directory of the Vagrantfile, typically ctx.path
+
+    Returns:
+        statuses (list): vagrant.Status of every machine, e.g.
+            [Status(name='infra-001', state='running', provider='virtualbox')]
+
+    Raises:
+        CalledProcessError: vagrant status failed, e.g. there is no Vagrantfile
+    """
+    return get_status_engine(path).all().values()
+
+
+def forget_statuses(path=None):
+    """
+    Drop the states read for path, or for all directories if path is None.
+    """
+    for key, engine in _engines.items():
+        if path is None or key == os.path.realpath(path):
+            engine.forget()
 
 
 def vm_isrunning(hostname, path):
@@ -107,31 +337,32 @@ def vm_isrunning(hostname, path):
 
     '''
     slab_logger.log(15, 'Determining the running state of %s' % hostname)
-    vm_connection = Connect_to_vagrant(vm_name=hostname,
-                                       path=path)
     try:
-        status = vm_connection.v.status(vm_name=hostname)
-        # Note: local vbox value: running
-        if status[0][1] == 'running':
-            return 0, False
-        # Note: local vbox value: poweroff
-        elif status[0][1] == 'poweroff':
-            return 1, False
-        # Note: remote OS value: active
-        elif status[0][1] == 'active':
-            return 0, True
-        # Note: remote OS value: shutoff
-        elif status[0][1] == 'shutoff':
-            return 1, True
-        # Note: remote OS value: saved
-        elif status[0][1] == 'saved':
-            return 1, True
-        # Note: remote OS value: un created
-        elif status[0][1] == 'not_created':
-            return 1, False
+        status = get_status_engine(path).get(hostname)
     except CalledProcessError:
         # RFI: is there a better way to return here? raise exception?
         return 2, False
+    if status is None:
+        # Note: vagrant status fails for a machine the Vagrantfile does not have.
+        return 2, False
+    # Note: local vbox value: running
+    if status[1] == 'running':
+        return 0, False
+    # Note: local vbox value: poweroff
+    elif status[1] == 'poweroff':
+        return 1, False
+    # Note: remote OS value: active
+    elif status[1] == 'active':
+        return 0, True
+    # Note: remote OS value: shutoff
+    elif status[1] == 'shutoff':
+        return 1, True
+    # Note: remote OS value: saved
+    elif status[1] == 'saved':
+        return 1, True
+    # Note: remote OS value: un created
+    elif status[1] == 'not_created':
+        return 1, False
     # Note: 3 represent some other state --> suspended, aborted, etc.
     return 3, False
 
@@ -208,7 +439,7 @@ def infra_ensure_up(mynets, float_net, my_security_groups, nfs, path=None):
         infra_connection.vm_name = hostname
         if yaml_utils.addto_inventory(hostname, path) > 0:
             return 1, hostname
-        ispoweron, isremote = vagrant_utils.vm_isrunning(hostname=hostname, path=path)
+        ispoweron, isremote = vm_isrunning(hostname=hostname, path=path)
         if isremote == remote and ispoweron == 0:
             infra_connection.v.reload(hostname)
             return 0, hostname
@@ -266,8 +497,8 @@ def check_vm_is_available(path):
         try:
             if not os.path.isfile(os.path.join(vagrant_folder, "Vagrantfile")):
                 return False
-            v = vagrant.Vagrant(vagrant_folder)
-            return v.status(vm_name)[0].state != 'not_created'
+            status = get_status_engine(vagrant_folder).get(vm_name)
+            return status is not None and status.state != 'not_created'
         except:
             return False
 
@@ -1,20 +1,106 @@
+"""
+In memory model of the Vagrantfile.
+
+A SlabVagrantfile parses the Vagrantfile once into its header and one block per
+cluster.vm.define, keyed by VM name.  Adding or deleting a VM changes the model,
+and save() renders the file from it in one atomic write, skipped when the
+rendered text is the same as the file's.
+"""
 import os
-import yaml
+import re
+import hashlib
+import threading
+from collections import OrderedDict
 
+import yaml_io
+import cache_utils
 import logger_utils
 
 from servicelab import settings
 
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.vagrantfile')
 
+HEADER = """\
+# -*- mode: ruby -*-
+# vi: set ft=ruby :
+VAGRANTFILE_API_VERSION = "2"
+required_plugins = %w( vagrant-hostmanager vagrant-openstack-provider )
+required_plugins.each do |plugin|
+  system "vagrant plugin install #{plugin}" unless
+Vagrant.has_plugin? plugin
+end
+
+#---------------- Setup to pass the envirionment variable -------------------
+
+def get_rcmd(rcmd, variable)
+  if ENV[variable]
+    if rcmd
+      rcmd << "\n"
+    end
+    value = ENV[variable]
+    rcmd = rcmd + "export #{variable}=#{value}"
+  end
+  return rcmd
+end
+
+def get_rcmdlst(rcmd)
+  env_var_cmd = ""
+  if rcmd
+    env_var_cmd = <<CMD
+echo "#{rcmd}" | tee -a /home/vagrant/.bash_profile
+CMD
+  end
+  return env_var_cmd
+end
+
+remote_cmd = ""
+remote_cmd = get_rcmd(remote_cmd, 'HEIGHLINER_DEPLOY_TARGET_HOSTS')
+remote_cmd = get_rcmd(remote_cmd, 'HEIGHLINER_DEPLOY_TAGS')
+remote_cmd = get_rcmd(remote_cmd, 'CCS_ENVIRONMENT')
+env_var_cmd = get_rcmdlst(remote_cmd)
+
+heighliner_script = <<SCRIPT
+#{env_var_cmd}
+SCRIPT
+#---------------- END -------------------------------------------------------
+Vagrant.configure(VAGRANTFILE_API_VERSION) do |cluster|
+"""
+
+CONFIGURE = 'Vagrant.configure('
+DEFINE = re.compile(r'^cluster\.vm\.define "([^"]+)"')
+
+
+def _file_stamp(fname):
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+def _digest(text):
+    return hashlib.sha1(text).hexdigest()
+
 
 class SlabVagrantfile(object):
     """
-    Create and append data to Vagrantfile
+    Create and change the VMs of the Vagrantfile
+
+    The Vagrantfile is parsed on first use and again only if someone else changed
+    it on disk.  add_virtualbox_vm, add_openstack_vm and delete_it replace or drop
+    the block of one VM and write the file at once, unless called with
+    write=False, in which case the change waits for save().
 
     Args:
         path {str}: Path to write or append Vagrantfile
 
+    Attributes:
+        header {str}: Everything up to and including the Vagrant.configure line
+        vms {OrderedDict}: VM name -> its cluster.vm.define block, without the
+                           closing 'end'
+        dirty {bool}: True if there are changes not saved yet
+        writes {int}: Number of times the Vagrantfile was written
+
     Returns:
         Varies per method.  See method docstrings for details
 
@@ -25,6 +111,7 @@ class SlabVagrantfile(object):
 
     def __init__(self, path, remote=False):
         self.path = path
+        self.fname = os.path.join(path, 'Vagrantfile')
         self.set_header = False
         # OS RC file vars
         self.env_vars = {}
@@ -35,116 +122,163 @@ class SlabVagrantfile(object):
         self.default_flavor = '2cpu.4ram.20sas'
         self.default_image = 'slab-RHEL7.1v9'
         self.remote = remote
+        self.header = ''
+        self.vms = OrderedDict()
+        self.dirty = False
+        self.writes = 0
+        self._stamp = None
+        self._digest = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        """
+        Parses the Vagrantfile into the header and VM blocks, unless the model is
+        current.  Unsaved changes are kept even if the file changed on disk.
 
-    def init_vagrantfile(self):
+        Args:
+            None
+
+        Returns:
+            0 -- the Vagrantfile exists and was parsed
+            1 -- the Vagrantfile is missing or unreadable, the model is empty
+
+        Example Usage:
+            my_class_var.load()
         """
-        Creates a new Vagrantfile with the needed header information
+        with self._lock:
+            stamp = _file_stamp(self.fname)
+            if self.dirty or (stamp is not None and stamp == self._stamp):
+                return 0
+            self._stamp = stamp
+            self._digest = None
+            self.header = ''
+            self.vms = OrderedDict()
+            if stamp is None:
+                return 1
+            slab_logger.log(15, 'Loading %s' % self.fname)
+            try:
+                with open(self.fname, 'r') as vfile:
+                    contents = vfile.read()
+            except IOError as error:
+                slab_logger.error('File error: ' + str(error))
+                return 1
+            self._digest = _digest(contents)
+            self._parse(contents)
+            return 0
+
+    def _parse(self, contents):
+        lines = contents.splitlines(True)
+        configure = [index for index, line in enumerate(lines)
+                     if line.startswith(CONFIGURE)]
+        if not configure:
+            if contents.strip():
+                slab_logger.warning('No Vagrant.configure in %s, rewriting its header'
+                                    % self.fname)
+            return
+        self.header = ''.join(lines[:configure[0] + 1])
+        name = None
+        block = []
+        for line in lines[configure[0] + 1:]:
+            if name is not None:
+                if line.rstrip('\r\n') == 'end':
+                    self.vms[name] = ''.join(block)
+                    name = None
+                else:
+                    block.append(line)
+                continue
+            match = DEFINE.match(line)
+            if match:
+                name = match.group(1)
+                block = [line]
+            elif line.strip() and line.strip() != 'end':
+                slab_logger.warning('Dropping a line outside of any VM in %s: %s'
+                                    % (self.fname, line.strip()))
+        if name is not None:
+            self.vms[name] = ''.join(block)
+
+    def render(self):
+        """
+        Renders the Vagrantfile text from the model
 
         Args:
             None
 
         Returns:
-            Nothing, instead a Vagrantfile is written to the class.path directory
+            The Vagrantfile contents {str}.  Without any VM it is only the header,
+            the way init_vagrantfile leaves it.
 
         Example Usage:
-            my_class_var.init_vagrantfile()
+            text = my_class_var.render()
         """
-        slab_logger.log(15, 'Creating new Vagrantfile within servicelab/.stack/')
+        blocks = ''.join(block + 'end\n' for block in self.vms.values())
+        return (self.header or HEADER) + blocks + ('end\n' if self.vms else '\n')
 
-        def _set_header():
-            """
-            Creates the standard headers for Vagrantfile
-
-            Args:
-                None
-
-            Returns:
-                line {str}:  Always the same data
-                line {str}:  Always the same data
-                req_plugin {str}:  Always the same data
-
-            Example Usage:
-                h1, h2, req_plugin = _set_header()
-            """
-            slab_logger.log(15, 'Building header data')
-            line1 = ("# -*- mode: ruby -*-\n"
-                     "# vi: set ft=ruby :\n")
-            line2 = "VAGRANTFILE_API_VERSION = \"2\"\n"
-            req_plugin = ("required_plugins = %w( vagrant-hostmanager ",
-                          "vagrant-openstack-provider )\n",
-                          "required_plugins.each do |plugin|\n",
-                          "  system \"vagrant plugin install #{plugin}\" unless\n",
-                          "Vagrant.has_plugin? plugin\n",
-                          "end\n")
-
-            return line1, line2, req_plugin
-
-        def _beg_vm_config():
-            """
-            Creates vm start data for Vagrantfile
-
-            Args:
-                None
-
-            Returns:
-                startvms {str}:  Always the same data
-
-            Example Usage:
-                startvms = _beg_vm_config()
-            """
-            startvms = "Vagrant.configure(VAGRANTFILE_API_VERSION) do |cluster|\n"
-            return startvms
-
-        def _setup_fn():
-            """
-            Set up the function which can pass the environment variable to the VM
-
-            Returns:
-               fn_lst {str}: Returns a list of function
-            """
-            fn_lst = """
-#---------------- Setup to pass the envirionment variable -------------------
+    def save(self):
+        """
+        Writes the Vagrantfile rendered from the model in one atomic step, unless
+        the file already has that content
 
-def get_rcmd(rcmd, variable)
-  if ENV[variable]
-    if rcmd
-      rcmd << "\n"
-    end
-    value = ENV[variable]
-    rcmd = rcmd + "export #{variable}=#{value}"
-  end
-  return rcmd
-end
+        Args:
+            None
 
-def get_rcmdlst(rcmd)
-  env_var_cmd = ""
-  if rcmd
-    env_var_cmd = <<CMD
-echo "#{rcmd}" | tee -a /home/vagrant/.bash_profile
-CMD
-  end
-  return env_var_cmd
-end
+        Returns:
+            0 -- Success, or nothing to write
+            1 -- Failure
 
-remote_cmd = ""
-remote_cmd = get_rcmd(remote_cmd, 'HEIGHLINER_DEPLOY_TARGET_HOSTS')
-remote_cmd = get_rcmd(remote_cmd, 'HEIGHLINER_DEPLOY_TAGS')
-remote_cmd = get_rcmd(remote_cmd, 'CCS_ENVIRONMENT')
-env_var_cmd = get_rcmdlst(remote_cmd)
+        Example Usage:
+            my_class_var.save()
+        """
+        with self._lock:
+            text = self.render()
+            digest = _digest(text)
+            if digest == self._digest and _file_stamp(self.fname) is not None:
+                slab_logger.log(15, 'Vagrantfile unchanged, not writing it')
+                self.dirty = False
+                return 0
+            slab_logger.log(15, 'Writing Vagrantfile')
+            try:
+                cache_utils.write_atomic(self.fname, text)
+            except (IOError, OSError) as error:
+                slab_logger.error('File error: ' + str(error))
+                return 1
+            self.header = self.header or HEADER
+            self.dirty = False
+            self.writes += 1
+            self._digest = digest
+            self._stamp = _file_stamp(self.fname)
+            return 0
 
-heighliner_script = <<SCRIPT
-#{env_var_cmd}
-SCRIPT
-#---------------- END -------------------------------------------------------
-"""
-            return fn_lst
-
-        slab_logger.log(15, 'Building vm data')
-        line1, line2, req_plugin = _set_header()
-        startvms = _beg_vm_config()
-        fn_setup = _setup_fn()
-        # Note: until write_it is fixed, have to move list out from middle
-        self.write_it(line1, line2, req_plugin, fn_setup, startvms)
+    def _define(self, hostname, block, write):
+        """
+        Puts the block of a VM in the model, in place of its previous one.
+        """
+        with self._lock:
+            self.load()
+            self.vms[hostname] = block
+            self.dirty = True
+            if write:
+                return self.save()
+            return 0
+
+    def init_vagrantfile(self):
+        """
+        Creates a new Vagrantfile with the needed header information
+
+        Args:
+            None
+
+        Returns:
+            Nothing, instead a Vagrantfile is written to the class.path directory
+
+        Example Usage:
+            my_class_var.init_vagrantfile()
+        """
+        slab_logger.log(15, 'Creating new Vagrantfile within servicelab/.stack/')
+        with self._lock:
+            self.header = HEADER
+            self.vms = OrderedDict()
+            self.dirty = True
+            self.save()
         self.set_header = True
 
     def write_it(self, *text):
@@ -163,16 +297,17 @@ SCRIPT
         slab_logger.log(15, 'Writing Vagrant file')
         # Note: Doesn't close the vagrant loop w/ an 'end'. Use append_it for that.
         mystr = ''
-        with open(os.path.join(self.path, "Vagrantfile"), 'w') as vfile:
-            for i in text:
-                if isinstance(i, (list, tuple)):
-                    for item in i:
-                        mystr += item
-                else:
-                    mystr += i
+        for i in text:
+            if isinstance(i, (list, tuple)):
+                mystr += ''.join(i)
+            else:
+                mystr += i
+        with open(self.fname, 'w') as vfile:
             vfile.write(mystr)
             # Note: This buffers us from append_it function
             vfile.write("\n")
+        # Note: written behind the model's back, parse it again on next use
+        self._stamp = None
 
     def append_it(self, *text):
         """
@@ -189,45 +324,47 @@ SCRIPT
         """
         slab_logger.log(15, 'Appending data to Vagrantfile')
         lines = ''
-        with open(os.path.join(self.path, "Vagrantfile"), 'r') as vfile:
+        with open(self.fname, 'r') as vfile:
             lines = vfile.readlines()
             # Note: Remove the last line always so we get rid of the 'end' and
             #       add our own.
             lines = lines[:-1]
-        with open(os.path.join(self.path, "Vagrantfile"), 'w') as vfile:
-            for line in lines:
-                vfile.write(line)
+        with open(self.fname, 'w') as vfile:
+            vfile.writelines(lines)
             for i in text:
-                try:
-                    vfile.write(text)
-                except TypeError:
-                    for item in i:
-                        vfile.write(item)
+                if isinstance(i, (list, tuple)):
+                    vfile.writelines(i)
+                else:
+                    vfile.write(i)
             vfile.write('end\n')
             vfile.write('end')
             vfile.write('\n')
+        self._stamp = None
 
-    def delete_virtualbox_vm(self, vm_name):
+    def delete_virtualbox_vm(self, vm_name, write=True):
         """
         Delete data in the class.path Vagrantfile
 
         Args:
             vm name
+            write {bool}: Write the Vagrantfile now rather than on save()
 
         Returns:
-            Nothing, instead the class.path Vagrantfile is deleted with the vm_name
+            True if vm is found and deleted
 
         Example Usage:
             my_class_var.delete_it(vm_name)
         """
-        return self.delete_it(vm_name)
+        return self.delete_it(vm_name, write)
 
-    def delete_it(self, vm_name):
+    def delete_it(self, vm_name, write=True):
         """
-        Deletes data from the Vagrantfile
+        Deletes the block of a VM from the Vagrantfile.  Only the VM defined with
+        exactly that name goes, lines merely mentioning it are kept.
 
         Args:
             vm_name
+            write {bool}: Write the Vagrantfile now rather than on save()
 
         Returns:
             True if vm is found and deleted
@@ -235,25 +372,44 @@ SCRIPT
         Example Usage:
             my_class_var.delete_it(vm_name)
         """
-        lines = ''
-        with open(os.path.join(self.path, "Vagrantfile"), 'r') as f:
-            lines = f.readlines()
+        with self._lock:
+            self.load()
+            if vm_name not in self.vms:
+                return False
+            del self.vms[vm_name]
+            self.dirty = True
+            if write:
+                self.save()
+            return True
+
+    def add_vms(self, host_dicts, path="", nfs=False):
+        """
+        Adds many VMs to the Vagrantfile and writes it once.  Openstack VMs are
+        added if the class was created with remote=True, virtual box ones if not.
 
-        vm_name_config_section = False
-        found_vm = False
-        with open(os.path.join(self.path, "Vagrantfile"), 'w') as f:
-            for line in lines:
-                if vm_name in line:
-                    vm_name_config_section = True
-                    found_vm = True
-                if not vm_name_config_section and vm_name not in line:
-                    f.write(line)
-                if vm_name_config_section and "end\n" == line:
-                    vm_name_config_section = False
+        Args:
+            host_dicts {list of dicts}: Nested dicts as taken by add_virtualbox_vm
+            path {str}: Passed on to add_virtualbox_vm
+            nfs {bool}: Passed on to add_virtualbox_vm
 
-        return found_vm
+        Returns:
+            0 or 1 for success or failure
 
-    def add_virtualbox_vm(self, host_dict, path="", nfs=False):
+        Example Usage:
+            return_code = my_class_var.add_vms([host_dict_1, host_dict_2])
+        """
+        returncode = 0
+        with self._lock:
+            for host_dict in host_dicts:
+                if self.remote:
+                    self.add_openstack_vm(host_dict, write=False)
+                elif self.add_virtualbox_vm(host_dict, path, nfs, write=False) > 0:
+                    returncode = 1
+            if self.save() > 0:
+                returncode = 1
+        return returncode
+
+    def add_virtualbox_vm(self, host_dict, path="", nfs=False, write=True):
         """
         Adds a virtual box to Vagrantfile
         Args:
@@ -268,9 +424,11 @@ SCRIPT
                               }
                  }
              nfs(boolean): True if we are nfs mounting the service subdirectory in the path
+             write(boolean): Write the Vagrantfile now rather than on save()
 
         Returns:
-            0 or 1 for success or failure.  Also calls append_it to add data to Vagrantfile
+            0 or 1 for success or failure.  The VM replaces any previous one of the
+            same name in the Vagrantfile
 
         Example Usage:
             return_code = my_class_var.add_openstack_vm(host_dict)
@@ -324,13 +482,12 @@ SCRIPT
                 if self.remote:
                     setitup += ', type: "rsync" '
                 setitup += "\n"
-            self.append_it(setitup)
-            return 0
+            return self._define(self.hostname, setitup, write)
         except KeyError:
             slab_logger.error('Can not add host b/c of missing Key')
             return 1
 
-    def add_openstack_vm(self, host_dict):
+    def add_openstack_vm(self, host_dict, write=True):
         """
         Adds an Openstack VM to the Vagrantfile
 
@@ -357,9 +514,11 @@ SCRIPT
                               'memory': '1024'
                               }
                  }
+            write {bool}: Write the Vagrantfile now rather than on save()
 
         Returns:
-            Nothing, appends the VM data to the class.path Vagrantfile
+            Nothing, puts the VM data in the class.path Vagrantfile, in place of any
+            previous VM of the same name
 
         Example Usage:
             my_class_var.add_openstack_vm(host_dict)
@@ -415,7 +574,7 @@ SCRIPT
             setitup += ', type: "rsync" '
         setitup += "\n"
 
-        self.append_it(setitup)
+        self._define(self.hostname, setitup, write)
 
     def set_env_vars(self, float_net, tenant_nets, tenant_security_groups):
         """
@@ -547,6 +706,8 @@ SCRIPT
             my_class_var.set_host_image_flavors(self.ctx.path)
         """
         slab_logger.log(15, 'Determining the image and flavor')
+        # Note: start over for every host, a host without yaml gets the defaults
+        self.host_vars = {}
         relpath_toyaml = 'services/ccs-data/sites/ccs-dev-1/environments/dev-tenant/hosts.d/'
         if os.path.exists(path):
             path = os.path.join(path, relpath_toyaml)
@@ -555,7 +716,7 @@ SCRIPT
                 if os.path.exists(path):
                     try:
                         with open(path) as host_yaml:
-                            host_data = yaml.load(host_yaml)
+                            host_data = yaml_io.load(host_yaml)
                             self.host_vars['image'] = host_data['deploy_args']['image']
                             self.host_vars['flavor'] = host_data['deploy_args']['flavor']
                     except:
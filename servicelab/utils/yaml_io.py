@@ -0,0 +1,211 @@
+"""
+Central yaml reading and writing for servicelab.
+
+Uses the libyaml backed CSafeLoader / CSafeDumper when PyYAML was built with
+libyaml, which parses the ccs-data host files roughly ten times faster than the
+pure python implementation, and falls back to SafeLoader / SafeDumper otherwise.
+"""
+from collections import OrderedDict
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as _BaseLoader
+    from yaml import CSafeDumper as _BaseDumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as _BaseLoader
+    from yaml import SafeDumper as _BaseDumper
+    LIBYAML = False
+
+YAMLError = yaml.YAMLError
+
+
+class Loader(_BaseLoader):
+    """
+    Safe loader, libyaml backed when available.  Mappings load as dicts.
+    """
+    pass
+
+
+class OrderedLoader(_BaseLoader):
+    """
+    Safe loader, libyaml backed when available.  Mappings load as OrderedDicts
+    so a load / dump round trip keeps the order of the keys in the file.
+    """
+    pass
+
+
+def _construct_ordered_mapping(loader, node):
+    loader.flatten_mapping(node)
+    return OrderedDict(loader.construct_pairs(node))
+
+
+OrderedLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+                              _construct_ordered_mapping)
+
+
+class Dumper(_BaseDumper):
+    """
+    Safe dumper, libyaml backed when available.  OrderedDicts are written as plain
+    mappings in their own order and tuples as lists, everything else as SafeDumper
+    would.
+    """
+    pass
+
+
+def _represent_ordered_mapping(dumper, data):
+    return dumper.represent_mapping(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+                                    data.items())
+
+
+Dumper.add_representer(OrderedDict, _represent_ordered_mapping)
+Dumper.add_representer(tuple, yaml.representer.SafeRepresenter.represent_list)
+
+
+def load(stream, ordered=False):
+    """Load a single yaml document.
+
+    Args:
+        stream (str or file): yaml text or an open file
+        ordered (bool): Load mappings as OrderedDicts
+
+    Returns:
+        The loaded data
+
+    Example Usage:
+        >>> with open('vagrant.yaml') as f:
+        ...     doc = yaml_io.load(f)
+    """
+    return yaml.load(stream, OrderedLoader if ordered else Loader)
+
+
+def load_all(stream, ordered=False):
+    """Load every document of a multi document yaml stream.
+
+    Args:
+        stream (str or file): yaml text or an open file
+        ordered (bool): Load mappings as OrderedDicts
+
+    Returns:
+        Generator over the loaded documents
+    """
+    return yaml.load_all(stream, OrderedLoader if ordered else Loader)
+
+
+def load_file(fname, ordered=False):
+    """Load the yaml file fname.
+
+    Args:
+        fname (str): Path to the yaml file
+        ordered (bool): Load mappings as OrderedDicts
+
+    Returns:
+        The loaded data.  IOError and YAMLError are left to the caller.
+    """
+    with open(fname, 'r') as stream:
+        return load(stream, ordered)
+
+
+def dump(data, stream=None, **kwargs):
+    """Dump data as yaml, block style unless told otherwise.
+
+    Args:
+        data: Data to dump
+        stream (file): Open file to write to.  If None the yaml text is returned.
+        kwargs: Passed through to yaml.dump
+
+    Returns:
+        The yaml text if stream is None, otherwise None
+
+    Example Usage:
+        >>> print yaml_io.dump({'hosts': {'infra-001': {'memory': 1024}}})
+        hosts:
+          infra-001:
+            memory: 1024
+    """
+    kwargs.setdefault('default_flow_style', False)
+    return yaml.dump(data, stream, Dumper=Dumper, **kwargs)
+
+
+def dump_file(data, fname, **kwargs):
+    """Dump data as yaml into the file fname, replacing its contents.
+
+    Args:
+        data: Data to dump
+        fname (str): Path to the yaml file
+        kwargs: Passed through to yaml.dump
+    """
+    with open(fname, 'w') as stream:
+        dump(data, stream, **kwargs)
+
+
+def check(stream):
+    """Check a yaml stream against the rules Ruby's Psych applies when loading it.
+
+    The stream is parsed event by event, without constructing any data, so the
+    checks follow Psych rather than PyYAML where the two differ:
+        - syntax errors, including tabs used for indentation, are errors
+        - an alias to an anchor not defined earlier in the document is an error
+        - redefining an anchor is allowed, later aliases use the newest one
+        - duplicate keys in a mapping are reported as warnings, Psych keeps the
+          last value
+        - the merge key '<<' may repeat
+
+    Args:
+        stream (str or file): yaml text or an open file
+
+    Returns:
+        problems (list): (line, column, severity, message) tuples in stream
+                         order, line and column counted from 1 and severity
+                         one of 'error' or 'warning'.  Empty for a clean stream.
+
+    Example Usage:
+        >>> yaml_io.check("hosts:\\n  db-001: {}\\n  db-001: {}\\n")
+        [(3, 3, 'warning', "duplicate key 'db-001'")]
+    """
+    problems = []
+    anchors = set()
+    # One entry per open collection: [keys, expecting_key] for mappings and
+    # None for sequences.
+    parents = []
+    try:
+        for event in yaml.parse(stream, Loader=_BaseLoader):
+            if isinstance(event, yaml.DocumentStartEvent):
+                anchors = set()
+            elif isinstance(event, yaml.NodeEvent) and \
+                    not isinstance(event, yaml.CollectionEndEvent):
+                parent = parents[-1] if parents else None
+                if parent is not None:
+                    keys, expecting_key = parent
+                    if expecting_key and isinstance(event, yaml.ScalarEvent) and \
+                            event.value != '<<':
+                        if event.value in keys:
+                            problems.append((event.start_mark.line + 1,
+                                             event.start_mark.column + 1, 'warning',
+                                             "duplicate key '%s'" % event.value))
+                        keys.add(event.value)
+                    parent[1] = not expecting_key
+                if isinstance(event, yaml.AliasEvent):
+                    if event.anchor not in anchors:
+                        problems.append((event.start_mark.line + 1,
+                                         event.start_mark.column + 1, 'error',
+                                         "found undefined alias '%s'" % event.anchor))
+                elif event.anchor is not None:
+                    anchors.add(event.anchor)
+                if isinstance(event, yaml.MappingStartEvent):
+                    parents.append([set(), True])
+                elif isinstance(event, yaml.SequenceStartEvent):
+                    parents.append(None)
+            elif isinstance(event, yaml.CollectionEndEvent):
+                parents.pop()
+    except yaml.MarkedYAMLError as err:
+        mark = err.problem_mark or err.context_mark
+        message = ' '.join(part for part in (err.context, err.problem) if part)
+        if mark is None:
+            problems.append((0, 0, 'error', message))
+        else:
+            problems.append((mark.line + 1, mark.column + 1, 'error', message))
+    except yaml.YAMLError as err:
+        problems.append((0, 0, 'error', str(err)))
+    return problems
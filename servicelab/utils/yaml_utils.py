@@ -1,13 +1,16 @@
 import os
 import re
 import sys
+import hashlib
+import multiprocessing
 
-import yaml
 import ipaddress
 
 import encrypt_utils
+import yaml_io
 import helper_utils
 import service_utils
+import inventory_utils
 import openstack_utils as os_utils
 import tc_vm_yaml_create
 import vagrantfile_utils
@@ -17,10 +20,63 @@ from servicelab import settings
 slab_logger = logger_utils.setup_logger(settings.verbosity, 'stack.utils.yaml')
 
 
+# Results of check_syntax keyed by the sha1 of the file contents, so a file that
+# is validated again unchanged, e.g. vagrant.yaml during stack up, is not reparsed.
+_syntax_cache = {}
+
+
+def check_syntax(file_name):
+    """Check the yaml syntax of a file in process.
+
+    The checks follow Ruby's YAML.load_file, see yaml_io.check.  Results are
+    cached by the sha1 of the file contents.
+
+    Args:
+        file_name (str): pathway to file to check
+
+    Returns:
+        returncode (int) -- 0 if the file loads, 1 if it has errors or is not
+                            readable
+        problems (list) -- (line, column, severity, message) tuples, warnings
+                           included
+
+    Example Usage:
+        >>> print check_syntax("~/vagrant.yaml")
+        (0, [])
+    """
+    try:
+        with open(file_name, 'r') as stream:
+            contents = stream.read()
+    except IOError as err:
+        return 1, [(0, 0, 'error', 'unable to read file: %s' % err.strerror)]
+    digest = hashlib.sha1(contents).hexdigest()
+    if digest not in _syntax_cache:
+        problems = yaml_io.check(contents)
+        failed = any(severity == 'error' for _, _, severity, _ in problems)
+        _syntax_cache[digest] = (1 if failed else 0, problems)
+    return _syntax_cache[digest]
+
+
+def format_problem(file_name, problem):
+    """Format a problem returned by check_syntax as file:line:column: message.
+
+    Args:
+        file_name (str): pathway of the checked file
+        problem (tuple): (line, column, severity, message)
+
+    Returns:
+        The formatted problem (str)
+    """
+    line, column, severity, message = problem
+    if line:
+        return '%s:%i:%i: %s: %s' % (file_name, line, column, severity, message)
+    return '%s: %s: %s' % (file_name, severity, message)
+
+
 def validate_syntax(file_name):
     """Syntax checker for a yaml file.
 
-    Writes command output to Service Utils Log file.
+    Logs every problem found with its line and column.
 
     Args:
         file_name (str): pathway to file to validate
@@ -30,21 +86,76 @@ def validate_syntax(file_name):
         1 -- failure, possibly because
                 - the file has yaml syntax error
                 - the file does not exist or is not readable.
-                - or ruby is not installed and 1 if there are any syntax errors.
 
     Example Usage:
         >>> print validate_syntax("~/vagrant.yaml")
         0
     """
     slab_logger.log(15, 'Validating syntax of %s' % file_name)
-    code = "\"require 'yaml'; YAML.load_file('" + file_name + "');\""
-    cmd = "ruby -e " + code
-    cmd_returncode, cmd_info = service_utils.run_this(cmd)
-    if cmd_returncode > 0:
+    returncode, problems = check_syntax(file_name)
+    if returncode > 0:
         slab_logger.error("Invalid yaml: ")
-        slab_logger.error(cmd_info)
-        return 1
-    return 0
+    for problem in problems:
+        if problem[2] == 'error':
+            slab_logger.error(format_problem(file_name, problem))
+        else:
+            slab_logger.warning(format_problem(file_name, problem))
+    return returncode
+
+
+def find_yaml_files(paths):
+    """Expand a list of files and directories to the yaml files they contain.
+
+    Directories are searched recursively for .yaml and .yml files, files are
+    kept as given.
+
+    Args:
+        paths (list): pathways to files or directories
+
+    Returns:
+        file_names (list): sorted yaml file pathways, files given explicitly first
+    """
+    file_names = []
+    for path in paths:
+        if not os.path.isdir(path):
+            file_names.append(path)
+            continue
+        found = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [dname for dname in dirnames if not dname.startswith('.')]
+            found.extend(os.path.join(dirpath, fname) for fname in filenames
+                         if fname.endswith(('.yaml', '.yml')))
+        file_names.extend(sorted(found))
+    return file_names
+
+
+def _check_syntax_worker(file_name):
+    return file_name, check_syntax(file_name)
+
+
+def check_syntax_files(file_names, jobs=None):
+    """Check the yaml syntax of many files using a pool of worker processes.
+
+    Args:
+        file_names (list): pathways to files to check
+        jobs (int): number of worker processes, defaults to the number of cpus
+
+    Returns:
+        results (list): (file_name, (returncode, problems)) in the order of
+                        file_names, see check_syntax
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(file_names))
+    if jobs <= 1:
+        return [_check_syntax_worker(file_name) for file_name in file_names]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        chunksize = max(1, len(file_names) // (jobs * 4))
+        return pool.map(_check_syntax_worker, file_names, chunksize)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def host_exists_vagrantyaml(hostname, pathto_yaml):
@@ -83,34 +194,14 @@ def host_exists_vagrantyaml(hostname, pathto_yaml):
         0
     """
     slab_logger.log(15, 'Checking for %s within .stack/vagrant.yaml' % hostname)
-    if not os.path.isfile(os.path.join(pathto_yaml, "vagrant.yaml")):
-        slab_logger.debug("vagrant.yaml file is missing")
-        return 1
-    retcode = validate_syntax(os.path.join(pathto_yaml, "vagrant.yaml"))
-    if retcode > 0:
-        slab_logger.error("Invalid yaml file")
-        return 1
-    # Note: load vagrant yaml file
-    try:
-        with open(os.path.join(pathto_yaml, "vagrant.yaml"), 'r') as f:
-            doc = yaml.load(f)
-
-            # EXP: Prints top lvl, aka d = "hosts", doc = dictofyaml
-            if doc is None:
-                return 1
-            for d in doc:
-                # EXP: x = hostname for vagrantyaml
-                try:
-                    for x in doc[d]:
-                        if hostname == x:
-                            slab_logger.debug("Found host:" + hostname)
-                            return 0
-                except TypeError:
-                    return 1
-            return 1
-    except IOError as error:
-        slab_logger.error('File error: ' + str(error))
+    inventory = inventory_utils.get_inventory(pathto_yaml)
+    if inventory.load() > 0:
+        slab_logger.debug("vagrant.yaml file is missing or invalid")
         return 1
+    if inventory.exists(hostname):
+        slab_logger.debug("Found host:" + hostname)
+        return 0
+    return 1
 
 
 def gethost_byname(hostname, pathto_yaml):
@@ -144,25 +235,7 @@ def gethost_byname(hostname, pathto_yaml):
            }
     """
     slab_logger.log(15, 'Extracting data for %s from vagrant.yaml' % hostname)
-    yourdict = {}
-    retcode = validate_syntax(os.path.join(pathto_yaml, "vagrant.yaml"))
-    if retcode > 0:
-        slab_logger.error("Invalid yaml file")
-        return 1, yourdict
-    # Note: load vagrant yaml file
-    try:
-        with open(os.path.join(pathto_yaml, "vagrant.yaml"), 'r') as f:
-            doc = yaml.load(f)
-            yourdict = doc['hosts'][hostname]
-            if not yourdict:
-                slab_logger.debug("Found host:" + hostname)
-                return 1, yourdict
-            else:
-                yourdict = {hostname: yourdict}
-                return 0, yourdict
-    except IOError as error:
-        slab_logger.error('File error: ' + str(error))
-        return 1, yourdict
+    return inventory_utils.get_inventory(pathto_yaml).get(hostname)
 
 
 def get_host_order(pathto_yaml):
@@ -195,16 +268,7 @@ def get_host_order(pathto_yaml):
 
     """
     slab_logger.log(15, 'Extracting list of OSP hosts in the order they should be booted')
-    try:
-        with open(os.path.join(pathto_yaml, "order.yaml"), 'r') as f:
-            doc = yaml.load(f)
-            if "order" in doc:
-                return 0, doc["order"]
-            else:
-                return 1, []
-    except IOError as error:
-        slab_logger.error('File error: ' + str(error))
-        return 1, []
+    return inventory_utils.get_inventory(pathto_yaml).host_order()
 
 
 def getmin_OS_vms(path):
@@ -250,35 +314,15 @@ def getmin_OS_vms(path):
     RFI: min: True the true is boolean/string?
     """
     slab_logger.log(15, 'Filtering list of OPS hosts for those needed for mini deploy')
-    host_list = []
-    pathto_yaml = os.path.join(path, "provision")
-    retcode = validate_syntax(os.path.join(pathto_yaml, "vagrant.yaml"))
-    if retcode > 0:
+    inventory = inventory_utils.get_inventory(os.path.join(path, "provision"))
+    if inventory.load() > 0:
         slab_logger.error("Invalid yaml file")
+        return 1, []
+    host_list = inventory.mini_hosts()
+    if not host_list:
+        slab_logger.error('No hosts in host_list')
         return 1, host_list
-    # Note: load vagrant yaml file
-    try:
-        with open(os.path.join(pathto_yaml, "vagrant.yaml"), 'r') as f:
-            doc = yaml.load(f)
-            for host in doc['hosts']:
-                for k in doc['hosts'][host]:
-                    if k == "min":
-                        returncode, host_dict = gethost_byname(host, pathto_yaml)
-                        if returncode == 0:
-                            host_list.append(host_dict)
-                        else:
-                            slab_logger.error('failed to retrieve a host from\
-                                                    vagrant.yaml')
-                            return 1, host_list
-
-        if not host_list:
-            slab_logger.error('No hosts in host_list')
-            return 1, host_list
-        else:
-            return 0, host_list
-    except IOError as error:
-        slab_logger.error('File error: ' + str(error))
-        return 1, host_list
+    return 0, host_list
 
 
 def getfull_OS_vms(pathto_yaml, vmname_ending_in):
@@ -327,34 +371,15 @@ def getfull_OS_vms(pathto_yaml, vmname_ending_in):
            ]
     """
     slab_logger.log(15, 'Extracting data for all OS vms')
-    host_list = []
-    vmname_ending_in = str(vmname_ending_in)
-    retcode = validate_syntax(os.path.join(pathto_yaml, "vagrant.yaml"))
-    if retcode > 0:
+    inventory = inventory_utils.get_inventory(pathto_yaml)
+    if inventory.load() > 0:
         slab_logger.error("Invalid yaml file")
+        return 1, []
+    host_list = inventory.hosts_matching(vmname_ending_in)
+    if not host_list:
+        slab_logger.error('No hosts in host_list')
         return 1, host_list
-    try:
-        with open(os.path.join(pathto_yaml, "vagrant.yaml"), 'r') as f:
-            doc = yaml.load(f)
-            for host in doc['hosts']:
-                    # RFI: probably want to compile something more specific here like -001/2$
-                    #      as regex
-                    if vmname_ending_in in host:
-                        returncode, host_dict = gethost_byname(host, pathto_yaml)
-                        if returncode == 0:
-                            host_list.append(host_dict)
-                        else:
-                            slab_logger.error('failed to retrieve a host from vagrant.yaml')
-                            return 1, host_list
-
-        if not host_list:
-            slab_logger.error('No hosts in host_list')
-            return 1, host_list
-        else:
-            return 0, host_list
-    except IOError as error:
-        slab_logger.error('File error: ' + str(error))
-        return 1, host_list
+    return 0, host_list
 
 
 def host_add_vagrantyaml(path, file_name, hostname, site, cpus=2, memory=2,
@@ -442,10 +467,6 @@ def host_add_vagrantyaml(path, file_name, hostname, site, cpus=2, memory=2,
     functions. TODO: add ref to funct here for shortlink.
     """
     slab_logger.log(15, 'Adding %s to .stack/vagrant.yaml' % hostname)
-    if not os.path.exists(os.path.join(path, file_name)):
-        with open(os.path.join(path, file_name), 'w') as f:
-            f.write("---")
-
     if storage >= 12:
         slab_logger.error("Invalid yaml file")
         slab_logger.error("Too many storage disks requested.")
@@ -458,53 +479,22 @@ def host_add_vagrantyaml(path, file_name, hostname, site, cpus=2, memory=2,
             storage -= 1
 
     memory *= 512
-    returncode = host_exists_vagrantyaml(hostname, path)
-    if returncode == 1:
-        # Note: load vagrant yaml file
-        try:
-            with open(os.path.join(path, file_name), 'r') as f:
-                doc = yaml.load(f)
-                if not mac_nocolon:
-                    returncode, ip, mac_colon, mac_nocolon = next_macip_for_devsite(path,
-                                                                                    site)
-                    if returncode > 0:
-                        slab_logger.error("Could not write file because no ip provided.")
-                        return 1
-                if doc is not None and doc['hosts']:
-                    for d in doc:
-                        doc["hosts"][hostname] = {'role': role,
-                                                  'domain': domain,
-                                                  'profile': profile,
-                                                  'ip': ip,
-                                                  'mac': mac_nocolon,
-                                                  'cpus': cpus,
-                                                  'memory': memory,
-                                                  'box': box,
-                                                  }
-                else:
-                    doc = {"hosts": {hostname: {'role': role,
-                                                'domain': domain,
-                                                'profile': profile,
-                                                'ip': ip,
-                                                'mac': mac_nocolon,
-                                                'cpus': cpus,
-                                                'memory': memory,
-                                                'box': box
-                                                }
-                                     }
-                           }
-                if storage > 0:
-                    doc["hosts"][hostname] = {storage: storage_disks}
-            stream = file(os.path.join(path, file_name), 'w')
-            slab_logger.debug("Adding %s to vagrant environment now." % hostname)
-            yaml.dump(doc, stream, default_flow_style=False)
-            return 0
-        except IOError as error:
-            slab_logger.error('File error: ' + str(error))
-            return 1
-    else:
+    inventory = inventory_utils.get_inventory(path, file_name)
+    if inventory.exists(hostname):
         slab_logger.debug("Host %s already exists in vagrant.yaml" % (hostname))
         return 0
+    if not mac_nocolon:
+        returncode, ip, mac_colon, mac_nocolon = next_macip_for_devsite(path, site)
+        if returncode > 0:
+            slab_logger.error("Could not write file because no ip provided.")
+            return 1
+    host = inventory_utils.make_host(ip, mac_nocolon, role=role, profile=profile,
+                                     domain=domain, cpus=cpus, memory=memory, box=box)
+    if storage > 0:
+        host = {storage: storage_disks}
+    if inventory.add_host(hostname, host) > 0:
+        return 1
+    return inventory.save()
 
 
 # RFI: Do we need to check if host is running or not
@@ -533,23 +523,11 @@ def host_del_vagrantyaml(path, file_name, hostname):
         0
     """
     slab_logger.log(15, 'Removing %s from .stack/vagrant.yaml' % hostname)
-    if not host_exists_vagrantyaml(hostname, path):
-        try:
-            with open(os.path.join(path, file_name), 'r') as f:
-                doc = yaml.load(f)
-                for d in doc:
-                    del doc[d][hostname]
-            stream = file(os.path.join(path, file_name), 'w')
-            slab_logger.debug('Deleting host: ' + hostname)
-
-            yaml.dump(doc, stream, default_flow_style=False)
-            return 0
-        except IOError as error:
-            slab_logger.error('File error: ' + str(error))
-            return 1
-    else:
+    inventory = inventory_utils.get_inventory(path, file_name)
+    if inventory.del_host(hostname) > 0:
         slab_logger.error("Host was not matched or doesn't exist.")
         return 1
+    return inventory.save()
 
 
 # Note: I had to separate this logic out from the
@@ -592,7 +570,7 @@ def get_allips_forsite(path, site):
         sys.exit(1)
     for yaml_f in yaml_files:
         with open(os.path.join(path, yaml_f), 'r') as f:
-            doc = yaml.load(f)
+            doc = yaml_io.load(f)
             allips.append(get_allips_foryaml(doc))
 
     # Note: flat b/c list of lists turned into a list
@@ -897,7 +875,7 @@ def write_dev_hostyaml_out(path, hostname, role='none', site="ccs-dev-1",
     path_to_utils = helper_utils.get_path_to_utils(path)
     with open(os.path.join(path_to_utils, "ccsdata_dev_example_host.yaml"), 'r') as f:
 
-        doc = yaml.load(f)
+        doc = yaml_io.load(f)
         doc['deploy_args']['mac_address'] = mac_colon
         doc['deploy_args']['image'] = image
         doc['deploy_args']['flavor'] = flavor
@@ -928,7 +906,7 @@ def write_dev_hostyaml_out(path, hostname, role='none', site="ccs-dev-1",
             return 1
         else:
             stream = file(os.path.join(deploy_hostyaml_to, hostname + ".yaml"), 'w')
-            yaml.dump(doc, stream, default_flow_style=False)
+            yaml_io.dump(doc, stream)
             return 0
 
 
@@ -994,7 +972,7 @@ def get_dev_hostyaml(path, hostname, site='ccs-dev-1', env='dev-tenant'):
         return 1, myhost
 
     with open(path, 'r') as f:
-        myhost = yaml.load(f)
+        myhost = yaml_io.load(f)
         return 0, myhost
 
 
@@ -1106,7 +1084,7 @@ def wr_settingsyaml(path, settingsyaml, hostname=''):
                    }
             for k, v in settingsyaml.iteritems():
                 doc[k] = v
-            yaml.dump(doc, f, default_flow_style=False)
+            yaml_io.dump(doc, f)
     except (OSError):
         slab_logger.error('Unable to write to %s' % settings)
         return 1
@@ -1184,7 +1162,7 @@ def open_yaml_file(yaml_file):
     slab_logger.log(15, 'Extracting yaml data from %s' % yaml_file)
     try:
         with open(yaml_file, 'r') as stream:
-            yaml_data = yaml.load(stream)
+            yaml_data = yaml_io.load(stream)
     except IOError:
         slab_logger.error('Unable to open %s' % yaml_file)
         return(1, {})
@@ -1208,7 +1186,7 @@ def decrypt_set(path):
                              "provision",
                              "servicelab.yaml")
     with open(yaml_path, 'r') as yaml_strm:
-        slab_doc = yaml.load(yaml_strm)
+        slab_doc = yaml_io.load(yaml_strm)
 
     if not all(k in slab_doc.keys() for k in ("pulp_user", "pulp_password")):
         slab_logger.error("Unable to decrypt the pulp encrypted password key missing")
@@ -1239,12 +1217,12 @@ def decrypt_set(path):
                              "data.d",
                              "environment.yaml")
     with file(yaml_path, 'r') as yaml_strm:
-        ccsdata_doc = yaml.load(yaml_strm)
+        ccsdata_doc = yaml_io.load(yaml_strm)
         ccsdata_doc["pulp_user"] = slab_doc["pulp_user"]
         ccsdata_doc["pulp_password"] = decrypt
 
     with file(yaml_path, 'w') as yaml_strm:
-        yaml.dump(ccsdata_doc, yaml_strm, default_flow_style=False)
+        yaml_io.dump(ccsdata_doc, yaml_strm)
     return 0
 
 
@@ -0,0 +1,76 @@
+"""
+Latency of a batch of gerrit queries against a local ssh server standing in for
+gerrit: a connection per query as the gerrit library made them, one shared
+transport, and parallel channels of it.
+
+Usage:
+    python -m tests.benchmarks.bench_gerrit [--queries 20] [--latency 0.05]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import paramiko
+
+from servicelab.utils import ssh_utils
+from tests.benchmarks.standin_sshd import StandInGerrit
+
+
+def connection_per_query(port, key, queries):
+    """
+    The previous queries, every one connecting and authenticating on its own.
+    """
+    for terms in queries:
+        conn = ssh_utils.GerritConnection('127.0.0.1', port, 'aaltman', key, os.devnull)
+        conn.query(*terms)
+        conn.close()
+
+
+def shared_transport(port, key, queries):
+    conn = ssh_utils.GerritConnection('127.0.0.1', port, 'aaltman', key, os.devnull)
+    for terms in queries:
+        conn.query(*terms)
+    conn.close()
+
+
+def parallel_channels(port, key, queries):
+    conn = ssh_utils.GerritConnection('127.0.0.1', port, 'aaltman', key, os.devnull)
+    conn.query_many(queries)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--queries', type=int, default=20, help='queries in the batch')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds the server takes for every command')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    key = os.path.join(path, 'id_rsa')
+    paramiko.RSAKey.generate(2048).write_private_key_file(key)
+    server = StandInGerrit(args.latency)
+    for number in range(args.queries):
+        server.add_change(number, 'servicelab')
+    server.start()
+    queries = [['change:%i' % number] for number in range(args.queries)]
+    print('%i queries, %.0f ms latency' % (args.queries, args.latency * 1000))
+    runs = (('connection per query (previous)', connection_per_query),
+            ('shared transport', shared_transport),
+            ('parallel channels', parallel_channels))
+    try:
+        for name, function in runs:
+            connections = server.connections
+            start = time.time()
+            function(server.port, key, queries)
+            print('%-32s %7.3fs %3i connections'
+                  % (name, time.time() - start, server.connections - connections))
+    finally:
+        server.stop()
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Request rate of one-off requests against the pooled http_utils clients.
+
+Usage:
+    python -m tests.benchmarks.bench_http [--requests 200] [--latency 0.0] [--http]
+"""
+import os
+import time
+import argparse
+
+import requests
+
+from servicelab.utils import http_utils
+from tests.benchmarks.standin_server import StandInServer
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def one_off(url, count):
+    """
+    The previous clients, a new connection and handshake for every call.
+    """
+    for num in range(count):
+        requests.packages.urllib3.disable_warnings()
+        requests.get('%s/api/items/%i' % (url, num), auth=('user', 'pw'),
+                     verify=False)
+
+
+def pooled(url, count):
+    client = http_utils.get_client('gocd', url, ('user', 'pw'), verify=False)
+    for num in range(count):
+        client.get('/api/items/%i' % num)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=200, help='number of requests')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the server delays every request by')
+    parser.add_argument('--http', action='store_true', help='plain http instead of https')
+    args = parser.parse_args()
+
+    tls = {} if args.http else {'certfile': os.path.join(HERE, 'test.crt'),
+                                'keyfile': os.path.join(HERE, 'test.key')}
+    print('%i requests, %s, %.0f ms latency'
+          % (args.requests, 'http' if args.http else 'https', args.latency * 1000))
+    for name, function in (('one-off requests (previous)', one_off),
+                           ('pooled keep-alive client', pooled)):
+        server = StandInServer(args.latency, **tls)
+        server.start()
+        try:
+            start = time.time()
+            function(server.url, args.requests)
+            elapsed = time.time() - start
+            print('%-30s %7.2fs %8.1f req/s %5i connections'
+                  % (name, elapsed, args.requests / elapsed, server.connections))
+        finally:
+            http_utils.close_all()
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Latency of finding free IPs for stack create host on a /16 vlan, the previous
+list of the vlan with serial reverse DNS against the bitset pool with batched,
+cached lookups.
+
+Usage:
+    python -m tests.benchmarks.bench_ip_alloc [--prefix 16] [--used 1500] [--stale 30]
+                                              [--latency 0.02] [--count 5]
+"""
+import time
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import ipaddress
+
+from servicelab.utils import ip_utils
+
+
+class Resolver(object):
+    """
+    A DNS taking latency seconds per reverse lookup, with names for the stale
+    addresses only.
+    """
+
+    def __init__(self, names, latency):
+        self.names = names
+        self.latency = latency
+        self.lookups = 0
+
+    def __call__(self, ip):
+        self.lookups += 1
+        time.sleep(self.latency)
+        if ip in self.names:
+            return self.names[ip], [], [ip]
+        raise socket.herror(1, 'Unknown host')
+
+
+def previous_find(vlan, used, resolver, count):
+    """
+    The previous find_ip, once per IP wanted: a list of every host of the vlan,
+    a list.remove per used address and a serial lookup per candidate.
+    """
+    ips = []
+    for _ in range(count):
+        all_ips = list(vlan.hosts())
+        del all_ips[0:4]
+        for addy in used + ips:
+            ipaddy = ipaddress.IPv4Address(unicode(addy))
+            if ipaddy in all_ips:
+                all_ips.remove(ipaddy)
+        for ip in all_ips:
+            try:
+                resolver(str(ip))
+            except socket.herror:
+                ips.append(str(ip))
+                break
+    return ips
+
+
+def find(vlan, used, resolver, count, path):
+    pool = ip_utils.IpPool(vlan)
+    for addy in used:
+        pool.mark(addy)
+    dns = ip_utils.ReverseDns(path, resolver=resolver)
+    return ip_utils.allocate(pool, count, dns)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--prefix', type=int, default=16, help='vlan prefix length')
+    parser.add_argument('--used', type=int, default=1500, help='addresses of ccs-data hosts')
+    parser.add_argument('--stale', type=int, default=30,
+                        help='free addresses still having a DNS name')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds per reverse lookup')
+    parser.add_argument('--count', type=int, default=5, help='IPs wanted')
+    args = parser.parse_args()
+
+    vlan = ipaddress.IPv4Network(u'10.20.0.0/%i' % args.prefix)
+    base = vlan.network_address
+    rand = random.Random(1)
+    offsets = rand.sample(xrange(5, vlan.num_addresses - 1), args.used + args.stale)
+    # Note: hosts fill the start of the vlan, the rest are scattered over it
+    used = [str(base + offset) for offset in range(5, 5 + args.used // 2)]
+    used += [str(base + offset) for offset in offsets[:args.used - len(used)]]
+    names = dict((str(base + offset), 'stale-%i.example.com' % offset)
+                 for offset in range(5 + args.used // 2, 5 + args.used // 2 + args.stale))
+    print('/%i vlan, %i used, %i stale DNS names, %.0fms per lookup, %i IPs wanted'
+          % (args.prefix, args.used, args.stale, args.latency * 1000, args.count))
+
+    path = tempfile.mkdtemp()
+    runs = (('previous', lambda resolver: previous_find(vlan, used, resolver, args.count)),
+            ('first run', lambda resolver: find(vlan, used, resolver, args.count, path)),
+            ('cached run', lambda resolver: find(vlan, used, resolver, args.count, path)))
+    try:
+        for name, function in runs:
+            resolver = Resolver(names, args.latency)
+            start = time.time()
+            ips = function(resolver)
+            print('%-12s %8.3fs %4i lookups  %s .. %s'
+                  % (name, time.time() - start, resolver.lookups, ips[0], ips[-1]))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Latency of stack build status, stack list builds and stack build log against a
+local fake Jenkins.
+
+Usage:
+    python -m tests.benchmarks.bench_jenkins [--jobs 500] [--builds 20] [--latency 0.05]
+                                             [--log-size 100]
+"""
+import os
+import time
+import resource
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+import requests
+
+from servicelab.utils import jenkins_utils
+from tests.benchmarks.standin_server import StandInServer
+
+JOB = 'job-0'
+
+
+def jenkinsapi_status(url):
+    """
+    The requests the previous build status made through jenkinsapi: the full
+    server document on connecting, then the job and its last build for each of
+    the three get_last_build() calls.
+    """
+    session = requests.Session()
+    session.get(url + '/api/json').json()
+    for _ in range(3):
+        job = session.get('%s/job/%s/api/json' % (url, JOB)).json()
+        session.get('%s/job/%s/%s/api/json' % (url, JOB, job['lastBuild']['number'])).json()
+
+
+def jenkinsapi_list(url):
+    """
+    The previous list builds, the full server document for server.keys().
+    """
+    [job['name'] for job in requests.Session().get(url + '/api/json').json()['jobs']]
+
+
+def client_list(url, path):
+    jenkins_utils.JenkinsClient(url, 'user', 'pw', path).job_names()
+
+
+def soup_log(url):
+    """
+    The previous build log, the whole console text read into memory and
+    through BeautifulSoup before printing.
+    """
+    from bs4 import BeautifulSoup
+
+    res = requests.get('%s/job/%s/lastBuild/consoleText' % (url, JOB))
+    log = str(BeautifulSoup(res.content, "html.parser")) + "\n"
+    with open(os.devnull, 'w') as out:
+        out.write(log)
+
+
+def streamed_log(url, tail=None):
+    with open(os.devnull, 'w') as out:
+        jenkins_utils.get_build_log(JOB, 'user', 'pw', url, out=out, tail=tail)
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def in_child(function, *args):
+    """
+    Calls function with args in a forked process, so the server's memory does not
+    count, and returns the elapsed seconds and how much the peak rss grew in MB.
+    """
+    queue = multiprocessing.Queue()
+
+    def run():
+        rss = max_rss()
+        start = time.time()
+        function(*args)
+        queue.put((time.time() - start, max_rss() - rss))
+
+    process = multiprocessing.Process(target=run)
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, default=500, help='number of jobs')
+    parser.add_argument('--builds', type=int, default=20, help='builds of every job')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds the server delays every request by')
+    parser.add_argument('--log-size', type=int, default=100,
+                        help='size of the console log of the build in MB')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    server = StandInServer(args.latency)
+    for num in range(args.jobs):
+        server.add_job('job-%i' % num, ['SUCCESS'] * args.builds)
+    line = 'x' * 99 + '\n'
+    server.append_log(JOB, '\n' + line * (args.log_size * 1024 * 1024 / len(line)))
+    server.start()
+    url = server.url + '/jenkins'
+    print('%i jobs of %i builds, %.0f ms latency'
+          % (args.jobs, args.builds, args.latency * 1000))
+    runs = (('build status, jenkinsapi (previous)', jenkinsapi_status, (url,)),
+            ('build status, tree query', jenkins_utils.get_build_status,
+             (JOB, 'user', 'pw', url)),
+            ('list builds, jenkinsapi (previous)', jenkinsapi_list, (url,)),
+            ('list builds, cold cache', client_list, (url, path)),
+            ('list builds, warm cache', client_list, (url, path)),
+            ('build status, warm cache', jenkins_utils.get_build_status,
+             (JOB, 'user', 'pw', url, path)),
+            ('build log --tail 50', streamed_log, (url, 50)),
+            ('build log, streamed', streamed_log, (url,)),
+            ('build log, whole (previous)', soup_log, (url,)))
+    try:
+        for name, function, function_args in runs:
+            del server.requests[:]
+            sent = server.sent
+            elapsed, rss = in_child(function, *function_args)
+            print('%-36s %7.3fs %4i requests %7.1f MB sent %7.1f MB peak rss growth'
+                  % (name, elapsed, len(server.requests),
+                     (server.sent - sent) / 1048576.0, rss))
+    finally:
+        server.stop()
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
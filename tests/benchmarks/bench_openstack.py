@@ -0,0 +1,84 @@
+"""
+Latency of the keystone logins and neutron waits of stack up --remote against a
+local keystone and neutron.
+
+Usage:
+    python -m tests.benchmarks.bench_openstack [--latency 0.05] [--ready-delay 2]
+                                               [--ports 0] [--item-latency 0.001]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from servicelab.utils import openstack_utils
+from tests.benchmarks.standin_openstack import StandInCloud
+
+# Note: The fixed sleeps os_ensure_network made before the router interfaces.
+PREVIOUS_SLEEPS = 2 * 5
+
+
+def previous_logins(cloud):
+    """
+    The previous logins: an unscoped one to list the tenants, then a scoped one.
+    """
+    from keystoneclient.v2_0 import client
+
+    keystone = client.Client(username='aaltman', password='secret', auth_url=cloud.auth_url)
+    tenant_id = [tenant.id for tenant in keystone.tenants.list()
+                 if tenant.name == 'ServiceLab'][0]
+    client.Client(username='aaltman', password='secret', auth_url=cloud.auth_url,
+                  tenant_id=tenant_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds the server delays every request by')
+    parser.add_argument('--ready-delay', type=float, default=2.0,
+                        help='seconds before neutron attaches a new subnet')
+    parser.add_argument('--ports', type=int, default=0,
+                        help='VM ports already in the tenant')
+    parser.add_argument('--item-latency', type=float, default=0.001,
+                        help='seconds a listing is delayed by for every item')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    cloud = StandInCloud(args.latency, args.ready_delay)
+    cloud.item_latency = args.item_latency
+    network = cloud.create('networks', {'name': 'vms'})
+    for index in range(args.ports):
+        cloud.create('ports', {'network_id': network['id'], 'device_id': 'vm%i' % index,
+                               'device_owner': 'compute:nova', 'fixed_ips': []})
+    cloud.start()
+    os.environ.update(OS_AUTH_URL=cloud.auth_url, OS_PASSWORD='secret',
+                      OS_USERNAME='aaltman', OS_REGION_NAME='bench',
+                      OS_TENANT_NAME='ServiceLab')
+    os.environ.pop('OS_TENANT_ID', None)
+    print('%.0f ms latency, %i ports in the tenant, subnets ready after %.1fs'
+          % (args.latency * 1000, args.ports, args.ready_delay))
+    runs = (('keystone logins (previous)', previous_logins, (cloud,)),
+            ('stack up --remote, cold', openstack_utils.os_ensure_network, (path,)),
+            ('stack up --remote, warm', openstack_utils.os_ensure_network, (path,)))
+    try:
+        for name, function, function_args in runs:
+            del cloud.requests[:]
+            start = time.time()
+            function(*function_args)
+            keystone = len([url for _, url in cloud.requests
+                            if url.startswith('/identity')])
+            listings = len([url for method, url in cloud.requests
+                            if method == 'GET' and url.startswith('/network') and
+                            url.count('/') == 3])
+            print('%-28s %7.3fs %3i keystone requests %3i neutron requests (%i lists)'
+                  % (name, time.time() - start, keystone, len(cloud.requests) - keystone,
+                     listings))
+        print('%-28s %7.3fs' % ('fixed sleeps (previous)', PREVIOUS_SLEEPS))
+    finally:
+        cloud.stop()
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Latency of stack destroy os-networks on a full SLAB tenant against a local
+keystone and neutron, the previous serial walk against the teardown plan.
+
+Usage:
+    python -m tests.benchmarks.bench_teardown [--latency 0.2] [--networks 4] [--ports 10]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from servicelab.utils import openstack_utils
+from tests.benchmarks.standin_openstack import StandInCloud
+
+
+def fill(cloud, networks, ports):
+    """
+    A tenant with SLAB networks, each with a subnet, VM ports and an interface
+    on one router.
+    """
+    tenant_id = cloud.tenants[0]['id']
+    router = cloud.create('routers', {'name': 'SLAB_aaltman_ServiceLab_router',
+                                      'tenant_id': tenant_id})
+    for index in range(networks):
+        network = cloud.create('networks', {'name': 'SLAB_aaltman_%i_network' % index,
+                                            'tenant_id': tenant_id})
+        subnet = cloud.create('subnets', {'name': 'SLAB_aaltman_%i_subnet' % index,
+                                          'network_id': network['id'],
+                                          'tenant_id': tenant_id,
+                                          'cidr': '192.168.%i.0/24' % index})
+        owners = [('compute:nova', 'vm%i' % port) for port in range(ports)]
+        owners.append(('network:router_interface', router['id']))
+        for owner, device in owners:
+            cloud.create('ports', {'network_id': network['id'], 'device_id': device,
+                                   'device_owner': owner, 'tenant_id': tenant_id,
+                                   'fixed_ips': [{'subnet_id': subnet['id'],
+                                                  'ip_address': ''}]})
+    cloud.settle(force=True)
+
+
+def previous_teardown(path):
+    """
+    The previous os_delete_networks: a listing of every port per network, the
+    ports, subnets and network one after the other, then the routers.
+    """
+    slab = openstack_utils.SLab_OS(path=path, password='secret', username='aaltman',
+                                   base_url='bench')
+    slab.os_tenant_name = 'ServiceLab'
+    _, slab.tenant_id, _ = slab.login_or_gettoken()
+    slab.connect_to_neutron()
+    neutron = slab.neutron
+    for network in neutron.list_networks()['networks']:
+        if network['tenant_id'] != slab.tenant_id or 'SLAB' not in network['name']:
+            continue
+        for port in neutron.list_ports()['ports']:
+            if network['id'] == port['network_id']:
+                if port['device_owner'] == 'network:router_interface':
+                    # Note: The previous code cleared device_owner to delete an
+                    #       interface as a port, the stand-in refuses that.
+                    neutron.remove_interface_router(port['device_id'],
+                                                    {'port_id': port['id']})
+                elif port['device_owner'] != 'network:dhcp':
+                    neutron.update_port(port['id'], {'port': {'device_owner': ''}})
+                    neutron.delete_port(port['id'])
+        for subnet in network['subnets']:
+            neutron.delete_subnet(subnet)
+        neutron.delete_network(network['id'])
+    for router in neutron.list_routers(retrieve_all=True)['routers']:
+        if router['tenant_id'] == slab.tenant_id:
+            neutron.delete_router(router['id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='seconds the server delays every request by')
+    parser.add_argument('--networks', type=int, default=4, help='SLAB networks')
+    parser.add_argument('--ports', type=int, default=10, help='VM ports per network')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    cloud = StandInCloud(args.latency)
+    cloud.start()
+    os.environ.update(OS_AUTH_URL=cloud.auth_url, OS_PASSWORD='secret',
+                      OS_USERNAME='aaltman', OS_REGION_NAME='bench',
+                      OS_TENANT_NAME='ServiceLab')
+    os.environ.pop('OS_TENANT_ID', None)
+    print('%.0f ms latency, %i networks with %i ports' % (args.latency * 1000,
+                                                          args.networks, args.ports))
+    runs = (('destroy os-networks (previous)', previous_teardown),
+            ('destroy os-networks', lambda path: openstack_utils.os_delete_networks(path,
+                                                                                    True)))
+    try:
+        for name, function in runs:
+            fill(cloud, args.networks, args.ports)
+            del cloud.requests[:]
+            start = time.time()
+            function(path)
+            left = sum(len([item for item in items.values()
+                            if item['tenant_id'] == cloud.tenants[0]['id']])
+                       for items in cloud.resources.values())
+            print('%-32s %7.3fs %4i neutron requests %3i resources left'
+                  % (name, time.time() - start, len(cloud.requests), left))
+    finally:
+        cloud.stop()
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
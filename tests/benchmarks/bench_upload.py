@@ -0,0 +1,114 @@
+"""
+Upload throughput against a local stand-in for Artifactory and Pulp.
+
+Usage:
+    python -m tests.benchmarks.bench_upload [--files 4] [--size 20] [--latency 0.02]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess32 as subprocess
+
+import requests
+
+from servicelab.utils import upload_utils
+from tests.benchmarks.standin_server import StandInServer
+
+
+def timed(function, *args):
+    """
+    Calls function with args and returns the elapsed seconds.
+    """
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+def curl_upload(server, files):
+    """
+    The previous stack artifact upload, one curl -X PUT per file.
+    """
+    for fname in files:
+        subprocess.check_call(['curl', '-s', '-o', os.devnull, '-X', 'PUT',
+                               '--upload-file', fname,
+                               '%s/artifactory/curl/%s' % (server.url,
+                                                           os.path.basename(fname)),
+                               '-u', 'user:password'])
+
+
+def pulp_chunked_upload(server, files):
+    """
+    The previous stack rpm upload, 100000 byte segments read and sent one at a
+    time with a new connection each.
+    """
+    uploads = '/pulp/api/v2/content/uploads/'
+    for fname in files:
+        upload_id = requests.post(server.url + uploads).json()['upload_id']
+        with open(fname, 'rb') as rpm_file:
+            offset = 0
+            for chunk in iter(lambda: rpm_file.read(100000), ''):
+                requests.put('%s%s%s/%s/' % (server.url, uploads, upload_id, offset),
+                             data=chunk, headers={"Content-Type": "multipart/form-data"})
+                offset += 100000
+        requests.post(server.url + '/pulp/api/v2/repositories/old/actions/import_upload/',
+                      json={'upload_id': upload_id})
+
+
+def pulp_upload(server, files, workers):
+    uploader = upload_utils.PulpUploader(server.url, workers=workers)
+    try:
+        uploader.upload('new', files)
+    finally:
+        uploader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=4, help='number of files')
+    parser.add_argument('--size', type=int, default=20, help='size of every file in MB')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds the server delays every request by')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent requests')
+    args = parser.parse_args()
+
+    tempdir = tempfile.mkdtemp()
+    server = StandInServer(args.latency)
+    server.start()
+    try:
+        files = []
+        for num in range(args.files):
+            fname = os.path.join(tempdir, 'pkg-%i.rpm' % num)
+            with open(fname, 'wb') as stream:
+                for _ in range(args.size):
+                    stream.write(os.urandom(1024 * 1024))
+            files.append(fname)
+        total = args.files * args.size
+        print('%i files, %i MB, %.0f ms latency'
+              % (args.files, total, args.latency * 1000))
+
+        runs = []
+        try:
+            runs.append(('artifactory curl (previous)', timed(curl_upload, server, files)))
+        except OSError:
+            print('curl not found, skipping the previous artifactory upload')
+        runs.append(('artifactory streamed', timed(
+            upload_utils.artifactory_upload_files, files,
+            server.url + '/artifactory/new/', None, True, args.workers)))
+        runs.append(('artifactory checksum deploy', timed(
+            upload_utils.artifactory_upload_files, files,
+            server.url + '/artifactory/again/', None, True, args.workers)))
+        runs.append(('pulp 100 kB segments (previous)',
+                     timed(pulp_chunked_upload, server, files)))
+        runs.append(('pulp parallel segments',
+                     timed(pulp_upload, server, files, args.workers)))
+        for name, elapsed in runs:
+            print('%-32s %7.2fs %8.1f MB/s' % (name, elapsed, total / elapsed))
+    finally:
+        server.stop()
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
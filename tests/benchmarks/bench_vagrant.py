@@ -0,0 +1,94 @@
+"""
+Vagrant runs and latency of the VM state checks of a stack up and a stack status,
+against a vagrant that takes as long as the real one to start Ruby.
+
+Usage:
+    python -m tests.benchmarks.bench_vagrant [--startup 1.5] [--vms 6]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from servicelab.utils import vagrant_utils
+from servicelab.utils import openstack_utils
+from servicelab.utils import status_utils
+from tests.benchmarks.standin_vagrant import StandInVagrant
+
+
+def previous_connect(path):
+    """
+    The previous Connect_to_vagrant: a plugin list, and a plugin install for every
+    plugin since names were compared to Plugin tuples.
+    """
+    import vagrant
+
+    v = vagrant.Vagrant(root=path, quiet_stdout=False, quiet_stderr=False)
+    plugins = v.plugin_list()
+    for plugin in vagrant_utils.REQUIRED_PLUGINS:
+        if plugin not in plugins:
+            v._call_vagrant_command(['plugin', 'install', plugin])
+    return v
+
+
+def previous_checks(path, names):
+    """
+    The checks with the previous code: a connection and a vagrant status for every
+    vm_isrunning, os_check_vms and show_vm_status, and a status per VM in
+    check_vm_is_available.
+    """
+    import vagrant
+
+    for name in names[:2]:
+        previous_connect(path).status(vm_name=name)
+    previous_connect(path).status()
+    previous_connect(path).status()
+    for name in names:
+        vagrant.Vagrant(path).status(name)
+
+
+def checks(path, names):
+    for name in names[:2]:
+        vagrant_utils.vm_isrunning(name, path)
+    openstack_utils.os_check_vms(path)
+    status_utils.show_vm_status(path)
+    vagrant_utils.check_vm_is_available(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--startup', type=float, default=1.5,
+                        help='seconds vagrant takes to start')
+    parser.add_argument('--vms', type=int, default=6, help='VMs in the Vagrantfile')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    path = os.path.join(root, '.stack')
+    names = ['infra-001'] + ['rhel7-%03i' % index for index in range(1, args.vms)]
+    for name in names:
+        os.makedirs(os.path.join(path, '.vagrant', 'machines', name, 'virtualbox'))
+    open(os.path.join(path, 'Vagrantfile'), 'w').close()
+    os.environ['VAGRANT_HOME'] = path
+    vagrant = StandInVagrant(dict((name, 'poweroff') for name in names),
+                             startup=args.startup)
+    vagrant.start()
+    print('%i VMs, vagrant starts in %.1fs' % (args.vms, args.startup))
+    runs = (('previous', previous_checks), ('first command', checks),
+            ('next command', checks))
+    try:
+        for name, function in runs:
+            vagrant_utils._engines.clear()
+            vagrant_utils._plugins_checked.clear()
+            vagrant.clear()
+            start = time.time()
+            function(path, names)
+            print('%-16s %7.2fs %3i vagrant runs'
+                  % (name, time.time() - start, len(vagrant.calls)))
+    finally:
+        vagrant.stop()
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
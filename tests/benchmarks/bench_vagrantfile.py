@@ -0,0 +1,80 @@
+"""
+Vagrantfile writes and latency of adding the VMs of a stack up --full, the
+previous read and rewrite of the whole file per VM against the model rendered once.
+
+Usage:
+    python -m tests.benchmarks.bench_vagrantfile [--vms 60] [--runs 5]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from servicelab.utils import vagrantfile_utils
+
+
+def hosts(count):
+    return [{'rhel7-%03i' % index: {'box': 'http://cis-kickstart.cisco.com/ccs-rhel-7.box',
+                                    'domain': '1', 'ip': '192.168.100.%i' % (index + 2),
+                                    'mac': '0200270000%02x' % index, 'memory': '1024',
+                                    'profile': 'null', 'role': 'none'}}
+            for index in range(count)]
+
+
+def previous_up(path, host_dicts):
+    """
+    The previous stack up --full: every add_virtualbox_vm read the Vagrantfile and
+    wrote it back with the new VM appended.
+    """
+    vfile = vagrantfile_utils.SlabVagrantfile(path)
+    vfile.init_vagrantfile()
+    blocks = vagrantfile_utils.SlabVagrantfile(path)
+    for host_dict in host_dicts:
+        name = host_dict.keys()[0]
+        blocks.add_virtualbox_vm(host_dict, write=False)
+        vfile.append_it(blocks.vms[name])
+    return len(host_dicts) + 1
+
+
+def up(path, host_dicts):
+    vfile = vagrantfile_utils.SlabVagrantfile(path)
+    vfile.init_vagrantfile()
+    vfile.add_vms(host_dicts)
+    return vfile.writes
+
+
+def rerun(path, host_dicts):
+    vfile = vagrantfile_utils.SlabVagrantfile(path)
+    vfile.add_vms(host_dicts)
+    return vfile.writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--vms', type=int, default=60, help='VMs of the environment')
+    parser.add_argument('--runs', type=int, default=5, help='runs to average')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    host_dicts = hosts(args.vms)
+    print('%i VMs' % args.vms)
+    runs = (('previous', previous_up), ('stack up --full', up),
+            ('same VMs again', rerun))
+    try:
+        for name, function in runs:
+            elapsed = 0.0
+            for _ in range(args.runs):
+                start = time.time()
+                writes = function(path, host_dicts)
+                elapsed += time.time() - start
+            with open(os.path.join(path, 'Vagrantfile')) as vfile:
+                size = len(vfile.read())
+            print('%-16s %8.2fms %4i writes %7i bytes'
+                  % (name, elapsed * 1000 / args.runs, writes, size))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
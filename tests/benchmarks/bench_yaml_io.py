@@ -0,0 +1,60 @@
+"""
+Parse throughput of the yaml loaders on a synthetic ccs-data tree.
+
+Usage:
+    python -m tests.benchmarks.bench_yaml_io [--hosts 10000]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import yaml
+
+from servicelab.utils import yaml_io
+from tests.benchmarks.ccsdata_tree import make_ccsdata_tree
+
+
+def parse_all(host_files, loader):
+    """
+    Parses every host file with loader and returns the elapsed seconds.
+    """
+    start = time.time()
+    for host_file in host_files:
+        with open(host_file, 'r') as stream:
+            yaml.load(stream, loader)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--hosts', type=int, default=10000,
+                        help='number of host yamls to generate')
+    args = parser.parse_args()
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        host_files = make_ccsdata_tree(tempdir, hosts=args.hosts)
+        total_bytes = sum(os.path.getsize(f) for f in host_files)
+        print('%i host files, %.1f MB, libyaml available: %s'
+              % (len(host_files), total_bytes / 1048576.0, yaml_io.LIBYAML))
+
+        loaders = [('yaml.Loader (previous default)', yaml.Loader),
+                   ('yaml.SafeLoader', yaml.SafeLoader),
+                   ('yaml_io.Loader', yaml_io.Loader),
+                   ('yaml_io.OrderedLoader', yaml_io.OrderedLoader)]
+        baseline = None
+        for name, loader in loaders:
+            elapsed = parse_all(host_files, loader)
+            if baseline is None:
+                baseline = elapsed
+            print('%-32s %7.2fs %9.0f files/s %6.2f MB/s  x%.1f'
+                  % (name, elapsed, len(host_files) / elapsed,
+                     total_bytes / 1048576.0 / elapsed, baseline / elapsed))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Builds a synthetic ccs-data checkout for the benchmarks.
+"""
+import os
+
+from servicelab.utils import yaml_io
+
+
+def host_doc(site, env, num):
+    """
+    Returns the data of one host yaml, shaped like the ones in ccs-data.
+    """
+    third, fourth = divmod(num, 250)
+    hostname = '%s-vm-%05i' % (env, num)
+    return {'deploy_args': {'availability_zone': 'csm-a',
+                            'flavor': '2cpu.4ram.20-96sas',
+                            'image': 'RHEL-7',
+                            'network_name': 'Nimbus-Management-iv66',
+                            'security_groups': 'default',
+                            'subnet_name': 'Nimbus-Management-iv66-subnet',
+                            'tenant': env},
+            'groups': ['virtual', 'redhouse-tenant'],
+            'hostname': '%s.%s.cisco.com' % (hostname, site),
+            'interfaces': {'eth0': {'gateway': '10.%i.0.1' % (third % 250),
+                                    'ip_address': '10.%i.%i.%i' % (third // 250,
+                                                                   third % 250,
+                                                                   fourth + 4),
+                                    'netmask': '255.255.0.0'}},
+            'role': 'none',
+            'type': 'virtual'}
+
+
+def make_ccsdata_tree(stack_path, hosts=10000, sites=10, envs=10):
+    """Writes a services/ccs-data tree with the given number of host yamls under
+       stack_path, spread evenly over sites and envs.
+
+    Args:
+        stack_path (str): Directory to use as the .stack directory
+        hosts (int): Total number of host yamls
+        sites (int): Number of sites
+        envs (int): Number of environments per site
+
+    Returns:
+        host_files (list): Paths of the host yamls written
+    """
+    host_files = []
+    per_env = max(1, hosts // (sites * envs))
+    num = 0
+    for site_num in range(sites):
+        site = 'bench-site-%i' % site_num
+        for env_num in range(envs):
+            env = '%s-env-%i' % (site, env_num)
+            hosts_path = os.path.join(stack_path, 'services', 'ccs-data', 'sites', site,
+                                      'environments', env, 'hosts.d')
+            os.makedirs(hosts_path)
+            for _ in range(per_env):
+                host_file = os.path.join(hosts_path, 'vm-%05i.yaml' % num)
+                yaml_io.dump_file(host_doc(site, env, num), host_file)
+                host_files.append(host_file)
+                num += 1
+    return host_files
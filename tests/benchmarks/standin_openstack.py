@@ -0,0 +1,341 @@
+"""
+A local http server standing in for keystone's v2.0 token api under /identity
+and neutron's v2.0 api under /network.
+
+Neutron is slow on purpose: a network stays in BUILD and a new subnet is not
+attached to its network for ready_delay seconds, and adding a router interface
+to a subnet that is not attached yet is refused with 409 Conflict.  Like
+neutron, it refuses to delete what is still in use with 409 Conflict: a subnet
+with ports other than its DHCP port, a network with subnets or ports, a router
+with interfaces and a port that is a router interface.
+
+Usage:
+    cloud = StandInCloud()
+    cloud.start()
+    ... OS_AUTH_URL=cloud.url + '/identity/v2.0' ...
+    cloud.stop()
+"""
+import json
+import time
+import uuid
+import urlparse
+import datetime
+import threading
+import BaseHTTPServer
+import SocketServer
+
+IDENTITY = '/identity/v2.0'
+NETWORK = '/network/v2.0/'
+
+# Note: Collections in the neutron urls and the keys of their json documents.
+COLLECTIONS = {'networks': 'network', 'subnets': 'subnet', 'routers': 'router',
+               'ports': 'port', 'security-groups': 'security_group',
+               'security-group-rules': 'security_group_rule'}
+
+
+class StandInCloudHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles the requests, keeping all state on the server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, body=None):
+        body = '' if body is None else json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or 'null')
+
+    def _handle(self):
+        server = self.server
+        path = self.path.split('?')[0]
+        with server.lock:
+            server.requests.append((self.command, path))
+        time.sleep(server.latency)
+        if path.startswith(IDENTITY):
+            return self._identity(path[len(IDENTITY):])
+        if path.startswith(NETWORK):
+            with server.lock:
+                if self.headers.getheader('X-Auth-Token') not in server.tokens:
+                    return self._reply(401, {'error': {'message': 'Unauthorized'}})
+                return self._network(path[len(NETWORK):])
+        return self._reply(404)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def _identity(self, path):
+        server = self.server
+        if self.command == 'POST' and path == '/tokens':
+            auth = self._body()['auth']
+            credentials = auth.get('passwordCredentials', {})
+            if credentials != {'username': server.username, 'password': server.password}:
+                return self._reply(401, {'error': {'message': 'Invalid user / password',
+                                                   'code': 401}})
+            tenant = None
+            if auth.get('tenantId') or auth.get('tenantName'):
+                tenant = server.tenant(auth.get('tenantId'), auth.get('tenantName'))
+                if tenant is None:
+                    return self._reply(401, {'error': {'message': 'Unknown tenant',
+                                                       'code': 401}})
+            with server.lock:
+                server.logins.append(tenant and tenant['name'])
+            return self._reply(200, server.issue(tenant))
+        if self.command == 'GET' and path == '/tenants':
+            if self.headers.getheader('X-Auth-Token') not in server.tokens:
+                return self._reply(401)
+            return self._reply(200, {'tenants': server.tenants, 'tenants_links': []})
+        return self._reply(404)
+
+    def _network(self, path):
+        server = self.server
+        server.settle()
+        parts = path.rsplit('.json', 1)[0].split('/')
+        collection = parts[0]
+        if collection not in COLLECTIONS:
+            return self._reply(404)
+        key = COLLECTIONS[collection]
+        items = server.resources[collection]
+        if self.command == 'GET' and len(parts) == 1:
+            filters = urlparse.parse_qsl(urlparse.urlsplit(self.path).query)
+            found = [item for item in items.values()
+                     if all(str(item.get(name)).lower() == value.lower()
+                            for name, value in filters if name != 'fields')]
+            time.sleep(server.item_latency * len(found))
+            return self._reply(200, {collection.replace('-', '_'): found,
+                                     collection.replace('-', '_') + '_links': []})
+        if self.command == 'POST' and len(parts) == 1:
+            item = server.create(collection, self._body()[key])
+            return self._reply(201, {key: item})
+        if parts[1] not in items:
+            return self._reply(404, {'NeutronError': {'message': '%s not found' % key,
+                                                      'type': 'NotFound', 'detail': ''}})
+        if self.command == 'GET':
+            return self._reply(200, {key: items[parts[1]]})
+        if self.command == 'DELETE':
+            reason = server.in_use(collection, parts[1])
+            if reason:
+                return self._reply(409, {'NeutronError': {
+                    'message': reason, 'type': 'Conflict', 'detail': ''}})
+            server.delete(collection, parts[1])
+            return self._reply(204)
+        if self.command == 'PUT' and parts[2:] == ['add_router_interface']:
+            subnet = server.resources['subnets'].get(self._body()['subnet_id'])
+            if subnet is None or subnet['id'] in server.pending:
+                return self._reply(409, {'NeutronError': {
+                    'message': 'Subnet is not ready', 'type': 'Conflict', 'detail': ''}})
+            port = server.create('ports', {
+                'network_id': subnet['network_id'], 'device_id': parts[1],
+                'device_owner': 'network:router_interface',
+                'fixed_ips': [{'subnet_id': subnet['id'],
+                               'ip_address': subnet['gateway_ip']}]})
+            return self._reply(200, {'subnet_id': subnet['id'], 'port_id': port['id'],
+                                     'id': parts[1], 'tenant_id': subnet['tenant_id']})
+        if self.command == 'PUT' and parts[2:] == ['remove_router_interface']:
+            body = self._body()
+            with server.lock:
+                found = [port for port in server.resources['ports'].values()
+                         if port['device_id'] == parts[1] and
+                         port['device_owner'] == 'network:router_interface' and
+                         (port['id'] == body.get('port_id') or
+                          body.get('subnet_id') in [ip['subnet_id']
+                                                    for ip in port['fixed_ips']])]
+            if not found:
+                return self._reply(404, {'NeutronError': {
+                    'message': 'Router has no such interface', 'type': 'NotFound',
+                    'detail': ''}})
+            server.delete('ports', found[0]['id'])
+            return self._reply(200, {'subnet_id': found[0]['fixed_ips'][0]['subnet_id'],
+                                     'port_id': found[0]['id'], 'id': parts[1]})
+        if self.command == 'PUT':
+            items[parts[1]].update(self._body()[key])
+            return self._reply(200, {key: items[parts[1]]})
+        return self._reply(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInCloud(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The server, recording what it was asked.
+
+    Attributes:
+        latency (float): Seconds every request is delayed by
+        item_latency (float): Seconds a listing is delayed by for every item
+        ready_delay (float): Seconds before a new network is ACTIVE and a new
+                             subnet is attached to its network
+        token_ttl (float): Seconds a token is valid for
+        tenants (list): The tenants, with an id and a name
+        resources (dict): Neutron resources by id, by collection
+        pending (dict): When each new network and subnet will be ready, by id
+        conflicts (dict): Deletions to refuse with 409 Conflict before allowing
+                          them, by id, as neutron does while an agent is busy
+        tokens (dict): Valid tokens and their tenant
+        logins (list): Tenant name of every token issued, None if unscoped
+        requests (list): (method, path) of every request
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, ready_delay=0.0, token_ttl=3600, username='aaltman',
+                 password='secret', tenants=('ServiceLab',)):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInCloudHandler)
+        self.latency = latency
+        self.item_latency = 0.0
+        self.ready_delay = ready_delay
+        self.token_ttl = token_ttl
+        self.username = username
+        self.password = password
+        self.tenants = [{'id': uuid.uuid4().hex, 'name': name, 'enabled': True,
+                         'description': ''} for name in tenants]
+        self.resources = dict((collection, {}) for collection in COLLECTIONS)
+        self.pending = {}
+        self.conflicts = {}
+        self.tokens = {}
+        self.logins = []
+        self.requests = []
+        self.lock = threading.RLock()
+        self.create('networks', {'name': 'public-floating-602', 'router:external': True,
+                                 'tenant_id': 'admin'})
+        self.create('networks', {'name': 'SLAB_kunanda_network', 'router:external': False,
+                                 'tenant_id': 'other'})
+        self.settle(force=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%i' % self.server_port
+
+    @property
+    def auth_url(self):
+        return self.url + IDENTITY
+
+    def tenant(self, tenant_id=None, name=None):
+        for tenant in self.tenants:
+            if tenant['id'] == tenant_id or (not tenant_id and tenant['name'] == name):
+                return tenant
+        return None
+
+    def issue(self, tenant):
+        """
+        Returns the access document of a new token, scoped to tenant if given.
+        """
+        token = uuid.uuid4().hex
+        expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.token_ttl)
+        with self.lock:
+            self.tokens[token] = tenant
+        access = {'token': {'id': token, 'expires': expires.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                            'issued_at': datetime.datetime.utcnow().isoformat()},
+                  'user': {'id': uuid.uuid4().hex, 'name': self.username,
+                           'username': self.username, 'roles': []},
+                  'serviceCatalog': [], 'metadata': {'roles': [], 'is_admin': 0}}
+        if tenant:
+            access['token']['tenant'] = tenant
+            access['serviceCatalog'] = [{
+                'type': 'network', 'name': 'neutron', 'endpoints_links': [],
+                'endpoints': [{'region': 'RegionOne', 'publicURL': self.url + '/network',
+                               'internalURL': self.url + '/network',
+                               'adminURL': self.url + '/network'}]}]
+        return {'access': access}
+
+    def revoke(self):
+        """
+        Revoke every token.
+        """
+        with self.lock:
+            self.tokens.clear()
+
+    def create(self, collection, item):
+        item = dict(item, id=str(uuid.uuid4()))
+        item.setdefault('tenant_id', self.tenants[0]['id'])
+        ready = time.time() + self.ready_delay
+        with self.lock:
+            if collection == 'networks':
+                item.update(status='BUILD', subnets=[], shared=False)
+                item.setdefault('router:external', False)
+                self.pending[item['id']] = ready
+            elif collection == 'subnets':
+                item.setdefault('enable_dhcp', True)
+                self.pending[item['id']] = ready
+                if item['enable_dhcp']:
+                    self.create('ports', {
+                        'network_id': item['network_id'], 'tenant_id': item['tenant_id'],
+                        'device_id': 'dhcp' + item['network_id'],
+                        'device_owner': 'network:dhcp',
+                        'fixed_ips': [{'subnet_id': item['id'], 'ip_address': ''}]})
+            elif collection == 'routers':
+                item['status'] = 'ACTIVE'
+            elif collection == 'security-groups':
+                item['security_group_rules'] = []
+            self.resources[collection][item['id']] = item
+        return item
+
+    def in_use(self, collection, item_id):
+        """
+        Returns why deleting a resource is refused, None if it is not.
+        """
+        with self.lock:
+            if self.conflicts.get(item_id):
+                self.conflicts[item_id] -= 1
+                return 'Resource %s is busy' % item_id
+            ports = self.resources['ports'].values()
+            if collection == 'subnets':
+                if [port for port in ports if port['device_owner'] != 'network:dhcp' and
+                        item_id in [ip['subnet_id'] for ip in port['fixed_ips']]]:
+                    return 'Subnet %s has ports in use' % item_id
+            elif collection == 'networks':
+                if [subnet for subnet in self.resources['subnets'].values()
+                        if subnet['network_id'] == item_id]:
+                    return 'Network %s has subnets' % item_id
+                if [port for port in ports if port['network_id'] == item_id]:
+                    return 'Network %s has ports in use' % item_id
+            elif collection == 'routers':
+                if [port for port in ports if port['device_id'] == item_id]:
+                    return 'Router %s has interfaces' % item_id
+            elif collection == 'ports':
+                port = self.resources['ports'][item_id]
+                if port['device_owner'] == 'network:router_interface':
+                    return 'Port %s is a router interface' % item_id
+        return None
+
+    def delete(self, collection, item_id):
+        with self.lock:
+            item = self.resources[collection].pop(item_id, None)
+            self.pending.pop(item_id, None)
+            if collection == 'subnets' and item:
+                for port in self.resources['ports'].values():
+                    if item_id in [ip['subnet_id'] for ip in port['fixed_ips']]:
+                        del self.resources['ports'][port['id']]
+                network = self.resources['networks'].get(item['network_id'])
+                if network and item_id in network['subnets']:
+                    network['subnets'].remove(item_id)
+
+    def settle(self, force=False):
+        """
+        Make the networks and subnets whose time has come ready.
+        """
+        now = time.time()
+        with self.lock:
+            for item_id, ready in self.pending.items():
+                if ready > now and not force:
+                    continue
+                del self.pending[item_id]
+                if item_id in self.resources['networks']:
+                    self.resources['networks'][item_id]['status'] = 'ACTIVE'
+                subnet = self.resources['subnets'].get(item_id)
+                if subnet:
+                    network = self.resources['networks'].get(subnet['network_id'])
+                    if network:
+                        network['subnets'].append(item_id)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
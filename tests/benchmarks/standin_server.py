@@ -0,0 +1,557 @@
+"""
+A local http server standing in for the Artifactory deploy and Pulp upload apis,
+for GoCD pipelines running scripted stages and for the json api of a Jenkins
+server under /jenkins.  Any other GET is answered with a small json document.
+
+Usage:
+    server = StandInServer()
+    server.start()
+    ... talk to server.url ...
+    server.stop()
+"""
+import sys
+import ssl
+import json
+import time
+import urllib
+import hashlib
+import urlparse
+import threading
+import BaseHTTPServer
+import SocketServer
+
+UPLOADS = '/pulp/api/v2/content/uploads/'
+REPOSITORIES = '/pulp/api/v2/repositories/'
+TASKS = '/pulp/api/v2/tasks/'
+GO_PIPELINES = '/go/api/pipelines/'
+GO_RUN = '/go/run/'
+JENKINS = '/jenkins'
+
+
+class ScriptedPipeline(object):
+    """
+    A GoCD pipeline whose stages take scripted times and end with scripted results.
+
+    Attributes:
+        name (str): Name of the pipeline
+        stages (list): Dicts of name, duration, result and approval_type
+        counter (int): The current run, 0 before the first one
+        started (dict): When every stage of the current run was scheduled
+        legacy (bool): Report stages like older GoCD versions, without scheduled
+                       and without result for a stage that was not scheduled
+    """
+
+    def __init__(self, name, stages, counter=0, legacy=False):
+        self.name = name
+        self.legacy = legacy
+        self.stages = [dict(zip(('name', 'duration', 'result', 'approval_type'), stage))
+                       for stage in stages]
+        self.counter = counter
+        self.started = {}
+
+    def run(self, now):
+        """
+        Start a new run with its first stage.
+        """
+        self.counter += 1
+        self.started = {self.stages[0]['name']: now}
+
+    def schedule_stage(self, stage_name, now):
+        self.started.setdefault(stage_name, now)
+
+    def instance(self, now):
+        """
+        The current run as the GoCD pipeline instance api returns it at time now.
+        Stages approved on success start as soon as the one before passed.
+        """
+        stages = []
+        end = None
+        for stage in self.stages:
+            start = self.started.get(stage['name'])
+            if (start is None and end is not None and stages[-1]['result'] == 'Passed' and
+                    stage['approval_type'] == 'success'):
+                start = self.started[stage['name']] = end
+            reported = {'name': stage['name'], 'approval_type': stage['approval_type'],
+                        'scheduled': start is not None, 'result': 'Unknown'}
+            end = None
+            if start is not None and now >= start + stage['duration']:
+                end = start + stage['duration']
+                reported['result'] = stage['result']
+            if self.legacy:
+                if not reported.pop('scheduled'):
+                    del reported['result']
+            stages.append(reported)
+        return {'name': self.name, 'counter': self.counter, 'stages': stages}
+
+    def schedulable(self, now):
+        return not [stage for stage in self.instance(now)['stages']
+                    if stage.get('scheduled', 'result' in stage) and
+                    stage.get('result') == 'Unknown']
+
+
+def project(data, tree):
+    """
+    The fields of data a Jenkins tree parameter asks for, e.g. jobs[name,color].
+    """
+    fields = []
+    depth = 0
+    start = 0
+    for pos, char in enumerate(tree + ','):
+        depth += {'[': 1, ']': -1}.get(char, 0)
+        if char == ',' and not depth:
+            fields.append(tree[start:pos])
+            start = pos + 1
+    projected = {}
+    for field in fields:
+        name, _, inner = field.partition('[')
+        if name not in data:
+            continue
+        value = data[name]
+        if inner and isinstance(value, list):
+            value = [project(item, inner[:-1]) for item in value]
+        elif inner and isinstance(value, dict):
+            value = project(value, inner[:-1])
+        projected[name] = value
+    return projected
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles the requests, keeping all state on the server.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, body='', headers=None):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            with self.server.lock:
+                self.server.sent += len(body)
+            self.wfile.write(body)
+
+    def _body(self):
+        """
+        Reads the request body in chunks, returning it and its sha1.
+        """
+        remaining = int(self.headers.getheader('Content-Length') or 0)
+        chunks = []
+        sha1 = hashlib.sha1()
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 65536))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            sha1.update(chunk)
+            chunks.append(chunk)
+        return ''.join(chunks), sha1.hexdigest()
+
+    def _handle(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path))
+            server.running += 1
+            server.peak = max(server.peak, server.running)
+        try:
+            time.sleep(server.latency)
+            getattr(self, '_%s' % self.command.lower())()
+        finally:
+            with server.lock:
+                server.running -= 1
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _handle
+
+    def _get(self):
+        if self.path.startswith(TASKS):
+            with self.server.lock:
+                task = self.server.tasks.get(self.path[len(TASKS):].strip('/'))
+                if task is None:
+                    return self._reply(404)
+                return self._reply(200, dict(task))
+        if self.path.startswith(GO_PIPELINES):
+            return self._go_get()
+        if self.path.startswith(JENKINS + '/'):
+            return self._jenkins_get()
+        return self._reply(200, {'path': self.path})
+
+    _head = _get
+
+    def _jenkins_get(self):
+        """
+        The json api of the server, its jobs and builds, honouring tree, and the
+        console text of builds, whole or from a byte offset.
+        """
+        url = urlparse.urlsplit(self.path)
+        parts = [urllib.unquote(part)
+                 for part in url.path[len(JENKINS):].strip('/').split('/')]
+        with self.server.lock:
+            if parts == ['api', 'json']:
+                data = {'jobs': [self.server.jenkins_job(name)
+                                 for name in sorted(self.server.jobs)]}
+            elif parts[0] != 'job' or parts[1] not in self.server.jobs:
+                return self._reply(404)
+            elif parts[2:] == ['api', 'json']:
+                data = self.server.jenkins_job(parts[1])
+            elif parts[-1] == 'consoleText' and len(parts) == 4:
+                build = self.server.jenkins_record(parts[1], parts[2])
+                if build is None:
+                    return self._reply(404)
+                return self._reply(200, str(build['log']))
+            elif parts[3:] == ['logText', 'progressiveText']:
+                build = self.server.jenkins_record(parts[1], parts[2])
+                if build is None:
+                    return self._reply(404)
+                log = str(build['log'])
+                start = int(urlparse.parse_qs(url.query).get('start', ['0'])[0])
+                # Note: Jenkins starts over when asked for more than there is.
+                if start > len(log):
+                    start = 0
+                headers = {'X-Text-Size': str(len(log))}
+                if build['building']:
+                    headers['X-More-Data'] = 'true'
+                return self._reply(200, log[start:], headers)
+            elif parts[3:] == ['api', 'json']:
+                data = self.server.jenkins_build(parts[1], parts[2])
+                if data is None:
+                    return self._reply(404)
+            else:
+                return self._reply(404)
+        tree = urlparse.parse_qs(url.query).get('tree')
+        if tree:
+            data = project(data, tree[0])
+        return self._reply(200, data, {'Content-Type': 'application/json'})
+
+    def _jenkins_post(self):
+        """
+        Start a build of a job, or retrigger one of its builds.
+        """
+        self._body()
+        parts = [urllib.unquote(part)
+                 for part in self.path[len(JENKINS):].strip('/').split('/')]
+        with self.server.lock:
+            if parts[0] != 'job' or parts[1] not in self.server.jobs or \
+                    parts[-1] not in ('build', 'gerrit-trigger-retrigger-this'):
+                return self._reply(404)
+            self.server.jobs[parts[1]].append({'result': None, 'building': True,
+                                               'log': 'Started by user'})
+        return self._reply(201)
+
+    def _go_get(self):
+        """
+        Pipeline history, instance and status, with an ETag honoured by
+        If-None-Match.
+        """
+        server = self.server
+        parts = self.path[len(GO_PIPELINES):].strip('/').split('/')
+        with server.lock:
+            pipeline = server.pipelines.get(parts[0])
+            if pipeline is None:
+                return self._reply(404)
+            now = time.time()
+            if parts[1:] == ['history', '0']:
+                body = {'pipelines': [pipeline.instance(now)] if pipeline.counter else []}
+            elif parts[1:2] == ['instance'] and parts[2:] == [str(pipeline.counter)]:
+                body = pipeline.instance(now)
+            elif parts[1:] == ['status']:
+                body = {'locked': False, 'paused': False,
+                        'schedulable': pipeline.schedulable(now)}
+            else:
+                return self._reply(404)
+        body = json.dumps(body)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.getheader('If-None-Match') == etag:
+            with server.lock:
+                server.not_modified += 1
+            return self._reply(304, '', {'ETag': etag})
+        return self._reply(200, body, {'ETag': etag, 'Content-Type': 'application/json'})
+
+    def _go_post(self):
+        """
+        Schedule a pipeline or a stage of its current run.
+        """
+        server = self.server
+        self._body()
+        with server.lock:
+            if self.path.startswith(GO_RUN):
+                name, counter, stage = self.path[len(GO_RUN):].strip('/').split('/')
+                pipeline = server.pipelines.get(name)
+                if pipeline is None or counter != str(pipeline.counter):
+                    return self._reply(404)
+                pipeline.schedule_stage(stage, time.time())
+                return self._reply(200, 'null')
+            name, action = self.path[len(GO_PIPELINES):].strip('/').split('/')
+            if name not in server.pipelines or action != 'schedule':
+                return self._reply(404)
+            server.pipelines[name].run(time.time())
+        return self._reply(202, 'Request to schedule pipeline %s accepted' % name)
+
+    def _put(self):
+        server = self.server
+        if self.path.startswith(UPLOADS):
+            upload_id, offset = self.path[len(UPLOADS):].strip('/').split('/')
+            data, _ = self._body()
+            with server.lock:
+                if upload_id not in server.uploads:
+                    return self._reply(404)
+                server.uploads[upload_id][int(offset)] = data
+            return self._reply(200, 'null')
+        sha1 = self.headers.getheader('X-Checksum-Sha1')
+        if self.headers.getheader('X-Checksum-Deploy') == 'true':
+            self._body()
+            with server.lock:
+                if sha1 not in server.blobs:
+                    return self._reply(404, {'errors': [{'status': 404}]})
+                server.artifacts[self.path] = sha1
+            return self._reply(201, {'path': self.path})
+        data, actual = self._body()
+        if sha1 and sha1 != actual:
+            return self._reply(409, {'errors': [{'status': 409,
+                                                 'message': 'Checksum mismatch'}]})
+        with server.lock:
+            server.blobs[actual] = data
+            server.artifacts[self.path] = actual
+        return self._reply(201, {'path': self.path})
+
+    def _post(self):
+        server = self.server
+        if self.path.startswith(GO_RUN) or self.path.startswith(GO_PIPELINES):
+            return self._go_post()
+        if self.path.startswith(JENKINS + '/'):
+            return self._jenkins_post()
+        payload, _ = self._body()
+        payload = json.loads(payload or 'null')
+        with server.lock:
+            if self.path == UPLOADS:
+                server.next_id += 1
+                upload_id = 'upload-%i' % server.next_id
+                server.uploads[upload_id] = {}
+                return self._reply(201, {'upload_id': upload_id,
+                                         '_href': UPLOADS + upload_id + '/'})
+            if not self.path.startswith(REPOSITORIES):
+                return self._reply(404)
+            repo, _, action = self.path[len(REPOSITORIES):].strip('/').split('/')
+            if action == 'import_upload':
+                if payload['upload_id'] not in server.uploads:
+                    return self._reply(404)
+                task_id = server.spawn(server.import_upload, repo, payload['upload_id'])
+            elif action == 'publish':
+                task_id = server.spawn(server.published.append, repo)
+            else:
+                return self._reply(404)
+        return self._reply(202, {'spawned_tasks': [{'task_id': task_id,
+                                                    '_href': TASKS + task_id + '/'}]})
+
+    def _delete(self):
+        with self.server.lock:
+            self.server.uploads.pop(self.path[len(UPLOADS):].strip('/'), None)
+        return self._reply(200, 'null')
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The server, recording what it was asked.
+
+    Attributes:
+        latency (float): Seconds every request is delayed by
+        certfile (str): Serve https with this certificate and keyfile if set
+        requests (list): (method, path) of every request
+        connections (int): Tcp connections accepted
+        peak (int): Most requests handled at the same time
+        blobs (dict): Artifactory contents by sha1
+        artifacts (dict): Artifactory paths and the sha1 they hold
+        uploads (dict): Pulp upload requests, segments by offset
+        repos (dict): Contents of the rpms imported into every pulp repo
+        published (list): Pulp repos published
+        tasks (dict): Pulp task reports by task id
+        task_delay (float): Seconds a pulp import or publish task runs after the
+                            request that spawned it returned
+        bad_rpms (set): sha1 of rpms whose import task fails
+        pipelines (dict): GoCD pipelines by name, see add_pipeline
+        not_modified (int): GoCD requests answered with 304 Not Modified
+        jobs (dict): Jenkins jobs by name, see add_job
+        sent (int): Bytes of response bodies sent
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, certfile=None, keyfile=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.certfile = certfile
+        if certfile:
+            self.socket = ssl.wrap_socket(self.socket, keyfile=keyfile,
+                                          certfile=certfile, server_side=True)
+        self.lock = threading.RLock()
+        self.requests = []
+        self.connections = 0
+        self.running = self.peak = 0
+        self.blobs = {}
+        self.artifacts = {}
+        self.uploads = {}
+        self.next_id = 0
+        self.repos = {}
+        self.published = []
+        self.tasks = {}
+        self.task_delay = 0.0
+        self.bad_rpms = set()
+        self.pipelines = {}
+        self.not_modified = 0
+        self.jobs = {}
+        self.sent = 0
+
+    def spawn(self, function, *args):
+        """Start a pulp task running function(*args) after task_delay seconds.
+
+        Returns:
+            task_id (str): Its id; the task errors if function raises
+        """
+        with self.lock:
+            self.next_id += 1
+            task_id = 'task-%i' % self.next_id
+            self.tasks[task_id] = {'task_id': task_id, 'state': 'waiting', 'error': None}
+
+        def run():
+            with self.lock:
+                try:
+                    function(*args)
+                    self.tasks[task_id]['state'] = 'finished'
+                except (KeyError, ValueError) as error:
+                    self.tasks[task_id].update(state='error',
+                                               error={'description': str(error)})
+        timer = threading.Timer(self.task_delay, run)
+        timer.daemon = True
+        timer.start()
+        return task_id
+
+    def import_upload(self, repo, upload_id):
+        """The import task, reading the upload request when it runs."""
+        if upload_id not in self.uploads:
+            raise KeyError('Upload request %s not found' % upload_id)
+        segments = self.uploads[upload_id]
+        data = ''.join(segments[offset] for offset in sorted(segments))
+        if hashlib.sha1(data).hexdigest() in self.bad_rpms:
+            raise ValueError('Not a valid rpm')
+        self.repos.setdefault(repo, []).append(data)
+
+    def add_pipeline(self, name, stages, run=True, legacy=False):
+        """Add a GoCD pipeline.
+
+        Args:
+            name (str): Name of the pipeline
+            stages (list): (name, duration, result, approval_type) of every stage,
+                           approval_type success or manual
+            run (bool): Start its first run now
+            legacy (bool): Leave scheduled out of its stages, see ScriptedPipeline
+        """
+        pipeline = ScriptedPipeline(name, stages, legacy=legacy)
+        if run:
+            pipeline.run(time.time())
+        with self.lock:
+            self.pipelines[name] = pipeline
+        return pipeline
+
+    def add_job(self, name, results=()):
+        """Add a Jenkins job.
+
+        Args:
+            name (str): Name of the job
+            results (list): Result of every build, e.g. SUCCESS or FAILURE, None
+                            for a build still running
+        """
+        with self.lock:
+            self.jobs[name] = [{'result': result, 'building': result is None,
+                                'log': 'Build %i of %s' % (num + 1, name)}
+                               for num, result in enumerate(results)]
+
+    def append_log(self, name, text, result=None):
+        """
+        Append text to the log of the last build of a job, finishing the build
+        with result if it is given.
+        """
+        with self.lock:
+            build = self.jobs[name][-1]
+            build['log'] += text
+            if result:
+                build['result'] = result
+                build['building'] = False
+
+    def build_number(self, name, number):
+        """
+        The number of a build, lastBuild for the last one, None if there is none.
+        """
+        builds = self.jobs[name]
+        if number == 'lastBuild':
+            number = len(builds)
+        if not str(number).isdigit() or not 0 < int(number) <= len(builds):
+            return None
+        return int(number)
+
+    def jenkins_record(self, name, number):
+        """
+        The result, building flag and log of a build, None if there is none.
+        """
+        number = self.build_number(name, number)
+        return None if number is None else self.jobs[name][number - 1]
+
+    def jenkins_build(self, name, number):
+        """
+        A build of a job as the Jenkins json api returns it, None if there is none.
+        """
+        number = self.build_number(name, number)
+        if number is None:
+            return None
+        build = self.jobs[name][number - 1]
+        return {'number': number, 'result': build['result'],
+                'building': build['building'],
+                'fullDisplayName': '%s #%s' % (name, number),
+                'url': '%s/job/%s/%s/' % (JENKINS, name, number),
+                'actions': [{'causes': [{'shortDescription': 'Started by user'}]}] * 8,
+                'changeSet': {'items': [{'msg': 'A change'}] * 20}}
+
+    def jenkins_job(self, name):
+        """
+        A job as the Jenkins json api returns it without a tree.
+        """
+        builds = [self.jenkins_build(name, num + 1) for num in range(len(self.jobs[name]))]
+        last = builds[-1] if builds else None
+        color = 'notbuilt'
+        if last:
+            color = {'SUCCESS': 'blue', 'FAILURE': 'red'}.get(last['result'], 'grey')
+            if last['building']:
+                color += '_anime'
+        return {'name': name, 'url': '%s/job/%s/' % (JENKINS, name), 'color': color,
+                'inQueue': False, 'lastBuild': last, 'builds': builds,
+                'description': 'Job %s' % name, 'healthReport': [{'score': 100}]}
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        """
+        Clients dropping https connections without a close_notify are expected.
+        """
+        if not isinstance(sys.exc_info()[1], ssl.SSLError):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+    @property
+    def url(self):
+        return '%s://127.0.0.1:%i' % ('https' if self.certfile else 'http',
+                                      self.server_port)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
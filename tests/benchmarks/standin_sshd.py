@@ -0,0 +1,222 @@
+"""
+A local ssh server standing in for the gerrit ssh commands: ls-projects,
+create-project, query and review.  Any public key is accepted.
+
+Usage:
+    server = StandInGerrit()
+    server.start()
+    ... ssh to 127.0.0.1:server.port ...
+    server.stop()
+"""
+import json
+import time
+import Queue
+import shlex
+import socket
+import threading
+
+import paramiko
+from paramiko.common import MSG_CHANNEL_REQUEST
+
+
+class _Interface(paramiko.ServerInterface):
+    """
+    Accepts every public key and queues exec requests for the StandInGerrit.
+    """
+
+    def __init__(self, gerrit):
+        self.gerrit = gerrit
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        # Note: the command must not run before paramiko replied to the request,
+        #       a client seeing the channel closed first fails with Channel closed.
+        channel.get_transport().commands.put((channel, command))
+        return True
+
+
+class _Transport(paramiko.Transport):
+    """
+    A server transport starting the commands queued by _Interface once the reply
+    to their exec request has been sent.
+    """
+
+    def __init__(self, sock, gerrit):
+        paramiko.Transport.__init__(self, sock)
+        self.gerrit = gerrit
+        self.commands = Queue.Queue()
+        self._channel_handler_table = dict(self._channel_handler_table)
+        self._channel_handler_table[MSG_CHANNEL_REQUEST] = self._handle_request
+
+    def _handle_request(self, channel, message):
+        paramiko.Channel._handle_request(channel, message)
+        while True:
+            try:
+                args = self.commands.get_nowait()
+            except Queue.Empty:
+                return
+            thread = threading.Thread(target=self.gerrit.execute, args=args)
+            thread.daemon = True
+            thread.start()
+
+
+class StandInGerrit(object):
+    """
+    The server, recording what it was asked.
+
+    Attributes:
+        latency (float): Seconds every command takes
+        port (int): The port it listens on
+        projects (list): Names of the projects
+        changes (list): Changes in gerrit's json format, see add_change
+        commands (list): Every command line run
+        reviews (list): Arguments of every gerrit review
+        connections (int): Ssh connections accepted
+        peak (int): Most commands running at the same time
+    """
+
+    def __init__(self, latency=0.0, projects=()):
+        self.latency = latency
+        self.host_key = paramiko.RSAKey.generate(1024)
+        self.projects = list(projects)
+        self.changes = []
+        self.commands = []
+        self.reviews = []
+        self.connections = 0
+        self.running = self.peak = 0
+        self.lock = threading.Lock()
+        self.transports = []
+        self.thread = None
+        self.stopped = False
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+
+    def add_change(self, number, project, owner='aaltman', status='NEW'):
+        """
+        Add a change with one patch set.
+        """
+        change = {'number': str(number), 'project': project, 'branch': 'master',
+                  'id': 'I%040x' % number, 'subject': 'Change %s' % number,
+                  'owner': {'name': owner, 'username': owner},
+                  'url': 'https://gerrit/%s' % number, 'status': status,
+                  'createdOn': 1440000000, 'lastUpdated': 1440000000,
+                  'commitMessage': 'Change %s\n' % number,
+                  'currentPatchSet': {'number': '1', 'revision': '%040x' % number,
+                                      'ref': 'refs/changes/%02d/%s/1' % (number % 100,
+                                                                         number),
+                                      'uploader': {'name': owner},
+                                      'createdOn': 1440000000,
+                                      'sizeInsertions': 1, 'sizeDeletions': 0}}
+        with self.lock:
+            self.changes.append(change)
+        return change
+
+    def _matches(self, change, terms):
+        for term in terms:
+            name, _, value = term.partition(':')
+            if name == 'change' and change['number'] != value:
+                return False
+            if name == 'project' and change['project'] != value:
+                return False
+            if name == 'owner' and change['owner']['username'] != value:
+                return False
+            if name == 'status' and value == 'open' and change['status'] != 'NEW':
+                return False
+        return True
+
+    def gerrit(self, args):
+        """
+        Runs a gerrit command, returns its exit status, stdout and stderr.
+        """
+        if args[:1] == ['ls-projects']:
+            return 0, ''.join(name + '\n' for name in self.projects), ''
+        if args[:1] == ['create-project']:
+            if args[1] in self.projects:
+                return 1, '', 'fatal: Project already exists\n'
+            self.projects.append(args[1])
+            return 0, '', ''
+        if args[:1] == ['query']:
+            terms = [arg for arg in args[1:] if not arg.startswith('--')]
+            with self.lock:
+                found = [change for change in self.changes if self._matches(change, terms)]
+            rows = found + [{'type': 'stats', 'rowCount': len(found)}]
+            return 0, ''.join(json.dumps(row) + '\n' for row in rows), ''
+        if args[:1] == ['review']:
+            revisions = [change['currentPatchSet']['revision'] for change in self.changes]
+            if args[-1] not in revisions:
+                return 1, '', 'fatal: "%s" no such change\n' % args[-1]
+            with self.lock:
+                self.reviews.append(args[1:])
+            return 0, '', ''
+        return 1, '', 'fatal: gerrit: %s: not found\n' % ' '.join(args[:1])
+
+    def execute(self, channel, command):
+        with self.lock:
+            self.commands.append(command)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.latency)
+            args = shlex.split(command)
+            if args[:1] != ['gerrit']:
+                status, output, error = 127, '', 'command not found\n'
+            else:
+                status, output, error = self.gerrit(args[1:])
+            channel.sendall(output)
+            channel.sendall_stderr(error)
+            channel.send_exit_status(status)
+        finally:
+            with self.lock:
+                self.running -= 1
+            channel.close()
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except socket.error:
+                return
+            if self.stopped:
+                client.close()
+                return
+            transport = _Transport(client, self)
+            transport.add_server_key(self.host_key)
+            with self.lock:
+                self.connections += 1
+                self.transports.append(transport)
+            try:
+                transport.start_server(server=_Interface(self))
+            except (paramiko.SSHException, EOFError):
+                continue
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        # Note: On python 2 close leaves the socket listening while _serve waits
+        #       in accept, shutdown wakes it up.
+        self.stopped = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        if self.thread is not None:
+            self.thread.join()
+        for transport in self.transports:
+            transport.close()
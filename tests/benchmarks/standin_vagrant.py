@@ -0,0 +1,123 @@
+"""
+A vagrant executable standing in for the real one: it answers --version, plugin
+list, plugin install, status and destroy from a json file, after sleeping as long
+as vagrant takes to start Ruby, and logs every run.
+
+Usage:
+    vagrant = StandInVagrant({'infra-001': 'running'})
+    vagrant.start()
+    ... vagrant is first on PATH ...
+    vagrant.stop()
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+SCRIPT = '''#!%(python)s
+import os
+import sys
+import json
+import time
+import fcntl
+
+state_file = %(state)r
+with open(%(log)r, 'a') as stream:
+    stream.write(json.dumps([os.getcwd()] + sys.argv[1:]) + '\\n')
+time.sleep(%(startup)r)
+lock = open(state_file + '.lock', 'w')
+fcntl.flock(lock, fcntl.LOCK_EX)
+with open(state_file) as stream:
+    state = json.load(stream)
+args = [arg for arg in sys.argv[1:] if arg != '--machine-readable']
+if args == ['--version']:
+    print('Vagrant ' + state['version'])
+elif args[:2] == ['plugin', 'list']:
+    for plugin in state['plugins']:
+        print('1,,plugin-name,%%s' %% plugin)
+        print('1,%%s,plugin-version,1.0.0' %% plugin)
+elif args[:2] == ['plugin', 'install']:
+    state['plugins'].append(args[2])
+elif args[:1] == ['status']:
+    names = args[1:] or sorted(state['machines'])
+    if [name for name in names if name not in state['machines']]:
+        sys.stderr.write('The machine with the name was not found\\n')
+        sys.exit(1)
+    for name in names:
+        print('1,%%s,provider-name,virtualbox' %% name)
+        print('1,%%s,state,%%s' %% (name, state['machines'][name]))
+elif args[:1] == ['destroy']:
+    for name in args[1:]:
+        if name in state['machines']:
+            state['machines'][name] = 'not_created'
+else:
+    sys.exit(1)
+with open(state_file, 'w') as stream:
+    json.dump(state, stream)
+'''
+
+
+class StandInVagrant(object):
+    """
+    The executable, in a directory of its own put first on PATH by start.
+
+    Attributes:
+        bindir (str): The directory of the executable
+        machines (dict): State of every machine of the Vagrantfile, by name
+        plugins (list): Names of the installed plugins
+        startup (float): Seconds every run sleeps first, vagrant's Ruby startup
+    """
+
+    def __init__(self, machines=None, plugins=('vagrant-hostmanager',
+                                               'vagrant-openstack-provider'),
+                 startup=0.0, version='1.8.1'):
+        self.bindir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.bindir, 'state.json')
+        self.log_file = os.path.join(self.bindir, 'calls.log')
+        self.executable = os.path.join(self.bindir, 'vagrant')
+        self._path = None
+        self.save({'machines': dict(machines or {}), 'plugins': list(plugins),
+                   'version': version})
+        with open(self.executable, 'w') as stream:
+            stream.write(SCRIPT % {'python': sys.executable, 'state': self.state_file,
+                                   'log': self.log_file, 'startup': startup})
+        os.chmod(self.executable, 0o755)
+
+    def load(self):
+        with open(self.state_file) as stream:
+            return json.load(stream)
+
+    def save(self, state):
+        with open(self.state_file, 'w') as stream:
+            json.dump(state, stream)
+
+    @property
+    def machines(self):
+        return self.load()['machines']
+
+    @property
+    def plugins(self):
+        return self.load()['plugins']
+
+    @property
+    def calls(self):
+        """
+        The arguments of every run, after the directory it ran in.
+        """
+        if not os.path.exists(self.log_file):
+            return []
+        with open(self.log_file) as stream:
+            return [json.loads(line) for line in stream]
+
+    def clear(self):
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+
+    def start(self):
+        self._path = os.environ.get('PATH', '')
+        os.environ['PATH'] = self.bindir + os.pathsep + self._path
+
+    def stop(self):
+        os.environ['PATH'] = self._path
+        shutil.rmtree(self.bindir)
@@ -0,0 +1,173 @@
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import boot_utils
+from servicelab.utils import inventory_utils
+
+# Note: Stands in for vagrant.  Records when each vm starts and ends booting
+#       and fails the vms named in FAKE_VAGRANT_FAIL.
+FAKE_VAGRANT = """#!/bin/sh
+echo "Bringing machine '$2' up with '${4:-virtualbox}' provider..."
+echo "start $2 $(date +%s.%N)" >> "$FAKE_VAGRANT_RECORD"
+sleep 0.3
+echo "end $2 $(date +%s.%N)" >> "$FAKE_VAGRANT_RECORD"
+for vm in $FAKE_VAGRANT_FAIL; do
+    if [ "$vm" = "$2" ]; then
+        echo "The VM failed to boot"
+        exit 1
+    fi
+done
+echo "==> $2: Machine booted and ready!"
+"""
+
+
+class TestBootUtils(unittest.TestCase):
+    """
+    TestBootUtils class is a unittest class for boot_utils, run against a fake
+    vagrant executable.
+    """
+    ORDER = ['proxyinternal-001', 'proxyinternal-002', 'db-001', 'db-002', 'db-003',
+             'keystonectl-001', 'keystonectl-002']
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.vagrant = os.path.join(self.tempdir, 'vagrant')
+        with open(self.vagrant, 'w') as stream:
+            stream.write(FAKE_VAGRANT)
+        os.chmod(self.vagrant, os.stat(self.vagrant).st_mode | stat.S_IEXEC)
+        self.record = os.path.join(self.tempdir, 'record')
+        os.environ['FAKE_VAGRANT_RECORD'] = self.record
+        os.environ['FAKE_VAGRANT_FAIL'] = ''
+        self.log_dir = os.path.join(self.tempdir, 'logs')
+
+    def tearDown(self):
+        del os.environ['FAKE_VAGRANT_RECORD']
+        del os.environ['FAKE_VAGRANT_FAIL']
+        shutil.rmtree(self.tempdir)
+
+    def scheduler(self, **kwargs):
+        return boot_utils.BootScheduler(self.tempdir, self.log_dir, vagrant=self.vagrant,
+                                        **kwargs)
+
+    def events(self):
+        """ Returns the (time, event, vm) records of the fake vagrant, by time """
+        with open(self.record) as stream:
+            events = [line.split() for line in stream]
+        return sorted((float(when), event, vm) for event, vm, when in events)
+
+    def max_running(self):
+        running = peak = 0
+        for _, event, _ in self.events():
+            running += 1 if event == 'start' else -1
+            peak = max(peak, running)
+        return peak
+
+    def test_boot_tiers(self):
+        """ Consecutive hosts of one role class form a tier, lists are tiers """
+        self.assertEqual(boot_utils.boot_tiers(self.ORDER),
+                         [['proxyinternal-001', 'proxyinternal-002'],
+                          ['db-001', 'db-002', 'db-003'],
+                          ['keystonectl-001', 'keystonectl-002']])
+        self.assertEqual(boot_utils.boot_tiers(self.ORDER, ['db-002', 'keystonectl-001',
+                                                            'proxyinternal-001']),
+                         [['proxyinternal-001'], ['db-002'], ['keystonectl-001']])
+        self.assertEqual(boot_utils.boot_tiers(['db-001', ['nova-001', 'net-001'],
+                                                'db-002', 'db-001']),
+                         [['db-001'], ['nova-001', 'net-001'], ['db-002']])
+        self.assertEqual(boot_utils.boot_tiers(['db-001', 'keystonectl-001',
+                                                'neutronapi-001', 'ceph-mon-001',
+                                                'net-001', 'nova-001']),
+                         [['db-001'], ['keystonectl-001', 'neutronapi-001'],
+                          ['ceph-mon-001'], ['net-001', 'nova-001']])
+
+    def test_full_tiers(self):
+        """ The vms of stack up --full from the shipped order.yaml boot in role tiers """
+        provision = inventory_utils.get_inventory(os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            'servicelab', '.stack', 'provision'))
+        self.assertEqual(provision.load(), 0)
+        hostnames = [host.keys()[0] for host in provision.hosts_matching('001')]
+        returncode, order = provision.host_order()
+        self.assertEqual(returncode, 0)
+        tiers = boot_utils.boot_tiers(order, hostnames)
+        self.assertEqual([boot_utils.role_class(tier[0]) for tier in tiers],
+                         ['proxy', 'db', 'ctl', 'compute'])
+        self.assertEqual(sorted(tiers[2]), ['ceilometerctl-001', 'cinderctl-001',
+                                            'glancectl-001', 'heatctl-001',
+                                            'keystonectl-001', 'neutronapi-001',
+                                            'novactl-001'])
+        self.assertEqual(tiers[3], ['net-001', 'nova-001'])
+
+    def test_parallel_tiers(self):
+        """ Vms of a tier boot together, tiers one after the other """
+        returncode, results = self.scheduler(parallel=3).boot(
+            boot_utils.boot_tiers(self.ORDER))
+        self.assertEqual(returncode, 0)
+        self.assertEqual([result.vm_name for result in results], self.ORDER)
+        self.assertEqual(self.max_running(), 3)
+        events = self.events()
+        last_db_end = max(when for when, event, vm in events
+                          if event == 'end' and vm.startswith('db-'))
+        first_ks_start = min(when for when, event, vm in events
+                             if event == 'start' and vm.startswith('keystonectl-'))
+        self.assertTrue(last_db_end <= first_ks_start)
+        with open(os.path.join(self.log_dir, 'db-002.log')) as stream:
+            self.assertEqual(stream.read(),
+                             "Bringing machine 'db-002' up with 'virtualbox' provider...\n"
+                             "==> db-002: Machine booted and ready!\n")
+
+    def test_worker_limit(self):
+        """ No more than parallel vms boot at once """
+        returncode, _ = self.scheduler(parallel=2).boot([self.ORDER])
+        self.assertEqual(returncode, 0)
+        self.assertEqual(self.max_running(), 2)
+
+    def test_fail_fast(self):
+        """ After a failure no new vm is started """
+        os.environ['FAKE_VAGRANT_FAIL'] = 'db-001'
+        returncode, results = self.scheduler(parallel=1).boot(
+            boot_utils.boot_tiers(self.ORDER))
+        self.assertEqual(returncode, 1)
+        outcome = dict((result.vm_name, result) for result in results)
+        self.assertFalse(outcome['proxyinternal-002'].failed)
+        self.assertTrue(outcome['db-001'].failed)
+        self.assertTrue(outcome['db-002'].skipped)
+        self.assertTrue(outcome['keystonectl-002'].skipped)
+        self.assertEqual(len(self.events()), 6)
+
+    def test_keep_going(self):
+        """ Without fail fast every vm is tried """
+        os.environ['FAKE_VAGRANT_FAIL'] = 'db-001 keystonectl-002'
+        returncode, results = self.scheduler(parallel=4, fail_fast=False).boot(
+            boot_utils.boot_tiers(self.ORDER))
+        self.assertEqual(returncode, 1)
+        self.assertEqual([result.vm_name for result in results if result.failed],
+                         ['db-001', 'keystonectl-002'])
+        self.assertFalse(any(result.skipped for result in results))
+        with open(os.path.join(self.log_dir, 'db-001.log')) as stream:
+            self.assertIn('The VM failed to boot', stream.read())
+
+    def test_prepare_and_provider(self):
+        """ prepare runs before each boot, the provider is passed to vagrant """
+        prepared = []
+
+        def prepare(vm_name):
+            prepared.append(vm_name)
+            return 1 if vm_name == 'db-003' else 0
+
+        returncode, results = self.scheduler(parallel=2, provider='openstack',
+                                             prepare=prepare,
+                                             hold_until_started=True).boot(
+            [['db-001', 'db-002', 'db-003']])
+        self.assertEqual(returncode, 1)
+        self.assertEqual(sorted(prepared), ['db-001', 'db-002', 'db-003'])
+        self.assertEqual([result.failed for result in results], [False, False, True])
+        with open(os.path.join(self.log_dir, 'db-001.log')) as stream:
+            self.assertIn("with 'openstack' provider", stream.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import time
+import yaml
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import cache_utils
+
+
+class TestCcsdataIndex(unittest.TestCase):
+    """
+    TestCcsdataIndex class is a unittest class for cache_utils.CcsdataIndex.
+    It builds a simulated ccs-data tree in a temporary .stack directory and
+    checks that the index serves unchanged host yamls from the index file and
+    re-reads only the ones that changed.
+
+    Attributes:
+        tempdir: Temporary directory used as the .stack directory
+    """
+
+    def touch_old(self, fname):
+        """ Push the mtime of fname back so the index trusts it right away """
+        old = time.time() - 60
+        os.utime(fname, (old, old))
+
+    def write_host(self, hostname, ip):
+        host_file = os.path.join(self.hostsd_path, hostname + '.yaml')
+        host_data = {'hostname': hostname,
+                     'interfaces': {'eth0': {'ip_address': ip}}}
+        with open(host_file, 'w') as output_file:
+            output_file.write(yaml.dump(host_data, default_flow_style=False))
+        self.touch_old(host_file)
+        return host_file
+
+    def setUp(self):
+        """ setUp function of the TestCcsdataIndex class, it sets up the simulated
+        ccs-data directories and host.yaml files.
+        """
+        self.tempdir = tempfile.mkdtemp()
+        self.site_env_path = os.path.join(self.tempdir, 'services', 'ccs-data', 'sites',
+                                          'test-site-1', 'environments')
+        self.hostsd_path = os.path.join(self.site_env_path, 'test-env-1', 'hosts.d')
+        os.makedirs(self.hostsd_path)
+        for i in range(1, 11):
+            self.write_host('fake-host-' + str(i).zfill(3), '10.11.12.' + str(i))
+        for dirpath, _, _ in os.walk(self.tempdir):
+            self.touch_old(dirpath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_sites(self):
+        """ The index lists sites, envs and host files like list_envs_or_sites """
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        sites = index.sites()
+        self.assertEqual(sites.keys(), ['test-site-1'])
+        self.assertEqual(sorted(sites['test-site-1']['test-env-1']),
+                         ['fake-host-' + str(i).zfill(3) + '.yaml' for i in range(1, 11)])
+
+    def test_warm_index_hits(self):
+        """ A second run against an unchanged tree parses nothing """
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        cold = index.host_data(self.site_env_path)
+        index.save()
+        self.assertEqual(index.summary()['misses'], 12)
+
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        warm = index.host_data(self.site_env_path)
+        self.assertEqual(cold, warm)
+        self.assertEqual(index.run_stats, {'hits': 12, 'misses': 0})
+
+    def test_incremental_update(self):
+        """ Only the changed and added host yamls are re-read """
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        index.host_data(self.site_env_path)
+        index.save()
+
+        self.write_host('fake-host-001', '10.11.12.101')
+        self.write_host('fake-host-011', '10.11.12.11')
+        os.remove(os.path.join(self.hostsd_path, 'fake-host-002.yaml'))
+        self.touch_old(self.hostsd_path)
+
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        site_data = index.host_data(self.site_env_path)
+        hosts = site_data['test-env-1']
+        self.assertEqual(len(hosts), 10)
+        self.assertNotIn('fake-host-002.yaml', hosts)
+        self.assertEqual(hosts['fake-host-001.yaml']['interfaces']['eth0']['ip_address'],
+                         '10.11.12.101')
+        # Note: hosts.d listing, fake-host-001 and fake-host-011 are re-read
+        self.assertEqual(index.run_stats['misses'], 3)
+
+    def test_yaml_types(self):
+        """ Host yamls come back with the types yaml gives, cached or not """
+        host_file = os.path.join(self.hostsd_path, 'fake-host-001.yaml')
+        with open(host_file, 'w') as output_file:
+            output_file.write('hostname: fake-host-001\n'
+                              'built: 2016-03-01\n'
+                              'vlans:\n  100: data\n  200: storage\n'
+                              'weight: 1.5\nenabled: yes\n')
+        self.touch_old(host_file)
+        with open(host_file) as stream:
+            expected = yaml.load(stream)
+
+        def types(data):
+            if isinstance(data, dict):
+                return dict((key, (type(key), types(value)))
+                            for key, value in data.items())
+            return type(data), data
+
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        self.assertEqual(types(index.load_yaml(host_file)), types(expected))
+        index.save()
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        self.assertEqual(types(index.load_yaml(host_file)), types(expected))
+        self.assertEqual(index.run_stats, {'hits': 1, 'misses': 0})
+
+    def test_clear(self):
+        """ Clearing the index removes the index file """
+        index = cache_utils.CcsdataIndex(self.tempdir)
+        self.assertEqual(index.rebuild(), 10)
+        self.assertTrue(os.path.exists(index.index_file))
+        index.clear()
+        self.assertFalse(os.path.exists(index.index_file))
+        self.assertEqual(index.summary()['files'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
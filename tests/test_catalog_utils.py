@@ -0,0 +1,126 @@
+"""
+Tests the gerrit project catalog
+"""
+import os
+import re
+import time
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import catalog_utils
+from servicelab.utils import service_utils
+
+PROJECTS = ['servicelab', 'service-horizon', 'service-heat', 'ccs-data', 'c++-tools',
+            'CCS/Puppet-Modules', 'openstack/nova', 'openstack/neutron']
+
+
+class TestCatalogUtils(unittest.TestCase):
+    """
+    TestCatalogUtils class is a unittest class for catalog_utils, with a shell
+    command standing in for gerrit ls-projects that counts its runs.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.source = os.path.join(self.path, 'gerrit-projects')
+        self.runs = os.path.join(self.path, 'runs')
+        self.set_projects(PROJECTS)
+        self.command = ['sh', '-c', 'echo run >> %s; cat %s' % (self.runs, self.source)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def set_projects(self, projects):
+        with open(self.source, 'w') as stream:
+            stream.write('\n'.join(projects) + '\n')
+
+    def count_runs(self):
+        if not os.path.exists(self.runs):
+            return 0
+        with open(self.runs) as stream:
+            return len(stream.readlines())
+
+    def catalog(self, ttl=catalog_utils.CATALOG_TTL):
+        return catalog_utils.ProjectCatalog(self.path, self.command, ttl)
+
+    def age_catalog(self, seconds):
+        fname = os.path.join(self.path, 'cache', catalog_utils.CATALOG_FILE)
+        stamp = time.time() - seconds
+        os.utime(fname, (stamp, stamp))
+
+    def test_cached(self):
+        """ Gerrit is asked once, later lookups and catalogs read the cache """
+        self.assertEqual(self.catalog().names(), PROJECTS)
+        self.assertEqual(self.count_runs(), 1)
+        catalog = self.catalog()
+        self.assertTrue(catalog.exists('ccs-data'))
+        self.assertEqual(catalog.search('^service-'), ['service-horizon', 'service-heat'])
+        self.assertEqual(self.count_runs(), 1)
+
+    def test_exists(self):
+        """ Names are matched exactly, not as regexes """
+        catalog = self.catalog()
+        self.assertTrue(catalog.exists('service-horizon'))
+        self.assertTrue(catalog.exists('c++-tools'))
+        self.assertFalse(catalog.exists('horizon'))
+        self.assertFalse(catalog.exists('service.horizon'))
+        self.assertEqual(self.count_runs(), 1)
+
+    def test_miss_refreshes(self):
+        """ A name missing from a catalog older than MISS_REFRESH refreshes it """
+        catalog = self.catalog()
+        catalog.names()
+        self.set_projects(PROJECTS + ['service-new'])
+        self.assertFalse(catalog.exists('service-new'))
+        self.age_catalog(catalog_utils.MISS_REFRESH + 1)
+        self.assertTrue(catalog.exists('service-new'))
+        self.assertEqual(self.count_runs(), 2)
+
+    def test_background_refresh(self):
+        """ A stale catalog answers at once while it is refreshed in the background """
+        self.catalog().names()
+        self.set_projects(PROJECTS + ['service-new'])
+        self.age_catalog(10)
+        catalog = self.catalog(ttl=5)
+        self.assertEqual(catalog.names(), PROJECTS)
+        self.assertEqual(catalog.background, 1)
+        self.assertFalse(catalog.refresh_in_background())
+        for _ in range(100):
+            if 'service-new' in catalog.names():
+                break
+            time.sleep(0.05)
+        self.assertEqual(catalog.names(), PROJECTS + ['service-new'])
+        self.assertEqual(catalog.refreshes, 0)
+        self.assertEqual(os.listdir(os.path.join(self.path, 'cache')),
+                         [catalog_utils.CATALOG_FILE])
+
+    def test_search(self):
+        """ The trigram index finds what a scan of every name finds """
+        names = ['team-%i/service-%i' % (num % 50, num) for num in range(5000)] + PROJECTS
+        self.set_projects(names)
+        catalog = self.catalog()
+        for pattern in ('service-12', 'SERVICE-HORIZON', '^openstack/n', 'ccs|nova',
+                        'team-4.*-49$', 'c\\+\\+', '(?i)puppet', 'e-h', '[0-9]{4}$'):
+            self.assertEqual(catalog.search(pattern),
+                             [name for name in names if re.search(pattern, name, re.I)])
+        self.assertEqual(len(catalog.candidates('service-4999')), 1)
+        self.assertRaises(re.error, catalog.search, 'service-(')
+
+    def test_required_literals(self):
+        """ Only literals every match contains are used to narrow down a search """
+        self.assertEqual(catalog_utils.required_literals('^Service-lab.*ccs$'),
+                         ['service-lab', 'ccs'])
+        self.assertEqual(catalog_utils.required_literals('ccs|nova'), [])
+        self.assertEqual(catalog_utils.required_literals('abc?d'), ['ab', 'd'])
+
+    def test_check_service(self):
+        """ check_service looks services up in the catalog """
+        catalog_utils.get_catalog(self.path, self.command).names()
+        self.assertEqual(service_utils.check_service(self.path, 'service-horizon'), 0)
+        self.assertEqual(service_utils.check_service(self.path, 'horizon'), 1)
+        self.assertEqual(self.count_runs(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
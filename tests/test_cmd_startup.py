@@ -0,0 +1,103 @@
+"""
+Tests the start up time of the stack entry point
+"""
+import os
+import ast
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess32 as subprocess
+
+from servicelab import stack
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Note: Libraries only the commands that talk to those services may import.
+HEAVY_MODULES = ['keystoneclient', 'neutronclient', 'vagrant', 'virtualbox', 'fabric',
+                 'paramiko', 'bs4', 'prettytable', 'jenkinsapi', 'gerrit']
+
+# Note: Seconds from starting to import servicelab.stack to the command returning.
+#       stack --help took 0.9s and imported every command before its short help
+#       came from stack.COMMANDS.
+HELP_BUDGET = 0.5
+LIST_SITES_BUDGET = 1.0
+
+# Note: Python 2 has no -X importtime, the script times the imports and the command
+#       in a fresh interpreter and records which heavy libraries got imported.
+SCRIPT = """
+import sys
+import json
+import time
+
+start = time.time()
+from servicelab.stack import cli
+try:
+    cli(sys.argv[2:])
+except SystemExit:
+    pass
+with open(sys.argv[1], 'w') as stream:
+    json.dump({'elapsed': time.time() - start,
+               'modules': sorted(set(name.split('.')[0] for name in sys.modules))},
+              stream)
+"""
+
+
+class TestCmdStartup(unittest.TestCase):
+    """
+    TestCmdStartup class is a unittest class checking that stack --help and cheap
+    commands stay within their start up budget.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def run_stack(self, *args):
+        """
+        Runs stack with args in a new interpreter, returns the elapsed seconds and
+        the top level modules it imported.
+        """
+        result = os.path.join(self.tempdir, 'result.json')
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call([sys.executable, '-c', SCRIPT, result] + list(args),
+                                  cwd=REPO_ROOT, env=env, stdout=devnull, stderr=devnull)
+        with open(result) as stream:
+            data = json.load(stream)
+        return data['elapsed'], data['modules']
+
+    def test_short_help(self):
+        """ COMMANDS lists every command with the short help of its cli """
+        cmd_folder = os.path.join(REPO_ROOT, 'servicelab', 'commands')
+        short_help = {}
+        for name in stack.ComplexCLI().list_commands(None):
+            with open(os.path.join(cmd_folder, 'cmd_%s.py' % name)) as stream:
+                tree = ast.parse(stream.read())
+            for node in tree.body:
+                if isinstance(node, ast.FunctionDef) and node.name == 'cli':
+                    for decorator in node.decorator_list:
+                        for keyword in getattr(decorator, 'keywords', []):
+                            if keyword.arg == 'short_help':
+                                short_help[name] = ast.literal_eval(keyword.value)
+        self.assertEqual(stack.COMMANDS, short_help)
+
+    def test_help(self):
+        """ stack --help imports no command """
+        elapsed, modules = self.run_stack('--help')
+        self.assertEqual([name for name in HEAVY_MODULES if name in modules], [])
+        self.assertNotIn('requests', modules)
+        self.assertLess(elapsed, HELP_BUDGET)
+
+    def test_list_sites(self):
+        """ stack list sites only imports what reading ccs-data needs """
+        elapsed, modules = self.run_stack('list', 'sites')
+        self.assertEqual([name for name in HEAVY_MODULES if name in modules], [])
+        self.assertLess(elapsed, LIST_SITES_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
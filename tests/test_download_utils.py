@@ -0,0 +1,187 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+import SocketServer
+
+from servicelab.utils import download_utils
+
+FILES = dict(('/file%i.rpm' % num, os.urandom(3 * 1024 * 1024 + num))
+             for num in range(4))
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves FILES, honouring Range requests unless the server says otherwise.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.getheader('Range')))
+            server.running += 1
+            server.peak = max(server.peak, server.running)
+        try:
+            time.sleep(server.delay)
+            data = FILES.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            start = 0
+            byte_range = self.headers.getheader('Range')
+            if byte_range and server.ranges:
+                start = int(byte_range.split('=')[1].rstrip('-'))
+                if start >= len(data):
+                    self.send_response(416)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', 'bytes %i-%i/%i'
+                                 % (start, len(data) - 1, len(data)))
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(data) - start))
+            self.end_headers()
+            self.wfile.write(data[start:])
+        finally:
+            with server.lock:
+                server.running -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestDownloadUtils(unittest.TestCase):
+    """
+    TestDownloadUtils class is a unittest class for download_utils, run against
+    a local http server standing in for Artifactory and Pulp.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.running = self.server.peak = 0
+        self.server.delay = 0
+        self.server.ranges = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.base = 'http://127.0.0.1:%i' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tempdir)
+
+    def download(self, name='/file0.rpm', checksum_type='sha256', checksum=None):
+        if checksum is None:
+            checksum = hashlib.new(checksum_type, FILES[name]).hexdigest()
+        return download_utils.Download(self.base + name,
+                                       os.path.join(self.tempdir, name[1:]),
+                                       checksum, checksum_type, len(FILES[name]))
+
+    def read(self, name):
+        with open(os.path.join(self.tempdir, name)) as stream:
+            return stream.read()
+
+    def test_download(self):
+        """ A download is streamed to its destination and verified """
+        download = self.download()
+        self.assertEqual(download_utils.download_file(download),
+                         (0, download.destination))
+        self.assertEqual(self.read('file0.rpm'), FILES['/file0.rpm'])
+        self.assertFalse(os.path.exists(download.part_file))
+
+    def test_resume(self):
+        """ A partial download only fetches the rest of the file """
+        download = self.download(checksum_type='sha1')
+        with open(download.part_file, 'wb') as part:
+            part.write(FILES['/file0.rpm'][:1000000])
+        self.assertEqual(download_utils.download_file(download)[0], 0)
+        self.assertEqual(self.server.requests, [('/file0.rpm', 'bytes=1000000-')])
+        self.assertEqual(self.read('file0.rpm'), FILES['/file0.rpm'])
+
+    def test_resume_without_ranges(self):
+        """ A server ignoring Range sends the whole file, which replaces the part """
+        self.server.ranges = False
+        download = self.download()
+        with open(download.part_file, 'wb') as part:
+            part.write('garbage')
+        self.assertEqual(download_utils.download_file(download)[0], 0)
+        self.assertEqual(self.read('file0.rpm'), FILES['/file0.rpm'])
+
+    def test_stale_part(self):
+        """ A part file that does not match the server is downloaded again """
+        download = self.download(checksum_type='md5')
+        with open(download.part_file, 'wb') as part:
+            part.write('garbage')
+        self.assertEqual(download_utils.download_file(download)[0], 0)
+        self.assertEqual([byte_range for _, byte_range in self.server.requests],
+                         ['bytes=7-', None])
+        self.assertEqual(self.read('file0.rpm'), FILES['/file0.rpm'])
+
+    def test_checksum_mismatch(self):
+        """ A download with the wrong checksum is thrown away """
+        download = self.download(checksum='0' * 64)
+        returncode, message = download_utils.download_file(download)
+        self.assertEqual(returncode, 1)
+        self.assertIn('expected 0000', message)
+        self.assertFalse(os.path.exists(download.destination))
+        self.assertFalse(os.path.exists(download.part_file))
+        download = download_utils.Download(self.base + '/missing.rpm',
+                                           os.path.join(self.tempdir, 'missing.rpm'))
+        self.assertEqual(download_utils.download_file(download),
+                         (1, 'Error 404 downloading %s/missing.rpm' % self.base))
+
+    def test_download_files(self):
+        """ Several files download concurrently, results keep their order """
+        self.server.delay = 0.3
+        downloads = [self.download('/file%i.rpm' % num) for num in range(4)]
+        returncode, results = download_utils.download_files(downloads, workers=3,
+                                                            stream=None)
+        self.assertEqual(returncode, 0)
+        self.assertEqual([result[0] for result in results], downloads)
+        self.assertEqual(self.server.peak, 3)
+        for num in range(4):
+            self.assertEqual(self.read('file%i.rpm' % num), FILES['/file%i.rpm' % num])
+
+    def test_unknown_checksum_type(self):
+        """ A download with an unknown checksum type fails, the others go on """
+        downloads = [self.download('/file%i.rpm' % num) for num in range(3)]
+        downloads[1].checksum_type = 'sha265'
+        returncode, results = download_utils.download_files(downloads, workers=2,
+                                                            stream=None)
+        self.assertEqual(returncode, 1)
+        self.assertEqual([result[1] for result in results], [0, 1, 0])
+        self.assertEqual(results[1][2], 'Unknown checksum type sha265 for file1.rpm')
+        self.assertFalse(os.path.exists(downloads[1].destination))
+        self.assertEqual(self.read('file2.rpm'), FILES['/file2.rpm'])
+
+    def test_metadata(self):
+        """ Checksums are taken from the Artifactory and Pulp metadata """
+        download = download_utils.artifactory_download(
+            {'downloadUri': 'https://host/artifactory/repo/foo.tgz',
+             'checksums': {'sha1': 'ABC', 'md5': 'def'}, 'size': '12'}, '/tmp')
+        self.assertEqual((download.destination, download.checksum_type, download.checksum,
+                          download.size), ('/tmp/foo.tgz', 'sha1', 'abc', 12))
+        download = download_utils.pulp_download(
+            'https://host/pulp/repos/foo.rpm',
+            {'filename': 'foo.rpm', 'checksum': 'abc', 'checksumtype': 'sha'}, '.')
+        self.assertEqual((download.destination, download.checksum_type),
+                         ('./foo.rpm', 'sha1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess32 as subprocess
+
+from servicelab.utils import gitcheck_utils
+
+
+class TestGitcheckUtils(unittest.TestCase):
+    """
+    TestGitcheckUtils class is a unittest class for gitcheck_utils, run against
+    throwaway git repositories.
+    """
+
+    def git(self, cwd, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME='slab', GIT_AUTHOR_EMAIL='slab@example.com',
+                   GIT_COMMITTER_NAME='slab', GIT_COMMITTER_EMAIL='slab@example.com')
+        subprocess.check_call(('git', '-c', 'init.defaultBranch=master') + args, cwd=cwd,
+                              env=env, stdout=open(os.devnull, 'w'),
+                              stderr=subprocess.STDOUT)
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.services = os.path.join(self.tempdir, 'services')
+        os.makedirs(self.services)
+        self.git(self.tempdir, 'init', '--bare', 'origin.git')
+        self.git(self.tempdir, 'clone', 'origin.git', 'seed')
+        seed = os.path.join(self.tempdir, 'seed')
+        for fname in ('a', 'b', 'c'):
+            with open(os.path.join(seed, fname), 'w') as stream:
+                stream.write(fname)
+        self.git(seed, 'add', '.')
+        self.git(seed, 'commit', '-m', 'init')
+        self.git(seed, 'push', 'origin', 'master')
+        for name in ('service-b', 'service-a', 'ccs-data'):
+            self.git(self.services, 'clone', '../origin.git', name)
+        self.repo = os.path.join(self.services, 'service-b')
+        with open(os.path.join(self.repo, 'a'), 'a') as stream:
+            stream.write('local')
+        self.git(self.repo, 'commit', '-am', 'local change')
+        with open(os.path.join(seed, 'b'), 'a') as stream:
+            stream.write('remote')
+        self.git(seed, 'commit', '-am', 'remote change')
+        self.git(seed, 'push', 'origin', 'master')
+        self.git(self.repo, 'fetch', 'origin')
+        self.git(self.repo, 'mv', 'c', 'c 2')
+        with open(os.path.join(self.repo, 'b'), 'a') as stream:
+            stream.write('modified')
+        with open(os.path.join(self.repo, 'new'), 'w') as stream:
+            stream.write('untracked')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_get_status(self):
+        """ The branch and changes match git branch and git status -s """
+        branch, changes = gitcheck_utils.Gitcheckutils.get_status(self.repo)
+        self.assertEqual(branch, 'master')
+        self.assertEqual(sorted(changes), [[' M', 'b'], ['??', 'new'],
+                                           ['R ', 'c -> "c 2"']])
+        self.assertEqual(sorted(changes),
+                         sorted(gitcheck_utils.Gitcheckutils.get_local_files_change(
+                             self.repo)))
+
+    def test_get_repository_state(self):
+        """ Commits to push and pull are found per remote """
+        state = gitcheck_utils.Gitcheckutils.get_repository_state(self.repo)
+        self.assertEqual(state['branch'], 'master')
+        self.assertEqual(len(state['remotes']), 1)
+        remote, topush, topull = state['remotes'][0]
+        self.assertEqual(remote, 'origin')
+        self.assertEqual([commit.split(' ', 1)[1] for commit in topush], ['local change'])
+        self.assertEqual([commit.split(' ', 1)[1] for commit in topull], ['remote change'])
+
+    def test_git_check_order(self):
+        """ Repositories are displayed in path order and ccs-data is skipped """
+        displayed = []
+        display = gitcheck_utils.Gitcheckutils.display_repository_state
+        gitcheck_utils.Gitcheckutils.display_repository_state = staticmethod(
+            lambda state: displayed.append(os.path.basename(state['rep'])))
+        try:
+            gitcheck_utils.Gitcheckutils().git_check(self.services, workers=4)
+        finally:
+            gitcheck_utils.Gitcheckutils.display_repository_state = staticmethod(display)
+        self.assertEqual(displayed, ['service-a', 'service-b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
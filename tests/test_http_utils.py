@@ -0,0 +1,97 @@
+import unittest
+
+from requests.auth import HTTPBasicAuth
+
+from servicelab.utils import http_utils
+from tests.benchmarks.standin_server import StandInServer
+
+
+class FakeContext(object):
+    """
+    Stands in for the stack Context, returning fixed backend info dictionaries.
+    """
+
+    def __init__(self, **infos):
+        self.infos = infos
+
+    def get_gocd_info(self):
+        return self.infos['gocd']
+
+    def get_pulp_info(self):
+        return self.infos['pulp']
+
+
+class TestHttpUtils(unittest.TestCase):
+    """
+    TestHttpUtils class is a unittest class for http_utils, run against a local
+    http server.
+    """
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.start()
+
+    def tearDown(self):
+        http_utils.close_all()
+        self.server.stop()
+
+    def test_shared_client(self):
+        """ One client per backend, server and credentials, never changed """
+        client = http_utils.get_client('pulp', self.server.url + '/', ('a', 'b'))
+        self.assertIs(http_utils.get_client('pulp', self.server.url, ('a', 'b')), client)
+        self.assertIsNot(http_utils.get_client('jenkins', self.server.url, ('a', 'b')),
+                         client)
+        self.assertEqual(client.session.auth, ('a', 'b'))
+        other = http_utils.get_client('pulp', self.server.url, ('c', 'd'))
+        self.assertIsNot(other, client)
+        self.assertEqual(other.session.auth, ('c', 'd'))
+        self.assertEqual(client.session.auth, ('a', 'b'))
+        self.assertIsNot(http_utils.get_client('pulp', self.server.url), client)
+        basic = http_utils.get_client('pulp', self.server.url, HTTPBasicAuth('a', 'b'))
+        self.assertIs(http_utils.get_client('pulp', self.server.url,
+                                            HTTPBasicAuth('a', 'b')), basic)
+        self.assertEqual(client.url('/api/x'), self.server.url + '/api/x')
+        self.assertEqual(client.url('http://other/y'), 'http://other/y')
+
+    def test_keep_alive(self):
+        """ Requests reuse one connection """
+        client = http_utils.get_client('gocd', self.server.url)
+        for num in range(20):
+            res = client.get('/api/items/%i' % num)
+            self.assertEqual(res.json(), {'path': '/api/items/%i' % num})
+        self.assertEqual(len(self.server.requests), 20)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_no_keep_alive(self):
+        """ With keep_alive off every request opens a connection """
+        client = http_utils.get_client('gocd', self.server.url, keep_alive=False)
+        for _ in range(5):
+            client.get('/ping')
+        self.assertEqual(self.server.connections, 5)
+
+    def test_timeout(self):
+        """ The default timeout applies unless a request passes its own """
+        client = http_utils.get_client('jenkins', self.server.url, read_timeout=0.1)
+        self.assertEqual(client.timeout, (http_utils.CONNECT_TIMEOUT, 0.1))
+        self.server.latency = 0.3
+        self.assertRaises(http_utils.requests.exceptions.Timeout, client.get, '/ping')
+        self.assertEqual(client.get('/ping', timeout=2).status_code, 200)
+
+    def test_client_for(self):
+        """ Server and options come from the Context """
+        ctx = FakeContext(gocd={'ip': self.server.url[len('http://'):],
+                                'read_timeout': 30},
+                          pulp={'url': self.server.url + '/pulp/api/v2',
+                                'verify': False})
+        gocd = http_utils.client_for(ctx, 'gocd', ('user', 'pw'))
+        self.assertEqual(gocd.base_url, self.server.url)
+        self.assertEqual(gocd.timeout, (http_utils.CONNECT_TIMEOUT, 30))
+        pulp = http_utils.client_for(ctx, 'pulp')
+        self.assertEqual(pulp.base_url, self.server.url)
+        self.assertFalse(pulp.verify)
+        other = http_utils.client_for(ctx, 'pulp', base_url='https://10.0.0.1')
+        self.assertEqual(other.base_url, 'https://10.0.0.1')
+
+
+if __name__ == '__main__':
+    unittest.main()
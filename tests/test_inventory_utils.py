@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import inventory_utils
+from servicelab.utils import yaml_io
+from servicelab.utils import yaml_utils
+
+
+class TestInventoryUtils(unittest.TestCase):
+    """
+    TestInventoryUtils class is a unittest class for inventory_utils, the in
+    memory model of vagrant.yaml.
+    """
+    VAGRANT_YAML = "servicelab/.stack/provision/vagrant.yaml"
+    ORDER_YAML = "servicelab/.stack/provision/order.yaml"
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        shutil.copy(self.VAGRANT_YAML, self.tempdir)
+        shutil.copy(self.ORDER_YAML, self.tempdir)
+        self.fname = os.path.join(self.tempdir, 'vagrant.yaml')
+        self.inventory = inventory_utils.VagrantInventory(self.tempdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_lookups(self):
+        """ Lookups by hostname, role, mini flag and name agree with the file """
+        doc = yaml_io.load_file(self.fname)
+        self.assertEqual(self.inventory.load(), 0)
+        self.assertTrue(self.inventory.exists('infra-001'))
+        self.assertFalse(self.inventory.exists('infra-999'))
+        self.assertEqual(self.inventory.get('infra-001'),
+                         (0, {'infra-001': doc['hosts']['infra-001']}))
+        self.assertEqual(self.inventory.get('infra-999'), (1, {}))
+        self.assertEqual([host.keys()[0] for host in self.inventory.by_role('build')],
+                         ['infra-001', 'infra-002'])
+        mini = sorted(host for host in doc['hosts'] if 'min' in doc['hosts'][host])
+        self.assertEqual([host.keys()[0] for host in self.inventory.mini_hosts()], mini)
+        full = sorted(host for host in doc['hosts'] if '001' in host)
+        self.assertEqual([host.keys()[0] for host in self.inventory.hosts_matching('001')],
+                         full)
+        returncode, order = self.inventory.host_order()
+        self.assertEqual(returncode, 0)
+        self.assertEqual(order, yaml_io.load_file(os.path.join(self.tempdir,
+                                                               'order.yaml'))['order'])
+
+    def test_parsed_once(self):
+        """ The file is parsed once and again only when it changes on disk """
+        self.inventory.load()
+        stamp = self.inventory._stamp
+        doc = self.inventory.doc
+        for _ in range(10):
+            self.inventory.exists('infra-001')
+            self.inventory.get('db-001')
+        self.assertTrue(self.inventory.doc is doc)
+        yaml_io.dump_file({'hosts': {'rhel7-001': {'role': 'none'}}},
+                          os.path.join(self.tempdir, 'new.yaml'))
+        os.rename(os.path.join(self.tempdir, 'new.yaml'), self.fname)
+        self.assertNotEqual(inventory_utils._file_stamp(self.fname), stamp)
+        self.assertTrue(self.inventory.exists('rhel7-001'))
+        self.assertFalse(self.inventory.exists('infra-001'))
+
+    def test_batched_changes(self):
+        """ Changes stay in memory until save writes them in one go """
+        before = open(self.fname).read()
+        host = inventory_utils.make_host('192.168.100.2', '000027000002')
+        self.assertEqual(self.inventory.add_host('rhel7-001', host), 0)
+        self.assertEqual(self.inventory.del_host('infra-002'), 0)
+        self.assertEqual(self.inventory.del_host('infra-999'), 1)
+        self.assertTrue(self.inventory.exists('rhel7-001'))
+        self.assertFalse(self.inventory.exists('infra-002'))
+        self.assertEqual(open(self.fname).read(), before)
+        self.assertEqual(self.inventory.save(), 0)
+        doc = yaml_io.load_file(self.fname)
+        self.assertEqual(doc['hosts']['rhel7-001'], host)
+        self.assertNotIn('infra-002', doc['hosts'])
+        self.assertEqual(sorted(os.listdir(self.tempdir)), ['order.yaml', 'vagrant.yaml'])
+
+    def test_invalid_file_untouched(self):
+        """ An invalid inventory is reported and never overwritten """
+        with open(self.fname, 'w') as stream:
+            stream.write('hosts:\n  infra-001\n    role: build\n')
+        self.assertEqual(self.inventory.load(), 1)
+        host = inventory_utils.make_host('192.168.100.2', '000027000002')
+        self.assertEqual(self.inventory.add_host('rhel7-001', host), 1)
+        self.assertEqual(self.inventory.save(), 0)
+        self.assertEqual(open(self.fname).read(), 'hosts:\n  infra-001\n    role: build\n')
+
+    def test_yaml_utils_shared(self):
+        """ The yaml_utils host functions work on the shared inventory """
+        self.assertTrue(inventory_utils.get_inventory(self.tempdir) is
+                        inventory_utils.get_inventory(self.tempdir + '/'))
+        self.assertEqual(yaml_utils.host_exists_vagrantyaml('infra-001', self.tempdir), 0)
+        self.assertEqual(yaml_utils.host_add_vagrantyaml(self.tempdir, 'vagrant.yaml',
+                                                         'rhel7-001', 'ccs-dev-1',
+                                                         mac_nocolon='000027000002',
+                                                         ip='192.168.100.2'), 0)
+        self.assertEqual(yaml_io.load_file(self.fname)['hosts']['rhel7-001']['memory'],
+                         1024)
+        self.assertEqual(yaml_utils.host_del_vagrantyaml(self.tempdir, 'vagrant.yaml',
+                                                         'rhel7-001'), 0)
+        self.assertEqual(yaml_utils.host_exists_vagrantyaml('rhel7-001', self.tempdir), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
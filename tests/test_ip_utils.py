@@ -0,0 +1,124 @@
+"""
+Tests the bitset IP pool and the cached reverse DNS checks of ip_utils
+"""
+import time
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+import ipaddress
+
+from servicelab.utils import ip_utils
+
+
+class Resolver(object):
+    """
+    Stands in for socket.gethostbyaddr, knowing the names of a few addresses.
+    """
+
+    def __init__(self, names, delay=0.0, silent=()):
+        self.names = names
+        self.delay = delay
+        self.silent = silent
+        self.asked = []
+        self.lock = threading.Lock()
+
+    def __call__(self, ip):
+        with self.lock:
+            self.asked.append(ip)
+        if ip in self.silent:
+            time.sleep(1)
+        time.sleep(self.delay)
+        if ip in self.names:
+            return self.names[ip], [], [ip]
+        raise socket.herror(1, 'Unknown host')
+
+
+class TestIpUtils(unittest.TestCase):
+    """
+    TestIpUtils class is a unittest class for ip_utils.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.vlan = ipaddress.IPv4Network(u'10.11.12.0/24')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_pool(self):
+        """ The first 4 hosts are left out and marked addresses are skipped """
+        pool = ip_utils.IpPool(self.vlan)
+        self.assertEqual(str(next(pool.free())), '10.11.12.5')
+        self.assertEqual(len(list(pool.free())), 250)
+        for offset in range(5, 30):
+            self.assertTrue(pool.mark(self.vlan.network_address + offset))
+        self.assertFalse(pool.mark(u'10.11.13.1'))
+        self.assertFalse(pool.mark(u'10.11.12.255'))
+        self.assertTrue(pool.mark('10.11.12.31'))
+        self.assertEqual(pool.used, 26)
+        self.assertFalse(pool.is_free('10.11.12.29'))
+        self.assertTrue(pool.is_free('10.11.12.30'))
+        self.assertEqual([str(ip) for ip in pool.free(3)],
+                         ['10.11.12.30', '10.11.12.32', '10.11.12.33'])
+        self.assertEqual([str(ip) for ip in pool.free(1, '10.11.12.31')],
+                         ['10.11.12.32'])
+        self.assertEqual(str(list(pool.free())[-1]), '10.11.12.254')
+
+    def test_allocate(self):
+        """ Addresses with a DNS name are passed over and many are reserved at once """
+        pool = ip_utils.IpPool(self.vlan)
+        pool.mark('10.11.12.6')
+        resolver = Resolver({'10.11.12.5': 'old-001.example.com',
+                             '10.11.12.8': 'old-002.example.com'})
+        dns = ip_utils.ReverseDns(self.path, workers=4, resolver=resolver)
+        self.assertEqual(ip_utils.allocate(pool, 3, dns),
+                         (0, ['10.11.12.7', '10.11.12.9', '10.11.12.10']))
+        self.assertFalse(pool.is_free('10.11.12.8'))
+        self.assertEqual(ip_utils.allocate(pool, 1, dns), (0, ['10.11.12.11']))
+        self.assertEqual(len(resolver.asked), 9)
+
+    def test_cached(self):
+        """ Answers are kept in the cache between runs, until they expire """
+        resolver = Resolver({'10.11.12.5': 'old-001.example.com'})
+        dns = ip_utils.ReverseDns(self.path, workers=4, resolver=resolver)
+        ip_utils.allocate(ip_utils.IpPool(self.vlan), 1, dns)
+        self.assertEqual(resolver.asked.count('10.11.12.5'), 1)
+        del resolver.asked[:]
+        dns = ip_utils.ReverseDns(self.path, workers=4, resolver=resolver)
+        self.assertEqual(ip_utils.allocate(ip_utils.IpPool(self.vlan), 1, dns),
+                         (0, ['10.11.12.6']))
+        self.assertEqual(resolver.asked, [])
+        stale = time.time() - ip_utils.DNS_TTL_MISSING - 1
+        for ip, entry in dns.entries.items():
+            if not entry[0]:
+                entry[1] = stale
+        dns.dirty = True
+        dns.save()
+        dns = ip_utils.ReverseDns(self.path, workers=4, resolver=resolver)
+        ip_utils.allocate(ip_utils.IpPool(self.vlan), 1, dns)
+        self.assertEqual(sorted(resolver.asked), ['10.11.12.6', '10.11.12.7',
+                                                  '10.11.12.8'])
+
+    def test_timeout(self):
+        """ Lookups run at once and an address DNS does not answer for is not used """
+        resolver = Resolver({}, delay=0.2, silent=('10.11.12.5',))
+        dns = ip_utils.ReverseDns(self.path, workers=8, timeout=0.5, resolver=resolver)
+        start = time.time()
+        self.assertEqual(ip_utils.allocate(ip_utils.IpPool(self.vlan), 2, dns),
+                         (0, ['10.11.12.6', '10.11.12.7']))
+        self.assertTrue(time.time() - start < 0.8)
+        self.assertEqual(dns.cached('10.11.12.5'), None)
+        self.assertEqual(dns.cached('10.11.12.6'), '')
+
+    def test_exhausted(self):
+        """ A full vlan gives back what it has and a failure """
+        vlan = ipaddress.IPv4Network(u'10.11.12.0/29')
+        pool = ip_utils.IpPool(vlan)
+        self.assertEqual(ip_utils.allocate(pool, 3), (1, ['10.11.12.5', '10.11.12.6']))
+        self.assertEqual(ip_utils.allocate(pool, 1), (1, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
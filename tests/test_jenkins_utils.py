@@ -5,16 +5,25 @@ TestClass to test various Jenkins functions, namely
     3. Build find command.
     4. Log command.
 """
+import os
+import time
+import shutil
+import logging
+import tempfile
 import unittest
+import threading
+import StringIO
 
 from click.testing import CliRunner
 
+from servicelab.utils import http_utils
 from servicelab.utils import jenkins_utils
 
 from servicelab.commands import cmd_list
 from servicelab.commands import cmd_find
 from servicelab.commands import cmd_build
 from servicelab.stack import Context
+from tests.benchmarks.standin_server import StandInServer
 
 
 class TestJenkinsUtils(unittest.TestCase):
@@ -86,11 +95,13 @@ class TestJenkinsUtils(unittest.TestCase):
         """
           Tests log command.
         """
-        log = jenkins_utils.get_build_log(TestJenkinsUtils.JOB_NAME,
-                                          TestJenkinsUtils.JENKINS_USER,
-                                          TestJenkinsUtils.JENKINS_PASS,
-                                          TestJenkinsUtils.JENKINS_SERVER)
-        self.assertTrue(jenkins_utils.END_LOG in log)
+        out = StringIO.StringIO()
+        jenkins_utils.get_build_log(TestJenkinsUtils.JOB_NAME,
+                                    TestJenkinsUtils.JENKINS_USER,
+                                    TestJenkinsUtils.JENKINS_PASS,
+                                    TestJenkinsUtils.JENKINS_SERVER,
+                                    out=out)
+        self.assertTrue(jenkins_utils.END_LOG in out.getvalue())
 
     def test_cmd_build_run(self):
         """
@@ -109,5 +120,151 @@ class TestJenkinsUtils(unittest.TestCase):
         if len(result.output):
             self.assertTrue(TestJenkinsUtils.RUN_STATUS in result.output.strip())
 
+
+class TestJenkinsClient(unittest.TestCase):
+    """
+    TestJenkinsClient class is a unittest class for jenkins_utils.JenkinsClient, run
+    against a local http server standing in for Jenkins.
+    """
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.start()
+        self.server.add_job('check-servicelab', ['FAILURE', 'SUCCESS'])
+        self.server.add_job('gate-servicelab', ['SUCCESS', None])
+        self.server.add_job('new-job')
+        self.url = self.server.url + '/jenkins'
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        http_utils.close_all()
+        self.server.stop()
+        shutil.rmtree(self.path)
+
+    def get_paths(self):
+        return [path for method, path in self.server.requests if method == 'GET']
+
+    def test_jobs(self):
+        """ The job list is one tree filtered request, then served from the cache """
+        client = jenkins_utils.JenkinsClient(self.url, 'user', 'pw', self.path)
+        self.assertEqual(client.job_names(),
+                         ['check-servicelab', 'gate-servicelab', 'new-job'])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn('tree=jobs', self.server.requests[0][1])
+        other = jenkins_utils.JenkinsClient(self.url, 'user', 'pw', self.path)
+        self.assertEqual(other.job_names(), client.job_names())
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_jobs_expire(self):
+        """ A job list older than the ttl is fetched again """
+        jenkins_utils.JenkinsClient(self.url, path=self.path).jobs()
+        self.server.add_job('added-job')
+        client = jenkins_utils.JenkinsClient(self.url, path=self.path, ttl=0.1)
+        self.assertNotIn('added-job', client.job_names())
+        time.sleep(0.1)
+        self.assertIn('added-job', client.job_names())
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_build_status(self):
+        """ The status takes a single request, none with a fresh job list """
+        self.assertEqual(jenkins_utils.get_build_status('check-servicelab', 'user', 'pw',
+                                                        self.url),
+                         (0, 'check-servicelab #2,SUCCESS'))
+        self.assertEqual(self.get_paths(),
+                         ['/jenkins/job/check-servicelab/lastBuild/api/json?tree=' +
+                          'number%2Cresult%2Cbuilding%2CfullDisplayName'])
+        jenkins_utils.JenkinsClient(self.url, path=self.path).jobs()
+        self.assertEqual(jenkins_utils.get_build_status('gate-servicelab', 'user', 'pw',
+                                                        self.url, self.path),
+                         (0, 'gate-servicelab #2'))
+        self.assertEqual(jenkins_utils.get_build_status('new-job', 'user', 'pw',
+                                                        self.url, self.path)[0], 1)
+        self.assertEqual(jenkins_utils.get_build_status('missing', 'user', 'pw',
+                                                        self.url)[0], 1)
+        self.assertEqual(len(self.get_paths()), 3)
+
+    def test_build_log(self):
+        """ The log is the console text of the last build """
+        out = StringIO.StringIO()
+        self.assertEqual(jenkins_utils.get_build_log('check-servicelab', 'user', 'pw',
+                                                     self.url, out=out), 0)
+        log = out.getvalue()
+        self.assertIn('Build 2 of check-servicelab', log)
+        self.assertIn('/job/check-servicelab/2/consoleText', log)
+        self.assertTrue(log.endswith(jenkins_utils.END_LOG + "\n"))
+        self.assertEqual(jenkins_utils.get_build_log('new-job', 'user', 'pw', self.url,
+                                                     out=out), 1)
+
+    def test_tail(self):
+        """ The last lines are found without downloading the whole log """
+        lines = ['line %i\n' % num for num in range(100000)]
+        self.server.append_log('check-servicelab', '\n' + ''.join(lines))
+        sent = self.server.sent
+        out = StringIO.StringIO()
+        jenkins_utils.get_build_log('check-servicelab', 'user', 'pw', self.url,
+                                    out=out, tail=3)
+        self.assertIn(''.join(lines[-3:]) + '\n' + jenkins_utils.END_LOG, out.getvalue())
+        self.assertNotIn(lines[-4], out.getvalue())
+        self.assertLess(self.server.sent - sent, 2 * jenkins_utils.LOG_CHUNK)
+        client = jenkins_utils.JenkinsClient(self.url)
+        size = client.log_size('check-servicelab', 2)
+        self.assertEqual(client.tail_offset('check-servicelab', 2, 0), size)
+        self.assertEqual(client.tail_offset('check-servicelab', 2, 200000), 0)
+        self.assertEqual(client.tail_offset('check-servicelab', 2, 100000),
+                         len('Build 2 of check-servicelab\n'))
+
+    def test_follow(self):
+        """ Following writes what a running build logs until it finishes """
+        def build():
+            for num in range(3):
+                time.sleep(0.1)
+                self.server.append_log('gate-servicelab', '\nstep %i' % num)
+            self.server.append_log('gate-servicelab', '\ndone', 'SUCCESS')
+
+        thread = threading.Thread(target=build)
+        thread.start()
+        out = StringIO.StringIO()
+        client = jenkins_utils.JenkinsClient(self.url)
+        offset = client.stream_log('gate-servicelab', 2, out, follow=True, interval=0.05)
+        thread.join()
+        self.assertEqual(out.getvalue(),
+                         'Build 2 of gate-servicelab\nstep 0\nstep 1\nstep 2\ndone')
+        self.assertEqual(offset, len(out.getvalue()))
+
+    def test_run_build(self):
+        """ Running a job retriggers its last build, or starts its first one """
+        ctx = Context()
+        ctx.path = self.path
+        jenkins_utils.JenkinsClient(self.url, path=self.path).jobs()
+        self.assertTrue(jenkins_utils.run_build('new-job', 'user', 'pw', self.url, ctx))
+        self.assertTrue(jenkins_utils.run_build('check-servicelab', 'user', 'pw',
+                                                self.url, ctx))
+        self.assertEqual([path for method, path in self.server.requests if method == 'POST'],
+                         ['/jenkins/job/new-job/build',
+                          '/jenkins/job/check-servicelab/2/gerrit-trigger-retrigger-this/'])
+        self.assertEqual(len(self.server.jobs['check-servicelab']), 3)
+        self.assertFalse(os.listdir(os.path.join(self.path, 'cache')))
+
+    def test_find_build(self):
+        """ stack find build matches the cached job names """
+        ctx = Context()
+        ctx.path = self.path
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        cmd_find.slab_logger.addHandler(handler)
+        try:
+            for _ in range(2):
+                result = CliRunner().invoke(cmd_find.cli, ['build', 'SERVICELAB',
+                                                           '-u', 'user', '-p', 'pw',
+                                                           '-ip', self.url], obj=ctx)
+                self.assertEqual(result.exit_code, 0)
+        finally:
+            cmd_find.slab_logger.removeHandler(handler)
+        self.assertEqual([message for message in messages if 'servicelab' in message],
+                         ['check-servicelab', 'gate-servicelab'] * 2)
+        self.assertEqual(len(self.server.requests), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
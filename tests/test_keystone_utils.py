@@ -0,0 +1,126 @@
+"""
+Tests the keystone token cache and the neutron readiness polling
+"""
+import os
+import stat
+import time
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import keystone_utils
+from servicelab.utils import openstack_utils
+from tests.benchmarks.standin_openstack import StandInCloud
+
+ENVIRON = ('OS_AUTH_URL', 'OS_PASSWORD', 'OS_USERNAME', 'OS_REGION_NAME', 'OS_TENANT_NAME',
+           'OS_TENANT_ID')
+
+
+class TestKeystoneUtils(unittest.TestCase):
+    """
+    TestKeystoneUtils class is a unittest class for keystone_utils and the
+    os_ensure_network login, run against a local keystone and neutron.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.environ = dict((name, os.environ.get(name)) for name in ENVIRON)
+        self.cloud = StandInCloud(ready_delay=0.5)
+        self.cloud.start()
+        os.environ.update(OS_AUTH_URL=self.cloud.auth_url, OS_PASSWORD='secret',
+                          OS_USERNAME='aaltman', OS_REGION_NAME='us-rdu-3',
+                          OS_TENANT_NAME='ServiceLab')
+        os.environ.pop('OS_TENANT_ID', None)
+
+    def tearDown(self):
+        self.cloud.stop()
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.path)
+
+    def identity_requests(self):
+        return [path for _, path in self.cloud.requests if path.startswith('/identity')]
+
+    def test_scoped_login(self):
+        """ One login by tenant name gets a scoped token and the neutron endpoint """
+        token = keystone_utils.get_token(self.path, self.cloud.auth_url, 'aaltman',
+                                         'secret', tenant_name='ServiceLab')
+        self.assertEqual(token['tenant_id'], self.cloud.tenants[0]['id'])
+        self.assertEqual(token['network_url'], self.cloud.url + '/network')
+        self.assertEqual(self.identity_requests(), ['/identity/v2.0/tokens'])
+        fname = os.path.join(self.path, 'cache', keystone_utils.TOKEN_FILE)
+        self.assertEqual(stat.S_IMODE(os.stat(fname).st_mode), 0o600)
+
+    def test_cached(self):
+        """ A cached token is reused by tenant name and id until it is about to expire """
+        token = keystone_utils.get_token(self.path, self.cloud.auth_url, 'aaltman',
+                                         'secret', tenant_name='ServiceLab')
+        for tenant_id, tenant_name in ((None, 'ServiceLab'), (token['tenant_id'], None)):
+            self.assertEqual(keystone_utils.get_token(self.path, self.cloud.auth_url,
+                                                      'aaltman', 'secret', tenant_id,
+                                                      tenant_name), token)
+        self.assertEqual(len(self.cloud.logins), 1)
+        self.assertEqual(keystone_utils.TokenCache(self.path).get(
+            self.cloud.auth_url, 'kunanda', tenant_name='ServiceLab'), None)
+        self.cloud.token_ttl = keystone_utils.EXPIRY_MARGIN - 60
+        keystone_utils.TokenCache(self.path).invalidate(token['token'])
+        keystone_utils.get_token(self.path, self.cloud.auth_url, 'aaltman', 'secret',
+                                 tenant_name='ServiceLab')
+        keystone_utils.get_token(self.path, self.cloud.auth_url, 'aaltman', 'secret',
+                                 tenant_name='ServiceLab')
+        self.assertEqual(len(self.cloud.logins), 3)
+
+    def test_warm_run(self):
+        """ A second os_ensure_network does not talk to keystone at all """
+        returncode, float_net, nets, groups = openstack_utils.os_ensure_network(self.path)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(float_net, 'public-floating-602')
+        self.assertEqual(len(nets), 2)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(self.identity_requests(), ['/identity/v2.0/tokens'])
+        del self.cloud.requests[:]
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        self.assertEqual(self.identity_requests(), [])
+
+    def test_revoked(self):
+        """ A token neutron refuses is dropped and the run logs in again """
+        openstack_utils.os_ensure_network(self.path)
+        self.cloud.revoke()
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        self.assertEqual(self.cloud.logins, ['ServiceLab', 'ServiceLab'])
+
+    def test_unknown_tenant(self):
+        """ Logging in to a tenant keystone does not know fails """
+        os.environ['OS_TENANT_NAME'] = 'Unknown'
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 1)
+        self.assertEqual(os.listdir(os.path.join(self.path, 'cache')), [])
+
+    def test_wait_for_subnet(self):
+        """ Routers get their interfaces as soon as the subnets are ready """
+        start = time.time()
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        self.assertTrue(time.time() - start < 5)
+        ports = self.cloud.resources['ports'].values()
+        self.assertEqual(len([port for port in ports
+                              if port['device_owner'] == 'network:router_interface']), 2)
+
+    def test_subnet_timeout(self):
+        """ A subnet that is not ready in time fails instead of waiting forever """
+        self.cloud.ready_delay = 60
+        slab = openstack_utils.SLab_OS(self.path, 'secret', 'us-rdu-3', username='aaltman',
+                                       os_tenant_name='ServiceLab')
+        slab.login_or_gettoken()
+        slab.connect_to_neutron()
+        slab.create_network()
+        returncode, subnet = slab.create_subnet()
+        self.assertEqual(returncode, 0)
+        start = time.time()
+        self.assertEqual(slab.wait_for_subnet(subnet, timeout=0.5), 1)
+        self.assertTrue(time.time() - start < 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import logging
+import unittest
+
+from click.testing import CliRunner
+
+from servicelab import stack
+from servicelab import settings
+from servicelab.utils import logger_utils
+
+
+class TestLoggerUtils(unittest.TestCase):
+    """
+    TestLoggerUtils class is a unittest class for logger_utils and the verbosity
+    option of stack.
+    """
+
+    def setUp(self):
+        self.settings_file = os.path.join(os.path.dirname(settings.__file__),
+                                          'settings.py')
+        with open(self.settings_file) as stream:
+            self.settings_data = stream.read()
+        self.mtime = os.path.getmtime(self.settings_file)
+
+    def tearDown(self):
+        logger_utils.set_verbosity(25)
+
+    def console_level(self, logger):
+        return [handler.level for handler in logger.handlers
+                if isinstance(handler, logging.StreamHandler)][0]
+
+    def test_set_verbosity(self):
+        """ Existing and new loggers follow the verbosity set """
+        before = logger_utils.setup_logger(settings.verbosity, 'stack.test.before')
+        self.assertEqual(self.console_level(before), 25)
+        logger_utils.set_verbosity(10)
+        self.assertEqual(self.console_level(before), 10)
+        after = logger_utils.setup_logger(settings.verbosity, 'stack.test.after')
+        self.assertEqual(self.console_level(after), 10)
+
+    def test_verbosity_option(self):
+        """ stack -vv sets the verbosity in memory and never writes settings.py """
+        logger = logger_utils.setup_logger(settings.verbosity, 'stack.test.option')
+        result = CliRunner().invoke(stack.cli, ['-vv', 'cache', '--help'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('very verbose (DETAIL)', result.output)
+        self.assertEqual(settings.verbosity, 15)
+        self.assertEqual(self.console_level(logger), 15)
+        with open(self.settings_file) as stream:
+            self.assertEqual(stream.read(), self.settings_data)
+        self.assertEqual(os.path.getmtime(self.settings_file), self.mtime)
+
+        result = CliRunner().invoke(stack.cli, ['cache', '--help'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(settings.verbosity, 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess32 as subprocess
+
+from servicelab.utils import mirror_utils
+from servicelab.utils import service_utils
+
+
+class TestMirrorUtils(unittest.TestCase):
+    """
+    TestMirrorUtils class is a unittest class for mirror_utils, run against local
+    bare repositories standing in for gerrit.
+    """
+
+    def git(self, cwd, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME='slab', GIT_AUTHOR_EMAIL='slab@example.com',
+                   GIT_COMMITTER_NAME='slab', GIT_COMMITTER_EMAIL='slab@example.com')
+        return subprocess.check_output(('git', '-c', 'init.defaultBranch=master') + args,
+                                       cwd=cwd, env=env, stderr=subprocess.STDOUT)
+
+    def commit(self, message):
+        with open(os.path.join(self.seed, 'file'), 'a') as stream:
+            stream.write(message + '\n')
+        self.git(self.seed, 'add', 'file')
+        self.git(self.seed, 'commit', '-qm', message)
+        self.git(self.seed, 'push', '-q', 'origin', 'HEAD')
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.stack = os.path.join(self.tempdir, 'stack')
+        os.makedirs(os.path.join(self.stack, 'services'))
+        self.git(self.tempdir, 'init', '-q', '--bare', 'service-foo.git')
+        self.git(self.tempdir, 'clone', '-q', 'service-foo.git', 'seed')
+        self.seed = os.path.join(self.tempdir, 'seed')
+        self.commit('init')
+        self.git_url = service_utils.GIT_URL
+        service_utils.GIT_URL = 'file://%s/{service}.git' % self.tempdir
+        self.url = service_utils.GIT_URL.format(service='service-foo')
+        self.repo = os.path.join(self.stack, 'services', 'service-foo')
+        self.mirror = mirror_utils.mirror_path(self.stack, 'service-foo')
+
+    def tearDown(self):
+        service_utils.GIT_URL = self.git_url
+        shutil.rmtree(self.tempdir)
+
+    def head(self, repo):
+        return self.git(repo, 'log', '-1', '--format=%s').strip()
+
+    def test_clone_borrows_from_mirror(self):
+        """ Clones borrow the objects of the mirror and fetch from gerrit """
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.head(self.mirror), 'init')
+        with open(os.path.join(self.repo, '.git', 'objects', 'info', 'alternates')) as alt:
+            self.assertEqual(os.path.realpath(alt.read().strip()),
+                             os.path.realpath(os.path.join(self.mirror, 'objects')))
+        self.assertEqual(self.git(self.repo, 'remote', 'get-url', 'origin').strip(),
+                         self.url)
+        self.assertEqual(self.git(self.mirror, 'config', 'gc.pruneExpire').strip(),
+                         'never')
+        self.commit('second')
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.head(self.repo), 'second')
+
+    def test_reclone_refreshes_mirror(self):
+        """ Working on a service again refreshes its mirror with one fetch """
+        service_utils.sync_service(self.stack, 'master', 'slab', 'service-foo')
+        shutil.rmtree(self.repo)
+        self.commit('second')
+        self.git(self.seed, 'push', '-q', 'origin', 'HEAD:refs/heads/feature')
+        self.assertTrue(service_utils.sync_service(self.stack, 'feature', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.head(self.repo), 'second')
+        self.assertEqual(self.head(self.mirror), 'second')
+        self.assertEqual(self.git(self.repo, 'rev-parse', '--abbrev-ref',
+                                  '@{upstream}').strip(), 'origin/feature')
+
+    def objects(self, repo):
+        """ Returns the number of objects stored in repo itself, not borrowed """
+        counts = dict(line.split(': ') for line in
+                      self.git(repo, 'count-objects', '-v').splitlines())
+        return int(counts['count']) + int(counts['in-pack'])
+
+    def test_reclone_transfers_nothing(self):
+        """ Working on a service again takes no objects from gerrit """
+        self.git(os.path.join(self.tempdir, 'service-foo.git'), 'config',
+                 'uploadpack.allowFilter', 'true')
+        self.commit('second')
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        missing = self.git(self.mirror, 'rev-list', '--objects', '--missing=print', '--all')
+        self.assertFalse([line for line in missing.splitlines() if line.startswith('?')])
+        mirror_objects = self.objects(self.mirror)
+        shutil.rmtree(self.repo)
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.objects(self.repo), 0)
+        self.assertEqual(self.objects(self.mirror), mirror_objects)
+        with open(os.path.join(self.repo, 'file')) as stream:
+            self.assertEqual(stream.read(), 'init\nsecond\n')
+
+    def test_fallback_without_mirror(self):
+        """ A service whose mirror can not be made is still cloned """
+        self.assertEqual(mirror_utils.update_mirror(self.stack, self.url + '-missing',
+                                                    'service-foo')[0], 128)
+        self.assertFalse(os.path.exists(self.mirror))
+        self.assertFalse(os.path.exists(self.mirror + '.tmp'))
+
+    def test_gc(self):
+        """ gc removes old and oversized mirrors, never ones in use """
+        for name in ('service-a', 'service-b', 'service-c'):
+            self.assertEqual(mirror_utils.update_mirror(self.stack, self.url, name)[0], 0)
+        service_utils.sync_service(self.stack, 'master', 'slab', 'service-foo')
+        old = time.time() - 40 * 86400
+        for name in ('service-a', 'service-foo'):
+            stamp = os.path.join(mirror_utils.mirror_path(self.stack, name),
+                                 mirror_utils.STAMP_FILE)
+            os.utime(stamp, (old, old))
+        in_use = dict((mirror['name'], mirror['in_use'])
+                      for mirror in mirror_utils.list_mirrors(self.stack))
+        self.assertEqual(in_use, {'service-a': False, 'service-b': False,
+                                  'service-c': False, 'service-foo': True})
+        self.assertEqual(mirror_utils.gc(self.stack), ['service-a'])
+        self.assertEqual(mirror_utils.gc(self.stack, max_size_mb=0),
+                         ['service-b', 'service-c'])
+        self.assertEqual([mirror['name'] for mirror in mirror_utils.list_mirrors(
+            self.stack)], ['service-foo'])
+        self.assertEqual(self.head(self.repo), 'init')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests the neutron snapshot and the resource cache of openstack_utils
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import openstack_utils
+from tests.benchmarks.standin_openstack import StandInCloud
+
+ENVIRON = ('OS_AUTH_URL', 'OS_PASSWORD', 'OS_USERNAME', 'OS_REGION_NAME', 'OS_TENANT_NAME',
+           'OS_TENANT_ID')
+
+
+class TestNeutronSnapshot(unittest.TestCase):
+    """
+    TestNeutronSnapshot class is a unittest class for NeutronSnapshot and the
+    SLab_OS checks it answers, run against a local keystone and neutron.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.environ = dict((name, os.environ.get(name)) for name in ENVIRON)
+        self.cloud = StandInCloud()
+        self.cloud.start()
+        os.environ.update(OS_AUTH_URL=self.cloud.auth_url, OS_PASSWORD='secret',
+                          OS_USERNAME='aaltman', OS_REGION_NAME='us-rdu-3',
+                          OS_TENANT_NAME='ServiceLab')
+        os.environ.pop('OS_TENANT_ID', None)
+        self.slab = openstack_utils.SLab_OS(self.path, 'secret', 'us-rdu-3',
+                                            username='aaltman', os_tenant_name='ServiceLab')
+        self.slab.login_or_gettoken()
+        self.slab.connect_to_neutron()
+
+    def tearDown(self):
+        self.cloud.stop()
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.path)
+
+    def neutron_requests(self):
+        return [(method, path[len('/network/v2.0'):]) for method, path in self.cloud.requests
+                if path.startswith('/network')]
+
+    def test_listed_once(self):
+        """ Every resource type is listed once, filtered to the tenant by neutron """
+        snapshot = self.slab.snapshot
+        for _ in range(3):
+            self.assertEqual(self.slab.check_for_network('SLAB_kunanda_network')[0], 1)
+            self.assertEqual(self.slab.check_for_router('SLAB_aaltman_router')[0], 1)
+            self.assertEqual(self.slab.find_floatnet_id(return_name='Yes'),
+                             (0, 'public-floating-602'))
+        self.assertEqual(snapshot.items('networks'), [])
+        self.assertEqual(snapshot.listings, 3)
+        self.assertEqual(self.neutron_requests(), [('GET', '/networks.json'),
+                                                   ('GET', '/routers.json'),
+                                                   ('GET', '/networks.json')])
+
+    def test_created(self):
+        """ Created resources are put into the snapshot without listing again """
+        self.assertEqual(self.slab.create_network()[0], 0)
+        self.assertEqual(self.slab.create_network(
+            self.slab.create_name_for('network', append='mgmt'))[0], 0)
+        listings = self.slab.snapshot.listings
+        returncode, network = self.slab.check_for_network(
+            self.slab.create_name_for('network'))
+        self.assertEqual((returncode, network['name']),
+                         (0, 'SLAB_aaltman_ServiceLab_network'))
+        returncode, network = self.slab.check_for_network(
+            self.slab.create_name_for('network', append='mgmt'))
+        self.assertEqual((returncode, network['name']),
+                         (0, 'SLAB_aaltman_mgmt_ServiceLab_network'))
+        self.assertEqual(self.slab.snapshot.listings, listings)
+
+    def test_invalidated(self):
+        """ Only the resources a change had side effects on are fetched again """
+        self.slab.create_network()
+        returncode, subnet = self.slab.create_subnet()
+        self.assertEqual(returncode, 0)
+        self.assertEqual(self.slab.check_for_subnet(subnet['name'])[1]['id'], subnet['id'])
+        del self.cloud.requests[:]
+        network = self.slab.check_for_network(self.slab.create_name_for('network'))[1]
+        self.assertEqual(network['subnets'], [subnet['id']])
+        self.assertEqual(self.neutron_requests(), [('GET', '/networks/%s.json'
+                                                    % network['id'])])
+
+    def test_router_ports(self):
+        """ Router interfaces are matched to subnets without a request per port """
+        returncode, _, _, _ = openstack_utils.os_ensure_network(self.path)
+        self.assertEqual(returncode, 0)
+        os.remove(os.path.join(self.path, 'cache', openstack_utils.RESOURCE_FILE))
+        slab = openstack_utils.SLab_OS(self.path, 'secret', 'us-rdu-3',
+                                       username='aaltman', os_tenant_name='ServiceLab')
+        slab.login_or_gettoken()
+        slab.connect_to_neutron()
+        del self.cloud.requests[:]
+        self.assertEqual(slab.check_for_ports(), 0)
+        self.assertEqual(slab.check_for_ports(mgmt=True), 0)
+        self.assertEqual(self.neutron_requests(), [('GET', '/ports.json'),
+                                                   ('GET', '/subnets.json')])
+
+    def test_warm_run(self):
+        """ A run that finds everything in place shows what it cached and lists nothing """
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        del self.cloud.requests[:]
+        returncode, float_net, nets, groups = openstack_utils.os_ensure_network(self.path)
+        self.assertEqual((returncode, float_net), (0, 'public-floating-602'))
+        self.assertEqual(sorted(net['name'] for net in nets),
+                         ['SLAB_aaltman_ServiceLab_network',
+                          'SLAB_aaltman_mgmt_ServiceLab_network'])
+        self.assertEqual([group['name'] for group in groups],
+                         ['SLAB_aaltman_ServiceLab_security_group'])
+        requests = self.neutron_requests()
+        self.assertEqual([path for _, path in requests if path.count('/') == 1], [])
+        self.assertEqual(len(set(requests)), len(requests))
+        self.assertEqual(len(requests), 9)
+
+    def test_stale_cache(self):
+        """ A cached resource neutron no longer has is dropped and looked up again """
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        name = self.slab.create_name_for('router')
+        router = self.slab.get_from_cache('routers', name)[1]
+        self.cloud.delete('ports', [port['id'] for port in self.cloud.resources['ports']
+                                    .values() if port['device_id'] == router['id']][0])
+        self.cloud.delete('routers', router['id'])
+        self.slab.connect_to_neutron()
+        self.assertEqual(self.slab.check_for_router(name), (1, ''))
+        self.assertEqual(self.slab.get_from_cache('routers', name), (1, ''))
+        self.assertEqual(self.slab.snapshot.listings, 1)
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        self.assertNotEqual(self.slab.get_from_cache('routers', name)[1]['id'],
+                            router['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
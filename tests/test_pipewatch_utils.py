@@ -0,0 +1,172 @@
+import time
+import socket
+import logging
+import unittest
+
+from click.testing import CliRunner
+
+from servicelab.commands import cmd_pipe
+from servicelab.utils import gocd_utils
+from servicelab.utils import http_utils
+from servicelab.utils import pipewatch_utils
+from tests.benchmarks.standin_server import StandInServer
+
+
+class TestPipewatchUtils(unittest.TestCase):
+    """
+    TestPipewatchUtils class is a unittest class for pipewatch_utils, run against a
+    local http server standing in for GoCD with scripted pipelines.
+    """
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.start()
+        self.ip_address = self.server.url[len('http://'):]
+        self.client = http_utils.get_client('gocd', self.server.url)
+
+    def tearDown(self):
+        http_utils.close_all()
+        self.server.stop()
+
+    def transitions(self, events, pipeline):
+        return [(event.stage, event.previous, event.state)
+                for event in events if event.pipeline == pipeline]
+
+    def test_backoff(self):
+        """ The interval doubles without changes and drops back on a change """
+        backoff = pipewatch_utils.Backoff(1, 8)
+        self.assertEqual([backoff.update(changed) for changed in
+                          (False, False, False, False, False, True, False)],
+                         [1, 2, 4, 8, 8, 1, 2])
+
+    def test_watch(self):
+        """ Several pipelines are watched at once, every transition is reported """
+        self.server.add_pipeline('build', [('compile', 0.3, 'Passed', 'success'),
+                                           ('test', 0.3, 'Passed', 'success')])
+        self.server.add_pipeline('deploy', [('deploy', 0.2, 'Failed', 'success'),
+                                            ('verify', 0.2, 'Passed', 'success')])
+        self.server.add_pipeline('release', [('package', 0.1, 'Passed', 'success'),
+                                             ('publish', 0.1, 'Passed', 'manual')])
+        watcher = pipewatch_utils.PipelineWatcher(self.client, 0.05, 0.1)
+        start = time.time()
+        events = list(watcher.watch(['build', 'deploy', 'release']))
+        self.assertLess(time.time() - start, 0.6 + 0.1 + 0.3)
+        self.assertEqual(self.transitions(events, 'build'),
+                         [('compile', None, 'Building'), ('test', None, 'NotRun'),
+                          ('compile', 'Building', 'Passed'), ('test', 'NotRun', 'Building'),
+                          ('test', 'Building', 'Passed')])
+        self.assertEqual(self.transitions(events, 'deploy')[-1],
+                         ('deploy', 'Building', 'Failed'))
+        self.assertEqual(self.transitions(events, 'release')[-1],
+                         ('package', 'Building', 'Passed'))
+        self.assertTrue(pipewatch_utils.instance_passed(watcher.instances['build']))
+        self.assertFalse(pipewatch_utils.instance_passed(watcher.instances['deploy']))
+        self.assertEqual(watcher.errors, {})
+        self.assertEqual(pipewatch_utils.format_event(events[-1]).count('->'), 1)
+
+    def test_conditional_requests(self):
+        """ Polls of an unchanged pipeline are answered with 304 and back off """
+        self.server.add_pipeline('long', [('soak', 1.0, 'Passed', 'success')])
+        watcher = pipewatch_utils.PipelineWatcher(self.client, 0.02, 0.32)
+        list(watcher.watch(['long']))
+        # Note: Polls at 0, .02, .06, .14, .30, .62 and .94, then 1.26 sees it pass.
+        self.assertLessEqual(watcher.requests, 9)
+        self.assertEqual(watcher.not_modified, watcher.requests - 2)
+        self.assertEqual(self.server.not_modified, watcher.not_modified)
+
+    def test_wait_for_stage(self):
+        """ Waiting returns on the poll that sees the stage finish """
+        pipeline = self.server.add_pipeline('manual', [('build', 0.1, 'Passed', 'success'),
+                                                       ('deploy', 0.4, 'Passed', 'manual')])
+        time.sleep(0.1)
+        pipeline.schedule_stage('deploy', time.time())
+        watcher = pipewatch_utils.PipelineWatcher(self.client, 0.05, 0.1)
+        start = time.time()
+        instance = watcher.wait_for_stage('manual', 1, 'deploy')
+        self.assertLess(time.time() - start, 0.4 + 0.1 + 0.1)
+        self.assertEqual(instance['stages'][1]['result'], 'Passed')
+
+    def test_unknown_pipeline(self):
+        """ A pipeline the server does not know is reported, not polled forever """
+        self.server.add_pipeline('known', [('build', 0.1, 'Passed', 'success')])
+        watcher = pipewatch_utils.PipelineWatcher(self.client, 0.05, 0.1)
+        list(watcher.watch(['known', 'missing']))
+        self.assertEqual(watcher.errors.keys(), ['missing'])
+        self.assertIn('known', watcher.instances)
+
+    def test_unreachable_server(self):
+        """ A pipeline whose polls keep failing is given up on and the command fails """
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        address = '127.0.0.1:%i' % sock.getsockname()[1]
+        sock.close()
+        client = http_utils.get_client('gocd', 'http://' + address)
+        watcher = pipewatch_utils.PipelineWatcher(client, 0.01, 0.02, max_failures=3)
+        start = time.time()
+        self.assertEqual(list(watcher.watch(['deploy'])), [])
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(watcher.errors.keys(), ['deploy'])
+        self.assertEqual(watcher.wait_for_stage('deploy', 1, 'build'), None)
+        self.assertEqual(watcher.errors.keys(), ['deploy'])
+
+    def test_process_all_stages(self):
+        """ Manual stages are scheduled, stages approved on success are waited for """
+        self.server.add_pipeline('all', [('build', 0.05, 'Passed', 'success'),
+                                         ('deploy', 0.05, 'Passed', 'manual'),
+                                         ('verify', 0.05, 'Passed', 'success')])
+        gocd_utils.process_all_stages('all', 1, self.ip_address)
+        self.assertEqual([path for method, path in self.server.requests if method == 'POST'],
+                         ['/go/run/all/1/deploy'])
+        instance = self.server.pipelines['all'].instance(time.time())
+        self.assertEqual([stage['result'] for stage in instance['stages']],
+                         ['Passed'] * 3)
+
+    def test_stage_state(self):
+        """ A stage without scheduled is scheduled only if it has a result """
+        self.assertEqual(pipewatch_utils.stage_state({'name': 'deploy'}),
+                         pipewatch_utils.NOT_RUN)
+        self.assertEqual(pipewatch_utils.stage_state({'name': 'deploy',
+                                                      'result': 'Unknown'}),
+                         pipewatch_utils.BUILDING)
+        self.assertEqual(pipewatch_utils.stage_state({'name': 'deploy',
+                                                      'result': 'Passed'}), 'Passed')
+        self.assertEqual(pipewatch_utils.stage_state({'name': 'deploy', 'scheduled': False,
+                                                      'result': 'Unknown'}),
+                         pipewatch_utils.NOT_RUN)
+
+    def test_process_legacy_stages(self):
+        """ Manual stages GoCD reports without scheduled are scheduled """
+        self.server.add_pipeline('old', [('build', 0.05, 'Passed', 'success'),
+                                         ('deploy', 0.05, 'Passed', 'manual')], legacy=True)
+        instance = self.server.pipelines['old'].instance(time.time())
+        self.assertNotIn('scheduled', instance['stages'][1])
+        gocd_utils.process_all_stages('old', 1, self.ip_address)
+        self.assertEqual([path for method, path in self.server.requests
+                          if method == 'POST'], ['/go/run/old/1/deploy'])
+        instance = self.server.pipelines['old'].instance(time.time())
+        self.assertEqual([stage['result'] for stage in instance['stages']],
+                         ['Passed'] * 2)
+
+    def test_watch_command(self):
+        """ stack pipe watch prints the transitions and fails with a failed stage """
+        self.server.add_pipeline('ok', [('build', 0.1, 'Passed', 'success')])
+        self.server.add_pipeline('broken', [('build', 0.1, 'Failed', 'success')])
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        cmd_pipe.slab_logger.addHandler(handler)
+        try:
+            result = CliRunner().invoke(cmd_pipe.cli, ['watch', 'ok', 'broken',
+                                                       '-u', 'user', '-p', 'pw',
+                                                       '-ip', self.ip_address])
+        finally:
+            cmd_pipe.slab_logger.removeHandler(handler)
+        self.assertEqual(result.exit_code, 1)
+        self.assertEqual(sorted(message for message in messages if '/1 build' in message),
+                         ['broken/1 build: Building', 'broken/1 build: Building -> Failed',
+                          'ok/1 build: Building', 'ok/1 build: Building -> Passed'])
+        self.assertEqual(messages[-1], 'Failed: broken')
+
+
+if __name__ == '__main__':
+    unittest.main()
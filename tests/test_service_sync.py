@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess32 as subprocess
+
+from servicelab.utils import service_utils
+
+
+class TestServiceSync(unittest.TestCase):
+    """
+    TestServiceSync class is a unittest class for the clone and fast forward
+    sync of service_utils, run against local bare repositories standing in for
+    gerrit.
+    """
+
+    def git(self, cwd, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME='slab', GIT_AUTHOR_EMAIL='slab@example.com',
+                   GIT_COMMITTER_NAME='slab', GIT_COMMITTER_EMAIL='slab@example.com')
+        return subprocess.check_output(('git', '-c', 'init.defaultBranch=master') + args,
+                                       cwd=cwd, env=env, stderr=subprocess.STDOUT)
+
+    def commit(self, *messages):
+        for message in messages:
+            with open(os.path.join(self.seed, 'file'), 'a') as stream:
+                stream.write(message + '\n')
+            self.git(self.seed, 'commit', '-qam', message)
+        self.git(self.seed, 'push', '-q', 'origin', 'HEAD')
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.stack = os.path.join(self.tempdir, 'stack')
+        os.makedirs(os.path.join(self.stack, 'services'))
+        for name in ('service-foo', 'ccs-data'):
+            self.git(self.tempdir, 'init', '-q', '--bare', '%s.git' % name)
+            self.git(os.path.join(self.tempdir, '%s.git' % name),
+                     'config', 'uploadpack.allowFilter', 'true')
+        self.git(self.tempdir, 'clone', '-q', 'service-foo.git', 'seed')
+        self.seed = os.path.join(self.tempdir, 'seed')
+        with open(os.path.join(self.seed, 'file'), 'w') as stream:
+            stream.write('init\n')
+        self.git(self.seed, 'add', 'file')
+        self.git(self.seed, 'commit', '-qm', 'init')
+        self.git(self.seed, 'push', '-q', 'origin', 'master')
+        self.git(self.seed, 'push', '-q', os.path.join(self.tempdir, 'ccs-data.git'),
+                 'master')
+        self.commit(*['commit %i' % num for num in range(100)])
+        self.git_url = service_utils.GIT_URL
+        service_utils.GIT_URL = 'file://%s/{service}.git' % self.tempdir
+        service_utils.USE_MIRRORS = False
+        self.repo = os.path.join(self.stack, 'services', 'service-foo')
+
+    def tearDown(self):
+        service_utils.GIT_URL = self.git_url
+        service_utils.USE_MIRRORS = True
+        shutil.rmtree(self.tempdir)
+
+    def head(self, repo):
+        return self.git(repo, 'log', '-1', '--format=%s').strip()
+
+    def test_shallow_partial_clone(self):
+        """ Services are cloned shallow and without blobs outside the tree """
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        self.assertTrue(os.path.isfile(os.path.join(self.repo, '.git', 'shallow')))
+        self.assertEqual(self.git(self.repo, 'rev-list', '--count', 'HEAD').strip(), '1')
+        self.assertEqual(self.git(self.repo, 'config', 'remote.origin.partialclonefilter')
+                         .strip(), 'blob:none')
+        self.assertEqual(self.head(self.repo), 'commit 99')
+
+    def test_fast_forward(self):
+        """ New commits are fetched and fast forwarded without unshallowing """
+        service_utils.sync_service(self.stack, 'master', 'slab', 'service-foo')
+        self.commit('commit 100', 'commit 101')
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.head(self.repo), 'commit 101')
+        self.assertEqual(self.git(self.repo, 'rev-list', '--count', 'HEAD').strip(), '3')
+
+    def test_new_branch(self):
+        """ A branch missing from the clone is fetched shallow and tracked """
+        service_utils.sync_service(self.stack, 'master', 'slab', 'service-foo')
+        self.git(self.seed, 'checkout', '-qb', 'release/1.0', 'HEAD~2')
+        self.commit('release fix')
+        self.assertTrue(service_utils.sync_service(self.stack, 'release/1.0', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.head(self.repo), 'release fix')
+        self.assertEqual(self.git(self.repo, 'rev-parse', '--abbrev-ref',
+                                  '@{upstream}').strip(), 'origin/release/1.0')
+        self.assertEqual(service_utils._git_pull_ff(self.stack, 'no-such-branch',
+                                                    'service-foo'),
+                         (1, 'Unable to find remote branch'))
+
+    def test_lazy_deepen(self):
+        """ History is deepened only as far as the fast forward check needs """
+        service_utils.sync_service(self.stack, 'master', 'slab', 'service-foo')
+        self.git(self.repo, 'update-ref', '-d', 'refs/remotes/origin/master')
+        self.commit(*['commit %i' % num for num in range(100, 130)])
+        self.assertTrue(service_utils.sync_service(self.stack, 'master', 'slab',
+                                                   'service-foo'))
+        self.assertEqual(self.head(self.repo), 'commit 129')
+        self.assertTrue(os.path.isfile(os.path.join(self.repo, '.git', 'shallow')))
+        self.assertTrue(int(self.git(self.repo, 'rev-list', '--count', 'HEAD')) < 131)
+
+    def test_sync_services(self):
+        """ Several services sync concurrently, results keep their order """
+        results = service_utils.sync_services(self.stack, 'slab',
+                                              [('service-foo', 'master'),
+                                               ('ccs-data', 'master'),
+                                               ('service-missing', 'master')])
+        self.assertEqual([(name, synced) for name, synced, _ in results],
+                         [('service-foo', True), ('ccs-data', True),
+                          ('service-missing', False)])
+        self.assertTrue(all(elapsed >= 0 for _, _, elapsed in results))
+        self.assertEqual(self.head(os.path.join(self.stack, 'services', 'ccs-data')),
+                         'init')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests the shared gerrit ssh connections
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import paramiko
+
+from servicelab.utils import ssh_utils
+from tests.benchmarks.standin_sshd import StandInGerrit
+
+
+class TestSSHUtils(unittest.TestCase):
+    """
+    TestSSHUtils class is a unittest class for ssh_utils, run against a local
+    ssh server standing in for gerrit.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.key = os.path.join(self.path, 'id_rsa')
+        paramiko.RSAKey.generate(1024).write_private_key_file(self.key)
+        self.server = StandInGerrit(projects=['servicelab', 'service-horizon'])
+        for number in range(1, 9):
+            self.server.add_change(number, 'servicelab' if number % 2 else 'service-horizon')
+        self.server.start()
+        self.conn = ssh_utils.GerritConnection('127.0.0.1', self.server.port, 'aaltman',
+                                               self.key, config=os.devnull)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.stop()
+        shutil.rmtree(self.path)
+
+    def test_one_transport(self):
+        """ Every command runs on its own channel of a single transport """
+        self.assertEqual([review['number'] for review in self.conn.query('change:3')],
+                         ['3'])
+        self.assertEqual(len(self.conn.query('project:servicelab')), 4)
+        self.assertEqual(self.conn.ls_projects(), (0, 'servicelab\nservice-horizon\n'))
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.conn.commands, 3)
+
+    def test_query_many(self):
+        """ Queries of a batch run at once, on parallel channels """
+        self.server.latency = 0.2
+        results = self.conn.query_many([['change:%i' % number] for number in range(1, 9)])
+        self.assertEqual([[review['number'] for review in result] for result in results],
+                         [[str(number)] for number in range(1, 9)])
+        self.assertEqual(self.server.connections, 1)
+        self.assertTrue(self.server.peak > 1)
+
+    def test_review(self):
+        """ Votes and messages are quoted into one gerrit review command """
+        revision = '%040x' % 5
+        self.conn.review(revision, code_review=-1, verified=1, message="Don't merge")
+        self.conn.review(revision, state='abandon')
+        self.assertEqual(self.server.reviews,
+                         [['--code-review', '-1', '--verified', '1', '--message',
+                           "Don't merge", revision], ['--abandon', revision]])
+        self.assertRaises(ssh_utils.GerritSSHError, self.conn.review, 'f' * 40)
+
+    def test_errors(self):
+        """ Failed commands raise GerritSSHError, a dropped transport reconnects """
+        self.conn.gerrit('create-project', 'service-new')
+        with self.assertRaises(ssh_utils.GerritSSHError) as raised:
+            self.conn.gerrit('create-project', 'service-new')
+        self.assertIn('already exists', str(raised.exception))
+        self.conn.transport.close()
+        self.assertEqual(len(self.conn.query('status:open')), 8)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_unreachable(self):
+        """ A server that can not be reached raises GerritSSHError """
+        port = self.server.port
+        self.server.stop()
+        conn = ssh_utils.GerritConnection('127.0.0.1', port, 'aaltman', self.key,
+                                          config=os.devnull)
+        self.assertRaises(ssh_utils.GerritSSHError, conn.query, 'change:1')
+
+    def test_get_connection(self):
+        """ Connections are shared per server and user """
+        conn = ssh_utils.get_connection('127.0.0.1', self.server.port, 'aaltman', self.key,
+                                        config=os.devnull)
+        self.assertIs(ssh_utils.get_connection('127.0.0.1', str(self.server.port),
+                                               'aaltman', self.key), conn)
+        self.assertIsNot(ssh_utils.get_connection('127.0.0.1', self.server.port,
+                                                  'kunanda', self.key), conn)
+        ssh_utils.close_all()
+        self.assertIsNot(ssh_utils.get_connection('127.0.0.1', self.server.port,
+                                                  'aaltman', self.key), conn)
+        ssh_utils.close_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Tests the concurrent teardown of openstack networks and VMs
+"""
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from servicelab.utils import openstack_utils
+from servicelab.utils import teardown_utils
+from tests.benchmarks.standin_openstack import StandInCloud
+
+ENVIRON = ('OS_AUTH_URL', 'OS_PASSWORD', 'OS_USERNAME', 'OS_REGION_NAME', 'OS_TENANT_NAME',
+           'OS_TENANT_ID')
+
+
+class Destroyer(object):
+    """
+    Stands in for vagrant.Vagrant, destroying VMs slowly and counting how many
+    are destroyed at once.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.destroyed = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def destroy(self, name):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+            self.destroyed.append(name)
+
+
+class Conflict(Exception):
+    status_code = 409
+
+
+class TestTeardownUtils(unittest.TestCase):
+    """
+    TestTeardownUtils class is a unittest class for teardown_utils and the
+    os_delete_networks teardown, run against a local keystone and neutron.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.environ = dict((name, os.environ.get(name)) for name in ENVIRON)
+        self.cloud = StandInCloud()
+        self.cloud.start()
+        os.environ.update(OS_AUTH_URL=self.cloud.auth_url, OS_PASSWORD='secret',
+                          OS_USERNAME='aaltman', OS_REGION_NAME='us-rdu-3',
+                          OS_TENANT_NAME='ServiceLab')
+        os.environ.pop('OS_TENANT_ID', None)
+        self.assertEqual(openstack_utils.os_ensure_network(self.path)[0], 0)
+        tenant_id = self.cloud.tenants[0]['id']
+        network = [network for network in self.cloud.resources['networks'].values()
+                   if network['tenant_id'] == tenant_id][0]
+        for _ in range(3):
+            self.cloud.create('ports', {'network_id': network['id'], 'device_id': 'vm',
+                                        'device_owner': 'compute:nova',
+                                        'fixed_ips': [{'subnet_id': network['subnets'][0],
+                                                       'ip_address': ''}]})
+        del self.cloud.requests[:]
+
+    def tearDown(self):
+        self.cloud.stop()
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.path)
+
+    def remaining(self, collection):
+        tenant_id = self.cloud.tenants[0]['id']
+        return [item for item in self.cloud.resources[collection].values()
+                if item['tenant_id'] == tenant_id]
+
+    def test_delete_networks(self):
+        """ The tenant is listed once and everything is deleted in order """
+        self.assertEqual(openstack_utils.os_delete_networks(self.path, True), 0)
+        for collection in ('networks', 'subnets', 'routers', 'ports'):
+            self.assertEqual(self.remaining(collection), [])
+        self.assertEqual(len(self.cloud.resources['networks']), 2)
+        listings = [path for method, path in self.cloud.requests
+                    if method == 'GET' and path.startswith('/network')]
+        self.assertEqual(sorted(listings), ['/network/v2.0/networks.json',
+                                            '/network/v2.0/ports.json',
+                                            '/network/v2.0/routers.json',
+                                            '/network/v2.0/subnets.json'])
+
+    def test_order(self):
+        """ Interfaces and ports go before subnets, subnets before networks """
+        slab = openstack_utils.SLab_OS(self.path, 'secret', 'us-rdu-3',
+                                       username='aaltman', os_tenant_name='ServiceLab')
+        slab.login_or_gettoken()
+        slab.connect_to_neutron()
+        plan = teardown_utils.network_plan(slab.neutron, slab.snapshot,
+                                           slab.snapshot.items('networks'),
+                                           slab.snapshot.items('routers'))
+        kinds = [key.split(':')[0] for key in plan.steps]
+        self.assertEqual(kinds.count('port'), 5)
+        self.assertEqual(kinds.count('subnet'), 2)
+        self.assertEqual(kinds.count('router'), 1)
+        self.assertEqual(plan.run(), 0)
+        done = sorted(plan.steps.values(), key=lambda step: step.attempts)
+        self.assertEqual([step.attempts for step in done], [1] * len(done))
+
+    def test_kept_router(self):
+        """ A router with interfaces on kept networks is not deleted """
+        slab = openstack_utils.SLab_OS(self.path, 'secret', 'us-rdu-3',
+                                       username='aaltman', os_tenant_name='ServiceLab')
+        slab.login_or_gettoken()
+        slab.connect_to_neutron()
+        networks = slab.snapshot.items('networks')
+        plan = teardown_utils.network_plan(slab.neutron, slab.snapshot, networks[:1],
+                                           slab.snapshot.items('routers'))
+        self.assertEqual(plan.run(), 0)
+        self.assertEqual(len(self.remaining('networks')), 1)
+        self.assertEqual(len(self.remaining('routers')), 1)
+
+    def test_conflict_retried(self):
+        """ A deletion refused while neutron is busy is retried """
+        subnet = self.remaining('subnets')[0]
+        self.cloud.conflicts[subnet['id']] = 2
+        slab = openstack_utils.SLab_OS(self.path, 'secret', 'us-rdu-3',
+                                       username='aaltman', os_tenant_name='ServiceLab')
+        slab.login_or_gettoken()
+        slab.connect_to_neutron()
+        plan = teardown_utils.network_plan(slab.neutron, slab.snapshot,
+                                           slab.snapshot.items('networks'),
+                                           slab.snapshot.items('routers'))
+        self.assertEqual(plan.run(delay=0.05), 0)
+        self.assertEqual(plan.steps['subnet:' + subnet['id']].attempts, 3)
+        self.assertEqual(self.remaining('networks'), [])
+
+    def test_failure_skips_dependents(self):
+        """ What waits for a failed deletion is skipped, the rest still runs """
+        plan = teardown_utils.TeardownPlan()
+        deleted = []
+
+        def fail():
+            raise Conflict('in use')
+        plan.add('subnet:a', 'subnet a', fail)
+        plan.add('network:a', 'network a', lambda: deleted.append('a'), ['subnet:a'])
+        plan.add('network:b', 'network b', lambda: deleted.append('b'))
+        self.assertEqual(plan.run(retries=1, delay=0.01), 1)
+        self.assertEqual(deleted, ['b'])
+        self.assertEqual(plan.steps['subnet:a'].attempts, 2)
+        self.assertEqual(plan.steps['network:a'].state, teardown_utils.SKIPPED)
+        lines = plan.report()
+        self.assertEqual(lines[-1].split(' in ')[0], 'Deleted 1 of 3')
+
+    def test_vms(self):
+        """ VMs are destroyed at once, bounded by the workers """
+        vagrant = Destroyer(0.2)
+        plan = teardown_utils.vm_plan(vagrant, ['infra-%03i' % i for i in range(1, 7)])
+        start = time.time()
+        self.assertEqual(plan.run(workers=3), 0)
+        self.assertTrue(time.time() - start < 0.2 * 6 / 2)
+        self.assertEqual(vagrant.peak, 3)
+        self.assertEqual(len(vagrant.destroyed), 6)
+        self.assertTrue(all(step.elapsed >= 0.2 for step in plan.steps.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
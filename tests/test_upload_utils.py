@@ -0,0 +1,141 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from servicelab.utils import upload_utils
+from tests.benchmarks.standin_server import StandInServer
+
+
+class TestUploadUtils(unittest.TestCase):
+    """
+    TestUploadUtils class is a unittest class for upload_utils, run against a
+    local http server standing in for Artifactory and Pulp.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.server = StandInServer()
+        self.server.start()
+        self.files = []
+        for num in range(3):
+            fname = os.path.join(self.tempdir, 'pkg-%i.rpm' % num)
+            with open(fname, 'wb') as stream:
+                stream.write(os.urandom(1024 * 1024 + 1000 * num))
+            self.files.append(fname)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tempdir)
+
+    def content(self, fname):
+        with open(fname, 'rb') as stream:
+            return stream.read()
+
+    def test_artifactory_upload(self):
+        """ New content is streamed, known content is deployed by checksum """
+        url = self.server.url + '/artifactory/repo/pkg-0.rpm'
+        self.assertEqual(upload_utils.artifactory_upload(self.files[0], url),
+                         (0, 'Uploaded pkg-0.rpm'))
+        sha1 = hashlib.sha1(self.content(self.files[0])).hexdigest()
+        self.assertEqual(self.server.artifacts['/artifactory/repo/pkg-0.rpm'], sha1)
+        self.assertEqual(self.server.blobs[sha1], self.content(self.files[0]))
+        self.assertEqual(upload_utils.artifactory_upload(self.files[0],
+                                                         url.replace('repo', 'other')),
+                         (0, 'Deployed pkg-0.rpm by checksum'))
+        self.assertEqual(self.server.artifacts['/artifactory/other/pkg-0.rpm'], sha1)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_artifactory_upload_files(self):
+        """ Several files go to the folder url concurrently """
+        self.server.latency = 0.2
+        returncode, results = upload_utils.artifactory_upload_files(
+            self.files, self.server.url + '/artifactory/repo/', workers=3)
+        self.assertEqual(returncode, 0)
+        self.assertEqual([result[0] for result in results], self.files)
+        self.assertEqual(sorted(self.server.artifacts),
+                         ['/artifactory/repo/pkg-%i.rpm' % num for num in range(3)])
+        self.assertEqual(self.server.peak, 3)
+        self.assertEqual(upload_utils.artifactory_target('http://a/r/x.rpm', 'y.rpm'),
+                         'http://a/r/x.rpm')
+
+    def test_pulp_upload(self):
+        """ Segments of all rpms are sent in parallel, then imported and published """
+        self.server.latency = 0.05
+        uploader = upload_utils.PulpUploader(self.server.url, ('admin', 'admin'),
+                                             workers=4, segment_size=256 * 1024)
+        try:
+            returncode, results = uploader.upload('CentOS-7-x86_64', self.files)
+        finally:
+            uploader.close()
+        self.assertEqual(returncode, 0)
+        self.assertEqual(results, [(fname, None) for fname in self.files])
+        self.assertEqual(sorted(self.server.repos['CentOS-7-x86_64']),
+                         sorted(self.content(fname) for fname in self.files))
+        self.assertEqual(self.server.published, ['CentOS-7-x86_64'])
+        self.assertEqual(self.server.uploads, {})
+        self.assertEqual(self.server.peak, 4)
+        self.assertEqual(uploader.sent, sum(os.path.getsize(fname) for fname in self.files))
+
+    def test_pulp_upload_failure(self):
+        """ A failed upload is reported and not imported """
+        uploader = upload_utils.PulpUploader(self.server.url + '/missing')
+        returncode, results = uploader.upload('CentOS-7-x86_64', self.files[:1])
+        self.assertEqual(returncode, 1)
+        self.assertIn('Error 404', results[0][1])
+        self.assertEqual(self.server.repos, {})
+
+    def pulp_upload(self, **kwargs):
+        uploader = upload_utils.PulpUploader(self.server.url, ('admin', 'admin'),
+                                             poll=0.02, **kwargs)
+        try:
+            return uploader.upload('CentOS-7-x86_64', self.files)
+        finally:
+            uploader.close()
+
+    def test_pulp_import_tasks(self):
+        """ Uploads are deleted and the repo published only once the imports ran """
+        self.server.task_delay = 0.3
+        returncode, results = self.pulp_upload()
+        self.assertEqual(returncode, 0)
+        self.assertEqual(results, [(fname, None) for fname in self.files])
+        self.assertEqual(sorted(self.server.repos['CentOS-7-x86_64']),
+                         sorted(self.content(fname) for fname in self.files))
+        self.assertEqual(self.server.published, ['CentOS-7-x86_64'])
+        self.assertEqual(self.server.uploads, {})
+        self.assertEqual([task['state'] for task in self.server.tasks.values()],
+                         ['finished'] * 4)
+
+    def test_pulp_import_error(self):
+        """ An rpm whose import task failed is reported, the others are published """
+        self.server.bad_rpms.add(hashlib.sha1(self.content(self.files[1])).hexdigest())
+        returncode, results = self.pulp_upload()
+        self.assertEqual(returncode, 1)
+        self.assertEqual([result[1] for result in results[::2]], [None, None])
+        self.assertIn('Not a valid rpm', results[1][1])
+        self.assertEqual(len(self.server.repos['CentOS-7-x86_64']), 2)
+        self.assertEqual(self.server.published, ['CentOS-7-x86_64'])
+
+    def test_pulp_import_timeout(self):
+        """ The upload of an import still running at the timeout is kept """
+        self.server.task_delay = 0.5
+        returncode, results = self.pulp_upload(timeout=0.1)
+        self.assertEqual(returncode, 1)
+        self.assertIn('still waiting', results[0][1])
+        self.assertEqual(self.server.published, [])
+        time.sleep(0.6)
+        self.assertEqual(len(self.server.repos['CentOS-7-x86_64']), 3)
+
+    def test_file_segments(self):
+        """ Segments cover the file, an empty file has one empty segment """
+        self.assertEqual(upload_utils.file_segments(self.files[2], 400 * 1024),
+                         [(0, 409600), (409600, 409600), (819200, 231376)])
+        empty = os.path.join(self.tempdir, 'empty.rpm')
+        open(empty, 'w').close()
+        self.assertEqual(upload_utils.file_segments(empty), [(0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests the vagrant plugin check and the VM status engine of vagrant_utils
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from servicelab.utils import vagrant_utils
+from servicelab.utils import openstack_utils
+from servicelab.utils import status_utils
+from tests.benchmarks.standin_vagrant import StandInVagrant
+
+MACHINES = {'infra-001': 'running', 'rhel7-001': 'poweroff', 'rhel7-002': 'not_created'}
+
+
+class FakeVirtualBox(object):
+    """
+    Stands in for virtualbox.VirtualBox, knowing machines by their uuid.
+    """
+
+    class Machine(object):
+        def __init__(self, state):
+            self.state = state
+
+    def __init__(self, states):
+        self.states = states
+
+    def find_machine(self, uuid):
+        return self.Machine(self.states[uuid])
+
+
+class TestVagrantStatus(unittest.TestCase):
+    """
+    TestVagrantStatus class is a unittest class for the cached plugin check and
+    the StatusEngine, run against a vagrant executable standing in for the real one.
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), '.stack')
+        os.mkdir(self.path)
+        open(os.path.join(self.path, 'Vagrantfile'), 'w').close()
+        self.vagrant_home = os.environ.get('VAGRANT_HOME')
+        os.environ['VAGRANT_HOME'] = self.path
+        self.vagrant = StandInVagrant(MACHINES)
+        self.vagrant.start()
+        vagrant_utils._engines.clear()
+        vagrant_utils._plugins_checked.clear()
+        vagrant_utils._vbox[:] = [None]
+
+    def tearDown(self):
+        self.vagrant.stop()
+        if self.vagrant_home is None:
+            os.environ.pop('VAGRANT_HOME', None)
+        else:
+            os.environ['VAGRANT_HOME'] = self.vagrant_home
+        shutil.rmtree(os.path.dirname(self.path))
+        vagrant_utils._engines.clear()
+        vagrant_utils._plugins_checked.clear()
+        del vagrant_utils._vbox[:]
+
+    def commands(self):
+        return [call[1] for call in self.vagrant.calls]
+
+    def test_plugins_cached(self):
+        """ The plugins are listed once for a vagrant install, across commands """
+        vagrant_utils.Connect_to_vagrant('infra-001', self.path)
+        self.assertEqual(self.commands(), ['--version', 'plugin'])
+        self.vagrant.clear()
+        vagrant_utils.Connect_to_vagrant('infra-001', self.path)
+        vagrant_utils._plugins_checked.clear()
+        vagrant_utils.Connect_to_vagrant('infra-001', self.path)
+        self.assertEqual(self.commands(), [])
+
+    def test_missing_plugin(self):
+        """ A missing plugin is installed once, the ones present are not reinstalled """
+        state = self.vagrant.load()
+        state['plugins'] = ['vagrant-hostmanager']
+        self.vagrant.save(state)
+        for _ in range(2):
+            vagrant_utils.Connect_to_vagrant('infra-001', self.path)
+        self.assertEqual(self.vagrant.calls[2][1:],
+                         ['plugin', 'install', 'vagrant-openstack-provider'])
+        self.assertEqual(len(self.vagrant.calls), 3)
+        self.assertEqual(self.vagrant.plugins, ['vagrant-hostmanager',
+                                                'vagrant-openstack-provider'])
+
+    def test_one_status(self):
+        """ Every state a command needs comes from one vagrant status """
+        self.assertEqual(vagrant_utils.vm_isrunning('infra-001', self.path), (0, False))
+        self.assertEqual(vagrant_utils.vm_isrunning('rhel7-001', self.path), (1, False))
+        self.assertEqual(vagrant_utils.vm_isrunning('rhel7-002', self.path), (1, False))
+        self.assertEqual(vagrant_utils.vm_isrunning('rhel7-003', self.path), (2, False))
+        self.assertEqual(openstack_utils.os_check_vms(self.path), (0, True))
+        self.assertEqual(status_utils.show_vm_status(self.path), (1, True))
+        self.assertEqual(self.commands(), ['--version', 'plugin', 'status'])
+
+    def test_state_change(self):
+        """ A command changing the state of the VMs makes the next check ask again """
+        self.assertEqual(openstack_utils.os_check_vms(self.path), (0, True))
+        self.assertEqual(openstack_utils.os_delete_vms(self.path, True), 0)
+        self.assertEqual(openstack_utils.os_check_vms(self.path), (0, False))
+        self.assertEqual(self.commands().count('status'), 2)
+        self.assertEqual(self.commands().count('destroy'), 3)
+
+    def test_available(self):
+        """ check_vm_is_available reads the states once per Vagrantfile """
+        for name in MACHINES:
+            os.makedirs(os.path.join(self.path, '.vagrant', 'machines', name))
+        self.assertTrue(vagrant_utils.check_vm_is_available(self.path))
+        self.assertEqual(self.commands(), ['--version', 'plugin', 'status'])
+
+    def test_virtualbox(self):
+        """ The state of a local VM vagrant created is read from VirtualBox """
+        for name, uuid in (('infra-001', 'a1'), ('rhel7-001', 'b2')):
+            machine = os.path.join(self.path, '.vagrant', 'machines', name, 'virtualbox')
+            os.makedirs(machine)
+            with open(os.path.join(machine, 'id'), 'w') as id_stream:
+                id_stream.write(uuid)
+        vagrant_utils._vbox[:] = [FakeVirtualBox({'a1': 'Running', 'b2': 'Saved'})]
+        self.assertEqual(vagrant_utils.vm_isrunning('infra-001', self.path), (0, False))
+        self.assertEqual(vagrant_utils.vm_isrunning('rhel7-001', self.path), (1, True))
+        self.assertEqual(self.commands(), [])
+        self.assertEqual(vagrant_utils.vm_isrunning('rhel7-002', self.path), (1, False))
+        self.assertEqual(self.commands(), ['--version', 'plugin', 'status'])
+
+
+if __name__ == '__main__':
+    unittest.main()
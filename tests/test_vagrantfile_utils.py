@@ -279,6 +279,66 @@ Vagrant.configure(VAGRANTFILE_API_VERSION) do |cluster|
         self.vf_utils.set_host_image_flavors(self.ctx.path)
         self.assertEqual(self.vf_utils.host_vars, compare_data)
 
+    def host(self, name, ip):
+        host_dict = dict(self.host_dict[self.test_host], ip=ip)
+        return {name: host_dict}
+
+    def test_add_vms_written_once(self):
+        """
+        Test that add_vms writes the Vagrantfile once, and that it reads back the same
+        """
+        self.vf_utils.init_vagrantfile()
+        names = ['infra-001', 'rhel7-001', 'rhel7-002']
+        hosts = [self.host(name, '192.168.100.%i' % (index + 2))
+                 for index, name in enumerate(names)]
+        self.assertEqual(self.vf_utils.add_vms(hosts), 0)
+        self.assertEqual(self.vf_utils.writes, 2)
+        with open(self.vagrant_file, 'r') as f:
+            file_data = f.read()
+        self.assertEqual(file_data.count('cluster.vm.define'), 3)
+        self.assertTrue(file_data.endswith('  config.vm.synced_folder "services", '
+                                           '"/opt/ccs/services"\nend\nend\n'))
+        reread = vagrantfile_utils.SlabVagrantfile(self.host_var_tempdir)
+        self.assertEqual(reread.load(), 0)
+        self.assertEqual(reread.vms.keys(), names)
+        self.assertEqual(reread.render(), file_data)
+
+    def test_add_same_vm(self):
+        """
+        Test that adding a VM again replaces it, without writing the same file again
+        """
+        self.vf_utils.add_virtualbox_vm(self.host_dict)
+        self.assertEqual(self.vf_utils.writes, 1)
+        vf_utils = vagrantfile_utils.SlabVagrantfile(self.host_var_tempdir)
+        vf_utils.add_virtualbox_vm(self.host_dict)
+        self.assertEqual(vf_utils.writes, 0)
+        vf_utils.add_virtualbox_vm(self.host('test_host', '192.168.100.9'))
+        self.assertEqual(vf_utils.writes, 1)
+        with open(self.vagrant_file, 'r') as f:
+            file_data = f.read()
+        self.assertEqual(file_data.count('cluster.vm.define'), 1)
+        self.assertTrue('ip: "192.168.100.9"' in file_data)
+
+    def test_delete_it(self):
+        """
+        Test that delete_it only removes the VM of that exact name
+        """
+        hosts = [self.host('rhel7-001', '192.168.100.2'),
+                 self.host('rhel7-0011', '192.168.100.3')]
+        self.vf_utils.add_vms(hosts)
+        vf_utils = vagrantfile_utils.SlabVagrantfile(self.host_var_tempdir)
+        self.assertFalse(vf_utils.delete_it('rhel7'))
+        self.assertTrue(vf_utils.delete_virtualbox_vm('rhel7-001'))
+        self.assertFalse(vf_utils.delete_it('rhel7-001'))
+        with open(self.vagrant_file, 'r') as f:
+            file_data = f.read()
+        self.assertTrue(file_data.startswith(self.vagrant_data))
+        self.assertEqual(file_data.count('cluster.vm.define'), 1)
+        self.assertTrue('config.vm.hostname = "rhel7-0011"' in file_data)
+        self.assertTrue(vf_utils.delete_it('rhel7-0011'))
+        with open(self.vagrant_file, 'r') as f:
+            self.assertEqual(f.read(), self.vagrant_data + '\n')
+
 
 if __name__ == '__main__':
     unittest.main()
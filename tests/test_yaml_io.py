@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from servicelab.utils import yaml_io
+from servicelab.utils import ordered_yaml
+
+
+class TestYamlIo(unittest.TestCase):
+    """
+    TestYamlIo class is a unittest class for yaml_io, the central yaml reader and
+    writer.
+    """
+    DOC = "hosts:\n  db-001:\n    role: tenant_db\n    memory: 512\n" \
+          "  aio-001:\n    role: aio\n    min: true\n"
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_load(self):
+        """ Plain loads return dicts with yaml types resolved """
+        doc = yaml_io.load(self.DOC)
+        self.assertEqual(type(doc['hosts']), dict)
+        self.assertEqual(doc['hosts']['db-001']['memory'], 512)
+        self.assertTrue(doc['hosts']['aio-001']['min'] is True)
+
+    def test_ordered_round_trip(self):
+        """ Ordered loads keep the key order through a dump """
+        doc = yaml_io.load(self.DOC, ordered=True)
+        self.assertEqual(type(doc['hosts']), OrderedDict)
+        self.assertEqual(doc['hosts'].keys(), ['db-001', 'aio-001'])
+        self.assertEqual(yaml_io.dump(doc), self.DOC)
+
+    def test_ordered_yaml_file(self):
+        """ ordered_yaml.load / dump keep working on top of yaml_io """
+        fname = os.path.join(self.tempdir, 'environment.yaml')
+        with open(fname, 'w') as stream:
+            stream.write(self.DOC)
+        with open(fname) as stream:
+            doc = ordered_yaml.load(stream)
+        ordered_yaml.dump(doc, fname)
+        with open(fname) as stream:
+            self.assertEqual(stream.read(), self.DOC)
+
+    def test_dump_is_safe(self):
+        """ Dumps never contain python specific tags """
+        text = yaml_io.dump({'ports': (22, 80), 'name': u'infra-001'})
+        self.assertNotIn('!!python', text)
+        self.assertEqual(yaml_io.load(text), {'ports': [22, 80], 'name': 'infra-001'})
+
+    def test_invalid_yaml(self):
+        """ Syntax errors surface as yaml_io.YAMLError """
+        self.assertRaises(yaml_io.YAMLError, yaml_io.load, "hosts: [db-001\n")
+
+    def test_check_clean(self):
+        """ A clean stream has no problems """
+        self.assertEqual(yaml_io.check(self.DOC), [])
+
+    def test_check_syntax_error(self):
+        """ Syntax errors and tab indentation are errors with line and column """
+        self.assertEqual(yaml_io.check("hosts:\n  db-001\n    role: aio\n")[0][:3],
+                         (3, 9, 'error'))
+        self.assertEqual(yaml_io.check("hosts:\n\tdb-001: {}\n")[0][:3],
+                         (2, 1, 'error'))
+
+    def test_check_duplicate_keys(self):
+        """ Duplicate keys are warnings, merge keys may repeat """
+        self.assertEqual(yaml_io.check("a: 1\nb: {c: 1, c: 2}\na: 3\n"),
+                         [(2, 11, 'warning', "duplicate key 'c'"),
+                          (3, 1, 'warning', "duplicate key 'a'")])
+        self.assertEqual(yaml_io.check("x: &x {a: 1}\ny:\n  <<: *x\n  <<: *x\n"), [])
+
+    def test_check_anchors(self):
+        """ Undefined aliases are errors, anchors may be redefined """
+        self.assertEqual(yaml_io.check("a: &x 1\nb: &x 2\nc: *x\n"), [])
+        self.assertEqual(yaml_io.check("a: &x 1\n---\nb: *x\n"),
+                         [(3, 4, 'error', "found undefined alias 'x'")])
+
+
+if __name__ == '__main__':
+    unittest.main()
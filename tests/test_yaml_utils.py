@@ -103,6 +103,24 @@ class TestYamlUtils(unittest.TestCase):
         self.assertEquals(
             yaml_utils.validate_syntax(
                 TestYamlUtils.INVALID_FILE_PATH), 1)
+        self.assertEquals(yaml_utils.validate_syntax("tests/no-such-file.yaml"), 1)
+
+    def test_check_syntax_files(self):
+        """ Tests validating a directory of yaml files in parallel. Results come
+            back in file order with line and column of each problem.
+        """
+        shutil.copy(TestYamlUtils.VALID_FILE_PATH, self.temp_dir)
+        shutil.copy(TestYamlUtils.INVALID_FILE_PATH, self.temp_dir)
+        file_names = yaml_utils.find_yaml_files([self.temp_dir])
+        self.assertEquals([os.path.basename(fname) for fname in file_names],
+                          ['Invalid.yaml', 'Valid.yaml', 'testfile.yaml'])
+        results = yaml_utils.check_syntax_files(file_names, jobs=2)
+        self.assertEquals([result[0] for result in results], file_names)
+        self.assertEquals(results[0][1], (1, [(2, 6, 'error',
+                                               'mapping values are not allowed '
+                                               'in this context')]))
+        self.assertEquals(results[1][1], (0, []))
+        self.assertEquals(results[2][1], (0, []))
 
     def test_host_exists_vagrantyaml(self):
         """ Tests syntax validation of yaml.